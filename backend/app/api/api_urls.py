@@ -18,12 +18,14 @@ from .root_views import (
     TenantViewSet,
     HealthView,
 )
+from .views.ticket import TagViewSet
 
 # Create router
 router = DefaultRouter()
 router.register(r"tickets", TicketViewSet, basename="ticket")
 router.register(r"users", UserViewSet, basename="user")
 router.register(r"tenants", TenantViewSet, basename="tenant")
+router.register(r"tags", TagViewSet, basename="tag")
 
 urlpatterns = [
     # Health check
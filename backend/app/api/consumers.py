@@ -2,19 +2,62 @@
 WebSocket-консюмеры для портала WorkerNet.
 Обрабатывают уведомления в реальном времени, обновления тикетов и чат.
 """
-import json
+import re
+import time
 from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.consumer import get_handler_name
 from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
+from django.conf import settings
 from django.utils import timezone
 
+from app.core.chat_conversations import is_participant
+from app.core.chat_history import chat_history, load_older
+from app.core.chat_writer import chat_writer
+from app.core.presence import presence, typing_throttle
+from app.core.tracing import traced
+from app.core import dashboard_renderer, ws_frames
+
 User = get_user_model()
 
 
-class TicketConsumer(AsyncWebsocketConsumer):
+class EncodedWebsocketConsumer(AsyncWebsocketConsumer):
+    """
+    Базовый консюмер с кодировкой кадров, согласованной при подключении.
+    
+    Клиент выбирает JSON или MessagePack подпротоколом WebSocket (см.
+    app.core.ws_frames). События групп приходят с готовыми кадрами и
+    отправляются через send_event() без повторной сериализации.
+    """
+    
+    encoding = ws_frames.JSON
+    
+    async def accept(self, subprotocol=None):
+        """Принять соединение с согласованным подпротоколом."""
+        self.encoding, negotiated = ws_frames.negotiate(self.scope)
+        await super().accept(subprotocol or negotiated)
+    
+    async def send_frame(self, frame):
+        """Отправить готовый кадр: str — текстом, bytes — бинарно."""
+        if isinstance(frame, bytes):
+            await self.send(bytes_data=frame)
+        else:
+            await self.send(text_data=frame)
+    
+    async def send_payload(self, payload):
+        """Закодировать сообщение для этого соединения и отправить."""
+        await self.send_frame(ws_frames.encode(payload, self.encoding))
+    
+    async def send_event(self, event):
+        """Отправить кадр события группы, закодированный отправителем."""
+        await self.send_frame(event['frames'][self.encoding])
+
+
+class TicketConsumer(EncodedWebsocketConsumer):
     """Консюмер WebSocket для обновлений по тикетам."""
     
+    @traced(operation_type='websocket')
     async def connect(self):
         """Подключение к каналу обновлений конкретного тикета."""
         self.ticket_id = self.scope['url_route']['kwargs']['ticket_id']
@@ -36,10 +79,11 @@ class TicketConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
     
-    async def receive(self, text_data):
+    @traced(operation_type='websocket')
+    async def receive(self, text_data=None, bytes_data=None):
         """Приём сообщения от клиента WebSocket."""
         try:
-            text_data_json = json.loads(text_data)
+            text_data_json = ws_frames.decode(text_data, bytes_data)
             message_type = text_data_json.get('type')
             
             if message_type == 'comment':
@@ -48,11 +92,11 @@ class TicketConsumer(AsyncWebsocketConsumer):
                 await self.handle_status_update(text_data_json)
             elif message_type == 'assignment':
                 await self.handle_assignment(text_data_json)
-        except json.JSONDecodeError:
-            await self.send(text_data=json.dumps({
+        except ValueError:
+            await self.send_payload({
                 'type': 'error',
-                'message': 'Invalid JSON'
-            }))
+                'message': 'Invalid frame'
+            })
     
     async def handle_comment(self, data):
         """Обработка добавления нового комментария."""
@@ -64,7 +108,7 @@ class TicketConsumer(AsyncWebsocketConsumer):
         # Отправить комментарий всем подписчикам группы тикета
         await self.channel_layer.group_send(
             self.ticket_group_name,
-            {
+            ws_frames.group_event('comment_added', self.ticket_group_name, {
                 'type': 'comment_added',
                 'comment': {
                     'id': comment.id,
@@ -73,7 +117,7 @@ class TicketConsumer(AsyncWebsocketConsumer):
                     'created_at': comment.created_at.isoformat(),
                     'is_internal': comment.is_internal
                 }
-            }
+            })
         )
     
     async def handle_status_update(self, data):
@@ -86,10 +130,10 @@ class TicketConsumer(AsyncWebsocketConsumer):
         # Разослать обновление статуса подписчикам
         await self.channel_layer.group_send(
             self.ticket_group_name,
-            {
+            ws_frames.group_event('status_updated', self.ticket_group_name, {
                 'type': 'status_updated',
                 'status': status
-            }
+            })
         )
     
     async def handle_assignment(self, data):
@@ -102,34 +146,26 @@ class TicketConsumer(AsyncWebsocketConsumer):
         # Разослать обновление назначения подписчикам
         await self.channel_layer.group_send(
             self.ticket_group_name,
-            {
+            ws_frames.group_event('assignment_updated', self.ticket_group_name, {
                 'type': 'assignment_updated',
                 'assigned_to': user_id
-            }
+            })
         )
     
     async def comment_added(self, event):
         """Отправить событие о новом комментарии клиенту."""
-        await self.send(text_data=json.dumps({
-            'type': 'comment_added',
-            'comment': event['comment']
-        }))
+        await self.send_event(event)
     
     async def status_updated(self, event):
         """Отправить событие об обновлении статуса клиенту."""
-        await self.send(text_data=json.dumps({
-            'type': 'status_updated',
-            'status': event['status']
-        }))
+        await self.send_event(event)
     
     async def assignment_updated(self, event):
         """Отправить событие об изменении назначения клиенту."""
-        await self.send(text_data=json.dumps({
-            'type': 'assignment_updated',
-            'assigned_to': event['assigned_to']
-        }))
+        await self.send_event(event)
     
     @database_sync_to_async
+    @traced(operation_type='db')
     def save_comment(self, comment_data):
         """Сохранить комментарий в базе данных."""
         from app.models.ticket import Ticket, TicketComment
@@ -144,6 +180,7 @@ class TicketConsumer(AsyncWebsocketConsumer):
         return comment
     
     @database_sync_to_async
+    @traced(operation_type='db')
     def update_ticket_status(self, status):
         """Обновить статус тикета."""
         from app.models.ticket import Ticket
@@ -153,6 +190,7 @@ class TicketConsumer(AsyncWebsocketConsumer):
         ticket.save()
     
     @database_sync_to_async
+    @traced(operation_type='db')
     def update_ticket_assignment(self, user_id):
         """Обновить назначение ответственного по тикету."""
         from app.models.ticket import Ticket
@@ -166,9 +204,10 @@ class TicketConsumer(AsyncWebsocketConsumer):
         ticket.save()
 
 
-class NotificationConsumer(AsyncWebsocketConsumer):
+class NotificationConsumer(EncodedWebsocketConsumer):
     """Консюмер WebSocket для пользовательских уведомлений."""
     
+    @traced(operation_type='websocket')
     async def connect(self):
         """Подключение к личному каналу уведомлений пользователя."""
         if self.scope['user'] == AnonymousUser():
@@ -185,6 +224,13 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         )
         
         await self.accept()
+        
+        # Сразу отдаём текущий счётчик, чтобы клиенту не нужно было опрашивать REST
+        unread_count = await self.get_unread_count()
+        await self.send_payload({
+            'type': 'unread_count_updated',
+            'unread_count': unread_count
+        })
     
     async def disconnect(self, close_code):
         """Отключение от канала уведомлений."""
@@ -194,68 +240,97 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
     
-    async def receive(self, text_data):
+    @traced(operation_type='websocket')
+    async def receive(self, text_data=None, bytes_data=None):
         """Приём сообщения от клиента WebSocket."""
         try:
-            text_data_json = json.loads(text_data)
+            text_data_json = ws_frames.decode(text_data, bytes_data)
             message_type = text_data_json.get('type')
             
             if message_type == 'mark_read':
                 await self.handle_mark_read(text_data_json)
-        except json.JSONDecodeError:
-            await self.send(text_data=json.dumps({
+        except ValueError:
+            await self.send_payload({
                 'type': 'error',
-                'message': 'Invalid JSON'
-            }))
+                'message': 'Invalid frame'
+            })
     
     async def handle_mark_read(self, data):
         """Отметить уведомление как прочитанное."""
         notification_id = data.get('notification_id')
         
         # Mark notification as read
-        await self.mark_notification_read(notification_id)
+        was_unread, unread_count = await self.mark_notification_read(notification_id)
         
         # Send confirmation
-        await self.send(text_data=json.dumps({
+        await self.send_payload({
             'type': 'notification_marked_read',
             'notification_id': notification_id
-        }))
+        })
+        
+        # Обновить счётчик во всех открытых вкладках пользователя
+        if was_unread:
+            await self.channel_layer.group_send(
+                self.notification_group_name,
+                ws_frames.group_event('unread_count_updated', self.notification_group_name, {
+                    'type': 'unread_count_updated',
+                    'unread_count': unread_count
+                })
+            )
     
     async def notification_created(self, event):
         """Отправить событие о создании уведомления клиенту."""
-        await self.send(text_data=json.dumps({
-            'type': 'notification_created',
-            'notification': event['notification']
-        }))
+        await self.send_event(event)
     
     async def notification_updated(self, event):
         """Отправить событие об обновлении уведомления клиенту."""
-        await self.send(text_data=json.dumps({
-            'type': 'notification_updated',
-            'notification': event['notification']
-        }))
+        await self.send_event(event)
+    
+    async def unread_count_updated(self, event):
+        """Отправить клиенту новое значение счётчика непрочитанных."""
+        await self.send_event(event)
     
     @database_sync_to_async
+    @traced(operation_type='db')
+    def get_unread_count(self):
+        """Получить счётчик непрочитанных уведомлений."""
+        from app.core.notification_counters import unread_counter
+        
+        return unread_counter.get(self.user_id)
+    
+    @database_sync_to_async
+    @traced(operation_type='db')
     def mark_notification_read(self, notification_id):
         """Пометить уведомление как прочитанное."""
         from app.models.notification import Notification
+        from app.core.notification_counters import unread_counter
         
-        try:
-            notification = Notification.objects.get(id=notification_id, user_id=self.user_id)
-            notification.is_read = True
-            notification.save()
-        except Notification.DoesNotExist:
-            pass
+        updated = Notification.objects.filter(
+            id=notification_id, user_id=self.user_id, is_read=False
+        ).update(is_read=True)
+        if not updated:
+            return False, None
+        
+        unread_count = unread_counter.decr(self.user_id)
+        if unread_count is None:
+            unread_count = unread_counter.reconcile(self.user_id)
+        return True, unread_count
 
 
-class ChatConsumer(AsyncWebsocketConsumer):
+class ChatConsumer(EncodedWebsocketConsumer):
     """Консюмер WebSocket для чата службы поддержки."""
     
+    @traced(operation_type='websocket')
     async def connect(self):
         """Подключение к комнате чата."""
         self.room_name = self.scope['url_route']['kwargs']['room_name']
         self.room_group_name = f'chat_{self.room_name}'
         
+        user = self.scope['user']
+        if not user.is_authenticated:
+            await self.close()
+            return
+        
         # Подписка на группу комнаты чата
         await self.channel_layer.group_add(
             self.room_group_name,
@@ -263,6 +338,19 @@ class ChatConsumer(AsyncWebsocketConsumer):
         )
         
         await self.accept()
+        
+        await presence.connect(user.tenant_id, user.id)
+        self.presence_touched_at = time.monotonic()
+        
+        # Историю получают только участники комнаты (как в REST history);
+        # новый собеседник становится участником, отправив сообщение
+        self.is_member = await self.check_participant()
+        messages = await self.get_recent_history() if self.is_member else []
+        await self.send_payload({
+            'type': 'history',
+            'messages': messages,
+            'has_more': len(messages) >= chat_history.size
+        })
     
     async def disconnect(self, close_code):
         """Отключение от комнаты чата."""
@@ -271,76 +359,158 @@ class ChatConsumer(AsyncWebsocketConsumer):
             self.room_group_name,
             self.channel_name
         )
+        
+        user = self.scope['user']
+        if user.is_authenticated:
+            await presence.disconnect(user.tenant_id, user.id)
     
-    async def receive(self, text_data):
+    @traced(operation_type='websocket')
+    async def receive(self, text_data=None, bytes_data=None):
         """Приём сообщения от клиента WebSocket."""
+        # Любой кадр клиента продлевает статус онлайн, отдельный heartbeat не обязателен
+        await self.touch_presence()
         try:
-            text_data_json = json.loads(text_data)
+            text_data_json = ws_frames.decode(text_data, bytes_data)
             message_type = text_data_json.get('type')
             
             if message_type == 'chat_message':
                 await self.handle_chat_message(text_data_json)
             elif message_type == 'typing':
                 await self.handle_typing(text_data_json)
-        except json.JSONDecodeError:
-            await self.send(text_data=json.dumps({
+            elif message_type == 'load_older':
+                await self.handle_load_older(text_data_json)
+        except ValueError:
+            await self.send_payload({
                 'type': 'error',
-                'message': 'Invalid JSON'
-            }))
+                'message': 'Invalid frame'
+            })
     
     async def handle_chat_message(self, data):
         """Обработка отправки сообщения чата."""
         message_data = data.get('message', {})
         
-        # Сохранить сообщение в БД
-        message = await self.save_chat_message(message_data)
+        if getattr(settings, 'CHAT_WRITE_BEHIND_ENABLED', True):
+            # Рассылаем сразу с временным ID, запись в БД — пакетно в фоне
+            payload = await chat_writer.submit(
+                room_name=self.room_name,
+                sender=self.scope['user'],
+                content=message_data.get('content', ''),
+                message_type=message_data.get('message_type', 'text')
+            )
+        else:
+            # Сохранить сообщение в БД
+            message = await self.save_chat_message(message_data)
+            payload = {
+                'id': message.id,
+                'content': message.content,
+                'sender': message.sender.username,
+                'timestamp': message.timestamp.isoformat(),
+                'message_type': message.message_type
+            }
+        
+        self.is_member = True
         
         # Разослать сообщение подписчикам комнаты
         await self.channel_layer.group_send(
             self.room_group_name,
-            {
+            ws_frames.group_event('chat_message', self.room_group_name, {
                 'type': 'chat_message',
-                'message': {
-                    'id': message.id,
-                    'content': message.content,
-                    'sender': message.sender.username,
-                    'timestamp': message.timestamp.isoformat(),
-                    'message_type': message.message_type
-                }
-            }
+                'message': payload
+            })
         )
     
+    async def handle_load_older(self, data):
+        """Отдать страницу более старых сообщений (keyset-пагинация)."""
+        if not self.is_member:
+            self.is_member = await self.check_participant()
+        if not self.is_member:
+            await self.send_payload({
+                'type': 'error',
+                'message': 'Not a room participant'
+            })
+            return
+        
+        before = data.get('before') or {}
+        try:
+            limit = min(int(data.get('limit', chat_history.size)), chat_history.size)
+            if limit < 1:
+                raise ValueError("limit must be positive")
+            messages = await self.get_older_history(
+                before.get('timestamp'), before.get('id'), limit
+            )
+        except (TypeError, ValueError):
+            await self.send_payload({
+                'type': 'error',
+                'message': 'Invalid cursor'
+            })
+            return
+        
+        await self.send_payload({
+            'type': 'history_page',
+            'messages': messages,
+            'has_more': len(messages) >= limit
+        })
+    
+    async def touch_presence(self):
+        """Продлить статус онлайн пользователя, не чаще трёх раз за PRESENCE_TTL."""
+        user = self.scope['user']
+        now = time.monotonic()
+        if not user.is_authenticated or now - self.presence_touched_at < presence.ttl / 3:
+            return
+        self.presence_touched_at = now
+        await presence.heartbeat(user.tenant_id, user.id)
+    
     async def handle_typing(self, data):
         """Обработка индикатора набора текста."""
-        is_typing = data.get('is_typing', False)
+        is_typing = bool(data.get('is_typing', False))
         user = self.scope['user']
         
+        # Повторные события в окне троттлинга не рассылаются
+        if not await typing_throttle.should_broadcast(self.room_name, user.id, is_typing):
+            return
+        
         # Отправить индикатор набора в группу комнаты
         await self.channel_layer.group_send(
             self.room_group_name,
-            {
+            ws_frames.group_event('typing', self.room_group_name, {
                 'type': 'typing',
                 'user': user.username,
-                'is_typing': is_typing
-            }
+                'is_typing': is_typing,
+                'expires_in': typing_throttle.ttl_ms
+            })
         )
     
     async def chat_message(self, event):
         """Отправить сообщение чата клиенту."""
-        await self.send(text_data=json.dumps({
-            'type': 'chat_message',
-            'message': event['message']
-        }))
+        await self.send_event(event)
+    
+    async def chat_message_persisted(self, event):
+        """Сообщить клиенту постоянный ID ранее разосланного сообщения."""
+        await self.send_event(event)
     
     async def typing(self, event):
         """Отправить индикатор набора клиенту."""
-        await self.send(text_data=json.dumps({
-            'type': 'typing',
-            'user': event['user'],
-            'is_typing': event['is_typing']
-        }))
+        await self.send_event(event)
+    
+    @database_sync_to_async
+    def check_participant(self):
+        """Пользователь писал в комнату или у него есть сводка беседы."""
+        return is_participant(self.scope['user'], self.room_name)
+    
+    @database_sync_to_async
+    @traced(operation_type='db')
+    def get_recent_history(self):
+        """Последние сообщения комнаты (Redis, с откатом на БД)."""
+        return chat_history.recent(self.room_name)
+    
+    @database_sync_to_async
+    @traced(operation_type='db')
+    def get_older_history(self, before_timestamp, before_id, limit):
+        """Сообщения комнаты старше курсора."""
+        return load_older(self.room_name, before_timestamp, before_id, limit)
     
     @database_sync_to_async
+    @traced(operation_type='db')
     def save_chat_message(self, message_data):
         """Сохранить сообщение чата в базе данных."""
         from app.models.chat import ChatMessage
@@ -352,3 +522,260 @@ class ChatConsumer(AsyncWebsocketConsumer):
             message_type=message_data.get('message_type', 'text')
         )
         return message
+
+
+class DashboardConsumer(EncodedWebsocketConsumer):
+    """
+    Консюмер WebSocket для обновлений дашборда производительности.
+    
+    При подключении отдаёт отрисованный дашборд (dashboard_rendered), затем
+    фоновая задача присылает только изменившиеся виджеты
+    (dashboard_widgets_updated). Клиент раз в DASHBOARD_WATCH_TTL/2 сек
+    присылает heartbeat, пока дашборд открыт.
+    """
+    
+    @traced(operation_type='websocket')
+    async def connect(self):
+        """Подключение к группе дашборда арендатора пользователя."""
+        user = self.scope['user']
+        if not user.is_authenticated:
+            await self.close()
+            return
+        
+        self.dashboard_id = str(self.scope['url_route']['kwargs']['dashboard_id'])
+        dashboard = await self.get_dashboard() if self.dashboard_id.isdigit() else None
+        if dashboard is None:
+            await self.close()
+            return
+        
+        self.dashboard_group_name = dashboard_renderer.dashboard_group(dashboard.id)
+        await self.channel_layer.group_add(
+            self.dashboard_group_name,
+            self.channel_name
+        )
+        await self.accept()
+        await dashboard_renderer.dashboard_watchers.touch(dashboard.id)
+        
+        rendered = await self.render_dashboard(dashboard)
+        await self.send_payload(dict(rendered, type='dashboard_rendered'))
+    
+    async def disconnect(self, close_code):
+        """Отключение от группы дашборда."""
+        if hasattr(self, 'dashboard_group_name'):
+            await self.channel_layer.group_discard(
+                self.dashboard_group_name,
+                self.channel_name
+            )
+    
+    @traced(operation_type='websocket')
+    async def receive(self, text_data=None, bytes_data=None):
+        """Приём сообщения от клиента WebSocket."""
+        try:
+            data = ws_frames.decode(text_data, bytes_data)
+        except ValueError:
+            await self.send_payload({
+                'type': 'error',
+                'message': 'Invalid frame'
+            })
+            return
+        
+        message_type = data.get('type')
+        if message_type == 'heartbeat':
+            await dashboard_renderer.dashboard_watchers.touch(int(self.dashboard_id))
+        elif message_type == 'refresh':
+            dashboard = await self.get_dashboard()
+            if dashboard is not None:
+                rendered = await self.render_dashboard(dashboard)
+                await self.send_payload(dict(rendered, type='dashboard_rendered'))
+    
+    async def dashboard_rendered(self, event):
+        """Отправить клиенту дашборд целиком (после изменения виджетов)."""
+        await self.send_event(event)
+    
+    async def dashboard_widgets_updated(self, event):
+        """Отправить клиенту изменившиеся виджеты."""
+        await self.send_event(event)
+    
+    @database_sync_to_async
+    @traced(operation_type='db')
+    def get_dashboard(self):
+        """Активный дашборд арендатора пользователя или None."""
+        from app.models.performance import PerformanceDashboard
+        
+        return PerformanceDashboard.objects.select_related('tenant').filter(
+            id=self.dashboard_id, tenant_id=self.scope['user'].tenant_id, is_active=True
+        ).first()
+    
+    @database_sync_to_async
+    @traced(operation_type='db')
+    def render_dashboard(self, dashboard):
+        """Отрисовать виджеты дашборда (с учётом кеша виджетов)."""
+        return dashboard_renderer.render(dashboard)
+
+
+class MultiplexConsumer(EncodedWebsocketConsumer):
+    """
+    Один WebSocket на все темы агента: тикеты, чат, уведомления и дашборды.
+    
+    Клиент подписывается сообщениями
+        {"type": "subscribe", "topic": "ticket:<id>" | "chat:<room>" | "notifications" | "dashboard:<id>"}
+        {"type": "unsubscribe", "topic": ...}
+    и отправляет сообщения в тему, добавляя к ним поле "topic". Для каждой
+    темы создаётся делегат — экземпляр обычного консюмера, который работает
+    с тем же channel_name, поэтому членство в группах ведётся на сервере,
+    а события групп маршрутизируются делегату по полю "group".
+    Исходящие кадры имеют вид {"topic": ..., "event": {...}} в кодировке,
+    согласованной для соединения.
+    """
+    
+    topic_consumers = {
+        'ticket': (TicketConsumer, 'ticket_id'),
+        'chat': (ChatConsumer, 'room_name'),
+        'notifications': (NotificationConsumer, None),
+        'dashboard': (DashboardConsumer, 'dashboard_id'),
+    }
+    topic_pattern = re.compile(r'^(?P<kind>ticket|chat|notifications|dashboard)(?::(?P<key>[\w-]+))?$')
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # topic -> делегат, group -> topic
+        self.subscriptions = {}
+        self.topic_by_group = {}
+    
+    async def connect(self):
+        """Подключение агента; темы добавляются подписками."""
+        if not self.scope['user'].is_authenticated:
+            await self.close()
+            return
+        
+        self.max_subscriptions = getattr(settings, 'WS_MAX_SUBSCRIPTIONS', 100)
+        await self.accept()
+    
+    async def disconnect(self, close_code):
+        """Отписать все делегаты от их групп."""
+        for topic in list(self.subscriptions):
+            await self.unsubscribe(topic, close_code)
+    
+    async def receive(self, text_data=None, bytes_data=None):
+        """Управление подписками и передача сообщений делегату темы."""
+        try:
+            data = ws_frames.decode(text_data, bytes_data)
+        except ValueError:
+            await self.send_error('Invalid frame')
+            return
+        
+        message_type = data.get('type')
+        topic = data.get('topic')
+        if message_type == 'subscribe':
+            await self.subscribe(topic)
+        elif message_type == 'unsubscribe':
+            if await self.unsubscribe(topic):
+                await self.send_payload({'type': 'unsubscribed', 'topic': topic})
+        elif topic in self.subscriptions:
+            # Делегат сам разбирает кадр и игнорирует поле topic
+            await self.subscriptions[topic].receive(text_data=text_data, bytes_data=bytes_data)
+        else:
+            await self.send_error('Not subscribed', topic)
+    
+    async def subscribe(self, topic):
+        """Создать делегат темы и выполнить его подключение."""
+        match = self.topic_pattern.match(topic or '')
+        if match is None or (match['kind'] == 'notifications') != (match['key'] is None):
+            await self.send_error('Unknown topic', topic)
+            return
+        if topic in self.subscriptions:
+            await self.send_payload({'type': 'subscribed', 'topic': topic})
+            return
+        if len(self.subscriptions) >= self.max_subscriptions:
+            await self.send_error('Too many subscriptions', topic)
+            return
+        
+        consumer_class, url_kwarg = self.topic_consumers[match['kind']]
+        delegate = consumer_class()
+        delegate.scope = dict(
+            self.scope,
+            url_route={'args': (), 'kwargs': {url_kwarg: match['key']} if url_kwarg else {}}
+        )
+        delegate.channel_layer = self.channel_layer
+        delegate.channel_name = self.channel_name
+        delegate.encoding = self.encoding
+        delegate.base_send = self._delegate_send(topic, delegate)
+        delegate.accepted = False
+        
+        await delegate.connect()
+        if not delegate.accepted:
+            await self._discard_delegate_groups(delegate)
+            await self.send_error('Subscription rejected', topic)
+            return
+        
+        self.subscriptions[topic] = delegate
+        for group in self._delegate_groups(delegate):
+            self.topic_by_group[group] = topic
+        await self.send_payload({'type': 'subscribed', 'topic': topic})
+        
+        # Кадры, отправленные делегатом при подключении (история, счётчик),
+        # придерживаются до подтверждения подписки
+        for frame in delegate.pending_frames:
+            await self.send_frame(frame)
+        delegate.pending_frames = None
+    
+    async def unsubscribe(self, topic, close_code=1000):
+        """Отключить делегат темы; возвращает False, если подписки не было."""
+        delegate = self.subscriptions.pop(topic, None)
+        if delegate is None:
+            return False
+        for group in self._delegate_groups(delegate):
+            self.topic_by_group.pop(group, None)
+        await delegate.disconnect(close_code)
+        return True
+    
+    async def dispatch(self, message):
+        """Событие группы отдать делегату, подписанному на эту группу."""
+        topic = self.topic_by_group.get(message.get('group'))
+        if topic is not None:
+            handler = getattr(self.subscriptions[topic], get_handler_name(message), None)
+            if handler is not None:
+                await handler(message)
+                return
+        if message['type'].startswith('websocket.'):
+            await super().dispatch(message)
+    
+    async def send_error(self, message, topic=None):
+        """Отправить клиенту ошибку протокола."""
+        await self.send_payload({
+            'type': 'error',
+            'topic': topic,
+            'message': message
+        })
+    
+    def _delegate_send(self, topic, delegate):
+        """Перехватчик ASGI-сообщений делегата."""
+        prefix = ws_frames.wrap_prefix(topic, self.encoding)
+        delegate.pending_frames = []
+        
+        async def base_send(message):
+            if message['type'] == 'websocket.accept':
+                delegate.accepted = True
+            elif message['type'] == 'websocket.send':
+                # Оборачиваем готовый кадр делегата без повторной сериализации
+                frame = ws_frames.wrap(prefix, message.get('bytes') or message['text'])
+                if delegate.pending_frames is not None:
+                    delegate.pending_frames.append(frame)
+                else:
+                    await self.send_frame(frame)
+            elif message['type'] == 'websocket.close':
+                delegate.accepted = False
+        
+        return base_send
+    
+    @staticmethod
+    def _delegate_groups(delegate):
+        return [
+            getattr(delegate, name) for name in
+            ('ticket_group_name', 'room_group_name', 'notification_group_name', 'dashboard_group_name')
+            if hasattr(delegate, name)
+        ]
+    
+    async def _discard_delegate_groups(self, delegate):
+        for group in self._delegate_groups(delegate):
+            await self.channel_layer.group_discard(group, self.channel_name)
@@ -11,7 +11,6 @@ from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
 from django.db.models import Q
 from django.utils import timezone
-from django.conf import settings
 
 from app.models.ticket import Ticket, TicketComment, TicketAttachment
 from app.models.tenant import User, Tenant
@@ -20,6 +19,7 @@ from app.models.knowledge import KnowledgeArticle, KnowledgeCategory
 # Импортируем конкретные модули сериализаторов и алиасим нужные классы
 from app.api.serializers.ticket import (
     TicketDetailSerializer as TicketSerializer,
+    TicketCreateSerializer,
     TicketCommentSerializer,
     TicketAttachmentSerializer,
 )
@@ -48,6 +48,12 @@ class TicketViewSet(viewsets.ModelViewSet):
         """Фильтрация тикетов по текущему арендатору пользователя."""
         return Ticket.objects.filter(tenant=self.request.user.tenant)
     
+    def get_serializer_class(self):
+        """Создание идет через TicketCreateSerializer (SLA и настройки арендатора)."""
+        if self.action == 'create':
+            return TicketCreateSerializer
+        return super().get_serializer_class()
+    
     @action(detail=True, methods=['post'])
     def add_comment(self, request, pk=None):
         """Добавить комментарий к тикету."""
@@ -278,7 +284,7 @@ class HealthView(APIView):
         """Вернуть сводку состояния сервисов системы."""
         from django.db import connection
         from django.core.cache import cache
-        import redis
+        from app.core.redis_client import get_redis_client
         
         health_data = {
             'status': 'healthy',
@@ -306,8 +312,7 @@ class HealthView(APIView):
         
         # Check Redis
         try:
-            r = redis.Redis.from_url(settings.REDIS_URL)
-            r.ping()
+            get_redis_client().ping()
             health_data['services']['redis'] = {'status': 'healthy'}
         except Exception as e:
             health_data['services']['redis'] = {'status': 'unhealthy', 'error': str(e)}
@@ -5,7 +5,9 @@ from django.urls import re_path
 from . import consumers
 
 websocket_urlpatterns = [
-    re_path(r'ws/tickets/(?P<ticket_id>\w+)/$', consumers.TicketConsumer.as_asgi()),
+    re_path(r'ws/tickets/(?P<ticket_id>[\w-]+)/$', consumers.TicketConsumer.as_asgi()),
     re_path(r'ws/notifications/$', consumers.NotificationConsumer.as_asgi()),
     re_path(r'ws/chat/(?P<room_name>\w+)/$', consumers.ChatConsumer.as_asgi()),
+    re_path(r'ws/performance/dashboards/(?P<dashboard_id>\d+)/$', consumers.DashboardConsumer.as_asgi()),
+    re_path(r'ws/stream/$', consumers.MultiplexConsumer.as_asgi()),
 ]
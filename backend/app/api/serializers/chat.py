@@ -4,7 +4,7 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 
-from app.models import ChatMessage
+from app.models import ChatMessage, ChatConversation
 
 User = get_user_model()
 
@@ -49,48 +49,19 @@ class ChatMessageUpdateSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
-class ChatConversationSerializer(serializers.Serializer):
+class ChatConversationSerializer(serializers.ModelSerializer):
     """Сериализатор для беседы в чате."""
     
-    user = serializers.SerializerMethodField()
-    last_message = serializers.SerializerMethodField()
-    unread_count = serializers.SerializerMethodField()
-    last_message_time = serializers.SerializerMethodField()
-    
-    def get_user(self, obj):
-        """Информация о пользователе."""
-        from app.api.serializers.auth import UserSerializer
-        return UserSerializer(obj).data
-    
-    def get_last_message(self, obj):
-        """Последнее сообщение."""
-        last_message = ChatMessage.objects.filter(
-            Q(sender=obj, recipient=self.context['request'].user) |
-            Q(sender=self.context['request'].user, recipient=obj)
-        ).order_by('-created_at').first()
-        
-        if last_message:
-            return ChatMessageSerializer(last_message).data
-        return None
-    
-    def get_unread_count(self, obj):
-        """Количество непрочитанных сообщений."""
-        return ChatMessage.objects.filter(
-            sender=obj,
-            recipient=self.context['request'].user,
-            is_read=False
-        ).count()
-    
-    def get_last_message_time(self, obj):
-        """Время последнего сообщения."""
-        last_message = ChatMessage.objects.filter(
-            Q(sender=obj, recipient=self.context['request'].user) |
-            Q(sender=self.context['request'].user, recipient=obj)
-        ).order_by('-created_at').first()
-        
-        if last_message:
-            return last_message.created_at
-        return None
+    last_message = ChatMessageSerializer(read_only=True)
+    last_message_time = serializers.DateTimeField(source='last_message_at', read_only=True)
+    
+    class Meta:
+        model = ChatConversation
+        fields = [
+            'id', 'room_name', 'last_message', 'last_message_time',
+            'unread_count', 'last_read_at'
+        ]
+        read_only_fields = fields
 
 
 class ChatStatsSerializer(serializers.Serializer):
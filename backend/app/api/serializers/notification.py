@@ -12,33 +12,39 @@ User = get_user_model()
 class NotificationSerializer(serializers.ModelSerializer):
     """Сериализатор для уведомлений."""
     
-    sender_name = serializers.CharField(source='sender.get_full_name', read_only=True)
-    recipient_name = serializers.CharField(source='recipient.get_full_name', read_only=True)
-    
-    class Meta:
-        model = Notification
-        fields = [
-            'id', 'type', 'title', 'message', 'sender', 'sender_name',
-            'recipient', 'recipient_name', 'is_read', 'is_sent',
-            'priority', 'data', 'created_at', 'read_at', 'sent_at'
-        ]
-        read_only_fields = ['id', 'created_at', 'read_at', 'sent_at']
-
-
-class NotificationCreateSerializer(serializers.ModelSerializer):
-    """Сериализатор для создания уведомлений."""
-    
     class Meta:
         model = Notification
         fields = [
-            'type', 'title', 'message', 'recipient', 'priority', 'data'
+            'id', 'user', 'type', 'title', 'message', 'payload',
+            'is_read', 'created_at'
         ]
+        read_only_fields = ['id', 'user', 'created_at']
+
+
+class NotificationCreateSerializer(serializers.Serializer):
+    """
+    Сериализатор для создания уведомлений.
+    
+    Уведомление создает NotificationDigestEngine.notify: с низким
+    приоритетом оно может попасть в сводку получателя.
+    """
+    
+    user = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
+    type = serializers.ChoiceField(choices=Notification.NOTIFICATION_TYPES, default='system')
+    title = serializers.CharField(max_length=255)
+    message = serializers.CharField(required=False, allow_blank=True, default='')
+    payload = serializers.DictField(required=False, default=dict)
+    priority = serializers.ChoiceField(
+        choices=['low', 'normal', 'high', 'urgent'],
+        required=False,
+        default='normal'
+    )
     
-    def create(self, validated_data):
-        """Создание уведомления."""
-        validated_data['sender'] = self.context['request'].user
-        validated_data['tenant'] = self.context['request'].user.tenant
-        return super().create(validated_data)
+    def validate_user(self, value):
+        """Получатель должен быть из арендатора отправителя."""
+        if value.tenant_id != self.context['request'].user.tenant_id:
+            raise serializers.ValidationError("Пользователь не найден")
+        return value
 
 
 class NotificationUpdateSerializer(serializers.ModelSerializer):
@@ -121,6 +127,17 @@ class NotificationPreferencesSerializer(serializers.Serializer):
     quiet_hours_start = serializers.TimeField(required=False, allow_null=True)
     quiet_hours_end = serializers.TimeField(required=False, allow_null=True)
     
+    digest_frequency = serializers.ChoiceField(
+        choices=[
+            ('immediate', 'Сразу'),
+            ('hourly', 'Ежечасная сводка'),
+            ('daily', 'Ежедневная сводка'),
+        ],
+        required=False,
+        default='immediate'
+    )
+    digest_hour = serializers.IntegerField(min_value=0, max_value=23, required=False, default=9)
+    
     def validate(self, attrs):
         """Валидация настроек уведомлений."""
         start = attrs.get('quiet_hours_start')
@@ -3,7 +3,12 @@
 """
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
 
+from app.core.alert_evaluator import threshold_evaluator
+from app.core.dashboard_renderer import parse_widget
+from app.core.metric_rollups import SERIES_FIELDS, apply_rollups
 from app.models import (
     PerformanceMetric, PerformanceAlert, PerformanceTrace,
     PerformanceDashboard, PerformanceReport, PerformanceThreshold
@@ -18,8 +23,8 @@ class PerformanceMetricSerializer(serializers.ModelSerializer):
     class Meta:
         model = PerformanceMetric
         fields = [
-            'id', 'name', 'value', 'unit', 'category', 'tags',
-            'timestamp', 'metadata', 'created_at'
+            'id', 'name', 'value', 'unit', 'metric_type', 'service', 'endpoint',
+            'method', 'tags', 'timestamp', 'metadata', 'created_at'
         ]
         read_only_fields = ['id', 'created_at']
 
@@ -29,12 +34,23 @@ class PerformanceMetricCreateSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = PerformanceMetric
-        fields = ['name', 'value', 'unit', 'category', 'tags', 'metadata']
+        fields = [
+            'name', 'value', 'unit', 'metric_type', 'service', 'endpoint',
+            'method', 'tags', 'metadata', 'timestamp'
+        ]
+        extra_kwargs = {'timestamp': {'required': False}}
     
     def create(self, validated_data):
-        """Создание метрики производительности."""
+        """Создание метрики производительности с обновлением агрегатов."""
         validated_data['tenant'] = self.context['request'].user.tenant
-        return super().create(validated_data)
+        validated_data.setdefault('timestamp', timezone.now())
+        columns = SERIES_FIELDS + ('value', 'timestamp')
+        with transaction.atomic():
+            metric = super().create(validated_data)
+            row = [getattr(metric, column) for column in columns]
+            apply_rollups([row], columns)
+        threshold_evaluator.process([row], columns)
+        return metric
 
 
 class PerformanceAlertSerializer(serializers.ModelSerializer):
@@ -43,10 +59,13 @@ class PerformanceAlertSerializer(serializers.ModelSerializer):
     class Meta:
         model = PerformanceAlert
         fields = [
-            'id', 'metric', 'threshold', 'current_value', 'severity',
-            'message', 'is_resolved', 'resolved_at', 'created_at'
+            'id', 'name', 'description', 'metric_type', 'threshold', 'threshold_value',
+            'comparison_operator', 'current_value', 'severity', 'status', 'conditions',
+            'triggered_at', 'resolved_at', 'created_at', 'updated_at'
+        ]
+        read_only_fields = [
+            'id', 'threshold', 'current_value', 'triggered_at', 'resolved_at', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'resolved_at']
 
 
 class PerformanceAlertCreateSerializer(serializers.ModelSerializer):
@@ -54,7 +73,10 @@ class PerformanceAlertCreateSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = PerformanceAlert
-        fields = ['metric', 'threshold', 'current_value', 'severity', 'message']
+        fields = [
+            'name', 'description', 'metric_type', 'threshold_value', 'comparison_operator',
+            'current_value', 'severity', 'conditions'
+        ]
     
     def create(self, validated_data):
         """Создание алерта производительности."""
@@ -68,8 +90,9 @@ class PerformanceTraceSerializer(serializers.ModelSerializer):
     class Meta:
         model = PerformanceTrace
         fields = [
-            'id', 'trace_id', 'operation', 'duration', 'status',
-            'start_time', 'end_time', 'metadata', 'created_at'
+            'id', 'trace_id', 'span_id', 'parent_span_id', 'operation_name',
+            'service_name', 'start_time', 'end_time', 'duration_ms', 'status_code',
+            'is_error', 'error_message', 'tags', 'logs', 'created_at'
         ]
         read_only_fields = ['id', 'created_at']
 
@@ -79,7 +102,11 @@ class PerformanceTraceCreateSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = PerformanceTrace
-        fields = ['trace_id', 'operation', 'duration', 'status', 'metadata']
+        fields = [
+            'trace_id', 'span_id', 'parent_span_id', 'operation_name', 'service_name',
+            'start_time', 'end_time', 'duration_ms', 'status_code', 'is_error',
+            'error_message', 'tags', 'logs'
+        ]
     
     def create(self, validated_data):
         """Создание трейса производительности."""
@@ -87,10 +114,25 @@ class PerformanceTraceCreateSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+def validate_dashboard_widgets(widgets):
+    """Проверить список виджетов дашборда и конфигурацию виджетов с данными."""
+    if not isinstance(widgets, list):
+        raise serializers.ValidationError("Ожидается список виджетов")
+    for index, widget in enumerate(widgets):
+        if not isinstance(widget, dict) or not widget.get('widget_type'):
+            raise serializers.ValidationError(f"Виджет {index}: widget_type обязателен")
+        try:
+            parse_widget(widget)
+        except ValueError as exc:
+            raise serializers.ValidationError(f"Виджет {index}: {exc}")
+    return widgets
+
+
 class PerformanceDashboardSerializer(serializers.ModelSerializer):
     """Сериализатор для дашбордов производительности."""
     
-    author_name = serializers.CharField(source='author.get_full_name', read_only=True)
+    author = serializers.PrimaryKeyRelatedField(source='created_by', read_only=True)
+    author_name = serializers.CharField(source='created_by.get_full_name', read_only=True)
     widgets_count = serializers.SerializerMethodField()
     
     class Meta:
@@ -105,6 +147,10 @@ class PerformanceDashboardSerializer(serializers.ModelSerializer):
     def get_widgets_count(self, obj):
         """Количество виджетов в дашборде."""
         return len(obj.widgets) if obj.widgets else 0
+    
+    def validate_widgets(self, value):
+        """Валидация виджетов."""
+        return validate_dashboard_widgets(value)
 
 
 class PerformanceDashboardCreateSerializer(serializers.ModelSerializer):
@@ -114,9 +160,13 @@ class PerformanceDashboardCreateSerializer(serializers.ModelSerializer):
         model = PerformanceDashboard
         fields = ['name', 'description', 'layout', 'widgets', 'is_public']
     
+    def validate_widgets(self, value):
+        """Валидация виджетов."""
+        return validate_dashboard_widgets(value)
+    
     def create(self, validated_data):
         """Создание дашборда производительности."""
-        validated_data['author'] = self.context['request'].user
+        validated_data['created_by'] = self.context['request'].user
         validated_data['tenant'] = self.context['request'].user.tenant
         return super().create(validated_data)
 
@@ -124,20 +174,36 @@ class PerformanceDashboardCreateSerializer(serializers.ModelSerializer):
 class PerformanceReportSerializer(serializers.ModelSerializer):
     """Сериализатор для отчетов производительности."""
     
-    author_name = serializers.CharField(source='author.get_full_name', read_only=True)
+    period_start = serializers.DateTimeField(source='start_date')
+    period_end = serializers.DateTimeField(source='end_date')
+    author = serializers.PrimaryKeyRelatedField(source='created_by', read_only=True)
+    author_name = serializers.CharField(source='created_by.get_full_name', read_only=True)
     
     class Meta:
         model = PerformanceReport
         fields = [
             'id', 'name', 'description', 'report_type', 'period_start',
-            'period_end', 'data', 'author', 'author_name', 'is_public',
-            'created_at', 'updated_at'
+            'period_end', 'config', 'author', 'author_name', 'status', 'progress',
+            'error_message', 'artifact_size', 'generated_at', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = [
+            'id', 'status', 'progress', 'error_message', 'artifact_size',
+            'generated_at', 'created_at', 'updated_at'
+        ]
+    
+    def validate(self, attrs):
+        """Проверка периода отчета."""
+        start = attrs.get('start_date', getattr(self.instance, 'start_date', None))
+        end = attrs.get('end_date', getattr(self.instance, 'end_date', None))
+        if start and end and start >= end:
+            raise serializers.ValidationError(
+                "Начало периода должно быть раньше окончания"
+            )
+        return attrs
     
     def create(self, validated_data):
         """Создание отчета производительности."""
-        validated_data['author'] = self.context['request'].user
+        validated_data['created_by'] = self.context['request'].user
         validated_data['tenant'] = self.context['request'].user.tenant
         return super().create(validated_data)
 
@@ -148,11 +214,34 @@ class PerformanceThresholdSerializer(serializers.ModelSerializer):
     class Meta:
         model = PerformanceThreshold
         fields = [
-            'id', 'metric_name', 'threshold_value', 'operator',
-            'severity', 'is_active', 'created_at', 'updated_at'
+            'id', 'name', 'metric_type', 'metric_name', 'warning_threshold', 'critical_threshold',
+            'operator', 'aggregation', 'window_seconds', 'min_samples', 'conditions',
+            'is_active', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
     
+    def validate(self, attrs):
+        """Критический порог должен быть не мягче порога предупреждения."""
+        instance = self.instance
+        operator = attrs.get('operator', getattr(instance, 'operator', 'gt'))
+        warning = attrs.get('warning_threshold', getattr(instance, 'warning_threshold', None))
+        critical = attrs.get('critical_threshold', getattr(instance, 'critical_threshold', None))
+        if warning is not None and critical is not None:
+            if operator in ('gt', 'gte') and critical < warning:
+                raise serializers.ValidationError(
+                    {'critical_threshold': 'Для оператора больше критический порог не может быть ниже порога предупреждения'}
+                )
+            if operator in ('lt', 'lte') and critical > warning:
+                raise serializers.ValidationError(
+                    {'critical_threshold': 'Для оператора меньше критический порог не может быть выше порога предупреждения'}
+                )
+        if attrs.get('window_seconds') == 0:
+            raise serializers.ValidationError({'window_seconds': 'Окно должно быть больше нуля'})
+        conditions = attrs.get('conditions')
+        if conditions is not None and not isinstance(conditions, dict):
+            raise serializers.ValidationError({'conditions': 'Ожидается объект с полями service/endpoint'})
+        return attrs
+    
     def create(self, validated_data):
         """Создание порогового значения."""
         validated_data['tenant'] = self.context['request'].user.tenant
@@ -170,6 +259,7 @@ class PerformanceStatsSerializer(serializers.Serializer):
     alerts_by_severity = serializers.DictField()
     
     average_response_time = serializers.FloatField()
+    response_time_percentiles = serializers.DictField()
     uptime_percentage = serializers.FloatField()
     
     top_operations = serializers.ListField()
@@ -219,10 +309,18 @@ class PerformanceWidgetSerializer(serializers.Serializer):
     
     widget_type = serializers.CharField()
     title = serializers.CharField()
-    data = serializers.DictField()
-    position = serializers.DictField()
-    size = serializers.DictField()
-    config = serializers.DictField()
+    data = serializers.DictField(required=False, default=dict)
+    position = serializers.DictField(required=False, default=dict)
+    size = serializers.DictField(required=False, default=dict)
+    config = serializers.DictField(required=False, default=dict)
+    
+    def validate(self, attrs):
+        """Проверка запроса виджета с данными (timeseries, stat, top)."""
+        try:
+            parse_widget(attrs)
+        except ValueError as exc:
+            raise serializers.ValidationError({'config': str(exc)})
+        return attrs
 
 
 class PerformanceDashboardWidgetSerializer(serializers.Serializer):
@@ -1,9 +1,14 @@
 """
 Сериализаторы для системы тикетов.
 """
+from datetime import timedelta
+
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
 
+from app.core.reference_cache import sla_for_priority, tag_ids, tenant_configuration
 from app.models import (
     Ticket, TicketComment, TicketAttachment, Tag, SLA, TicketSLA
 )
@@ -11,6 +16,25 @@ from app.models import (
 User = get_user_model()
 
 
+class CachedTagField(serializers.PrimaryKeyRelatedField):
+    """
+    Тег по ID с проверкой по кешу справочника тегов, без запроса к БД.
+    
+    Возвращает ID тега: related manager принимает его в set().
+    """
+    
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in tag_ids():
+            self.fail('does_not_exist', pk_value=data)
+        return pk
+
+
 class TagSerializer(serializers.ModelSerializer):
     """Сериализатор для тегов."""
     
@@ -139,6 +163,8 @@ class TicketDetailSerializer(serializers.ModelSerializer):
 class TicketCreateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания тикета."""
     
+    tags = CachedTagField(many=True, required=False, queryset=Tag.objects.all())
+    
     class Meta:
         model = Ticket
         fields = [
@@ -147,10 +173,35 @@ class TicketCreateSerializer(serializers.ModelSerializer):
         ]
     
     def create(self, validated_data):
-        """Создание тикета."""
-        validated_data['created_by'] = self.context['request'].user
-        validated_data['tenant'] = self.context['request'].user.tenant
-        return super().create(validated_data)
+        """
+        Создание тикета.
+        
+        Срок решения берется из SLA арендатора для приоритета, а без SLA —
+        из базового SLA в настройках арендатора. SLA и настройки читаются из
+        кеша справочников (app.core.reference_cache).
+        """
+        user = self.context['request'].user
+        validated_data['created_by'] = user
+        validated_data['tenant'] = user.tenant
+        
+        priority = validated_data.get('priority', Ticket._meta.get_field('priority').default)
+        sla = sla_for_priority(user.tenant_id, priority)
+        if 'sla_hours' not in validated_data:
+            if sla is not None:
+                validated_data['sla_hours'] = sla['resolution_time']
+            else:
+                config = tenant_configuration(user.tenant_id)
+                if config is not None:
+                    validated_data['sla_hours'] = config['default_sla_hours']
+        sla_hours = validated_data.get('sla_hours', Ticket._meta.get_field('sla_hours').default)
+        validated_data['due_date'] = timezone.now() + timedelta(hours=sla_hours)
+        
+        # Тикет без записи SLA не сохраняется
+        with transaction.atomic():
+            ticket = super().create(validated_data)
+            if sla is not None:
+                TicketSLA.objects.create(ticket=ticket, sla_id=sla['id'])
+        return ticket
 
 
 class TicketUpdateSerializer(serializers.ModelSerializer):
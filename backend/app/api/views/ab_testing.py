@@ -13,6 +13,7 @@ from django.shortcuts import get_object_or_404
 from django.contrib.auth import get_user_model
 import random
 
+from app.core.reference_cache import feature_flags, flag_enabled
 from app.models import (
     FeatureFlag, ABTest, ABTestVariant, ABTestParticipant,
     ABTestEvent, ABTestMetric
@@ -65,28 +66,24 @@ class FeatureFlagViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def check(self, request):
-        """Проверка состояния флагов для пользователя."""
+        """
+        Проверка состояния флагов для пользователя.
+        
+        Флаги читаются из кеша справочников, а не из БД на каждый запрос.
+        """
         user = request.user
-        flags = self.get_queryset().filter(is_enabled=True)
         
         result = {}
-        for flag in flags:
-            # Простая логика проверки условий
-            is_enabled = self._check_flag_conditions(flag, user)
-            result[flag.name] = is_enabled
+        for name, flag in feature_flags().items():
+            result[name] = self._check_flag_conditions(flag, user)
         
         return Response(result)
     
     def _check_flag_conditions(self, flag, user):
         """Проверка условий флага для пользователя."""
-        # Простая реализация - можно расширить
-        if flag.rollout_percentage < 100:
-            # Простое хеширование по ID пользователя
-            hash_value = hash(str(user.id)) % 100
-            if hash_value >= flag.rollout_percentage:
-                return False
-        
-        return True
+        # Процент раскатки считается по стабильному хешу ID пользователя,
+        # одинаковому во всех процессах
+        return flag_enabled(flag, user.id, user.tenant_id)
     
     @action(detail=False, methods=['get'])
     def usage_stats(self, request):
@@ -12,7 +12,12 @@ from django.utils import timezone
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import get_user_model
 
-from app.models import ChatMessage
+from app.models import ChatMessage, ChatConversation
+from app.core.chat_conversations import (
+    is_participant, mark_conversation_read as mark_room_read, total_unread
+)
+from app.core.chat_history import load_older
+from app.core.presence import presence
 from app.api.serializers.chat import (
     ChatMessageSerializer, ChatMessageCreateSerializer,
     ChatMessageUpdateSerializer, ChatConversationSerializer,
@@ -23,6 +28,10 @@ from app.api.serializers.chat import (
 
 User = get_user_model()
 
+# Размер страницы истории комнаты
+HISTORY_DEFAULT_LIMIT = 50
+HISTORY_MAX_LIMIT = 200
+
 
 class ChatMessageViewSet(viewsets.ModelViewSet):
     """Управление сообщениями чата."""
@@ -59,19 +68,17 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def mark_conversation_read(self, request):
         """Отметить все сообщения в беседе как прочитанные."""
-        user_id = request.data.get('user_id')
+        room_name = request.data.get('room_name')
         
-        if not user_id:
+        if not room_name:
             return Response(
-                {'error': 'user_id обязателен'},
+                {'error': 'room_name обязателен'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        try:
-            user = User.objects.get(id=user_id, tenant=request.user.tenant)
-        except User.DoesNotExist:
+        if not mark_room_read(request.user, room_name):
             return Response(
-                {'error': 'Пользователь не найден'},
+                {'error': 'Беседа не найдена'},
                 status=status.HTTP_404_NOT_FOUND
             )
         
@@ -79,53 +86,18 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def conversations(self, request):
-        """Список бесед пользователя."""
-        # Получаем всех пользователей, с которыми есть сообщения
-        user_ids = self.get_queryset().values_list('sender', flat=True)
-        all_user_ids = set()
-        
-        for sender_id, recipient_id in user_ids:
-            all_user_ids.add(sender_id)
-            # no recipient in current model
-        
-        # Исключаем текущего пользователя
-        all_user_ids.discard(request.user.id)
-        
-        # Получаем пользователей
-        users = User.objects.filter(
-            id__in=all_user_ids,
-            tenant=request.user.tenant
-        ).order_by('first_name', 'last_name')
-        
-        # Создаем список бесед
-        conversations = []
-        for user in users:
-            conversation_data = {
-                'user': user,
-                'unread_count': self.get_queryset().filter(
-                    sender=user,
-                    recipient=request.user,
-                    is_read=False
-                ).count()
-            }
-            conversations.append(conversation_data)
-        
-        # Сортируем по времени последнего сообщения
-        conversations.sort(
-            key=lambda x: self.get_queryset().filter(
-                Q(sender=x['user'], recipient=request.user) |
-                Q(sender=request.user, recipient=x['user'])
-            ).aggregate(last_message=Max('created_at'))['last_message'] or timezone.now(),
-            reverse=True
-        )
-        
-        serializer = ChatConversationSerializer(
-            [conv['user'] for conv in conversations],
-            many=True,
-            context={'request': request}
-        )
+        """Список бесед пользователя (из таблицы сводок, одним запросом)."""
+        conversations = ChatConversation.objects.filter(user=request.user)
         
-        return Response(serializer.data)
+        conversations = conversations.select_related(
+            'last_message', 'last_message__sender'
+        ).order_by(F('last_message_at').desc(nulls_last=True))
+        
+        paginator = PageNumberPagination()
+        page = paginator.paginate_queryset(conversations, request)
+        
+        serializer = ChatConversationSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
     
     @action(detail=False, methods=['get'])
     def conversation(self, request):
@@ -156,6 +128,54 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
         serializer = ChatMessageSerializer(paginated_messages, many=True)
         return paginator.get_paginated_response(serializer.data)
     
+    @action(detail=False, methods=['get'])
+    def history(self, request):
+        """История комнаты с keyset-пагинацией (before/before_id)."""
+        room_name = request.query_params.get('room_name')
+        
+        if not room_name:
+            return Response(
+                {'error': 'room_name обязателен'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Историю читают только участники комнаты; чужая комната не отличима от несуществующей
+        if not is_participant(request.user, room_name):
+            return Response(
+                {'error': 'Беседа не найдена'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        try:
+            limit = int(request.query_params.get('limit', HISTORY_DEFAULT_LIMIT))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= HISTORY_MAX_LIMIT:
+            return Response(
+                {'error': f'limit должен быть от 1 до {HISTORY_MAX_LIMIT}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            before_id = request.query_params.get('before_id')
+            messages = load_older(
+                room_name,
+                before_timestamp=request.query_params.get('before'),
+                before_id=int(before_id) if before_id else None,
+                limit=limit
+            )
+        except ValueError:
+            return Response(
+                {'error': 'Некорректный курсор'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        next_cursor = None
+        if len(messages) >= limit:
+            next_cursor = {'before': messages[0]['timestamp'], 'before_id': messages[0]['id']}
+        
+        return Response({'results': messages, 'next': next_cursor})
+    
     @action(detail=False, methods=['post'])
     def search(self, request):
         """Поиск сообщений."""
@@ -200,7 +220,7 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def unread_count(self, request):
         """Количество непрочитанных сообщений."""
-        return Response({'unread_count': 0})
+        return Response({'unread_count': total_unread(request.user)})
     
     @action(detail=False, methods=['get'])
     def stats(self, request):
@@ -208,7 +228,7 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
         user = request.user
         tenant = getattr(user, 'tenant', None)
         total_messages = ChatMessage.objects.filter(sender=user).count()
-        unread_messages = 0
+        unread_messages = total_unread(user)
         week_ago = timezone.now() - timezone.timedelta(days=7)
         active_conversations = ChatMessage.objects.filter(sender=user, timestamp__gte=week_ago).values('room_name').distinct().count()
         messages_by_type = ChatMessage.objects.filter(sender=user).values('message_type').annotate(count=Count('id')).order_by('-count')
@@ -260,11 +280,30 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def online_status(self, request):
-        """Статус онлайн пользователей."""
-        # Здесь можно добавить модель UserOnlineStatus
-        # для отслеживания статуса онлайн
+        """Статус онлайн пользователей (user_ids=1,2,3 или все онлайн арендатора)."""
+        tenant_id = request.user.tenant_id
+        raw_ids = request.query_params.get('user_ids')
+        
+        if raw_ids:
+            try:
+                user_ids = [int(user_id) for user_id in raw_ids.split(',') if user_id]
+            except ValueError:
+                return Response(
+                    {'error': 'Некорректный список user_ids'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            statuses = presence.get_status(tenant_id, user_ids[:1000])
+            return Response({
+                'statuses': [
+                    {'user_id': user_id, **user_status}
+                    for user_id, user_status in statuses.items()
+                ]
+            })
+        
+        online_ids = presence.online_user_ids(tenant_id)
         online_users = User.objects.filter(
-            tenant=request.user.tenant,
+            tenant_id=tenant_id,
+            id__in=online_ids,
             is_active=True
         ).values('id', 'first_name', 'last_name', 'last_login')
         
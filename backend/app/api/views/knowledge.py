@@ -11,6 +11,7 @@ from django.db.models import Q, Count, Avg, F
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
 
+from app.core.response_cache import cached_response
 from app.models import (
     KnowledgeCategory, KnowledgeArticle, KnowledgeArticleAttachment,
     KnowledgeArticleRating, KnowledgeArticleView, KnowledgeSearch
@@ -42,6 +43,7 @@ class KnowledgeCategoryViewSet(viewsets.ModelViewSet):
         return self.queryset.filter(tenant=self.request.user.tenant)
     
     @action(detail=False, methods=['get'])
+    @cached_response('knowledge_categories', 'knowledge_articles')
     def tree(self, request):
         """Получение дерева категорий."""
         root_categories = self.get_queryset().filter(parent=None, is_active=True)
@@ -116,6 +118,11 @@ class KnowledgeArticleViewSet(viewsets.ModelViewSet):
             return [AllowAny()]
         return [IsAuthenticated()]
     
+    @cached_response('knowledge_articles', 'tags')
+    def list(self, request, *args, **kwargs):
+        """Список статей (ответ кешируется по арендатору, роли и параметрам)."""
+        return super().list(request, *args, **kwargs)
+    
     def retrieve(self, request, *args, **kwargs):
         """Детальный просмотр статьи с увеличением счетчика просмотров."""
         instance = self.get_object()
@@ -186,6 +193,7 @@ class KnowledgeArticleViewSet(viewsets.ModelViewSet):
         return Response({'message': 'Спасибо за обратную связь!'})
     
     @action(detail=False, methods=['get'])
+    @cached_response('knowledge_articles', 'tags')
     def featured(self, request):
         """Рекомендуемые статьи."""
         articles = self.get_queryset().filter(
@@ -197,6 +205,7 @@ class KnowledgeArticleViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
+    @cached_response('knowledge_articles', 'tags')
     def popular(self, request):
         """Популярные статьи."""
         articles = self.get_queryset().filter(
@@ -209,6 +218,7 @@ class KnowledgeArticleViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
+    @cached_response('knowledge_articles', 'tags')
     def recent(self, request):
         """Недавние статьи."""
         articles = self.get_queryset().filter(
@@ -12,6 +12,8 @@ from django.utils import timezone
 from django.shortcuts import get_object_or_404
 
 from app.models import Notification
+from app.core.notification_counters import unread_counter
+from app.core.notification_digest import digest_engine, get_notification_preferences
 from app.api.serializers.notification import (
     NotificationSerializer, NotificationCreateSerializer,
     NotificationUpdateSerializer, NotificationStatsSerializer,
@@ -25,17 +27,14 @@ class NotificationViewSet(viewsets.ModelViewSet):
     queryset = Notification.objects.all()
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['type', 'is_read', 'is_sent', 'priority']
+    filterset_fields = ['type', 'is_read']
     search_fields = ['title', 'message']
-    ordering_fields = ['created_at', 'priority', 'is_read']
+    ordering_fields = ['created_at', 'is_read']
     ordering = ['-created_at']
     
     def get_queryset(self):
-        """Фильтрация по получателю и арендатору."""
-        return self.queryset.filter(
-            recipient=self.request.user,
-            tenant=self.request.user.tenant
-        )
+        """Уведомления текущего пользователя."""
+        return self.queryset.filter(user=self.request.user)
     
     def get_serializer_class(self):
         """Выбор сериализатора в зависимости от действия."""
@@ -46,13 +45,31 @@ class NotificationViewSet(viewsets.ModelViewSet):
         else:
             return NotificationSerializer
     
+    def create(self, request, *args, **kwargs):
+        """Создание уведомления через движок сводок."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        
+        notification = digest_engine.notify(
+            data['user'], data['type'], data['title'], data['message'],
+            payload=data['payload'], priority=data['priority']
+        )
+        if notification is None:
+            return Response(
+                {'message': 'Уведомление добавлено в сводку получателя'},
+                status=status.HTTP_202_ACCEPTED
+            )
+        return Response(NotificationSerializer(notification).data, status=status.HTTP_201_CREATED)
+    
     @action(detail=True, methods=['post'])
     def mark_read(self, request, pk=None):
         """Отметить уведомление как прочитанное."""
         notification = self.get_object()
-        notification.is_read = True
-        notification.read_at = timezone.now()
-        notification.save(update_fields=['is_read', 'read_at'])
+        # Условный UPDATE: из параллельных запросов счётчик меняет только один
+        updated = self.get_queryset().filter(pk=notification.pk, is_read=False).update(is_read=True)
+        if updated == 1:
+            unread_counter.adjust_and_publish(notification.user_id, -1)
         
         return Response({'message': 'Уведомление отмечено как прочитанное'})
     
@@ -60,19 +77,17 @@ class NotificationViewSet(viewsets.ModelViewSet):
     def mark_unread(self, request, pk=None):
         """Отметить уведомление как непрочитанное."""
         notification = self.get_object()
-        notification.is_read = False
-        notification.read_at = None
-        notification.save(update_fields=['is_read', 'read_at'])
+        updated = self.get_queryset().filter(pk=notification.pk, is_read=True).update(is_read=False)
+        if updated == 1:
+            unread_counter.adjust_and_publish(notification.user_id, 1)
         
         return Response({'message': 'Уведомление отмечено как непрочитанное'})
     
     @action(detail=False, methods=['post'])
     def mark_all_read(self, request):
         """Отметить все уведомления как прочитанные."""
-        updated_count = self.get_queryset().filter(is_read=False).update(
-            is_read=True,
-            read_at=timezone.now()
-        )
+        updated_count = self.get_queryset().filter(is_read=False).update(is_read=True)
+        unread_counter.adjust_and_publish(request.user.id, -updated_count)
         
         return Response({
             'message': f'Отмечено как прочитанные: {updated_count} уведомлений'
@@ -94,20 +109,17 @@ class NotificationViewSet(viewsets.ModelViewSet):
         notifications = self.get_queryset().filter(id__in=notification_ids)
         
         if action == 'mark_read':
-            updated_count = notifications.filter(is_read=False).update(
-                is_read=True,
-                read_at=timezone.now()
-            )
+            updated_count = notifications.filter(is_read=False).update(is_read=True)
+            unread_counter.adjust_and_publish(request.user.id, -updated_count)
             message = f'Отмечено как прочитанные: {updated_count} уведомлений'
         
         elif action == 'mark_unread':
-            updated_count = notifications.filter(is_read=True).update(
-                is_read=False,
-                read_at=None
-            )
+            updated_count = notifications.filter(is_read=True).update(is_read=False)
+            unread_counter.adjust_and_publish(request.user.id, updated_count)
             message = f'Отмечено как непрочитанные: {updated_count} уведомлений'
         
         elif action == 'delete':
+            # Счётчик непрочитанных корректируется сигналом post_delete
             deleted_count = notifications.count()
             notifications.delete()
             message = f'Удалено: {deleted_count} уведомлений'
@@ -129,8 +141,8 @@ class NotificationViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def unread_count(self, request):
-        """Количество непрочитанных уведомлений."""
-        count = self.get_queryset().filter(is_read=False).count()
+        """Количество непрочитанных уведомлений (из кэша Redis)."""
+        count = unread_counter.get(request.user.id)
         return Response({'unread_count': count})
     
     @action(detail=False, methods=['get'])
@@ -196,24 +208,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
     def preferences(self, request):
         """Настройки уведомлений пользователя."""
         if request.method == 'GET':
-            # Получаем текущие настройки
-            # Здесь можно добавить модель UserNotificationPreferences
-            preferences = {
-                'email_notifications': True,
-                'push_notifications': True,
-                'sms_notifications': False,
-                'notification_types': {
-                    'ticket_created': True,
-                    'ticket_updated': True,
-                    'ticket_assigned': True,
-                    'ticket_resolved': True,
-                    'knowledge_article_created': False,
-                    'system_announcement': True,
-                },
-                'quiet_hours_start': None,
-                'quiet_hours_end': None,
-            }
-            
+            preferences = get_notification_preferences(request.user)
             serializer = NotificationPreferencesSerializer(preferences)
             return Response(serializer.data)
         
@@ -222,13 +217,21 @@ class NotificationViewSet(viewsets.ModelViewSet):
             serializer = NotificationPreferencesSerializer(data=request.data)
             
             if serializer.is_valid():
-                # Здесь можно сохранить настройки в модель UserNotificationPreferences
+                user = request.user
+                user.preferences = dict(user.preferences or {})
+                user.preferences['notifications'] = serializer.data
+                user.save(update_fields=['preferences'])
                 return Response({
                     'message': 'Настройки уведомлений обновлены'
                 })
             
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['get'])
+    def digest_pending(self, request):
+        """События, накопленные для следующей сводки."""
+        return Response({'groups': digest_engine.pending(request.user.id)})
+    
     @action(detail=False, methods=['get'])
     def by_type(self, request):
         """Уведомления по типу."""
@@ -5,13 +5,20 @@ from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, Count, Avg, F, Max, Min
+from django.db.models import Q, Count, Avg, F
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import get_user_model
+from django.conf import settings
 
+from app.core import dashboard_renderer, metric_rollups
+from app.core.alert_evaluator import threshold_evaluator
+from app.core.metric_ingest import IngestBackpressure, metric_ingest, parse_samples
+from app.core.performance_reports import report_builder
+from app.core.trace_analysis import analyze_trace, load_spans
 from app.models import (
     PerformanceMetric, PerformanceAlert, PerformanceTrace,
     PerformanceDashboard, PerformanceReport, PerformanceThreshold
@@ -36,7 +43,7 @@ class PerformanceMetricViewSet(viewsets.ModelViewSet):
     queryset = PerformanceMetric.objects.all()
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['category', 'unit']
+    filterset_fields = ['metric_type', 'unit', 'service', 'endpoint']
     search_fields = ['name', 'tags']
     ordering_fields = ['timestamp', 'value', 'created_at']
     ordering = ['-timestamp']
@@ -52,9 +59,48 @@ class PerformanceMetricViewSet(viewsets.ModelViewSet):
         else:
             return PerformanceMetricSerializer
     
+    @action(detail=False, methods=['post'])
+    def ingest(self, request):
+        """
+        Пакетный приём метрик: массив образцов или {"samples": [...]}.
+        
+        Образцы буферизуются и записываются пакетами в фоне; при
+        заполненном буфере отвечает 429 с Retry-After.
+        """
+        samples = request.data.get('samples') if isinstance(request.data, dict) else request.data
+        if not isinstance(samples, list) or not samples:
+            return Response(
+                {'error': 'Ожидается непустой массив samples'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        max_samples = min(getattr(settings, 'METRIC_INGEST_MAX_SAMPLES', 10000), metric_ingest.max_buffer)
+        if len(samples) > max_samples:
+            return Response(
+                {'error': f'Не более {max_samples} образцов за запрос'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            rows = parse_samples(samples, request.user.tenant_id)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            accepted = metric_ingest.submit(rows)
+        except IngestBackpressure as exc:
+            response = Response(
+                {'error': 'Буфер приёма метрик переполнен, повторите позже'},
+                status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
+            response['Retry-After'] = max(1, round(exc.retry_after))
+            return response
+        
+        return Response({'accepted': accepted}, status=status.HTTP_202_ACCEPTED)
+    
     @action(detail=False, methods=['get'])
     def by_category(self, request):
-        """Метрики по категории."""
+        """Метрики по типу (category), постранично."""
         category = request.query_params.get('category')
         
         if not category:
@@ -63,21 +109,30 @@ class PerformanceMetricViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        metrics = self.get_queryset().filter(category=category)
-        serializer = PerformanceMetricSerializer(metrics, many=True)
-        return Response(serializer.data)
+        metrics = self.get_queryset().filter(metric_type=category).order_by('-timestamp')
+        paginator = PageNumberPagination()
+        page = paginator.paginate_queryset(metrics, request)
+        serializer = PerformanceMetricSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
     
     @action(detail=False, methods=['get'])
     def latest(self, request):
-        """Последние метрики."""
-        limit = int(request.query_params.get('limit', 100))
+        """Последние метрики (не более METRIC_LATEST_MAX_LIMIT)."""
+        try:
+            limit = int(request.query_params.get('limit', 100))
+        except ValueError:
+            return Response(
+                {'error': 'limit должен быть числом'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = max(1, min(limit, getattr(settings, 'METRIC_LATEST_MAX_LIMIT', 1000)))
         metrics = self.get_queryset().order_by('-timestamp')[:limit]
         serializer = PerformanceMetricSerializer(metrics, many=True)
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
     def aggregated(self, request):
-        """Агрегированные метрики."""
+        """Агрегированные метрики по агрегатам 1m/1h/1d."""
         metric_name = request.query_params.get('metric_name')
         period = request.query_params.get('period', 'hour')  # hour, day, week
         
@@ -87,37 +142,136 @@ class PerformanceMetricViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Базовый запрос
-        metrics = self.get_queryset().filter(name=metric_name)
-        
-        # Период
         now = timezone.now()
-        if period == 'hour':
-            start_time = now - timezone.timedelta(hours=1)
-        elif period == 'day':
-            start_time = now - timezone.timedelta(days=1)
-        elif period == 'week':
-            start_time = now - timezone.timedelta(weeks=1)
-        else:
-            start_time = now - timezone.timedelta(hours=1)
+        start_time = now - self._period_delta(period)
         
-        metrics = metrics.filter(timestamp__gte=start_time)
+        # Грубейшие агрегаты, покрывающие период; сырые строки только по краям
+        result = metric_rollups.aggregate(
+            request.user.tenant, metric_name, start_time, now, **self._series_params(request)
+        )
         
-        # Агрегация
-        aggregated = metrics.aggregate(
-            avg=Avg('value'),
-            max=Max('value'),
-            min=Min('value'),
-            count=Count('id')
+        return Response({
+            'metric_name': metric_name,
+            'period': period,
+            'aggregated': {
+                'avg': result['avg'],
+                'max': result['max'],
+                'min': result['min'],
+                'count': result['count'],
+                'sum': result['sum'],
+                'p50': result['p50'],
+                'p90': result['p90'],
+                'p99': result['p99'],
+            },
+            'data_points': result['count'],
+            'segments': result['segments'],
+        })
+    
+    @action(detail=False, methods=['get'])
+    def series(self, request):
+        """Временной ряд метрики по агрегатам (разрешение по длине периода)."""
+        metric_name = request.query_params.get('metric_name')
+        if not metric_name:
+            return Response(
+                {'error': 'metric_name обязателен'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        now = timezone.now()
+        date_from = parse_datetime(request.query_params.get('date_from', ''))
+        date_to = parse_datetime(request.query_params.get('date_to', '')) or now
+        date_from = date_from or date_to - timezone.timedelta(hours=1)
+        resolution = request.query_params.get('resolution')
+        if resolution and resolution not in metric_rollups.RESOLUTION_SECONDS:
+            return Response(
+                {'error': 'resolution должен быть одним из 1m, 1h, 1d'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            max_points = min(int(request.query_params.get('max_points', 500)), 5000)
+        except ValueError:
+            return Response(
+                {'error': 'max_points должен быть числом'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        result = metric_rollups.series(
+            request.user.tenant, metric_name, date_from, date_to,
+            resolution=resolution, max_points=max_points, **self._series_params(request)
         )
         
+        return Response({
+            'metric_name': metric_name,
+            'resolution': result['resolution'],
+            'points': [
+                {key: value for key, value in point.items() if key != 'sketch'}
+                for point in result['points']
+            ],
+        })
+    
+    @action(detail=False, methods=['get'])
+    def percentiles(self, request):
+        """
+        Перцентили p50/p90/p99 метрики за период, в том числе по группам.
+        
+        Скетчи всех интервалов, эндпоинтов и воркеров сливаются, поэтому
+        перцентили относятся ко всему периоду, а не усредняются.
+        """
+        metric_name = request.query_params.get('metric_name')
+        metric_type = request.query_params.get('metric_type')
+        if not metric_name and not metric_type:
+            return Response(
+                {'error': 'metric_name или metric_type обязателен'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        period = request.query_params.get('period', 'hour')
+        group_by = request.query_params.get('group_by')
+        now = timezone.now()
+        try:
+            groups, _ = metric_rollups.aggregate_groups(
+                request.user.tenant, metric_name, now - self._period_delta(period), now,
+                group_by=group_by, **self._series_params(request)
+            )
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        results = [
+            {
+                group_by or 'metric_name': key if group_by else metric_name,
+                'count': summary['count'],
+                'avg': summary['avg'],
+                'p50': summary['p50'],
+                'p90': summary['p90'],
+                'p99': summary['p99'],
+                'max': summary['max'],
+            }
+            for key, summary in groups.items()
+        ]
+        results.sort(key=lambda item: item['p99'] or 0, reverse=True)
+        
         return Response({
             'metric_name': metric_name,
             'period': period,
-            'aggregated': aggregated,
-            'data_points': metrics.count()
+            'group_by': group_by,
+            'results': results,
         })
     
+    @staticmethod
+    def _period_delta(period):
+        if period == 'day':
+            return timezone.timedelta(days=1)
+        if period == 'week':
+            return timezone.timedelta(weeks=1)
+        return timezone.timedelta(hours=1)
+    
+    def _series_params(self, request):
+        return {
+            key: request.query_params.get(key)
+            for key in ('metric_type', 'service', 'endpoint')
+            if request.query_params.get(key)
+        }
+    
     @action(detail=False, methods=['post'])
     def search(self, request):
         """Поиск метрик."""
@@ -140,7 +294,7 @@ class PerformanceMetricViewSet(viewsets.ModelViewSet):
         
         # Фильтры
         if data.get('category'):
-            metrics = metrics.filter(category=data['category'])
+            metrics = metrics.filter(metric_type=data['category'])
         
         if data.get('metric_name'):
             metrics = metrics.filter(name=data['metric_name'])
@@ -169,15 +323,15 @@ class PerformanceMetricViewSet(viewsets.ModelViewSet):
         # Общая статистика
         total_metrics = PerformanceMetric.objects.filter(tenant=tenant).count()
         active_alerts = PerformanceAlert.objects.filter(
-            tenant=tenant, is_resolved=False
+            tenant=tenant, status__in=PerformanceAlert.OPEN_STATUSES
         ).count()
         resolved_alerts = PerformanceAlert.objects.filter(
-            tenant=tenant, is_resolved=True
+            tenant=tenant, status='resolved'
         ).count()
         
         # Метрики по категориям
         metrics_by_category = PerformanceMetric.objects.filter(tenant=tenant).values(
-            'category'
+            'metric_type'
         ).annotate(count=Count('id')).order_by('-count')
         
         # Алерты по серьезности
@@ -185,11 +339,12 @@ class PerformanceMetricViewSet(viewsets.ModelViewSet):
             'severity'
         ).annotate(count=Count('id')).order_by('-count')
         
-        # Среднее время ответа
-        response_time_metrics = PerformanceMetric.objects.filter(
-            tenant=tenant, name='response_time'
+        # Время ответа за сутки по агрегатам: среднее скрывает хвост, поэтому и перцентили
+        now = timezone.now()
+        response_time = metric_rollups.aggregate(
+            tenant, None, now - timezone.timedelta(days=1), now, metric_type='response_time'
         )
-        average_response_time = response_time_metrics.aggregate(avg=Avg('value'))['avg'] or 0
+        average_response_time = response_time['avg'] or 0
         
         # Процент uptime
         uptime_metrics = PerformanceMetric.objects.filter(
@@ -199,10 +354,10 @@ class PerformanceMetricViewSet(viewsets.ModelViewSet):
         
         # Топ операции
         top_operations = PerformanceTrace.objects.filter(tenant=tenant).values(
-            'operation'
+            'operation_name'
         ).annotate(
             count=Count('id'),
-            avg_duration=Avg('duration')
+            avg_duration=Avg('duration_ms')
         ).order_by('-count')[:10]
         
         # Недавние метрики
@@ -212,9 +367,13 @@ class PerformanceMetricViewSet(viewsets.ModelViewSet):
             'total_metrics': total_metrics,
             'active_alerts': active_alerts,
             'resolved_alerts': resolved_alerts,
-            'metrics_by_category': dict(metrics_by_category),
-            'alerts_by_severity': dict(alerts_by_severity),
+            'metrics_by_category': {row['metric_type']: row['count'] for row in metrics_by_category},
+            'alerts_by_severity': {row['severity']: row['count'] for row in alerts_by_severity},
             'average_response_time': round(average_response_time, 2),
+            'response_time_percentiles': {
+                key: round(response_time[key], 2) if response_time[key] is not None else None
+                for key in ('p50', 'p90', 'p99')
+            },
             'uptime_percentage': round(uptime_percentage, 2),
             'top_operations': list(top_operations),
             'recent_metrics': PerformanceMetricSerializer(recent_metrics, many=True).data,
@@ -230,10 +389,10 @@ class PerformanceAlertViewSet(viewsets.ModelViewSet):
     queryset = PerformanceAlert.objects.all()
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['metric', 'severity', 'is_resolved']
-    search_fields = ['message']
-    ordering_fields = ['created_at', 'severity']
-    ordering = ['-created_at']
+    filterset_fields = ['metric_type', 'severity', 'status', 'threshold']
+    search_fields = ['name', 'description']
+    ordering_fields = ['triggered_at', 'created_at', 'severity']
+    ordering = ['-triggered_at']
     
     def get_queryset(self):
         """Фильтрация по арендатору."""
@@ -250,16 +409,34 @@ class PerformanceAlertViewSet(viewsets.ModelViewSet):
     def resolve(self, request, pk=None):
         """Решение алерта."""
         alert = self.get_object()
-        alert.is_resolved = True
+        alert.status = 'resolved'
         alert.resolved_at = timezone.now()
-        alert.save(update_fields=['is_resolved', 'resolved_at'])
+        alert.save(update_fields=['status', 'resolved_at', 'updated_at'])
+        
+        # Оценщик перечитает состояние порога: при сохранении нарушения откроется новый алерт
+        if alert.threshold_id:
+            threshold_evaluator.invalidate(alert.tenant_id)
         
         return Response({'message': 'Алерт решен'})
     
+    @action(detail=True, methods=['post'])
+    def acknowledge(self, request, pk=None):
+        """Подтверждение алерта: остаётся открытым, пока порог нарушен."""
+        alert = self.get_object()
+        if alert.status != 'active':
+            return Response(
+                {'error': 'Подтвердить можно только активный алерт'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        alert.status = 'acknowledged'
+        alert.save(update_fields=['status', 'updated_at'])
+        
+        return Response({'message': 'Алерт подтвержден'})
+    
     @action(detail=False, methods=['get'])
     def active(self, request):
         """Активные алерты."""
-        alerts = self.get_queryset().filter(is_resolved=False)
+        alerts = self.get_queryset().filter(status__in=PerformanceAlert.OPEN_STATUSES)
         serializer = PerformanceAlertSerializer(alerts, many=True)
         return Response(serializer.data)
     
@@ -279,15 +456,24 @@ class PerformanceAlertViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
+class SlowTraceCursorPagination(CursorPagination):
+    """Курсорная пагинация медленных трассировок по индексу (tenant, duration_ms)."""
+    
+    ordering = ('-duration_ms', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
 class PerformanceTraceViewSet(viewsets.ModelViewSet):
     """Управление трейсами производительности."""
     
     queryset = PerformanceTrace.objects.all()
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['operation', 'status']
-    search_fields = ['trace_id', 'operation']
-    ordering_fields = ['start_time', 'duration', 'created_at']
+    filterset_fields = ['operation_name', 'service_name', 'is_error']
+    search_fields = ['trace_id', 'operation_name']
+    ordering_fields = ['start_time', 'duration_ms', 'created_at']
     ordering = ['-start_time']
     
     def get_queryset(self):
@@ -301,9 +487,15 @@ class PerformanceTraceViewSet(viewsets.ModelViewSet):
         else:
             return PerformanceTraceSerializer
     
+    def _paginated(self, request, queryset):
+        paginator = PageNumberPagination()
+        page = paginator.paginate_queryset(queryset, request)
+        serializer = PerformanceTraceSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+    
     @action(detail=False, methods=['get'])
     def by_operation(self, request):
-        """Трейсы по операции."""
+        """Трейсы по операции, постранично."""
         operation = request.query_params.get('operation')
         
         if not operation:
@@ -312,28 +504,65 @@ class PerformanceTraceViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        traces = self.get_queryset().filter(operation=operation)
-        serializer = PerformanceTraceSerializer(traces, many=True)
-        return Response(serializer.data)
+        traces = self.get_queryset().filter(operation_name=operation).order_by('-start_time')
+        return self._paginated(request, traces)
     
     @action(detail=False, methods=['get'])
     def slow_operations(self, request):
-        """Медленные операции."""
-        threshold = float(request.query_params.get('threshold', 1.0))  # секунды
+        """Медленные операции (span дольше threshold секунд), постранично."""
+        try:
+            threshold_ms = float(request.query_params.get('threshold', 1.0)) * 1000  # секунды
+        except ValueError:
+            return Response(
+                {'error': 'threshold должен быть числом'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         traces = self.get_queryset().filter(
-            duration__gt=threshold
-        ).order_by('-duration')
-        
-        serializer = PerformanceTraceSerializer(traces, many=True)
-        return Response(serializer.data)
+            duration_ms__gt=threshold_ms
+        ).order_by('-duration_ms', '-id')
+        return self._paginated(request, traces)
     
     @action(detail=False, methods=['get'])
     def failed_operations(self, request):
-        """Неудачные операции."""
-        traces = self.get_queryset().filter(status='failed')
-        serializer = PerformanceTraceSerializer(traces, many=True)
-        return Response(serializer.data)
+        """Неудачные операции, постранично."""
+        traces = self.get_queryset().filter(is_error=True).order_by('-start_time')
+        return self._paginated(request, traces)
+    
+    @action(detail=False, methods=['get'])
+    def slow_traces(self, request):
+        """
+        Самые медленные трассировки (корневые span) с курсорной пагинацией.
+        
+        Фильтры: min_duration_ms, service.
+        """
+        traces = self.get_queryset().filter(parent_span_id='')
+        min_duration = request.query_params.get('min_duration_ms')
+        if min_duration:
+            if not min_duration.isdigit():
+                return Response(
+                    {'error': 'min_duration_ms должен быть целым числом'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            traces = traces.filter(duration_ms__gte=int(min_duration))
+        if request.query_params.get('service'):
+            traces = traces.filter(service_name=request.query_params['service'])
+        
+        paginator = SlowTraceCursorPagination()
+        # Без view: порядок задаёт пагинатор, а не OrderingFilter представления
+        page = paginator.paginate_queryset(traces, request)
+        serializer = PerformanceTraceSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+    
+    @action(detail=False, methods=['get'], url_path=r'tree/(?P<trace_id>[^/]+)')
+    def tree(self, request, trace_id=None):
+        """Дерево span трассировки с собственным временем и критическим путём."""
+        spans = load_spans(request.user.tenant, trace_id)
+        result = analyze_trace(spans)
+        if result is None:
+            return Response({'error': 'Трассировка не найдена'}, status=status.HTTP_404_NOT_FOUND)
+        result['trace_id'] = trace_id
+        return Response(result)
 
 
 class PerformanceDashboardViewSet(viewsets.ModelViewSet):
@@ -342,7 +571,7 @@ class PerformanceDashboardViewSet(viewsets.ModelViewSet):
     queryset = PerformanceDashboard.objects.all()
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['is_public', 'author']
+    filterset_fields = ['is_public', 'created_by']
     search_fields = ['name', 'description']
     ordering_fields = ['name', 'created_at']
     ordering = ['-created_at']
@@ -358,6 +587,23 @@ class PerformanceDashboardViewSet(viewsets.ModelViewSet):
         else:
             return PerformanceDashboardSerializer
     
+    def perform_update(self, serializer):
+        """Сохранение и рассылка новой раскладки подписчикам дашборда."""
+        super().perform_update(serializer)
+        dashboard_renderer.publish(serializer.instance, full=True)
+    
+    @action(detail=True, methods=['get'])
+    def render(self, request, pk=None):
+        """
+        Данные всех виджетов дашборда.
+        
+        Виджеты считаются на сервере одним запросом к агрегатам на каждое
+        разрешение и кешируются; обновления приходят по WebSocket
+        (ws/performance/dashboards/<id>/), опрашивать виджеты не нужно.
+        """
+        dashboard = self.get_object()
+        return Response(dashboard_renderer.render(dashboard))
+    
     @action(detail=True, methods=['post'])
     def add_widget(self, request, pk=None):
         """Добавление виджета к дашборду."""
@@ -372,7 +618,8 @@ class PerformanceDashboardViewSet(viewsets.ModelViewSet):
                 dashboard.widgets = []
             
             dashboard.widgets.append(widget_data)
-            dashboard.save(update_fields=['widgets'])
+            dashboard.save(update_fields=['widgets', 'updated_at'])
+            dashboard_renderer.publish(dashboard, full=True)
             
             return Response({
                 'message': 'Виджет добавлен',
@@ -401,7 +648,8 @@ class PerformanceDashboardViewSet(viewsets.ModelViewSet):
         
         # Удаляем виджет
         dashboard.widgets.pop(widget_index)
-        dashboard.save(update_fields=['widgets'])
+        dashboard.save(update_fields=['widgets', 'updated_at'])
+        dashboard_renderer.publish(dashboard, full=True)
         
         return Response({
             'message': 'Виджет удален',
@@ -416,7 +664,8 @@ class PerformanceDashboardViewSet(viewsets.ModelViewSet):
         
         if serializer.is_valid():
             dashboard.widgets = serializer.validated_data['widgets']
-            dashboard.save(update_fields=['widgets'])
+            dashboard.save(update_fields=['widgets', 'updated_at'])
+            dashboard_renderer.publish(dashboard, full=True)
             
             return Response({
                 'message': 'Виджеты обновлены',
@@ -436,7 +685,7 @@ class PerformanceDashboardViewSet(viewsets.ModelViewSet):
     def my_dashboards(self, request):
         """Дашборды текущего пользователя."""
         user = request.user
-        dashboards = self.get_queryset().filter(author=user)
+        dashboards = self.get_queryset().filter(created_by=user)
         serializer = PerformanceDashboardSerializer(dashboards, many=True)
         return Response(serializer.data)
 
@@ -447,14 +696,14 @@ class PerformanceReportViewSet(viewsets.ModelViewSet):
     queryset = PerformanceReport.objects.all()
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['report_type', 'is_public', 'author']
+    filterset_fields = ['report_type', 'status', 'created_by']
     search_fields = ['name', 'description']
     ordering_fields = ['name', 'created_at']
     ordering = ['-created_at']
     
     def get_queryset(self):
-        """Фильтрация по арендатору."""
-        return self.queryset.filter(tenant=self.request.user.tenant)
+        """Фильтрация по арендатору; сжатый отчет читается только при выгрузке."""
+        return self.queryset.filter(tenant=self.request.user.tenant).defer('artifact')
     
     def get_serializer_class(self):
         """Выбор сериализатора в зависимости от действия."""
@@ -465,22 +714,43 @@ class PerformanceReportViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['post'])
     def generate(self, request, pk=None):
-        """Генерация отчета."""
+        """
+        Генерация отчета в фоне.
+        
+        Если данные за период не менялись с прошлой генерации, сразу
+        возвращается готовый отчет (200), иначе ставится задача Celery (202),
+        ход выполнения виден в полях status и progress.
+        """
         report = self.get_object()
+        force = str(request.data.get('force', '')).lower() in ('1', 'true', 'yes')
+        cached = report_builder.request(report, force=force)
         
-        # Здесь можно добавить логику генерации отчета
-        # Пока возвращаем базовую информацию
         return Response({
-            'message': 'Отчет сгенерирован',
+            'message': 'Отчет готов' if cached else 'Отчет формируется',
             'report_id': report.id,
-            'data': report.data
-        })
+            'status': report.status,
+            'progress': report.progress,
+            'cached': cached,
+        }, status=status.HTTP_200_OK if cached else status.HTTP_202_ACCEPTED)
+    
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """Сформированный отчет."""
+        report = self.get_object()
+        if report.status != 'completed':
+            return Response({
+                'error': 'Отчет еще не сформирован',
+                'status': report.status,
+                'progress': report.progress,
+                'error_message': report.error_message,
+            }, status=status.HTTP_409_CONFLICT)
+        return Response(report.unpack())
     
     @action(detail=False, methods=['get'])
     def my_reports(self, request):
         """Отчеты текущего пользователя."""
         user = request.user
-        reports = self.get_queryset().filter(author=user)
+        reports = self.get_queryset().filter(created_by=user)
         serializer = PerformanceReportSerializer(reports, many=True)
         return Response(serializer.data)
 
@@ -491,10 +761,10 @@ class PerformanceThresholdViewSet(viewsets.ModelViewSet):
     queryset = PerformanceThreshold.objects.all()
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['metric_name', 'severity', 'is_active']
-    search_fields = ['metric_name']
-    ordering_fields = ['metric_name', 'threshold_value', 'created_at']
-    ordering = ['metric_name']
+    filterset_fields = ['metric_type', 'metric_name', 'is_active']
+    search_fields = ['name', 'metric_name']
+    ordering_fields = ['name', 'metric_type', 'metric_name', 'created_at']
+    ordering = ['metric_type', 'name']
     
     def get_queryset(self):
         """Фильтрация по арендатору."""
@@ -507,12 +777,26 @@ class PerformanceThresholdViewSet(viewsets.ModelViewSet):
         else:
             return PerformanceThresholdSerializer
     
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        threshold_evaluator.invalidate(serializer.instance.tenant_id)
+    
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        threshold_evaluator.invalidate(serializer.instance.tenant_id)
+    
+    def perform_destroy(self, instance):
+        tenant_id = instance.tenant_id
+        super().perform_destroy(instance)
+        threshold_evaluator.invalidate(tenant_id)
+    
     @action(detail=True, methods=['post'])
     def toggle(self, request, pk=None):
         """Переключение активности порогового значения."""
         threshold = self.get_object()
         threshold.is_active = not threshold.is_active
-        threshold.save(update_fields=['is_active'])
+        threshold.save(update_fields=['is_active', 'updated_at'])
+        threshold_evaluator.invalidate(threshold.tenant_id)
         
         return Response({
             'message': f'Пороговое значение {"активировано" if threshold.is_active else "деактивировано"}',
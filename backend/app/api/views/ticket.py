@@ -9,6 +9,7 @@ from django.db.models import Q, Count, Avg, Case, When, IntegerField, DurationFi
 from django.utils import timezone
 from datetime import timedelta
 
+from app.core.response_cache import cached_response
 from app.models import Ticket, TicketComment, TicketAttachment, Tag, SLA, TicketSLA
 from app.api.serializers.ticket import (
     TicketListSerializer, TicketDetailSerializer, TicketCreateSerializer,
@@ -341,6 +342,17 @@ class TagViewSet(viewsets.ModelViewSet):
     search_fields = ['name', 'description']
     ordering_fields = ['name', 'created_at']
     ordering = ['name']
+    
+    def get_permissions(self):
+        """Теги общие для всех арендаторов: изменять их может только персонал."""
+        if self.action in ['list', 'retrieve']:
+            return [permissions.IsAuthenticated()]
+        return [permissions.IsAdminUser()]
+    
+    @cached_response('tags')
+    def list(self, request, *args, **kwargs):
+        """Список тегов (ответ кешируется, сбрасывается при изменении тегов)."""
+        return super().list(request, *args, **kwargs)
 
 
 class SLAViewSet(viewsets.ModelViewSet):
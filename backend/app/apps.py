@@ -18,4 +18,14 @@ class AppConfig(AppConfig):
             # Избегаем падений при командах, не требующих загрузки всех моделей
             pass
 
+        # Подключаем обработчики сигналов моделей
+        from . import signals  # noqa: F401
+
+        # Трассировки: сэмплер, экспорт span и проброс контекста в задачи Celery
+        from django.conf import settings
+        if getattr(settings, 'TRACE_ENABLED', True):
+            from .core.trace_export import configure_tracing
+            from .core import tracing  # noqa: F401
+            configure_tracing()
+
 
@@ -0,0 +1,434 @@
+"""
+Streaming evaluation of PerformanceThreshold rules
+
+Active thresholds of a tenant are loaded once (refreshed every
+ALERT_RULES_REFRESH_SECONDS) into an index keyed by metric name; rules
+without a metric name are indexed by metric type. Every incoming sample
+goes only to the rules under its keys and is folded into each rule's
+sliding window: bucket counts and sums plus monotonic deques for min and
+max, so both adding a sample and reading the window aggregate are O(1)
+amortized and a batch costs O(samples x matching rules), independent of
+how many thresholds a tenant has.
+
+After every sample the rule level (ok / warning / critical) is
+recomputed; only the last level change of a rule in a batch reaches the
+database. A new level opens a PerformanceAlert, a changed level updates
+its severity, back to ok resolves it. A partial unique constraint keeps
+at most one open alert per threshold, so workers evaluating the same
+rule never open duplicates.
+
+Windows live in the process that ingested the samples: with several
+ingestion workers each one evaluates its share of the stream. An alert
+only resolves through a window that actually received samples here, so a
+worker never resolves an alert opened by another worker (or before a
+restart) just because its own window for the rule is empty.
+
+Windows are evaluated under one lock; alert writes happen after it is
+released, under a separate lock taken before the first is released, so
+batches reach the database in the order they were evaluated.
+"""
+import logging
+import operator
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from prometheus_client import Counter, Histogram
+
+
+logger = logging.getLogger(__name__)
+
+
+OPERATORS: Dict[str, Callable[[float, float], bool]] = {
+    'gt': operator.gt,
+    'gte': operator.ge,
+    'lt': operator.lt,
+    'lte': operator.le,
+    'eq': operator.eq,
+    'ne': operator.ne,
+}
+
+WARNING = 'warning'
+CRITICAL = 'critical'
+# Уровень правила -> критичность алерта и обратно (алерты low/high считаются предупреждением)
+LEVEL_SEVERITY = {WARNING: 'medium', CRITICAL: 'critical'}
+
+# Порядок полей образца для process()
+SAMPLE_COLUMNS = ('tenant_id', 'name', 'metric_type', 'service', 'endpoint', 'timestamp', 'value')
+
+# На сколько интервалов делится окно: точность границы окна — 1/60 его длины
+WINDOW_BUCKETS = 60
+
+ALERT_METRICS = {
+    'samples': Counter(
+        'performance_threshold_samples_total',
+        'Samples passed through the threshold evaluator'
+    ),
+    'transitions': Counter(
+        'performance_alert_transitions_total',
+        'Alert level changes written to the database',
+        ['transition']
+    ),
+    'duration': Histogram(
+        'performance_threshold_batch_duration_seconds',
+        'Time to evaluate one batch of samples'
+    ),
+}
+
+
+class SlidingWindow:
+    """
+    Time window over a stream of values
+
+    Values are grouped into WINDOW_BUCKETS intervals; a bucket leaves the
+    window as a whole once it is entirely older than `window` seconds.
+    Count and sum are kept as running totals, min and max as monotonic
+    deques of (bucket_start, value).
+    """
+
+    __slots__ = ('window', 'step', 'latest', 'count', 'sum', '_buckets', '_max', '_min')
+
+    def __init__(self, window_seconds: float):
+        self.window = float(window_seconds)
+        self.step = max(1.0, self.window / WINDOW_BUCKETS)
+        self.latest = float('-inf')
+        self.count = 0
+        self.sum = 0.0
+        self._buckets = deque()  # [start, count, sum]
+        self._max = deque()
+        self._min = deque()
+
+    def add(self, ts: float, value: float) -> bool:
+        """
+        Add a value measured at `ts` (epoch seconds)
+
+        Returns:
+            bool: False if the value is already older than the window
+        """
+        if ts <= self.latest - self.window:
+            return False
+        start = ts - ts % self.step
+        if self._buckets and start <= self._buckets[-1][0]:
+            # Запоздавшее значение внутри окна учитывается в последнем интервале
+            bucket = self._buckets[-1]
+            start = bucket[0]
+            bucket[1] += 1
+            bucket[2] += value
+        else:
+            self._buckets.append([start, 1, value])
+        self.count += 1
+        self.sum += value
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((start, value))
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((start, value))
+        if ts > self.latest:
+            self.latest = ts
+            self.expire(ts)
+        return True
+
+    def expire(self, now: float):
+        """Drop buckets that ended more than `window` seconds before `now`"""
+        cutoff = now - self.window - self.step
+        buckets = self._buckets
+        while buckets and buckets[0][0] <= cutoff:
+            _, count, total = buckets.popleft()
+            self.count -= count
+            self.sum -= total
+        if not buckets:
+            self.count, self.sum = 0, 0.0
+        while self._max and self._max[0][0] <= cutoff:
+            self._max.popleft()
+        while self._min and self._min[0][0] <= cutoff:
+            self._min.popleft()
+
+    def aggregate(self, kind: str) -> Optional[float]:
+        if kind == 'count':
+            return float(self.count)
+        if not self.count:
+            return None
+        if kind == 'avg':
+            return self.sum / self.count
+        if kind == 'sum':
+            return self.sum
+        if kind == 'max':
+            return self._max[0][1]
+        if kind == 'min':
+            return self._min[0][1]
+        raise ValueError(f"Unknown aggregation {kind!r}")
+
+
+class Rule:
+    """A PerformanceThreshold with its window and current level"""
+
+    __slots__ = ('threshold_id', 'tenant_id', 'name', 'metric_name', 'metric_type', 'operator',
+                 'compare', 'warning', 'critical', 'aggregation', 'min_samples', 'service',
+                 'endpoint', 'version', 'window', 'level', 'alert_id', 'value')
+
+    def __init__(self, threshold):
+        conditions = threshold.conditions if isinstance(threshold.conditions, dict) else {}
+        self.threshold_id = threshold.id
+        self.tenant_id = threshold.tenant_id
+        self.name = threshold.name
+        self.metric_name = threshold.metric_name
+        self.metric_type = threshold.metric_type
+        self.operator = threshold.operator if threshold.operator in OPERATORS else 'gt'
+        self.compare = OPERATORS[self.operator]
+        self.warning = threshold.warning_threshold
+        self.critical = threshold.critical_threshold
+        self.aggregation = threshold.aggregation
+        self.min_samples = threshold.min_samples
+        self.service = conditions.get('service') or ''
+        self.endpoint = conditions.get('endpoint') or ''
+        self.version = threshold.updated_at
+        self.window = SlidingWindow(threshold.window_seconds or 1)
+        self.level: Optional[str] = None
+        self.alert_id: Optional[int] = None
+        self.value: Optional[float] = None
+
+    def evaluate(self) -> Optional[str]:
+        """Recompute the level from the window aggregate"""
+        if self.window.count < self.min_samples and self.aggregation != 'count':
+            self.value = None
+            return None
+        value = self.value = self.window.aggregate(self.aggregation)
+        if value is None:
+            return None
+        if self.compare(value, self.critical):
+            return CRITICAL
+        if self.compare(value, self.warning):
+            return WARNING
+        return None
+
+
+class TenantRules:
+    __slots__ = ('loaded_at', 'rules', 'by_name', 'by_type')
+
+    def __init__(self, rules: Dict[int, Rule]):
+        self.loaded_at = time.monotonic()
+        self.rules = rules
+        self.by_name: Dict[str, List[Rule]] = {}
+        self.by_type: Dict[str, List[Rule]] = {}
+        for rule in rules.values():
+            if rule.metric_name:
+                self.by_name.setdefault(rule.metric_name, []).append(rule)
+            else:
+                self.by_type.setdefault(rule.metric_type, []).append(rule)
+
+
+def _epoch(value) -> float:
+    return value.timestamp() if isinstance(value, datetime) else float(value)
+
+
+class ThresholdEvaluator:
+    """
+    Evaluates the sample stream against PerformanceThreshold rows
+
+    Args:
+        refresh_interval: Seconds between reloads of a tenant's thresholds
+        sweep_interval: Seconds between expiring windows of rules that
+            received no samples, so alerts resolve when a metric goes quiet
+    """
+
+    def __init__(self, refresh_interval: Optional[float] = None, sweep_interval: Optional[float] = None):
+        self.refresh_interval = refresh_interval if refresh_interval is not None else \
+            getattr(settings, 'ALERT_RULES_REFRESH_SECONDS', 60)
+        self.sweep_interval = sweep_interval if sweep_interval is not None else \
+            getattr(settings, 'ALERT_SWEEP_SECONDS', 10)
+        self._tenants: Dict[Optional[int], TenantRules] = {}
+        self._last_sweep = time.monotonic()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def _load(self, tenant_id: Optional[int], previous: Optional[TenantRules]) -> TenantRules:
+        from app.models import PerformanceAlert, PerformanceThreshold
+
+        rules = {}
+        for threshold in PerformanceThreshold.objects.filter(tenant_id=tenant_id, is_active=True):
+            rule = previous.rules.get(threshold.id) if previous else None
+            # Неизменённое правило сохраняет окно; изменённое начинает заново
+            if rule is None or rule.version != threshold.updated_at:
+                rule = Rule(threshold)
+            rules[threshold.id] = rule
+
+        # Уровень и открытый алерт берутся из БД: их мог изменить другой
+        # воркер или пользователь (ручное решение алерта)
+        open_alerts = {
+            threshold_id: (alert_id, severity)
+            for alert_id, threshold_id, severity in PerformanceAlert.objects.filter(
+                threshold_id__in=list(rules), status__in=PerformanceAlert.OPEN_STATUSES
+            ).values_list('id', 'threshold_id', 'severity')
+        }
+        for threshold_id, rule in rules.items():
+            alert_id, severity = open_alerts.get(threshold_id, (None, None))
+            rule.alert_id = alert_id
+            rule.level = None if alert_id is None else (CRITICAL if severity == 'critical' else WARNING)
+        return TenantRules(rules)
+
+    def rules_for(self, tenant_id: Optional[int]) -> TenantRules:
+        """Rules of a tenant, loaded on first use and refreshed periodically"""
+        loaded = self._tenants.get(tenant_id)
+        if loaded is None or time.monotonic() - loaded.loaded_at >= self.refresh_interval:
+            loaded = self._tenants[tenant_id] = self._load(tenant_id, loaded)
+        return loaded
+
+    def invalidate(self, tenant_id: Optional[int] = None):
+        """Force a reload of one tenant's (or all) thresholds on the next sample"""
+        with self._lock:
+            if tenant_id is None:
+                for loaded in self._tenants.values():
+                    loaded.loaded_at = float('-inf')
+            elif tenant_id in self._tenants:
+                self._tenants[tenant_id].loaded_at = float('-inf')
+
+    def process(self, rows: Iterable[Sequence], columns: Sequence[str] = SAMPLE_COLUMNS) -> List[Dict[str, Any]]:
+        """
+        Evaluate samples and write resulting alert changes
+
+        Args:
+            rows: Sample rows (e.g. metric ingestion rows)
+            columns: Column names of the rows; must include SAMPLE_COLUMNS
+
+        Returns:
+            List of transitions: threshold_id, alert_id, level, previous_level, value
+        """
+        positions = [columns.index(column) for column in SAMPLE_COLUMNS]
+        started = time.perf_counter()
+        with self._lock:
+            previous: Dict[int, Tuple[Rule, Optional[str]]] = {}
+            tenants: Dict[Optional[int], TenantRules] = {}
+            samples = 0
+            for row in rows:
+                tenant_id, name, metric_type, service, endpoint, timestamp, value = (
+                    row[position] for position in positions
+                )
+                samples += 1
+                loaded = tenants.get(tenant_id)
+                if loaded is None:
+                    loaded = tenants[tenant_id] = self.rules_for(tenant_id)
+                if not loaded.rules:
+                    continue
+                ts = _epoch(timestamp)
+                for candidates in (loaded.by_name.get(name), loaded.by_type.get(metric_type)):
+                    if not candidates:
+                        continue
+                    for rule in candidates:
+                        if (rule.service and rule.service != service) or \
+                                (rule.endpoint and rule.endpoint != endpoint):
+                            continue
+                        if not rule.window.add(ts, value):
+                            continue
+                        self._update(rule, previous)
+
+            if time.monotonic() - self._last_sweep >= self.sweep_interval:
+                self._sweep(time.time(), previous)
+
+            changes = [
+                (rule, level_before, rule.level, rule.value)
+                for rule, level_before in previous.values()
+                if rule.level != level_before
+            ]
+            # Очередь записи занимается до освобождения окон: порядок пакетов сохраняется
+            self._write_lock.acquire()
+        try:
+            transitions = [self._apply(*change) for change in changes]
+        finally:
+            self._write_lock.release()
+        ALERT_METRICS['samples'].inc(samples)
+        ALERT_METRICS['duration'].observe(time.perf_counter() - started)
+        return transitions
+
+    def _update(self, rule: Rule, previous: Dict[int, Tuple[Rule, Optional[str]]]):
+        level = rule.evaluate()
+        if level != rule.level:
+            previous.setdefault(rule.threshold_id, (rule, rule.level))
+            rule.level = level
+
+    def _sweep(self, now: float, previous: Dict[int, Tuple[Rule, Optional[str]]]):
+        self._last_sweep = time.monotonic()
+        for loaded in self._tenants.values():
+            for rule in loaded.rules.values():
+                # Правило без значений в этом процессе не оценивается: его алерт
+                # мог открыть другой воркер, нарушение у которого продолжается
+                if rule.window.latest != float('-inf'):
+                    rule.window.expire(now)
+                    self._update(rule, previous)
+
+    def _apply(self, rule: Rule, level_before: Optional[str], level: Optional[str],
+               value: Optional[float]) -> Dict[str, Any]:
+        """Write one level change; level and value are taken when it was evaluated"""
+        from app.models import PerformanceAlert
+
+        now = timezone.now()
+        if level is None:
+            if rule.alert_id is not None:
+                PerformanceAlert.objects.filter(
+                    id=rule.alert_id, status__in=PerformanceAlert.OPEN_STATUSES
+                ).update(status='resolved', resolved_at=now, current_value=value, updated_at=now)
+            transition = 'resolved'
+            rule.alert_id = None
+        elif rule.alert_id is None:
+            transition = 'fired'
+            self._open_alert(rule, level, value)
+        else:
+            transition = 'escalated' if level == CRITICAL else 'deescalated'
+            PerformanceAlert.objects.filter(id=rule.alert_id).update(
+                severity=LEVEL_SEVERITY[level],
+                threshold_value=rule.critical if level == CRITICAL else rule.warning,
+                current_value=value,
+                updated_at=now,
+            )
+        ALERT_METRICS['transitions'].labels(transition=transition).inc()
+        return {
+            'threshold_id': rule.threshold_id,
+            'alert_id': rule.alert_id,
+            'level': level,
+            'previous_level': level_before,
+            'value': value,
+            'transition': transition,
+        }
+
+    def _open_alert(self, rule: Rule, level: str, value: float):
+        from app.models import PerformanceAlert
+
+        metric = rule.metric_name or rule.metric_type
+        threshold_value = rule.critical if level == CRITICAL else rule.warning
+        try:
+            with transaction.atomic():
+                alert = PerformanceAlert.objects.create(
+                    name=rule.name,
+                    description=(
+                        f"{rule.aggregation}({metric}) за {rule.window.window:g} с = {value:g}, "
+                        f"порог {rule.operator} {threshold_value:g}"
+                    ),
+                    metric_type=rule.metric_type,
+                    threshold_value=threshold_value,
+                    comparison_operator=rule.operator,
+                    current_value=value,
+                    severity=LEVEL_SEVERITY[level],
+                    conditions={
+                        'metric_name': rule.metric_name,
+                        'aggregation': rule.aggregation,
+                        'window_seconds': rule.window.window,
+                        'service': rule.service,
+                        'endpoint': rule.endpoint,
+                    },
+                    threshold_id=rule.threshold_id,
+                    tenant_id=rule.tenant_id,
+                )
+            rule.alert_id = alert.id
+        except IntegrityError:
+            # Алерт по этому порогу уже открыл другой воркер
+            rule.alert_id = PerformanceAlert.objects.filter(
+                threshold_id=rule.threshold_id, status__in=PerformanceAlert.OPEN_STATUSES
+            ).values_list('id', flat=True).first()
+
+
+threshold_evaluator = ThresholdEvaluator()
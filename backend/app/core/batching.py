@@ -0,0 +1,183 @@
+"""
+Bounded in-process batching drained by a background thread
+
+Shared by the span export queue (app.core.trace_export) and the metric
+ingest buffer (app.core.metric_ingest): items are buffered in process and
+handed to `process_batch` in batches of up to `batch_size` as soon as a
+batch is full or `flush_interval` seconds after the oldest buffered item.
+"""
+import os
+import threading
+import time
+from typing import Any, List, Optional, Sequence
+
+
+class BackgroundBatcher:
+    """
+    Bounded item buffer with one flusher thread per process
+
+    Subclasses implement `process_batch` (it must not raise: a failure is
+    logged and counted there) and choose how to handle a full buffer:
+    `add_nowait` keeps what fits and drops the rest, `add` waits for free
+    space and gives up after a timeout. The flusher thread is started on
+    first use and restarted after fork(), dropping items inherited from the
+    parent.
+    """
+
+    thread_name = 'batch-flusher'
+
+    def __init__(self, batch_size: int, flush_interval: float, max_size: int):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self._items: List[Any] = []
+        self._oldest: Optional[float] = None
+        self._processing = 0
+        self._condition = threading.Condition()
+        # flush() из другого потока не должен обрабатывать пакет параллельно с фоновым
+        self._process_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._stopped = False
+
+    @property
+    def buffered(self) -> int:
+        """Number of items waiting for the flusher"""
+        return len(self._items)
+
+    def process_batch(self, batch: List[Any]) -> int:
+        """
+        Handle one batch
+
+        Returns:
+            int: Number of processed items
+        """
+        raise NotImplementedError
+
+    def buffer_changed(self, size: int):
+        """Called under the buffer lock with the new buffer size"""
+
+    def add_nowait(self, items: Sequence[Any]) -> int:
+        """
+        Queue as many items as fit without waiting
+
+        Returns:
+            int: Number of accepted items, the rest is dropped
+        """
+        self._ensure_flusher()
+        with self._condition:
+            accepted = items[:max(self.max_size - len(self._items), 0)]
+            if accepted:
+                self._append(accepted)
+        return len(accepted)
+
+    def add(self, items: Sequence[Any], timeout: float) -> bool:
+        """
+        Queue all items, waiting up to `timeout` seconds for free space
+
+        Returns:
+            bool: False if the buffer did not free up in time
+        """
+        self._ensure_flusher()
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while len(self._items) + len(items) > self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            self._append(items)
+        return True
+
+    def flush(self) -> int:
+        """
+        Process everything buffered so far from the calling thread
+
+        Also waits for the batch the flusher thread is processing, so the
+        items submitted before the call are handled when it returns.
+
+        Returns:
+            int: Number of processed items
+        """
+        processed = 0
+        while True:
+            batch = self._take(force=True)
+            if not batch:
+                break
+            processed += self._process(batch)
+        with self._condition:
+            while self._processing:
+                self._condition.wait(0.05)
+        return processed
+
+    def stop(self):
+        """Stop the flusher thread after processing buffered items"""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=10)
+        self.flush()
+
+    def _append(self, items: Sequence[Any]):
+        if not self._items:
+            self._oldest = time.monotonic()
+        self._items.extend(items)
+        self.buffer_changed(len(self._items))
+        if len(self._items) >= self.batch_size:
+            self._condition.notify_all()
+
+    def _ensure_flusher(self):
+        # После fork() поток родителя в дочернем процессе не существует
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._condition:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._items, self._oldest, self._processing = [], None, 0
+            self._pid = os.getpid()
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+            self._thread.start()
+
+    def _due(self) -> bool:
+        return bool(self._items) and (
+            len(self._items) >= self.batch_size
+            or time.monotonic() - self._oldest >= self.flush_interval
+        )
+
+    def _take(self, force: bool = False) -> List[Any]:
+        with self._condition:
+            if not self._items or not (force or self._due()):
+                return []
+            batch = self._items[:self.batch_size]
+            del self._items[:self.batch_size]
+            self._oldest = time.monotonic() if self._items else None
+            self._processing += 1
+            self.buffer_changed(len(self._items))
+            # Место в буфере освободилось: будим ждущие add
+            self._condition.notify_all()
+            return batch
+
+    def _process(self, batch: List[Any]) -> int:
+        try:
+            with self._process_lock:
+                return self.process_batch(batch)
+        finally:
+            with self._condition:
+                self._processing -= 1
+                self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopped and not self._due():
+                    timeout = None if not self._items else \
+                        self.flush_interval - (time.monotonic() - self._oldest)
+                    self._condition.wait(timeout)
+                if self._stopped:
+                    return
+            batch = self._take()
+            if batch:
+                self._process(batch)
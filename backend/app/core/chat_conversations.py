@@ -0,0 +1,226 @@
+"""
+Chat conversation summaries
+"""
+from typing import Dict, Iterable, List, Optional
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+
+def conversation_summary_queryset(user):
+    """
+    Build last message and unread count per room in a single query
+
+    Window functions partition the user's rooms by room_name: ROW_NUMBER()
+    picks the latest message and a windowed SUM counts messages from other
+    participants newer than the user's read marker.
+
+    Args:
+        user: Participant whose rooms are summarised
+
+    Returns:
+        QuerySet of ChatMessage rows (one per room) annotated with `unread`
+    """
+    from app.models.chat import ChatConversation, ChatMessage
+
+    rooms = ChatMessage.objects.filter(sender=user).values('room_name')
+    last_read = ChatConversation.objects.filter(
+        user=user, room_name=OuterRef('room_name')
+    ).values('last_read_at')[:1]
+
+    unread_case = Case(
+        When(
+            ~Q(sender=user) & (Q(read_marker__isnull=True) | Q(timestamp__gt=F('read_marker'))),
+            then=Value(1),
+        ),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    return (
+        ChatMessage.objects
+        .filter(room_name__in=rooms)
+        .annotate(read_marker=Subquery(last_read))
+        .annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=[F('room_name')],
+                order_by=[F('timestamp').desc(), F('id').desc()],
+            ),
+            unread=Window(Sum(unread_case), partition_by=[F('room_name')]),
+        )
+        .filter(row_number=1)
+        .select_related('sender')
+    )
+
+
+def rebuild_conversations(user, room_names: Optional[Iterable[str]] = None) -> List:
+    """
+    Recompute the user's ChatConversation rows from chat history
+
+    Args:
+        user: Participant whose summaries are rebuilt
+        room_names: Only these rooms (all rooms of the user if omitted)
+
+    Returns:
+        List of ChatConversation rows
+    """
+    from app.models.chat import ChatConversation
+
+    messages = conversation_summary_queryset(user)
+    if room_names is not None:
+        room_names = list(room_names)
+        if not room_names:
+            return []
+        messages = messages.filter(room_name__in=room_names)
+    summaries = [
+        ChatConversation(
+            user=user,
+            room_name=message.room_name,
+            last_message=message,
+            last_message_at=message.timestamp,
+            unread_count=message.unread or 0,
+        )
+        for message in messages
+    ]
+    return ChatConversation.objects.bulk_create(
+        summaries,
+        update_conflicts=True,
+        unique_fields=['user', 'room_name'],
+        update_fields=['last_message', 'last_message_at', 'unread_count'],
+    )
+
+
+def missing_rooms(user) -> List[str]:
+    """
+    Rooms the user took part in that have no ChatConversation row yet
+
+    Summaries are maintained only for rows that exist, so history older
+    than the summary table is filled in per room with rebuild_conversations.
+    """
+    from app.models.chat import ChatConversation, ChatMessage
+
+    return list(
+        ChatMessage.objects.filter(sender=user)
+        .exclude(room_name__in=ChatConversation.objects.filter(user=user).values('room_name'))
+        .values_list('room_name', flat=True)
+        .distinct()
+    )
+
+
+def is_participant(user, room_name: str) -> bool:
+    """Whether the user has a conversation in the room or sent messages there"""
+    from app.models.chat import ChatConversation, ChatMessage
+
+    return (
+        ChatConversation.objects.filter(user=user, room_name=room_name).exists()
+        or ChatMessage.objects.filter(sender=user, room_name=room_name).exists()
+    )
+
+
+def backfill_conversations(user) -> int:
+    """Create the user's missing ChatConversation rows, returns their number"""
+    return len(rebuild_conversations(user, missing_rooms(user)))
+
+
+def backfill_all_conversations() -> int:
+    """
+    Create missing ChatConversation rows of every chat participant
+
+    New messages keep the sender's row up to date, so rows are missing only
+    for history older than the summary table; this runs once from a data
+    migration and from the backfill_chat_conversations command.
+
+    Returns:
+        int: Number of created rows
+    """
+    from django.contrib.auth import get_user_model
+
+    from app.models.chat import ChatMessage
+
+    users = get_user_model().objects.filter(
+        pk__in=ChatMessage.objects.values('sender')
+    ).order_by('pk')
+    return sum(backfill_conversations(user) for user in users.iterator())
+
+
+def apply_new_message(message):
+    """
+    Update conversation summaries of a room after a message was saved
+
+    Args:
+        message: Newly created ChatMessage
+    """
+    apply_new_messages([message])
+
+
+def apply_new_messages(messages: List):
+    """
+    Update conversation summaries after a batch of messages was saved
+
+    Each room costs one UPDATE for all participants plus one upsert per
+    sender in the batch, independent of the number of messages.
+
+    Args:
+        messages: Newly created ChatMessage rows
+    """
+    from app.models.chat import ChatConversation
+
+    rooms: Dict[str, List] = {}
+    for message in sorted(messages, key=lambda m: (m.timestamp, m.pk or 0)):
+        rooms.setdefault(message.room_name, []).append(message)
+
+    with transaction.atomic():
+        for room_name, room_messages in rooms.items():
+            last = room_messages[-1]
+            ChatConversation.objects.filter(room_name=room_name).exclude(
+                user_id__in={m.sender_id for m in room_messages}
+            ).update(
+                unread_count=F('unread_count') + len(room_messages),
+                last_message=last,
+                last_message_at=last.timestamp,
+            )
+
+            # Отправитель прочитал комнату до своего последнего сообщения включительно
+            last_sent = {}
+            for index, message in enumerate(room_messages):
+                last_sent[message.sender_id] = index
+            for sender_id, index in last_sent.items():
+                ChatConversation.objects.update_or_create(
+                    user_id=sender_id,
+                    room_name=room_name,
+                    defaults={
+                        'last_message': last,
+                        'last_message_at': last.timestamp,
+                        'last_read_at': room_messages[index].timestamp,
+                        'unread_count': len(room_messages) - index - 1,
+                    },
+                )
+
+
+def mark_conversation_read(user, room_name: str) -> int:
+    """
+    Reset unread counter of the user's conversation
+
+    Args:
+        user: Reader
+        room_name: Room to mark as read
+
+    Returns:
+        int: Number of updated conversations (0 or 1)
+    """
+    from app.models.chat import ChatConversation
+
+    return ChatConversation.objects.filter(user=user, room_name=room_name).update(
+        unread_count=0, last_read_at=timezone.now()
+    )
+
+
+def total_unread(user) -> int:
+    """Sum of unread messages over all conversations of the user"""
+    from app.models.chat import ChatConversation
+
+    return ChatConversation.objects.filter(user=user).aggregate(
+        total=Sum('unread_count')
+    )['total'] or 0
@@ -0,0 +1,155 @@
+"""
+Chat history ring buffer and keyset pagination
+"""
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import redis
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from app.core.redis_client import get_redis_client
+
+
+logger = logging.getLogger(__name__)
+
+
+def serialize_message(message) -> Dict[str, Any]:
+    """
+    Convert ChatMessage into the payload used by ChatConsumer
+
+    Args:
+        message: ChatMessage instance (sender should be preloaded)
+
+    Returns:
+        Dict with message data
+    """
+    return {
+        'id': message.id,
+        'content': message.content,
+        'sender': message.sender.username,
+        'timestamp': message.timestamp.isoformat(),
+        'message_type': message.message_type,
+    }
+
+
+class ChatHistoryBuffer:
+    """Last N messages of every room kept in a Redis list"""
+
+    key_template = 'chat:history:{room_name}'
+
+    def __init__(self, redis_client: Optional[redis.Redis] = None,
+                 size: Optional[int] = None, ttl: int = 86400):
+        self._redis = redis_client
+        self.size = size or getattr(settings, 'CHAT_HISTORY_SIZE', 50)
+        self.ttl = ttl
+
+    @property
+    def redis(self) -> redis.Redis:
+        if self._redis is None:
+            self._redis = get_redis_client()
+        return self._redis
+
+    def key(self, room_name: str) -> str:
+        return self.key_template.format(room_name=room_name)
+
+    def append(self, room_name: str, message: Dict[str, Any]):
+        """
+        Push message to the room buffer, dropping the oldest beyond size
+
+        Args:
+            room_name: Chat room
+            message: Serialized message
+        """
+        key = self.key(room_name)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.lpush(key, json.dumps(message, ensure_ascii=False))
+            pipe.ltrim(key, 0, self.size - 1)
+            pipe.expire(key, self.ttl)
+            pipe.execute()
+        except redis.RedisError:
+            logger.warning("Failed to append chat history", exc_info=True)
+
+    def recent(self, room_name: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Get last messages of a room in chronological order
+
+        Falls back to the database and warms the buffer when it is empty.
+
+        Args:
+            room_name: Chat room
+            limit: Number of messages (buffer size if omitted)
+
+        Returns:
+            List of serialized messages, oldest first
+        """
+        limit = min(limit or self.size, self.size)
+        try:
+            raw = self.redis.lrange(self.key(room_name), 0, limit - 1)
+        except redis.RedisError:
+            logger.warning("Chat history buffer unavailable, reading DB", exc_info=True)
+            return load_older(room_name, limit=limit)
+
+        if raw:
+            return [json.loads(item) for item in reversed(raw)]
+
+        messages = load_older(room_name, limit=self.size)
+        self._warm(room_name, messages)
+        return messages[-limit:]
+
+    def _warm(self, room_name: str, messages: List[Dict[str, Any]]):
+        if not messages:
+            return
+        key = self.key(room_name)
+        try:
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.delete(key)
+            pipe.lpush(key, *[json.dumps(m, ensure_ascii=False) for m in messages])
+            pipe.expire(key, self.ttl)
+            pipe.execute()
+        except redis.RedisError:
+            logger.warning("Failed to warm chat history", exc_info=True)
+
+
+def load_older(room_name: str, before_timestamp: Optional[str] = None,
+               before_id: Optional[int] = None, limit: int = 50) -> List[Dict[str, Any]]:
+    """
+    Load a page of messages older than the cursor using keyset pagination
+
+    The query walks the (room_name, timestamp) index backwards from the
+    cursor instead of counting an OFFSET through the whole room.
+
+    Args:
+        room_name: Chat room
+        before_timestamp: ISO timestamp of the oldest message the client has
+        before_id: ID of that message (tie-breaker for equal timestamps)
+        limit: Page size
+
+    Returns:
+        List of serialized messages, oldest first
+    """
+    from app.models.chat import ChatMessage
+
+    messages = ChatMessage.objects.filter(room_name=room_name)
+    if before_timestamp:
+        cursor = before_timestamp
+        if not isinstance(cursor, datetime):
+            cursor = parse_datetime(cursor)
+        if cursor is None:
+            raise ValueError("Invalid cursor timestamp")
+        if before_id is not None:
+            messages = messages.filter(
+                Q(timestamp__lt=cursor) | Q(timestamp=cursor, id__lt=before_id)
+            )
+        else:
+            messages = messages.filter(timestamp__lt=cursor)
+
+    page = messages.select_related('sender').order_by('-timestamp', '-id')[:limit]
+    return [serialize_message(m) for m in list(page)[::-1]]
+
+
+chat_history = ChatHistoryBuffer()
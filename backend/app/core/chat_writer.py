@@ -0,0 +1,303 @@
+"""
+Write-behind persistence for chat messages
+"""
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from app.core.redis_client import get_async_redis_client, get_redis_client
+from app.core.ws_frames import group_event
+
+
+logger = logging.getLogger(__name__)
+
+
+PENDING_STREAM = 'chat:pending'
+# Записи, которые нельзя сохранить (битые поля, удалённый отправитель)
+DEAD_LETTER_STREAM = 'chat:pending:dead'
+
+
+def _decode(fields: Dict[Any, Any]) -> Dict[str, str]:
+    return {
+        (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+        for k, v in fields.items()
+    }
+
+
+def _build_message(fields: Dict[str, str]):
+    from app.models.chat import ChatMessage
+
+    timestamp = parse_datetime(fields['timestamp'])
+    if timestamp is None:
+        raise ValueError(f"Invalid message timestamp: {fields['timestamp']!r}")
+    return ChatMessage(
+        client_id=fields['client_id'],
+        room_name=fields['room_name'],
+        sender_id=int(fields['sender_id']),
+        content=fields['content'],
+        message_type=fields['message_type'],
+        timestamp=timestamp,
+    )
+
+
+def _is_valid(fields: Dict[str, str]) -> bool:
+    try:
+        _build_message(fields)
+    except (KeyError, TypeError, ValueError):
+        return False
+    return True
+
+
+def persist_messages(entries: List[Dict[str, str]]) -> List:
+    """
+    Insert pending messages and update derived chat state
+
+    Idempotent: messages whose client_id already exists are skipped, so
+    entries replayed from the stream after a crash are not duplicated.
+
+    Args:
+        entries: Decoded stream entries
+
+    Returns:
+        List of inserted ChatMessage rows
+    """
+    from app.core.chat_conversations import apply_new_messages
+    from app.core.chat_history import chat_history, serialize_message
+    from app.models.chat import ChatMessage
+
+    if not entries:
+        return []
+
+    messages = [_build_message(fields) for fields in entries]
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                created = ChatMessage.objects.bulk_create(messages)
+        except IntegrityError:
+            # Часть сообщений уже записана (повторная доставка из потока)
+            client_ids = [m.client_id for m in messages]
+            existing = set(ChatMessage.objects.filter(
+                client_id__in=client_ids
+            ).values_list('client_id', flat=True))
+            ChatMessage.objects.bulk_create(
+                [m for m in messages if m.client_id not in existing],
+                ignore_conflicts=True,
+            )
+            created = list(ChatMessage.objects.filter(
+                client_id__in=[c for c in client_ids if c not in existing]
+            ))
+        apply_new_messages(created)
+
+    created = list(ChatMessage.objects.filter(
+        pk__in=[m.pk for m in created]
+    ).select_related('sender').order_by('timestamp', 'id'))
+    for message in created:
+        payload = serialize_message(message)
+        payload['client_id'] = message.client_id
+        chat_history.append(message.room_name, payload)
+    return created
+
+
+class ChatWriteBehind:
+    """
+    Buffers chat messages in process and persists them in batches
+
+    Every message is first appended to a Redis stream, then broadcast, and
+    finally inserted with bulk_create when the batch is full or the flush
+    delay elapses. Stream entries are removed only after the insert, so
+    messages of a crashed worker are replayed by `recover_pending`.
+    """
+
+    def __init__(self, batch_size: Optional[int] = None, flush_interval: Optional[float] = None):
+        self.batch_size = batch_size or getattr(settings, 'CHAT_WRITE_BEHIND_BATCH_SIZE', 100)
+        self.flush_interval = flush_interval or (
+            getattr(settings, 'CHAT_WRITE_BEHIND_FLUSH_MS', 20) / 1000.0
+        )
+        self._buffer: List[Tuple[bytes, Dict[str, str]]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._redis = None
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_async_redis_client()
+        return self._redis
+
+    async def submit(self, room_name: str, sender, content: str,
+                     message_type: str = 'text') -> Dict[str, Any]:
+        """
+        Accept a message for broadcasting and deferred persistence
+
+        Args:
+            room_name: Chat room
+            sender: Sender user
+            content: Message text
+            message_type: Message type
+
+        Returns:
+            Dict with message payload carrying the provisional id
+
+        Raises:
+            ValueError: If the sender is not an authenticated user
+        """
+        # Запись без отправителя не восстановить из потока: отклоняем сразу
+        if not getattr(sender, 'is_authenticated', False) or sender.id is None:
+            raise ValueError("Chat message sender must be an authenticated user")
+
+        client_id = uuid.uuid4().hex
+        timestamp = timezone.now()
+        fields = {
+            'client_id': client_id,
+            'room_name': room_name,
+            'sender_id': str(sender.id),
+            'content': content,
+            'message_type': message_type,
+            'timestamp': timestamp.isoformat(),
+        }
+        payload = {
+            'id': client_id,
+            'client_id': client_id,
+            'provisional': True,
+            'content': content,
+            'sender': sender.username,
+            'timestamp': timestamp.isoformat(),
+            'message_type': message_type,
+        }
+
+        try:
+            entry_id = await self.redis.xadd(PENDING_STREAM, fields)
+        except redis.RedisError:
+            # Без журнала в Redis откладывать запись нельзя: пишем сразу
+            logger.warning("Chat write-behind stream unavailable, writing through", exc_info=True)
+            created = await database_sync_to_async(persist_messages)([fields])
+            if created:
+                payload.update(id=created[0].id, provisional=False)
+            return payload
+
+        self._buffer.append((entry_id, fields))
+        if len(self._buffer) >= self.batch_size:
+            self._cancel_timer()
+            asyncio.ensure_future(self.flush())
+        elif self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(
+                self.flush_interval, lambda: asyncio.ensure_future(self.flush())
+            )
+        return payload
+
+    async def flush(self) -> List:
+        """
+        Persist buffered messages and notify rooms about their final ids
+
+        Returns:
+            List of inserted ChatMessage rows
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            self._cancel_timer()
+            batch, self._buffer = self._buffer, []
+            if not batch:
+                return []
+
+            try:
+                created = await database_sync_to_async(persist_messages)([fields for _, fields in batch])
+            except Exception:
+                # Записи остаются в потоке и будут восстановлены recover_pending
+                logger.exception("Failed to flush %s chat messages", len(batch))
+                return []
+
+            try:
+                await self.redis.xdel(PENDING_STREAM, *[entry_id for entry_id, _ in batch])
+            except redis.RedisError:
+                logger.warning("Failed to trim chat write-behind stream", exc_info=True)
+
+            await self._announce(created)
+            return created
+
+    async def _announce(self, created: List):
+        from channels.layers import get_channel_layer
+
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        try:
+            for message in created:
+                group = f'chat_{message.room_name}'
+                await channel_layer.group_send(
+                    group,
+                    group_event('chat_message_persisted', group, {
+                        'type': 'chat_message_persisted',
+                        'client_id': message.client_id,
+                        'id': message.id,
+                    })
+                )
+        except Exception:
+            logger.warning("Failed to announce persisted chat messages", exc_info=True)
+
+    def _cancel_timer(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+
+def recover_pending(min_age: float = 30.0, count: int = 1000) -> int:
+    """
+    Persist stream entries left behind by crashed or stopped workers
+
+    Live workers flush within milliseconds, so entries older than `min_age`
+    seconds are considered orphaned. If the batch insert fails, entries are
+    retried one by one; entries that are malformed or violate constraints
+    are moved to DEAD_LETTER_STREAM instead of blocking the rest.
+
+    Args:
+        min_age: Minimal entry age in seconds
+        count: Maximum number of entries per call
+
+    Returns:
+        int: Number of recovered messages
+    """
+    client = get_redis_client()
+    max_id = f'{int((time.time() - min_age) * 1000)}-0'
+    entries = client.xrange(PENDING_STREAM, min='-', max=max_id, count=count)
+    if not entries:
+        return 0
+
+    valid, dead = [], []
+    for entry_id, fields in entries:
+        fields = _decode(fields)
+        (valid if _is_valid(fields) else dead).append((entry_id, fields))
+
+    try:
+        created = persist_messages([fields for _, fields in valid])
+    except DatabaseError:
+        logger.warning("Batch recovery of chat messages failed, retrying one by one", exc_info=True)
+        created = []
+        for entry in valid:
+            try:
+                created.extend(persist_messages([entry[1]]))
+            except IntegrityError:
+                dead.append(entry)
+
+    if dead:
+        for _, fields in dead:
+            client.xadd(DEAD_LETTER_STREAM, fields)
+        logger.error("Moved %s unrecoverable chat messages to %s", len(dead), DEAD_LETTER_STREAM)
+    client.xdel(PENDING_STREAM, *[entry_id for entry_id, _ in entries])
+    if created:
+        logger.warning("Recovered %s chat messages from write-behind stream", len(created))
+    return len(created)
+
+
+chat_writer = ChatWriteBehind()
@@ -0,0 +1,442 @@
+"""
+Server-side rendering of PerformanceDashboard widgets
+
+All widgets of a dashboard are resolved together: widgets are grouped by
+the rollup resolution their range needs and every group is answered by
+one query over PerformanceMetricRollup whose filter is the union of the
+widgets' series, so a dashboard costs at most one query per resolution
+however many widgets it has. Rows are folded into the widgets they match
+in Python, decoding each sketch once.
+
+Widget results are cached per tenant under a digest of the widget spec
+(identical widgets of different dashboards share an entry) with a TTL
+tied to the resolution. Only expired widgets are recomputed. Dashboards
+with open DashboardConsumer sockets are refreshed periodically and the
+widgets whose result changed since the last push are sent to the
+dashboard's group, so clients do not poll widgets.
+"""
+import hashlib
+import json
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import redis
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from app.core import metric_rollups
+from app.core.metric_rollups import GROUP_FIELDS, RESOLUTION_SECONDS, _Bucket, _summary, bucket_floor
+from app.core.quantile_sketch import DDSketch
+from app.core.redis_client import get_async_redis_client, get_redis_client
+from app.core.ws_frames import group_event
+
+
+logger = logging.getLogger(__name__)
+
+
+WIDGET_TYPES = ('timeseries', 'stat', 'top')
+STATS = ('count', 'sum', 'avg', 'min', 'max', 'p50', 'p90', 'p99')
+SERIES_KEYS = ('name', 'metric_type', 'service', 'endpoint')
+
+DEFAULT_RANGE = 3600
+MAX_RANGE = 90 * 86400
+DEFAULT_MAX_POINTS = 120
+DEFAULT_TOP_LIMIT = 10
+
+CACHE_PREFIX = 'perf_dashboard'
+
+
+def widget_ttl(resolution: str) -> int:
+    """Cache TTL of a widget result computed from `resolution` rollups"""
+    return {
+        '1m': getattr(settings, 'DASHBOARD_WIDGET_TTL_1M', 30),
+        '1h': getattr(settings, 'DASHBOARD_WIDGET_TTL_1H', 300),
+        '1d': getattr(settings, 'DASHBOARD_WIDGET_TTL_1D', 1800),
+    }[resolution]
+
+
+def dashboard_group(dashboard_id: int) -> str:
+    """Channel layer group of the sockets watching a dashboard"""
+    return f'perf_dashboard_{dashboard_id}'
+
+
+class WidgetSpec:
+    """Validated query of a data widget"""
+
+    __slots__ = ('widget_type', 'series', 'range', 'max_points', 'stat', 'group_by', 'limit', 'digest')
+
+    def __init__(self, widget_type: str, series: Dict[str, str], range_seconds: int,
+                 max_points: int, stat: str, group_by: Optional[str], limit: int):
+        self.widget_type = widget_type
+        self.series = series
+        self.range = range_seconds
+        self.max_points = max_points
+        self.stat = stat
+        self.group_by = group_by
+        self.limit = limit
+        canonical = json.dumps(
+            [widget_type, sorted(series.items()), range_seconds, max_points, stat, group_by, limit]
+        )
+        self.digest = hashlib.sha1(canonical.encode()).hexdigest()
+
+    def series_key(self) -> Tuple[Optional[str], ...]:
+        return tuple(self.series.get(key) for key in SERIES_KEYS)
+
+
+def parse_widget(widget: Dict[str, Any]) -> Optional[WidgetSpec]:
+    """
+    Build the query of a widget from its widget_type and config
+
+    Config keys: metric (name), metric_type, service, endpoint, range
+    (seconds), max_points, stat, group_by (top widgets) and limit.
+
+    Returns:
+        WidgetSpec, or None for widgets without data (text, links...)
+
+    Raises:
+        ValueError: config of a data widget is invalid
+    """
+    widget_type = widget.get('widget_type')
+    if widget_type not in WIDGET_TYPES:
+        return None
+    config = widget.get('config') or {}
+    series = {
+        key: str(config[source]) for key, source in
+        (('name', 'metric'), ('metric_type', 'metric_type'), ('service', 'service'), ('endpoint', 'endpoint'))
+        if config.get(source)
+    }
+    if 'name' not in series and 'metric_type' not in series:
+        raise ValueError("metric or metric_type is required")
+    try:
+        range_seconds = int(config.get('range', DEFAULT_RANGE))
+        max_points = int(config.get('max_points', DEFAULT_MAX_POINTS))
+        limit = int(config.get('limit', DEFAULT_TOP_LIMIT))
+    except (TypeError, ValueError):
+        raise ValueError("range, max_points and limit must be integers")
+    if not 60 <= range_seconds <= MAX_RANGE:
+        raise ValueError(f"range must be between 60 and {MAX_RANGE} seconds")
+    if not 1 <= max_points <= 5000 or not 1 <= limit <= 100:
+        raise ValueError("max_points must be within 1..5000 and limit within 1..100")
+    stat = config.get('stat', 'p99' if widget_type == 'top' else 'avg')
+    if stat not in STATS:
+        raise ValueError(f"stat must be one of {', '.join(STATS)}")
+    group_by = config.get('group_by') if widget_type == 'top' else None
+    if widget_type == 'top' and group_by not in GROUP_FIELDS:
+        raise ValueError(f"group_by must be one of {', '.join(GROUP_FIELDS)}")
+    return WidgetSpec(widget_type, series, range_seconds, max_points, stat, group_by, limit)
+
+
+def _public(summary: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in summary.items() if key != 'sketch'}
+
+
+class _Accumulator:
+    """Buckets of one widget while rollup rows are folded"""
+
+    __slots__ = ('spec', 'start', 'points', 'total', 'groups')
+
+    def __init__(self, spec: WidgetSpec, start: datetime):
+        self.spec = spec
+        self.start = start
+        self.points: Dict[datetime, _Bucket] = {}
+        self.total = _Bucket()
+        self.groups: Dict[Any, _Bucket] = {}
+
+    def bucket(self, bucket_start: datetime, row: Sequence) -> _Bucket:
+        if self.spec.widget_type == 'timeseries':
+            bucket = self.points.get(bucket_start)
+            if bucket is None:
+                bucket = self.points[bucket_start] = _Bucket()
+            return bucket
+        if self.spec.widget_type == 'top':
+            key = row[1 + SERIES_KEYS.index(self.spec.group_by)]
+            bucket = self.groups.get(key)
+            if bucket is None:
+                bucket = self.groups[key] = _Bucket()
+            return bucket
+        return self.total
+
+    def result(self, resolution: str) -> Dict[str, Any]:
+        spec = self.spec
+        if spec.widget_type == 'timeseries':
+            return {
+                'resolution': resolution,
+                'points': [
+                    dict(_public(_summary(point)), bucket_start=bucket_start.isoformat())
+                    for bucket_start, point in sorted(self.points.items())
+                ],
+            }
+        if spec.widget_type == 'top':
+            rows = [
+                dict(_public(_summary(bucket)), **{spec.group_by: key})
+                for key, bucket in self.groups.items()
+            ]
+            rows.sort(key=lambda row: row[spec.stat] or 0, reverse=True)
+            return {'resolution': resolution, 'group_by': spec.group_by, 'stat': spec.stat,
+                    'rows': rows[:spec.limit]}
+        summary = _public(_summary(self.total))
+        return dict(summary, resolution=resolution, stat=spec.stat, value=summary[spec.stat])
+
+
+def resolve(tenant, specs: Sequence[WidgetSpec], now: Optional[datetime] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Compute widget results with one rollup query per resolution
+
+    Args:
+        tenant: Tenant (None for shared metrics)
+        specs: Widget queries
+        now: Range end
+
+    Returns:
+        Mapping of spec digest to result (with the resolution used)
+    """
+    from app.models import PerformanceMetricRollup
+
+    now = now or timezone.now()
+    plan: Dict[str, Dict[Tuple, List[_Accumulator]]] = defaultdict(lambda: defaultdict(list))
+    accumulators: Dict[str, Tuple[_Accumulator, str]] = {}
+    for spec in specs:
+        if spec.digest in accumulators:
+            continue
+        start = now - timedelta(seconds=spec.range)
+        resolution = metric_rollups.choose_resolution(start, now, spec.max_points, now=now)
+        # Как и series(), берём корзины целиком: начало выравнивается вниз
+        accumulator = _Accumulator(spec, bucket_floor(start, RESOLUTION_SECONDS[resolution]))
+        plan[resolution][spec.series_key()].append(accumulator)
+        accumulators[spec.digest] = (accumulator, resolution)
+
+    for resolution, by_series in plan.items():
+        condition = Q()
+        for series_key in by_series:
+            condition |= Q(**{key: value for key, value in zip(SERIES_KEYS, series_key) if value})
+        rows = PerformanceMetricRollup.objects.filter(
+            condition,
+            tenant=tenant,
+            resolution=resolution,
+            bucket_start__gte=min(acc.start for group in by_series.values() for acc in group),
+            bucket_start__lt=now,
+        ).values_list('bucket_start', *SERIES_KEYS, 'count', 'sum', 'min', 'max', 'sketch')
+
+        for row in rows:
+            bucket_start = row[0]
+            sketch = None
+            for series_key, group in by_series.items():
+                if any(value is not None and value != row[1 + index]
+                       for index, value in enumerate(series_key)):
+                    continue
+                for accumulator in group:
+                    if bucket_start < accumulator.start:
+                        continue
+                    if sketch is None:
+                        sketch = DDSketch.from_bytes(row[9])
+                    bucket = accumulator.bucket(bucket_start, row)
+                    bucket.count += row[5]
+                    bucket.sum += row[6]
+                    bucket.min = min(bucket.min, row[7])
+                    bucket.max = max(bucket.max, row[8])
+                    bucket.sketch.merge(sketch)
+
+    return {digest: accumulator.result(resolution) for digest, (accumulator, resolution) in accumulators.items()}
+
+
+def _cache_key(tenant_id: Optional[int], digest: str) -> str:
+    return f'{CACHE_PREFIX}:widget:{tenant_id or 0}:{digest}'
+
+
+def _version(data: Any) -> str:
+    return hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def render(dashboard, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Render every widget of a dashboard
+
+    Cached widget results are reused; the rest are resolved together by
+    `resolve` and cached for widget_ttl(resolution) seconds. A widget
+    with an invalid config is rendered with an error instead of failing
+    the dashboard.
+
+    Returns:
+        Dict with dashboard id, generated_at and the list of widgets
+        (index, key, widget_type, title, data, version, cached)
+    """
+    tenant_id = dashboard.tenant_id
+    widgets = dashboard.widgets or []
+    specs: Dict[int, WidgetSpec] = {}
+    errors: Dict[int, str] = {}
+    for index, widget in enumerate(widgets):
+        try:
+            spec = parse_widget(widget)
+        except ValueError as exc:
+            errors[index] = str(exc)
+            continue
+        if spec is not None:
+            specs[index] = spec
+
+    keys = {spec.digest: _cache_key(tenant_id, spec.digest) for spec in specs.values()}
+    try:
+        cached = cache.get_many(list(keys.values())) if keys else {}
+    except Exception:
+        logger.warning("Dashboard widget cache unavailable", exc_info=True)
+        cached = {}
+    results = {digest: cached[key] for digest, key in keys.items() if key in cached}
+    missing = [spec for digest, spec in {s.digest: s for s in specs.values()}.items() if digest not in results]
+
+    if missing:
+        fresh = resolve(dashboard.tenant, missing, now=now)
+        by_ttl: Dict[int, Dict[str, Any]] = defaultdict(dict)
+        for digest, data in fresh.items():
+            entry = {'data': data, 'version': _version(data)}
+            results[digest] = entry
+            by_ttl[widget_ttl(data['resolution'])][keys[digest]] = entry
+        try:
+            for ttl, entries in by_ttl.items():
+                cache.set_many(entries, timeout=ttl)
+        except Exception:
+            logger.warning("Failed to cache dashboard widgets", exc_info=True)
+
+    rendered = []
+    for index, widget in enumerate(widgets):
+        item = {
+            'index': index,
+            'widget_type': widget.get('widget_type'),
+            'title': widget.get('title'),
+        }
+        if index in errors:
+            item.update(key=None, data=None, version=None, cached=False, error=errors[index])
+        elif index in specs:
+            digest = specs[index].digest
+            entry = results[digest]
+            item.update(key=digest, data=entry['data'], version=entry['version'],
+                        cached=keys[digest] in cached)
+        else:
+            # Виджет без данных (текст, ссылки): отдаём как сохранён
+            data = widget.get('data') or {}
+            item.update(key=f'static:{index}', data=data, version=_version(data), cached=True)
+        rendered.append(item)
+
+    return {
+        'dashboard': dashboard.id,
+        'generated_at': (now or timezone.now()).isoformat(),
+        'widgets': rendered,
+    }
+
+
+class DashboardWatchers:
+    """
+    Dashboards with open sockets
+
+    Sockets touch a sorted set scored by time on connect and heartbeat;
+    a dashboard is watched while its last touch is younger than `ttl`.
+    """
+
+    key = f'{CACHE_PREFIX}:watched'
+
+    def __init__(self, ttl: Optional[int] = None):
+        self.ttl = ttl or getattr(settings, 'DASHBOARD_WATCH_TTL', 120)
+
+    async def touch(self, dashboard_id: int):
+        try:
+            await get_async_redis_client().zadd(self.key, {dashboard_id: time.time()})
+        except redis.RedisError:
+            logger.warning("Dashboard watchers store unavailable", exc_info=True)
+
+    def watched(self) -> List[int]:
+        """IDs of dashboards touched within ttl; older entries are pruned"""
+        client = get_redis_client()
+        threshold = time.time() - self.ttl
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.zremrangebyscore(self.key, '-inf', threshold)
+            pipe.zrangebyscore(self.key, threshold, '+inf')
+            _, members = pipe.execute()
+        except redis.RedisError:
+            logger.warning("Dashboard watchers store unavailable", exc_info=True)
+            return []
+        return [int(member) for member in members]
+
+
+dashboard_watchers = DashboardWatchers()
+
+
+def _pushed_key(dashboard_id: int) -> str:
+    return f'{CACHE_PREFIX}:pushed:{dashboard_id}'
+
+
+def publish(dashboard, full: bool = False, now: Optional[datetime] = None) -> int:
+    """
+    Push changed widgets of a dashboard to its WebSocket group
+
+    Versions of the widgets last pushed are kept in the cache; only
+    widgets whose version differs are sent as `dashboard_widgets_updated`.
+    With `full` the whole rendering is sent as `dashboard_rendered`
+    (after the widget list itself changed).
+
+    Returns:
+        int: Number of widgets sent
+    """
+    rendered = render(dashboard, now=now)
+    versions = {item['index']: item['version'] for item in rendered['widgets']}
+    pushed_key = _pushed_key(dashboard.id)
+    try:
+        previous = None if full else cache.get(pushed_key)
+    except Exception:
+        previous = None
+
+    if previous is None:
+        handler, widgets = 'dashboard_rendered', rendered['widgets']
+        payload = dict(rendered, type='dashboard_rendered')
+    else:
+        handler = 'dashboard_widgets_updated'
+        widgets = [item for item in rendered['widgets'] if previous.get(item['index']) != item['version']]
+        payload = {'type': handler, 'dashboard': dashboard.id,
+                   'generated_at': rendered['generated_at'], 'widgets': widgets}
+    if not widgets and not full:
+        return 0
+
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return 0
+    group = dashboard_group(dashboard.id)
+    try:
+        async_to_sync(channel_layer.group_send)(group, group_event(handler, group, payload))
+    except Exception:
+        logger.warning("Failed to publish dashboard %s", dashboard.id, exc_info=True)
+        return 0
+    try:
+        cache.set(pushed_key, versions, timeout=86400)
+    except Exception:
+        logger.warning("Failed to store pushed dashboard versions", exc_info=True)
+    return len(widgets)
+
+
+def refresh_watched(now: Optional[datetime] = None) -> Dict[int, int]:
+    """
+    Push updates of every watched active dashboard
+
+    Returns:
+        Mapping of dashboard id to number of widgets sent
+    """
+    from app.models import PerformanceDashboard
+
+    ids = dashboard_watchers.watched()
+    if not ids:
+        return {}
+    now = now or timezone.now()
+    sent = {}
+    for dashboard in PerformanceDashboard.objects.filter(id__in=ids, is_active=True).select_related('tenant'):
+        try:
+            count = publish(dashboard, now=now)
+        except Exception:
+            logger.exception("Failed to refresh dashboard %s", dashboard.id)
+            continue
+        if count:
+            sent[dashboard.id] = count
+    return sent
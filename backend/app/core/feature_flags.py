@@ -6,10 +6,12 @@ import redis
 import json
 from datetime import datetime
 
+from app.core.redis_client import get_redis_client
+
 
 class FeatureFlagManager:
-    def __init__(self, redis_client: redis.Redis):
-        self.redis = redis_client
+    def __init__(self, redis_client: Optional[redis.Redis] = None):
+        self.redis = redis_client or get_redis_client()
         self.flags = {}
         self.experiments = {}
     
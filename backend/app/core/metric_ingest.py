@@ -0,0 +1,326 @@
+"""
+Batched ingestion of PerformanceMetric samples
+
+Samples are validated into plain row tuples, buffered in process and
+written by a background flusher every `batch_size` rows or
+`flush_interval` seconds: COPY on PostgreSQL, a single-transaction
+executemany elsewhere, plus the matching 1m/1h/1d rollup updates in the
+same transaction. Written batches are then evaluated against the
+tenants' PerformanceThreshold rules (app.core.alert_evaluator). The
+buffer is bounded; when it is full, `submit` waits for the flusher and
+finally raises IngestBackpressure so the API can answer 429.
+
+Samples still buffered when a worker is killed are lost; metrics are
+sampled data, so the write path trades that for throughput.
+"""
+import atexit
+import csv
+import io
+import json
+import logging
+import math
+import time
+from datetime import datetime, timezone as dt_timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from prometheus_client import Counter, Gauge, Histogram
+
+from app.core.alert_evaluator import threshold_evaluator
+from app.core.batching import BackgroundBatcher
+from app.core.metric_rollups import apply_rollups
+
+
+logger = logging.getLogger(__name__)
+
+
+# Порядок колонок строки буфера и COPY
+COLUMNS = (
+    'name', 'metric_type', 'description', 'value', 'unit', 'service', 'endpoint',
+    'method', 'tags', 'metadata', 'tenant_id', 'timestamp', 'created_at',
+)
+
+INGEST_METRICS = {
+    'accepted': Counter(
+        'performance_metric_ingest_accepted_total',
+        'Samples accepted into the ingestion buffer'
+    ),
+    'rejected': Counter(
+        'performance_metric_ingest_rejected_total',
+        'Samples rejected because the ingestion buffer was full'
+    ),
+    'written': Counter(
+        'performance_metric_ingest_written_total',
+        'Samples written to the database'
+    ),
+    'dropped': Counter(
+        'performance_metric_ingest_dropped_total',
+        'Samples lost because a batch could not be written'
+    ),
+    'flush_duration': Histogram(
+        'performance_metric_ingest_flush_seconds',
+        'Time to write one batch of samples',
+        buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5)
+    ),
+    'buffered': Gauge(
+        'performance_metric_ingest_buffered',
+        'Samples waiting in the ingestion buffer'
+    ),
+}
+
+
+class IngestBackpressure(Exception):
+    """Ingestion buffer stayed full for longer than the submit timeout"""
+
+    def __init__(self, retry_after: float):
+        super().__init__("Metric ingestion buffer is full")
+        self.retry_after = retry_after
+
+
+_METRIC_TYPES = None
+
+
+def _metric_types() -> frozenset:
+    global _METRIC_TYPES
+    if _METRIC_TYPES is None:
+        from app.models import PerformanceMetric
+
+        _METRIC_TYPES = frozenset(key for key, _ in PerformanceMetric.METRIC_TYPES)
+    return _METRIC_TYPES
+
+
+def _text(sample: Dict[str, Any], field: str, max_length: int, default: str = '') -> str:
+    value = sample.get(field, default)
+    if value is None:
+        return default
+    if not isinstance(value, str):
+        raise ValueError(f"{field} must be a string")
+    if len(value) > max_length:
+        raise ValueError(f"{field} is longer than {max_length} characters")
+    return value
+
+
+def _timestamp(value: Any, now: datetime) -> datetime:
+    if value is None:
+        return now
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+    if isinstance(value, str):
+        parsed = parse_datetime(value)
+        if parsed is not None:
+            return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed, dt_timezone.utc)
+    raise ValueError("timestamp must be an ISO 8601 string or epoch seconds")
+
+
+def parse_samples(samples: Sequence[Any], tenant_id: Optional[int]) -> List[Tuple]:
+    """
+    Validate raw samples into row tuples ordered as COLUMNS
+
+    Kept free of serializer machinery: at tens of thousands of samples per
+    second, per-field DRF validation costs more than the write itself.
+
+    Args:
+        samples: Decoded JSON objects
+        tenant_id: Tenant of the submitting user
+
+    Returns:
+        List of row tuples
+
+    Raises:
+        ValueError: If a sample is invalid; the message names its index
+    """
+    metric_types = _metric_types()
+    now = timezone.now()
+    rows = []
+    for index, sample in enumerate(samples):
+        try:
+            if not isinstance(sample, dict):
+                raise ValueError("sample must be an object")
+            name = _text(sample, 'name', 100)
+            if not name:
+                raise ValueError("name is required")
+            metric_type = sample.get('metric_type') or 'custom'
+            if metric_type not in metric_types:
+                raise ValueError(f"unknown metric_type {metric_type!r}")
+            value = sample.get('value')
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                raise ValueError("value must be a finite number")
+            tags = sample.get('tags') or {}
+            metadata = sample.get('metadata') or {}
+            if not isinstance(tags, dict) or not isinstance(metadata, dict):
+                raise ValueError("tags and metadata must be objects")
+            rows.append((
+                name,
+                metric_type,
+                _text(sample, 'description', 10000),
+                float(value),
+                _text(sample, 'unit', 20, 'ms'),
+                _text(sample, 'service', 100),
+                _text(sample, 'endpoint', 200),
+                _text(sample, 'method', 10),
+                tags,
+                metadata,
+                tenant_id,
+                _timestamp(sample.get('timestamp'), now),
+                now,
+            ))
+        except (TypeError, ValueError, OverflowError, OSError) as exc:
+            raise ValueError(f"samples[{index}]: {exc}") from None
+    return rows
+
+
+def _copy_rows(rows: Sequence[Tuple], conn):
+    from app.models import PerformanceMetric
+
+    stream = io.StringIO()
+    writer = csv.writer(stream)
+    for row in rows:
+        writer.writerow(
+            json.dumps(value) if isinstance(value, dict)
+            else r'\N' if value is None
+            else value.isoformat() if isinstance(value, datetime)
+            else value
+            for value in row
+        )
+    stream.seek(0)
+    with conn.cursor() as cursor:
+        cursor.cursor.copy_expert(
+            f"COPY {PerformanceMetric._meta.db_table} ({', '.join(COLUMNS)}) "
+            f"FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            stream
+        )
+
+
+def _insert_rows(rows: Sequence[Tuple], conn, batch_size: int):
+    from app.models import PerformanceMetric
+
+    # executemany без построения экземпляров модели: вдвое быстрее bulk_create
+    adapt = conn.ops.adapt_datetimefield_value
+    sql = (
+        f"INSERT INTO {PerformanceMetric._meta.db_table} ({', '.join(COLUMNS)}) "
+        f"VALUES ({', '.join(['%s'] * len(COLUMNS))})"
+    )
+    params = [
+        tuple(
+            json.dumps(value) if isinstance(value, dict)
+            else adapt(value) if isinstance(value, datetime)
+            else value
+            for value in row
+        )
+        for row in rows
+    ]
+    with conn.cursor() as cursor:
+        for start in range(0, len(params), batch_size):
+            cursor.executemany(sql, params[start:start + batch_size])
+
+
+def write_rows(rows: Sequence[Tuple], using: str = 'default', batch_size: int = 1000) -> int:
+    """
+    Write row tuples to performance_metrics and fold them into rollups
+
+    Args:
+        rows: Rows produced by parse_samples
+        using: Database alias
+        batch_size: Rows per executemany call on databases without COPY
+
+    Returns:
+        int: Number of written rows
+    """
+    if not rows:
+        return 0
+    conn = connections[using]
+    with transaction.atomic(using=using):
+        if conn.vendor == 'postgresql':
+            _copy_rows(rows, conn)
+        else:
+            _insert_rows(rows, conn, batch_size)
+        apply_rollups(rows, COLUMNS, using=using)
+    return len(rows)
+
+
+class MetricIngestBuffer(BackgroundBatcher):
+    """
+    Bounded in-process buffer flushed by a background thread
+
+    One flusher thread per process writes batches of up to `batch_size`
+    rows as soon as a batch is full or `flush_interval` seconds after the
+    oldest buffered row, whichever comes first. `submit` blocks while the
+    buffer holds `max_buffer` rows, up to `submit_timeout` seconds.
+    """
+
+    thread_name = 'metric-ingest-flusher'
+
+    def __init__(self, batch_size: Optional[int] = None, flush_interval: Optional[float] = None,
+                 max_buffer: Optional[int] = None, submit_timeout: Optional[float] = None,
+                 using: str = 'default'):
+        super().__init__(
+            batch_size=batch_size or getattr(settings, 'METRIC_INGEST_BATCH_SIZE', 5000),
+            flush_interval=flush_interval or getattr(settings, 'METRIC_INGEST_FLUSH_MS', 200) / 1000.0,
+            max_size=max_buffer or getattr(settings, 'METRIC_INGEST_MAX_BUFFER', 100000),
+        )
+        self.submit_timeout = submit_timeout if submit_timeout is not None else (
+            getattr(settings, 'METRIC_INGEST_SUBMIT_TIMEOUT_MS', 1000) / 1000.0
+        )
+        self.using = using
+
+    @property
+    def max_buffer(self) -> int:
+        return self.max_size
+
+    def submit(self, rows: List[Tuple], timeout: Optional[float] = None) -> int:
+        """
+        Queue rows for writing
+
+        Args:
+            rows: Rows produced by parse_samples
+            timeout: Seconds to wait for free space (submit_timeout by default)
+
+        Returns:
+            int: Number of accepted rows
+
+        Raises:
+            IngestBackpressure: If the buffer did not free up in time
+        """
+        if not rows:
+            return 0
+        if len(rows) > self.max_buffer:
+            raise ValueError(f"At most {self.max_buffer} samples per submit")
+        if not self.add(rows, self.submit_timeout if timeout is None else timeout):
+            INGEST_METRICS['rejected'].inc(len(rows))
+            raise IngestBackpressure(retry_after=self.flush_interval * 2)
+        INGEST_METRICS['accepted'].inc(len(rows))
+        return len(rows)
+
+    def buffer_changed(self, size: int):
+        INGEST_METRICS['buffered'].set(size)
+
+    def process_batch(self, batch: List[Tuple]) -> int:
+        started = time.perf_counter()
+        try:
+            written = write_rows(batch, using=self.using, batch_size=self.batch_size)
+            INGEST_METRICS['written'].inc(written)
+        except Exception:
+            INGEST_METRICS['dropped'].inc(len(batch))
+            logger.exception("Failed to write %s performance metric samples", len(batch))
+            close_old_connections()
+            return 0
+        else:
+            self._evaluate(batch)
+            return written
+        finally:
+            INGEST_METRICS['flush_duration'].observe(time.perf_counter() - started)
+
+    def _evaluate(self, batch: List[Tuple]):
+        # Пороги проверяются по записанным значениям; сбой оценки не теряет пакет
+        try:
+            threshold_evaluator.process(batch, COLUMNS)
+        except Exception:
+            logger.exception("Failed to evaluate performance thresholds")
+            close_old_connections()
+
+
+metric_ingest = MetricIngestBuffer()
+atexit.register(lambda: metric_ingest.flush() if metric_ingest.buffered else None)
@@ -0,0 +1,506 @@
+"""
+Rollups and retention for PerformanceMetric
+
+Raw samples are folded into 1m, 1h and 1d rollup rows (count, sum, min,
+max and a DDSketch) in the same transaction that writes them, so rollups
+are always consistent with the raw table. Range queries are answered by
+`aggregate`/`series`, which read the coarsest rollups covering the range
+and touch raw rows only for the unaligned edges. `expire_metrics` trims
+raw rows and rollups according to the retention settings.
+"""
+import logging
+import math
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, router, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from app.core.quantile_sketch import DEFAULT_QUANTILES, DDSketch
+
+
+logger = logging.getLogger(__name__)
+
+
+# От грубого к мелкому
+RESOLUTIONS: Tuple[Tuple[str, int], ...] = (('1d', 86400), ('1h', 3600), ('1m', 60))
+RESOLUTION_SECONDS = dict(RESOLUTIONS)
+RAW = 'raw'
+
+# Поля ключа ряда (порядок совпадает с ключом в fold_rows)
+SERIES_FIELDS = ('tenant_id', 'name', 'metric_type', 'service', 'endpoint')
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def bucket_floor(value: datetime, seconds: int) -> datetime:
+    """Start of the bucket of `seconds` length containing value (UTC aligned)"""
+    offset = int((value - _EPOCH).total_seconds()) // seconds * seconds
+    return _EPOCH + timedelta(seconds=offset)
+
+
+def _bucket_ceil(value: datetime, seconds: int) -> datetime:
+    floor = bucket_floor(value, seconds)
+    return floor if floor == value else floor + timedelta(seconds=seconds)
+
+
+def retention(resolution: str) -> timedelta:
+    """Retention period of raw rows or of a rollup resolution"""
+    days = {
+        RAW: getattr(settings, 'METRIC_RAW_RETENTION_DAYS', 7),
+        '1m': getattr(settings, 'METRIC_ROLLUP_1M_RETENTION_DAYS', 14),
+        '1h': getattr(settings, 'METRIC_ROLLUP_1H_RETENTION_DAYS', 180),
+        '1d': getattr(settings, 'METRIC_ROLLUP_1D_RETENTION_DAYS', 730),
+    }[resolution]
+    return timedelta(days=days)
+
+
+class _Bucket:
+    __slots__ = ('count', 'sum', 'min', 'max', 'sketch')
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sketch = DDSketch()
+
+    def add(self, value: float):
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.sketch.add(value)
+
+
+def fold_rows(rows: Iterable[Sequence], columns: Sequence[str]) -> Dict[Tuple[str, datetime, Tuple], _Bucket]:
+    """
+    Aggregate raw rows into rollup deltas in memory
+
+    Args:
+        rows: Raw metric rows
+        columns: Column names of the rows (metric_ingest.COLUMNS)
+
+    Returns:
+        Mapping of (resolution, bucket_start, series key) to bucket delta
+    """
+    position = {column: index for index, column in enumerate(columns)}
+    key_positions = [position[field] for field in SERIES_FIELDS]
+    value_position = position['value']
+    timestamp_position = position['timestamp']
+
+    buckets: Dict[Tuple[str, datetime, Tuple], _Bucket] = {}
+    # Ряд и минута обычно повторяются подряд: часовые и дневные корзины
+    # получаются слиянием минутных, а не повторным добавлением значений
+    for row in rows:
+        key = tuple(row[p] for p in key_positions)
+        bucket_key = ('1m', bucket_floor(row[timestamp_position], 60), key)
+        bucket = buckets.get(bucket_key)
+        if bucket is None:
+            bucket = buckets[bucket_key] = _Bucket()
+        bucket.add(row[value_position])
+
+    for (_, minute, key), bucket in list(buckets.items()):
+        for resolution, seconds in RESOLUTIONS[:-1]:
+            coarse_key = (resolution, bucket_floor(minute, seconds), key)
+            coarse = buckets.get(coarse_key)
+            if coarse is None:
+                coarse = buckets[coarse_key] = _Bucket()
+            coarse.count += bucket.count
+            coarse.sum += bucket.sum
+            coarse.min = min(coarse.min, bucket.min)
+            coarse.max = max(coarse.max, bucket.max)
+            coarse.sketch.merge(bucket.sketch)
+    return buckets
+
+
+def apply_rollups(rows: Sequence[Sequence], columns: Sequence[str], using: Optional[str] = None) -> int:
+    """
+    Fold raw rows into rollup tables
+
+    Existing rollup rows are locked and merged; missing ones are inserted.
+    Must run inside the transaction that writes the raw rows. A concurrent
+    insert of the same bucket by another worker is resolved by retrying
+    the merge once.
+
+    Args:
+        rows: Raw metric rows
+        columns: Column names of the rows
+        using: Database alias
+
+    Returns:
+        int: Number of rollup rows touched
+    """
+    from app.models import PerformanceMetricRollup
+
+    if not rows:
+        return 0
+    using = using or router.db_for_write(PerformanceMetricRollup)
+    buckets = fold_rows(rows, columns)
+    for attempt in range(2):
+        try:
+            with transaction.atomic(using=using):
+                return _merge_buckets(buckets, using)
+        except IntegrityError:
+            if attempt:
+                raise
+            logger.info("Concurrent rollup insert, retrying merge of %s buckets", len(buckets))
+
+
+def _merge_buckets(buckets: Dict[Tuple[str, datetime, Tuple], _Bucket], using: str) -> int:
+    from app.models import PerformanceMetricRollup
+
+    by_resolution: Dict[str, Dict[Tuple, _Bucket]] = defaultdict(dict)
+    for (resolution, bucket_start, key), bucket in buckets.items():
+        by_resolution[resolution][(bucket_start,) + key] = bucket
+
+    touched = 0
+    now = timezone.now()
+    for resolution, deltas in by_resolution.items():
+        starts = {key[0] for key in deltas}
+        names = {key[2] for key in deltas}
+        tenants = {key[1] for key in deltas}
+        tenant_filter = Q(tenant_id__in=[t for t in tenants if t is not None])
+        if None in tenants:
+            tenant_filter |= Q(tenant__isnull=True)
+
+        existing = PerformanceMetricRollup.objects.using(using).select_for_update().filter(
+            tenant_filter, resolution=resolution, bucket_start__in=starts, name__in=names,
+        ).order_by('pk')
+
+        updated = []
+        for rollup in existing:
+            key = (rollup.bucket_start, rollup.tenant_id, rollup.name, rollup.metric_type,
+                   rollup.service, rollup.endpoint)
+            delta = deltas.pop(key, None)
+            if delta is None:
+                continue
+            sketch = DDSketch.from_bytes(rollup.sketch).merge(delta.sketch)
+            rollup.count += delta.count
+            rollup.sum += delta.sum
+            rollup.min = min(rollup.min, delta.min)
+            rollup.max = max(rollup.max, delta.max)
+            rollup.sketch = sketch.to_bytes()
+            rollup.updated_at = now
+            updated.append(rollup)
+        if updated:
+            PerformanceMetricRollup.objects.using(using).bulk_update(
+                updated, ['count', 'sum', 'min', 'max', 'sketch', 'updated_at']
+            )
+
+        created = [
+            PerformanceMetricRollup(
+                resolution=resolution,
+                bucket_start=key[0],
+                **dict(zip(SERIES_FIELDS, key[1:])),
+                count=delta.count,
+                sum=delta.sum,
+                min=delta.min,
+                max=delta.max,
+                sketch=delta.sketch.to_bytes(),
+            )
+            for key, delta in deltas.items()
+        ]
+        if created:
+            PerformanceMetricRollup.objects.using(using).bulk_create(created)
+        touched += len(updated) + len(created)
+    return touched
+
+
+def plan_segments(start: datetime, end: datetime,
+                  now: Optional[datetime] = None) -> List[Tuple[str, datetime, datetime]]:
+    """
+    Cover [start, end) with the coarsest available buckets
+
+    Whole days come from 1d rollups, the remaining whole hours from 1h,
+    minutes from 1m and only sub-minute edges from raw rows. A resolution
+    whose retention no longer covers a segment is skipped; edges older than
+    raw retention are widened to whole minutes.
+
+    Returns:
+        List of (resolution, segment_start, segment_end)
+    """
+    now = now or timezone.now()
+    segments: List[Tuple[str, datetime, datetime]] = []
+
+    def cover(low: datetime, high: datetime, level: int):
+        if low >= high:
+            return
+        if level == len(RESOLUTIONS):
+            if low >= now - retention(RAW):
+                segments.append((RAW, low, high))
+            else:
+                segments.append(('1m', bucket_floor(low, 60), _bucket_ceil(high, 60)))
+            return
+        resolution, seconds = RESOLUTIONS[level]
+        aligned_low, aligned_high = _bucket_ceil(low, seconds), bucket_floor(high, seconds)
+        if aligned_low >= aligned_high or aligned_low < now - retention(resolution):
+            cover(low, high, level + 1)
+            return
+        cover(low, aligned_low, level + 1)
+        segments.append((resolution, aligned_low, aligned_high))
+        cover(aligned_high, high, level + 1)
+
+    cover(start, end, 0)
+    return segments
+
+
+GROUP_FIELDS = ('service', 'endpoint', 'metric_type', 'name')
+
+
+def _series_filter(tenant, name: Optional[str], metric_type: Optional[str] = None,
+                   service: Optional[str] = None, endpoint: Optional[str] = None) -> Dict[str, Any]:
+    filters: Dict[str, Any] = {'tenant': tenant}
+    if name:
+        filters['name'] = name
+    if metric_type:
+        filters['metric_type'] = metric_type
+    if service:
+        filters['service'] = service
+    if endpoint:
+        filters['endpoint'] = endpoint
+    return filters
+
+
+def _summary(bucket: _Bucket, quantiles: Sequence[float] = DEFAULT_QUANTILES) -> Dict[str, Any]:
+    count = bucket.count
+    summary = {
+        'count': count,
+        'sum': bucket.sum,
+        'avg': bucket.sum / count if count else None,
+        'min': bucket.min if count else None,
+        'max': bucket.max if count else None,
+        'sketch': bucket.sketch,
+    }
+    summary.update(bucket.sketch.percentiles(quantiles))
+    return summary
+
+
+def aggregate_groups(tenant, name: Optional[str], start: datetime, end: Optional[datetime] = None,
+                     group_by: Optional[str] = None, quantiles: Sequence[float] = DEFAULT_QUANTILES,
+                     **series) -> Tuple[Dict[Any, Dict[str, Any]], List[Tuple[str, datetime, datetime]]]:
+    """
+    Aggregate metric values over [start, end) per group from rollups
+
+    Sketches of every bucket, endpoint and worker that wrote into the
+    range are merged, so percentiles are those of the whole range.
+
+    Args:
+        tenant: Tenant (None for shared metrics)
+        name: Metric name (None for every metric matching the filters)
+        start: Range start
+        end: Range end (now by default)
+        group_by: One of GROUP_FIELDS, or None for a single group
+        quantiles: Quantiles reported as pNN keys
+        **series: Optional metric_type, service, endpoint filters
+
+    Returns:
+        (mapping of group value to summary, segments used)
+    """
+    from app.models import PerformanceMetric, PerformanceMetricRollup
+
+    if group_by is not None and group_by not in GROUP_FIELDS:
+        raise ValueError(f"group_by must be one of {', '.join(GROUP_FIELDS)}")
+    end = end or timezone.now()
+    filters = _series_filter(tenant, name, **series)
+    segments = plan_segments(start, end)
+    group_field = [group_by] if group_by else []
+    groups: Dict[Any, _Bucket] = defaultdict(_Bucket)
+
+    rollup_ranges = defaultdict(Q)
+    for resolution, seg_start, seg_end in segments:
+        if resolution == RAW:
+            raw = PerformanceMetric.objects.filter(
+                timestamp__gte=seg_start, timestamp__lt=seg_end, **filters
+            ).values_list('value', *group_field)
+            for row in raw:
+                groups[row[1] if group_by else None].add(row[0])
+        else:
+            rollup_ranges[resolution] |= Q(bucket_start__gte=seg_start, bucket_start__lt=seg_end)
+
+    for resolution, condition in rollup_ranges.items():
+        rollups = PerformanceMetricRollup.objects.filter(
+            condition, resolution=resolution, **filters
+        ).values_list('count', 'sum', 'min', 'max', 'sketch', *group_field)
+        for row in rollups:
+            bucket = groups[row[5] if group_by else None]
+            bucket.count += row[0]
+            bucket.sum += row[1]
+            bucket.min = min(bucket.min, row[2])
+            bucket.max = max(bucket.max, row[3])
+            bucket.sketch.merge(DDSketch.from_bytes(row[4]))
+
+    return {key: _summary(bucket, quantiles) for key, bucket in groups.items()}, segments
+
+
+def aggregate(tenant, name: Optional[str], start: datetime, end: Optional[datetime] = None,
+              quantiles: Sequence[float] = DEFAULT_QUANTILES, **series) -> Dict[str, Any]:
+    """
+    Aggregate a metric over [start, end) from rollups
+
+    Args:
+        tenant: Tenant (None for shared metrics)
+        name: Metric name (None for every metric matching the filters)
+        start: Range start
+        end: Range end (now by default)
+        quantiles: Quantiles reported as pNN keys
+        **series: Optional metric_type, service, endpoint filters
+
+    Returns:
+        Dict with count, sum, avg, min, max, percentiles, the merged
+        DDSketch and the list of segments used
+    """
+    groups, segments = aggregate_groups(tenant, name, start, end, quantiles=quantiles, **series)
+    result = groups.get(None) or _summary(_Bucket(), quantiles)
+    result['segments'] = [
+        {'resolution': resolution, 'start': seg_start, 'end': seg_end}
+        for resolution, seg_start, seg_end in segments
+    ]
+    return result
+
+
+def choose_resolution(start: datetime, end: datetime, max_points: int = 500,
+                      now: Optional[datetime] = None) -> str:
+    """
+    Finest retained rollup resolution giving at most `max_points` buckets
+
+    Falls back to the coarsest resolution when even daily buckets exceed
+    the limit.
+    """
+    now = now or timezone.now()
+    span = (end - start).total_seconds()
+    for resolution, seconds in reversed(RESOLUTIONS):
+        if span / seconds <= max_points and start >= now - retention(resolution):
+            return resolution
+    return RESOLUTIONS[0][0]
+
+
+def series(tenant, name: Optional[str], start: datetime, end: Optional[datetime] = None,
+           resolution: Optional[str] = None, max_points: int = 500,
+           quantiles: Sequence[float] = DEFAULT_QUANTILES, **series_filter) -> Dict[str, Any]:
+    """
+    Time series of a metric from a single rollup resolution
+
+    Buckets of the same start are merged across services and endpoints
+    unless they are filtered.
+
+    Returns:
+        Dict with resolution and a list of points (bucket_start, count,
+        sum, avg, min, max, percentiles, sketch)
+    """
+    from app.models import PerformanceMetricRollup
+
+    end = end or timezone.now()
+    resolution = resolution or choose_resolution(start, end, max_points)
+    seconds = RESOLUTION_SECONDS[resolution]
+    rollups = PerformanceMetricRollup.objects.filter(
+        resolution=resolution,
+        bucket_start__gte=bucket_floor(start, seconds),
+        bucket_start__lt=end,
+        **_series_filter(tenant, name, **series_filter)
+    ).order_by('bucket_start').values_list('bucket_start', 'count', 'sum', 'min', 'max', 'sketch')
+
+    points: Dict[datetime, _Bucket] = {}
+    for bucket_start, row_count, row_sum, row_min, row_max, row_sketch in rollups:
+        point = points.get(bucket_start)
+        if point is None:
+            point = points[bucket_start] = _Bucket()
+        point.count += row_count
+        point.sum += row_sum
+        point.min = min(point.min, row_min)
+        point.max = max(point.max, row_max)
+        point.sketch.merge(DDSketch.from_bytes(row_sketch))
+
+    return {
+        'resolution': resolution,
+        'points': [
+            dict(_summary(point, quantiles), bucket_start=bucket_start)
+            for bucket_start, point in points.items()
+        ],
+    }
+
+
+def _delete_before(queryset, field: str, cutoff: datetime, batch_size: int, pause: float) -> int:
+    deleted = 0
+    while True:
+        ids = list(queryset.filter(**{f'{field}__lt': cutoff}).values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += queryset.filter(pk__in=ids).delete()[0]
+        if pause:
+            time.sleep(pause)
+
+
+def expire_metrics(now: Optional[datetime] = None, batch_size: int = 5000,
+                   pause: float = 0.0) -> Dict[str, int]:
+    """
+    Delete raw samples and rollups older than their retention
+
+    Rows are deleted in primary-key batches to keep transactions and
+    locks short.
+
+    Returns:
+        Mapping of resolution (or 'raw') to deleted row count
+    """
+    from app.models import PerformanceMetric, PerformanceMetricRollup
+
+    now = now or timezone.now()
+    deleted = {
+        RAW: _delete_before(
+            PerformanceMetric.objects.all(), 'timestamp', now - retention(RAW), batch_size, pause
+        )
+    }
+    for resolution, _ in RESOLUTIONS:
+        deleted[resolution] = _delete_before(
+            PerformanceMetricRollup.objects.filter(resolution=resolution), 'bucket_start',
+            now - retention(resolution), batch_size, pause
+        )
+    if any(deleted.values()):
+        logger.info("Expired performance metrics: %s", deleted)
+    return deleted
+
+
+def rebuild_rollups(start: datetime, end: datetime, chunk_size: int = 20000, using: Optional[str] = None) -> int:
+    """
+    Recompute rollups of [start, end) from raw rows
+
+    Used after enabling rollups on existing data or after a failed
+    flush. Boundaries are widened to whole days so partial buckets are
+    never merged twice; days whose raw rows may already be expired are
+    left untouched.
+
+    Returns:
+        int: Number of raw rows folded
+    """
+    from app.models import PerformanceMetric, PerformanceMetricRollup
+
+    oldest = _bucket_ceil(timezone.now() - retention(RAW), 86400)
+    start, end = max(bucket_floor(start, 86400), oldest), _bucket_ceil(end, 86400)
+    if start >= end:
+        return 0
+    columns = SERIES_FIELDS + ('value', 'timestamp')
+    with transaction.atomic(using=using):
+        PerformanceMetricRollup.objects.using(using).filter(
+            bucket_start__gte=start, bucket_start__lt=end
+        ).delete()
+        raw = PerformanceMetric.objects.using(using).filter(
+            timestamp__gte=start, timestamp__lt=end
+        ).order_by('pk').values_list(*columns)
+        folded = 0
+        chunk = []
+        for row in raw.iterator(chunk_size=chunk_size):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                apply_rollups(chunk, columns, using=using)
+                folded += len(chunk)
+                chunk = []
+        if chunk:
+            apply_rollups(chunk, columns, using=using)
+            folded += len(chunk)
+    return folded
@@ -0,0 +1,174 @@
+"""
+Cached unread notification counters
+"""
+import logging
+from typing import Optional
+
+import redis
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from app.core.redis_client import get_redis_client
+from app.core.ws_frames import group_event
+
+
+logger = logging.getLogger(__name__)
+
+
+# INCRBY only when the key exists: a missing key means "unknown", and must be
+# rebuilt from the database instead of starting from zero.
+_ADJUST_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+local value = redis.call('INCRBY', KEYS[1], ARGV[1])
+if value < 0 then
+    redis.call('DEL', KEYS[1])
+    return nil
+end
+return value
+"""
+
+
+class UnreadNotificationCounter:
+    """Per-user unread notification counters kept in Redis"""
+
+    key_template = 'notifications:unread:{user_id}'
+
+    def __init__(self, redis_client: Optional[redis.Redis] = None,
+                 ttl: Optional[int] = None):
+        self._redis = redis_client
+        self.ttl = ttl or getattr(settings, 'NOTIFICATION_UNREAD_COUNTER_TTL', 300)
+        self._adjust_script = None
+
+    @property
+    def redis(self) -> redis.Redis:
+        if self._redis is None:
+            self._redis = get_redis_client()
+        return self._redis
+
+    def key(self, user_id: int) -> str:
+        return self.key_template.format(user_id=user_id)
+
+    def get(self, user_id: int) -> int:
+        """
+        Get unread count, rebuilding it from the database on a miss
+
+        Args:
+            user_id: ID of the user
+
+        Returns:
+            int: Number of unread notifications
+        """
+        try:
+            cached = self.redis.get(self.key(user_id))
+        except redis.RedisError:
+            logger.warning("Unread counter unavailable, falling back to DB", exc_info=True)
+            return self._count_from_db(user_id)
+
+        if cached is not None:
+            return int(cached)
+        return self.reconcile(user_id)
+
+    def reconcile(self, user_id: int) -> int:
+        """
+        Recompute counter from the database and store it with TTL
+
+        Args:
+            user_id: ID of the user
+
+        Returns:
+            int: Number of unread notifications
+        """
+        count = self._count_from_db(user_id)
+        try:
+            self.redis.set(self.key(user_id), count, ex=self.ttl)
+        except redis.RedisError:
+            logger.warning("Failed to store unread counter", exc_info=True)
+        return count
+
+    def incr(self, user_id: int, amount: int = 1) -> Optional[int]:
+        """
+        Increase counter if it is currently cached
+
+        Args:
+            user_id: ID of the user
+            amount: Value to add
+
+        Returns:
+            New counter value or None if the counter must be reconciled
+        """
+        return self._adjust(user_id, amount)
+
+    def decr(self, user_id: int, amount: int = 1) -> Optional[int]:
+        """
+        Decrease counter if it is currently cached
+
+        Args:
+            user_id: ID of the user
+            amount: Value to subtract
+
+        Returns:
+            New counter value or None if the counter must be reconciled
+        """
+        return self._adjust(user_id, -amount)
+
+    def reset(self, user_id: int):
+        """Drop cached counter so the next read reconciles it"""
+        try:
+            self.redis.delete(self.key(user_id))
+        except redis.RedisError:
+            logger.warning("Failed to reset unread counter", exc_info=True)
+
+    def publish(self, user_id: int, count: Optional[int] = None):
+        """
+        Push current counter to the user's NotificationConsumer group
+
+        Args:
+            user_id: ID of the user
+            count: Already known counter value
+        """
+        if count is None:
+            count = self.get(user_id)
+
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        try:
+            group = f'notifications_{user_id}'
+            async_to_sync(channel_layer.group_send)(
+                group,
+                group_event('unread_count_updated', group, {
+                    'type': 'unread_count_updated', 'unread_count': count
+                })
+            )
+        except Exception:
+            logger.warning("Failed to publish unread counter", exc_info=True)
+
+    def adjust_and_publish(self, user_id: int, amount: int):
+        """Apply delta and push the resulting counter to the user"""
+        if not amount:
+            return
+        count = self._adjust(user_id, amount)
+        self.publish(user_id, count)
+
+    def _adjust(self, user_id: int, amount: int) -> Optional[int]:
+        if not amount:
+            return None
+        try:
+            if self._adjust_script is None:
+                self._adjust_script = self.redis.register_script(_ADJUST_SCRIPT)
+            value = self._adjust_script(keys=[self.key(user_id)], args=[amount])
+        except redis.RedisError:
+            logger.warning("Failed to adjust unread counter", exc_info=True)
+            return None
+        return None if value is None else int(value)
+
+    def _count_from_db(self, user_id: int) -> int:
+        from app.models.notification import Notification
+
+        return Notification.objects.filter(user_id=user_id, is_read=False).count()
+
+
+unread_counter = UnreadNotificationCounter()
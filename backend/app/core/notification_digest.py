@@ -0,0 +1,310 @@
+"""
+Per-user notification digest aggregation
+"""
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import redis
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.utils import timezone
+
+from app.core.notification_counters import unread_counter
+from app.core.redis_client import get_redis_client
+from app.core.ws_frames import group_event
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_NOTIFICATION_PREFERENCES = {
+    'email_notifications': True,
+    'push_notifications': True,
+    'sms_notifications': False,
+    'notification_types': {
+        'ticket_created': True,
+        'ticket_updated': True,
+        'ticket_assigned': True,
+        'ticket_resolved': True,
+        'knowledge_article_created': False,
+        'system_announcement': True,
+    },
+    'quiet_hours_start': None,
+    'quiet_hours_end': None,
+    'digest_frequency': 'immediate',
+    'digest_hour': 9,
+}
+
+# Priorities that are never delayed by digests
+IMMEDIATE_PRIORITIES = ('high', 'urgent')
+
+
+def get_notification_preferences(user) -> Dict[str, Any]:
+    """
+    Get notification preferences of a user merged with defaults
+
+    Args:
+        user: User instance
+
+    Returns:
+        Dict with notification preferences
+    """
+    stored = (user.preferences or {}).get('notifications', {})
+    preferences = dict(DEFAULT_NOTIFICATION_PREFERENCES)
+    preferences.update(stored)
+    return preferences
+
+
+def next_digest_time(frequency: str, digest_hour: int = 9,
+                     now: Optional[datetime] = None) -> datetime:
+    """
+    Compute when the digest that is opened now should be delivered
+
+    Args:
+        frequency: 'hourly' or 'daily'
+        digest_hour: Hour of day (UTC) for daily digests
+        now: Reference time (current time if omitted)
+
+    Returns:
+        datetime: Delivery time
+    """
+    now = now or timezone.now()
+    if frequency == 'daily':
+        due = now.replace(hour=digest_hour, minute=0, second=0, microsecond=0)
+        if due <= now:
+            due += timedelta(days=1)
+        return due
+    return now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+
+
+class NotificationDigestEngine:
+    """Buffers low-priority notifications per user and emits grouped digests"""
+
+    buffer_key_template = 'notifications:digest:{user_id}'
+    due_key = 'notifications:digest:due'
+
+    def __init__(self, redis_client: Optional[redis.Redis] = None):
+        self._redis = redis_client
+
+    @property
+    def redis(self) -> redis.Redis:
+        if self._redis is None:
+            self._redis = get_redis_client()
+        return self._redis
+
+    def buffer_key(self, user_id: int) -> str:
+        return self.buffer_key_template.format(user_id=user_id)
+
+    def notify(self, user, type: str, title: str, message: str = '',
+               payload: Optional[Dict[str, Any]] = None, priority: str = 'normal'):
+        """
+        Deliver a notification immediately or add it to the user's digest
+
+        Args:
+            user: Recipient
+            type: Notification type
+            title: Notification title
+            message: Notification text
+            payload: Extra data (ticket_id is used to collapse similar events)
+            priority: low, normal, high or urgent
+
+        Returns:
+            Created Notification or None if the event was buffered
+        """
+        payload = payload or {}
+        preferences = get_notification_preferences(user)
+        frequency = preferences.get('digest_frequency', 'immediate')
+
+        if frequency == 'immediate' or priority in IMMEDIATE_PRIORITIES:
+            return self._deliver_now(user, type, title, message, payload)
+
+        due = next_digest_time(frequency, preferences.get('digest_hour', 9))
+        try:
+            self._buffer(user.id, type, title, message, payload, due)
+        except redis.RedisError:
+            logger.warning("Digest buffer unavailable, delivering immediately", exc_info=True)
+            return self._deliver_now(user, type, title, message, payload)
+        return None
+
+    def flush_due(self, now: Optional[datetime] = None, limit: int = 500) -> int:
+        """
+        Emit digests whose delivery time has come
+
+        Args:
+            now: Reference time (current time if omitted)
+            limit: Maximum number of users processed per call
+
+        Returns:
+            int: Number of digests created
+        """
+        from app.models.notification import Notification
+
+        now_ts = (now or timezone.now()).timestamp()
+        user_ids = [
+            int(user_id) for user_id in
+            self.redis.zrangebyscore(self.due_key, '-inf', now_ts, start=0, num=limit)
+        ]
+        if not user_ids:
+            return 0
+
+        digests = []
+        drained = []
+        for user_id in user_ids:
+            groups = self._drain(user_id)
+            if groups:
+                drained.append((user_id, groups))
+                digests.append(self._build_digest(user_id, groups))
+
+        try:
+            created = Notification.objects.bulk_create(digests)
+        except Exception:
+            # Сводки не записаны: события возвращаются в буферы до следующего запуска
+            for user_id, groups in drained:
+                self._restore(user_id, groups, now_ts)
+            raise
+        # bulk_create не вызывает сигналы, поэтому счётчики обновляем явно
+        for notification in created:
+            unread_counter.adjust_and_publish(notification.user_id, 1)
+            self._push(notification)
+        return len(created)
+
+    def pending(self, user_id: int) -> List[Dict[str, Any]]:
+        """
+        List groups buffered for the user's next digest
+
+        Args:
+            user_id: ID of the user
+
+        Returns:
+            List of buffered groups
+        """
+        return self._parse_groups(self.redis.hgetall(self.buffer_key(user_id)))
+
+    def _buffer(self, user_id: int, type: str, title: str, message: str,
+                payload: Dict[str, Any], due: datetime):
+        ticket_id = payload.get('ticket_id')
+        group = f'{type}:{ticket_id}' if ticket_id else type
+        key = self.buffer_key(user_id)
+        event = json.dumps({
+            'type': type,
+            'title': title,
+            'message': message,
+            'payload': payload,
+        }, ensure_ascii=False, default=str)
+
+        pipe = self.redis.pipeline()
+        pipe.hincrby(key, f'{group}|count', 1)
+        pipe.hset(key, f'{group}|last', event)
+        pipe.hsetnx(key, f'{group}|first', time.time())
+        pipe.zadd(self.due_key, {user_id: due.timestamp()}, nx=True)
+        pipe.execute()
+
+    def _drain(self, user_id: int) -> List[Dict[str, Any]]:
+        key = self.buffer_key(user_id)
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hgetall(key)
+        pipe.delete(key)
+        pipe.zrem(self.due_key, user_id)
+        raw, _, _ = pipe.execute()
+        return self._parse_groups(raw)
+
+    def _restore(self, user_id: int, groups: List[Dict[str, Any]], due_ts: float):
+        """Merge drained groups back into the user's buffer"""
+        key = self.buffer_key(user_id)
+        pipe = self.redis.pipeline(transaction=True)
+        for group in groups:
+            name = group['group']
+            pipe.hincrby(key, f'{name}|count', group.get('count', 1))
+            # Событие, пришедшее после выборки, новее восстановленного
+            pipe.hsetnx(key, f'{name}|last', json.dumps(group['last'], ensure_ascii=False, default=str))
+            pipe.hset(key, f'{name}|first', group.get('first_at', time.time()))
+        pipe.zadd(self.due_key, {user_id: due_ts}, lt=True)
+        pipe.execute()
+
+    def _parse_groups(self, raw: Dict[bytes, bytes]) -> List[Dict[str, Any]]:
+        groups: Dict[str, Dict[str, Any]] = {}
+        for field, value in raw.items():
+            field = field.decode() if isinstance(field, bytes) else field
+            group, _, attr = field.rpartition('|')
+            entry = groups.setdefault(group, {'group': group})
+            if attr == 'count':
+                entry['count'] = int(value)
+            elif attr == 'first':
+                entry['first_at'] = float(value)
+            elif attr == 'last':
+                entry['last'] = json.loads(value)
+        return sorted(
+            (g for g in groups.values() if 'last' in g),
+            key=lambda g: g.get('first_at', 0)
+        )
+
+    def _build_digest(self, user_id: int, groups: List[Dict[str, Any]]):
+        from app.models.notification import Notification
+
+        total = sum(g.get('count', 1) for g in groups)
+        lines = []
+        for group in groups:
+            last = group['last']
+            count = group.get('count', 1)
+            suffix = f' (+{count - 1})' if count > 1 else ''
+            lines.append(f"{last['title']}{suffix}")
+
+        return Notification(
+            user_id=user_id,
+            type='digest',
+            title=f'Сводка уведомлений: {total}',
+            message='\n'.join(lines),
+            payload={
+                'digest': True,
+                'total': total,
+                'groups': [
+                    {
+                        'group': g['group'],
+                        'type': g['last']['type'],
+                        'count': g.get('count', 1),
+                        'title': g['last']['title'],
+                        'payload': g['last']['payload'],
+                    }
+                    for g in groups
+                ],
+            },
+        )
+
+    def _deliver_now(self, user, type: str, title: str, message: str,
+                     payload: Dict[str, Any]):
+        from app.models.notification import Notification
+
+        notification = Notification.objects.create(
+            user=user, type=type, title=title, message=message, payload=payload
+        )
+        self._push(notification)
+        return notification
+
+    def _push(self, notification):
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        try:
+            group = f'notifications_{notification.user_id}'
+            async_to_sync(channel_layer.group_send)(
+                group,
+                group_event('notification_created', group, {
+                    'type': 'notification_created',
+                    'notification': {
+                        'id': notification.id,
+                        'type': notification.type,
+                        'title': notification.title,
+                        'message': notification.message,
+                        'payload': notification.payload,
+                        'created_at': notification.created_at.isoformat(),
+                    }
+                })
+            )
+        except Exception:
+            logger.warning("Failed to push notification", exc_info=True)
+
+
+digest_engine = NotificationDigestEngine()
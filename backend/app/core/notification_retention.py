@@ -0,0 +1,294 @@
+"""
+Notification retention, partitioning and archival
+"""
+import logging
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+
+NOTIFICATIONS_TABLE = 'notifications'
+
+
+def _month_start(value: date) -> date:
+    return value.replace(day=1)
+
+
+def _next_month(value: date) -> date:
+    return (value.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def iter_months(start: date, end: date) -> Iterator[Tuple[date, date]]:
+    """
+    Iterate month ranges covering [start, end]
+
+    Args:
+        start: First date to cover
+        end: Last date to cover
+
+    Yields:
+        (month_start, next_month_start) pairs
+    """
+    current = _month_start(start)
+    while current <= end:
+        following = _next_month(current)
+        yield current, following
+        current = following
+
+
+def partition_name(month: date, table: str = NOTIFICATIONS_TABLE) -> str:
+    """Name of the monthly partition holding rows of the given month"""
+    return f'{table}_p{month:%Y_%m}'
+
+
+def is_partitioned(table: str = NOTIFICATIONS_TABLE, using=None) -> bool:
+    """
+    Check whether table is a PostgreSQL declaratively partitioned table
+
+    Args:
+        table: Table name
+        using: Database connection (default connection if omitted)
+
+    Returns:
+        bool: True if table is partitioned
+    """
+    conn = using or connection
+    if conn.vendor != 'postgresql':
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table pt "
+            "JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = %s",
+            [table]
+        )
+        return cursor.fetchone() is not None
+
+
+def ensure_monthly_partitions(months_ahead: int = 2, start: Optional[date] = None,
+                              table: str = NOTIFICATIONS_TABLE, using=None) -> List[str]:
+    """
+    Create missing monthly partitions up to `months_ahead` months in the future
+
+    Partitions are created ahead of time so that new rows never land in the
+    default partition (attaching a partition would then require a full scan
+    of it under an exclusive lock).
+
+    Args:
+        months_ahead: Number of future months to prepare
+        start: First month to cover (current month if omitted)
+        table: Partitioned parent table
+        using: Database connection (default connection if omitted)
+
+    Returns:
+        List of partition names that were created
+    """
+    conn = using or connection
+    if not is_partitioned(table, using=conn):
+        return []
+
+    today = timezone.now().date()
+    start = start or today
+    end = today
+    for _ in range(months_ahead):
+        end = _next_month(end)
+
+    created = []
+    with conn.cursor() as cursor:
+        for month, following in iter_months(start, end):
+            name = partition_name(month, table)
+            cursor.execute("SELECT to_regclass(%s)", [name])
+            if cursor.fetchone()[0] is not None:
+                continue
+            cursor.execute(
+                f'CREATE TABLE "{name}" PARTITION OF "{table}" '
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+            )
+            created.append(name)
+
+    if created:
+        logger.info("Created notification partitions: %s", ', '.join(created))
+    return created
+
+
+def partition_notifications_table(schema_editor):
+    """
+    Convert `notifications` into a table partitioned monthly by created_at
+
+    PostgreSQL only; other backends keep the plain table. The primary key
+    becomes (id, created_at) because PostgreSQL requires the partition key
+    in every unique constraint; ids stay unique through the identity column.
+
+    Args:
+        schema_editor: Migration schema editor
+    """
+    conn = schema_editor.connection
+    if conn.vendor != 'postgresql' or is_partitioned(NOTIFICATIONS_TABLE, using=conn):
+        return
+
+    legacy = f'{NOTIFICATIONS_TABLE}_unpartitioned'
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes "
+            "WHERE tablename = %s AND indexname <> %s",
+            [NOTIFICATIONS_TABLE, f'{NOTIFICATIONS_TABLE}_pkey']
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [NOTIFICATIONS_TABLE]
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f'SELECT MIN(created_at) FROM "{NOTIFICATIONS_TABLE}"')
+        first_created = cursor.fetchone()[0]
+
+        # Освобождаем имена индексов и ограничений для новой таблицы
+        cursor.execute(f'ALTER TABLE "{NOTIFICATIONS_TABLE}" RENAME TO "{legacy}"')
+        cursor.execute(
+            f'ALTER TABLE "{legacy}" RENAME CONSTRAINT "{NOTIFICATIONS_TABLE}_pkey" TO "{legacy}_pkey"'
+        )
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX "{name}"')
+        for name, _ in foreign_keys:
+            cursor.execute(f'ALTER TABLE "{legacy}" DROP CONSTRAINT "{name}"')
+
+        cursor.execute(
+            f'CREATE TABLE "{NOTIFICATIONS_TABLE}" '
+            f'(LIKE "{legacy}" INCLUDING DEFAULTS INCLUDING IDENTITY) '
+            f'PARTITION BY RANGE (created_at)'
+        )
+        cursor.execute(
+            f'ALTER TABLE "{NOTIFICATIONS_TABLE}" '
+            f'ADD CONSTRAINT "{NOTIFICATIONS_TABLE}_pkey" PRIMARY KEY (id, created_at)'
+        )
+        for name, definition in foreign_keys:
+            cursor.execute(
+                f'ALTER TABLE "{NOTIFICATIONS_TABLE}" ADD CONSTRAINT "{name}" {definition}'
+            )
+        for _, definition in indexes:
+            cursor.execute(definition)
+        cursor.execute(
+            f'CREATE TABLE "{NOTIFICATIONS_TABLE}_default" '
+            f'PARTITION OF "{NOTIFICATIONS_TABLE}" DEFAULT'
+        )
+
+    start = first_created.date() if first_created else None
+    ensure_monthly_partitions(start=start, using=conn)
+
+    with conn.cursor() as cursor:
+        cursor.execute(f'INSERT INTO "{NOTIFICATIONS_TABLE}" SELECT * FROM "{legacy}"')
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence('\"{NOTIFICATIONS_TABLE}\"', 'id'), "
+            f'COALESCE((SELECT MAX(id) FROM "{NOTIFICATIONS_TABLE}"), 0) + 1, false)'
+        )
+        cursor.execute(f'DROP TABLE "{legacy}"')
+
+
+def get_retention_policies() -> Dict[int, int]:
+    """
+    Load notification retention per tenant
+
+    Returns:
+        Mapping of tenant id to retention in days (0 disables archival)
+    """
+    from app.models.tenant import Tenant
+
+    default_days = getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 90)
+    policies = {}
+    for tenant_id, days in Tenant.objects.filter(is_active=True).values_list(
+        'id', 'configuration__notification_retention_days'
+    ):
+        policies[tenant_id] = default_days if days is None else days
+    return policies
+
+
+class NotificationArchiver:
+    """Moves read notifications past retention into the compressed archive"""
+
+    def __init__(self, batch_size: int = 1000, pause: float = 0.0,
+                 max_batches: Optional[int] = None):
+        self.batch_size = batch_size
+        self.pause = pause
+        self.max_batches = max_batches
+
+    def archive_tenant(self, tenant_id: int, retention_days: int,
+                       now: Optional[datetime] = None) -> int:
+        """
+        Archive read notifications of a tenant older than retention
+
+        Each chunk is moved in its own short transaction, so row locks are
+        held only for `batch_size` rows at a time.
+
+        Args:
+            tenant_id: ID of the tenant
+            retention_days: Keep read notifications younger than this
+            now: Reference time (current time if omitted)
+
+        Returns:
+            int: Number of archived notifications
+        """
+        if retention_days <= 0:
+            return 0
+
+        cutoff = (now or timezone.now()) - timedelta(days=retention_days)
+        archived = 0
+        batches = 0
+        while self.max_batches is None or batches < self.max_batches:
+            moved = self._archive_batch(tenant_id, cutoff)
+            if not moved:
+                break
+            archived += moved
+            batches += 1
+            if moved < self.batch_size:
+                break
+            if self.pause:
+                time.sleep(self.pause)
+
+        if archived:
+            logger.info("Archived %s notifications for tenant %s", archived, tenant_id)
+        return archived
+
+    def archive_all(self, now: Optional[datetime] = None) -> Dict[int, int]:
+        """
+        Archive read notifications of every active tenant
+
+        Returns:
+            Mapping of tenant id to number of archived notifications
+        """
+        return {
+            tenant_id: self.archive_tenant(tenant_id, days, now=now)
+            for tenant_id, days in get_retention_policies().items()
+        }
+
+    def _archive_batch(self, tenant_id: int, cutoff: datetime) -> int:
+        from app.models.notification import Notification, NotificationArchive
+
+        with transaction.atomic():
+            batch = list(
+                Notification.objects.filter(
+                    user__tenant_id=tenant_id,
+                    is_read=True,
+                    created_at__lt=cutoff,
+                )
+                .select_for_update(skip_locked=True, of=('self',))
+                .order_by('created_at', 'id')[:self.batch_size]
+            )
+            if not batch:
+                return 0
+
+            NotificationArchive.objects.bulk_create(
+                [NotificationArchive.from_notification(n) for n in batch]
+            )
+            # created_at в условии позволяет PostgreSQL отсечь лишние партиции
+            Notification.objects.filter(
+                pk__in=[n.pk for n in batch],
+                created_at__lt=cutoff,
+            ).delete()
+        return len(batch)
@@ -1,15 +1,37 @@
 """
 Performance Monitoring and APM
 """
+import collections
+import logging
+import math
+import random
+import re
 import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
 from typing import Dict, Any, List, Optional
 from dataclasses import dataclass
+from datetime import datetime, timezone as dt_timezone
 from opentelemetry import trace
 from opentelemetry.instrumentation.requests import RequestsInstrumentor
 from prometheus_client import Counter, Histogram, Gauge, start_http_server
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
 import redis
 import json
 
+from app.core.alert_evaluator import ThresholdEvaluator, threshold_evaluator
+from app.core.redis_client import get_redis_client
+from app.core.trace_export import configure_tracing
+from app.core.tracing import traced
+
+
+logger = logging.getLogger(__name__)
+
 
 @dataclass
 class PerformanceMetrics:
@@ -27,6 +49,8 @@ class APMInstrumentation:
     """Application Performance Monitoring instrumentation"""
     
     def __init__(self):
+        # Сэмплер и запись span в PerformanceTrace ставятся до получения tracer
+        configure_tracing()
         self.tracer = trace.get_tracer(__name__)
         self.setup_instrumentation()
     
@@ -43,32 +67,17 @@ class APMInstrumentation:
     
     def instrument_database(self):
         """Instrument database operations"""
-        # This would typically use database-specific instrumentation
-        pass
+        database_monitor.install()
     
     def instrument_redis(self):
         """Instrument Redis operations"""
-        # This would typically use Redis-specific instrumentation
-        pass
+        # Клиенты проекта создаются через инструментированные пулы redis_client;
+        # здесь достаточно создать общий пул, чтобы его метрики появились сразу
+        get_redis_client()
     
     def trace_request(self, operation_name: str):
-        """Decorator for tracing requests"""
-        def decorator(func):
-            def wrapper(*args, **kwargs):
-                with self.tracer.start_as_current_span(operation_name) as span:
-                    span.set_attribute("service.name", "worker-net-api")
-                    span.set_attribute("operation.type", "api_call")
-                    
-                    start_time = time.time()
-                    result = func(*args, **kwargs)
-                    duration = time.time() - start_time
-                    
-                    span.set_attribute("duration", duration)
-                    span.set_attribute("status", "success" if result else "error")
-                    
-                    return result
-            return wrapper
-        return decorator
+        """Decorator for tracing requests (sync and async callables, see app.core.tracing)"""
+        return traced(operation_name, operation_type="api_call")
 
 
 class PerformanceCollector:
@@ -104,29 +113,48 @@ class PerformanceCollector:
                 'CPU usage percentage'
             )
         }
+        # (method, endpoint, status_code) -> bound label child methods
+        self._request_children = {}
     
     def record_request(self, method: str, endpoint: str, 
                       status_code: int, duration: float):
         """
         Record HTTP request metrics
         
+        Label children are bound once per (method, endpoint, status_code)
+        and cached, so the hot path is a dict lookup and two observations.
+        
         Args:
             method: HTTP method
-            endpoint: API endpoint
+            endpoint: Route template (not raw path, to bound cardinality)
             status_code: HTTP status code
             duration: Request duration in seconds
         """
+        key = (method, endpoint, status_code)
+        children = self._request_children.get(key)
+        if children is None:
+            children = self._bind_request_labels(method, endpoint, status_code)
+        
+        observe, inc, error_inc = children
+        observe(duration)
+        inc()
+        if error_inc is not None:
+            error_inc()
+    
+    def _bind_request_labels(self, method: str, endpoint: str, status_code: int):
+        """Resolve label children for a request key and cache their methods"""
         labels = {
             'method': method,
             'endpoint': endpoint,
             'status_code': str(status_code)
         }
-        
-        self.metrics['response_time'].observe(duration, **labels)
-        self.metrics['request_count'].inc(**labels)
-        
-        if status_code >= 400:
-            self.metrics['error_count'].inc(**labels)
+        children = (
+            self.metrics['response_time'].labels(**labels).observe,
+            self.metrics['request_count'].labels(**labels).inc,
+            self.metrics['error_count'].labels(**labels).inc if status_code >= 400 else None,
+        )
+        self._request_children[(method, endpoint, status_code)] = children
+        return children
     
     def record_system_metrics(self, memory_usage: int, cpu_usage: float):
         """
@@ -140,10 +168,122 @@ class PerformanceCollector:
         self.metrics['cpu_usage'].set(cpu_usage)
 
 
+class RequestTimingMiddleware:
+    """
+    Django middleware recording request metrics in PerformanceCollector
+    
+    Works in both sync and async stacks. The endpoint label is the resolved
+    route template (e.g. "api/v1/tickets/<int:pk>/"), never the raw path.
+    """
+    
+    sync_capable = True
+    async_capable = True
+    
+    methods = frozenset(['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'])
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.collector = performance_collector
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        
+        start_time = time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - start_time)
+        return response
+    
+    async def __acall__(self, request):
+        start_time = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - start_time)
+        return response
+    
+    def record(self, request, response, duration: float):
+        """Record a finished request"""
+        method = request.method if request.method in self.methods else 'OTHER'
+        match = getattr(request, 'resolver_match', None)
+        endpoint = (match.route or '/') if match is not None else '<unmatched>'
+        self.collector.record_request(method, endpoint, response.status_code, duration)
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised when a request runs more queries than its budget allows"""
+
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_VALUE_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=2048)
+def fingerprint_query(sql: str) -> str:
+    """
+    Normalize SQL so repeated queries with different values compare equal
+    
+    Literals, numbers and placeholder lists are replaced, e.g.
+    "... WHERE id IN (%s, %s, %s) AND name = 'x'" -> "... WHERE id IN (?) AND name = ?"
+    
+    Args:
+        sql: SQL query
+        
+    Returns:
+        Normalized SQL
+    """
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _VALUE_LIST.sub('(?)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class RequestQueries:
+    """Queries executed during one request (or query_budget block)"""
+    
+    def __init__(self, budget: Optional[int] = None, raise_on_budget: bool = False,
+                 parent: Optional['RequestQueries'] = None):
+        self.budget = budget
+        self.raise_on_budget = raise_on_budget
+        self.parent = parent
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = collections.Counter()
+    
+    def add(self, sql: str, duration: float):
+        """Account a finished query, raising if the budget is exhausted"""
+        self.count += 1
+        self.duration += duration
+        self.fingerprints[fingerprint_query(sql)] += 1
+        if self.parent is not None:
+            self.parent.add(sql, duration)
+        if self.raise_on_budget and self.budget is not None and self.count > self.budget:
+            raise QueryBudgetExceeded(
+                f"{self.count} queries exceed the budget of {self.budget}: {sql[:200]}"
+            )
+    
+    @property
+    def over_budget(self) -> bool:
+        return self.budget is not None and self.count > self.budget
+    
+    def duplicates(self, threshold: int) -> List[tuple]:
+        """Fingerprints executed at least `threshold` times (N+1 candidates)"""
+        return [(fp, n) for fp, n in self.fingerprints.most_common() if n >= threshold]
+
+
+_current_queries: ContextVar[Optional[RequestQueries]] = ContextVar('current_queries', default=None)
+
+
 class DatabaseMonitor:
     """Database performance monitoring"""
     
-    def __init__(self, db_pool):
+    query_types = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'OTHER')
+    
+    def __init__(self, db_pool=None):
         self.db_pool = db_pool
         self.metrics = {
             'active_connections': Gauge('db_active_connections', 'Active DB connections'),
@@ -153,11 +293,30 @@ class DatabaseMonitor:
                 'db_query_duration_seconds',
                 'Database query duration',
                 ['query_type']
+            ),
+            'queries_per_request': Histogram(
+                'db_queries_per_request',
+                'Database queries per HTTP request',
+                buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)
+            ),
+            'duplicate_queries': Counter(
+                'db_duplicate_queries',
+                'Requests with a query repeated above the N+1 threshold'
+            ),
+            'budget_exceeded': Counter(
+                'db_query_budget_exceeded',
+                'Requests exceeding the per-request query budget'
             )
         }
+        self._query_observers = {
+            query_type: self.metrics['query_duration'].labels(query_type=query_type).observe
+            for query_type in self.query_types
+        }
     
     def monitor_connections(self):
         """Monitor database connections"""
+        if self.db_pool is None:
+            return
         stats = self.db_pool.get_stats()
         self.metrics['active_connections'].set(stats['active_connections'])
         self.metrics['idle_connections'].set(stats['idle_connections'])
@@ -170,12 +329,65 @@ class DatabaseMonitor:
             query: SQL query
             duration: Query duration in seconds
         """
-        query_type = self._get_query_type(query)
-        self.metrics['query_duration'].observe(duration, query_type=query_type)
+        self._query_observers[self._get_query_type(query)](duration)
+    
+    def track_request(self, queries: RequestQueries, endpoint: str = ''):
+        """
+        Record per-request query statistics and log N+1 patterns
+        
+        Args:
+            queries: Queries collected during the request
+            endpoint: Route template for log messages
+        """
+        self.metrics['queries_per_request'].observe(queries.count)
+        
+        threshold = getattr(settings, 'DB_DUPLICATE_QUERY_THRESHOLD', 5)
+        duplicates = queries.duplicates(threshold)
+        if duplicates:
+            self.metrics['duplicate_queries'].inc()
+            for fingerprint, count in duplicates:
+                logger.warning(
+                    "Possible N+1 on %s: query repeated %s times: %s",
+                    endpoint or '-', count, fingerprint[:500]
+                )
+        
+        if queries.over_budget:
+            self.metrics['budget_exceeded'].inc()
+            logger.warning(
+                "Query budget exceeded on %s: %s queries (budget %s)",
+                endpoint or '-', queries.count, queries.budget
+            )
+    
+    def execute_wrapper(self, execute, sql, params, many, context):
+        """
+        connection.execute_wrapper hook timing every query
+        
+        Installed on every connection by `install`; per-request accounting
+        happens only while a RequestQueries is active in the context.
+        """
+        start_time = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start_time
+            self.track_query(sql, duration)
+            queries = _current_queries.get()
+            if queries is not None:
+                queries.add(sql, duration)
+    
+    def install(self):
+        """Attach execute_wrapper to existing and future DB connections"""
+        connection_created.connect(self._attach, dispatch_uid='database_monitor')
+        for conn in connections.all(initialized_only=True):
+            self._attach(sender=type(conn), connection=conn)
+    
+    def _attach(self, sender, connection, **kwargs):
+        if self.execute_wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self.execute_wrapper)
     
     def _get_query_type(self, query: str) -> str:
         """Determine query type from SQL"""
-        query_upper = query.upper().strip()
+        query_upper = query.lstrip()[:6].upper()
         if query_upper.startswith('SELECT'):
             return 'SELECT'
         elif query_upper.startswith('INSERT'):
@@ -188,6 +400,76 @@ class DatabaseMonitor:
             return 'OTHER'
 
 
+@contextmanager
+def query_budget(limit: int):
+    """
+    Fail with QueryBudgetExceeded if the block runs more than `limit` queries
+    
+    Intended for tests:
+        with query_budget(5):
+            client.get('/api/v1/tickets/')
+    """
+    database_monitor.install()
+    queries = RequestQueries(budget=limit, raise_on_budget=True, parent=_current_queries.get())
+    token = _current_queries.set(queries)
+    try:
+        yield queries
+    finally:
+        _current_queries.reset(token)
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Django middleware counting queries per request
+    
+    Logs repeated query fingerprints (N+1) and enforces the optional
+    DB_QUERY_BUDGET; with DB_QUERY_BUDGET_RAISE the offending query raises
+    QueryBudgetExceeded instead of a warning being logged.
+    """
+    
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.monitor = database_monitor
+        self.monitor.install()
+        self.budget = getattr(settings, 'DB_QUERY_BUDGET', None)
+        self.raise_on_budget = getattr(settings, 'DB_QUERY_BUDGET_RAISE', False)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        
+        queries, token = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_queries.reset(token)
+        self._finish(request, queries)
+        return response
+    
+    async def __acall__(self, request):
+        queries, token = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_queries.reset(token)
+        self._finish(request, queries)
+        return response
+    
+    def _start(self):
+        queries = RequestQueries(self.budget, self.raise_on_budget, parent=_current_queries.get())
+        return queries, _current_queries.set(queries)
+    
+    def _finish(self, request, queries: RequestQueries):
+        match = getattr(request, 'resolver_match', None)
+        self.monitor.track_request(queries, match.route if match is not None else request.path)
+
+
 class RUMMonitor:
     """Real User Monitoring for frontend"""
     
@@ -347,49 +629,317 @@ class SyntheticMonitor:
             }
 
 
+CACHE_METRICS = {
+    'requests': Counter(
+        'cache_manager_requests_total',
+        'CacheManager lookups by TTL class and result (hit, negative_hit, miss, early_refresh, error)',
+        ['ttl_class', 'result']
+    ),
+    'lookup_duration': Histogram(
+        'cache_manager_lookup_seconds',
+        'Time to read a key from the cache',
+        ['ttl_class'],
+        buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25)
+    ),
+    'fetch_duration': Histogram(
+        'cache_manager_fetch_seconds',
+        'Time to recompute a missed or expiring value',
+        ['ttl_class']
+    ),
+    'lock_waits': Counter(
+        'cache_manager_lock_waits_total',
+        'Lookups that waited for another worker to fill the key',
+        ['ttl_class']
+    ),
+    'invalidated': Counter(
+        'cache_manager_invalidated_total',
+        'Keys deleted by pattern or namespaces bumped',
+        ['mode']
+    ),
+}
+
+
+# KEYS[1] - ключ версии пространства имён; ARGV[1] - ключ без версии.
+# Возвращает {версия, значение}: версия и значение читаются за один запрос.
+# Ключ значения строится в скрипте, поэтому только для Redis без кластера.
+_VERSIONED_GET_SCRIPT = """
+local version = redis.call('GET', KEYS[1]) or '0'
+return {version, redis.call('GET', ARGV[1] .. ':v' .. version)}
+"""
+
+# KEYS[1] - ключ блокировки; ARGV[1] - токен владельца
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
 class CacheManager:
-    """Cache management for performance optimization"""
+    """
+    Cache management for performance optimization
+    
+    Values are stored as JSON envelopes with their expiry and the time it
+    took to compute them, so falsy values are cached like any other and
+    `None` results are cached as negative entries for `negative_ttl`.
+    
+    Stampede protection:
+    - probabilistic early expiration (XFetch): a reader recomputes the value
+      shortly before it expires, with a probability growing towards expiry
+      and with the recomputation cost; other readers keep the cached value;
+    - a per-key lock on misses: one worker computes the value, the others
+      wait up to `lock_wait` for it and only then compute it themselves.
     
-    def __init__(self, redis_client: redis.Redis):
-        self.redis = redis_client
+    Invalidation bumps the version of a namespace (old keys expire on
+    their own) or deletes keys matched with SCAN in batches. Metrics are
+    labelled by TTL class - the key prefix before the first colon.
+    """
+    
+    lock_suffix = ':lock'
+    namespace_key_template = 'cache:ns:{namespace}'
+    
+    def __init__(self, redis_client: Optional[redis.Redis] = None,
+                 negative_ttl: Optional[int] = None, beta: Optional[float] = None):
+        self._redis = redis_client
         self.cache_ttl = {
             'user_profile': 3600,  # 1 hour
             'ticket_list': 300,    # 5 minutes
             'knowledge_articles': 1800,  # 30 minutes
-            'system_config': 7200  # 2 hours
+            'system_config': 7200,  # 2 hours
+            'reference': 600,  # 10 minutes, see app.core.reference_cache
+            'response': 300  # 5 minutes, see app.core.response_cache
         }
+        self.negative_ttl = negative_ttl or getattr(settings, 'CACHE_NEGATIVE_TTL', 60)
+        self.beta = beta if beta is not None else getattr(settings, 'CACHE_EARLY_EXPIRATION_BETA', 1.0)
+        self.lock_timeout_ms = getattr(settings, 'CACHE_LOCK_TIMEOUT_MS', 10000)
+        self.lock_wait = getattr(settings, 'CACHE_LOCK_WAIT_MS', 2000) / 1000
+        self.lock_poll = 0.02
+        self._versioned_get = None
+        self._release_lock = None
+        # TTL class -> bound label children
+        self._observers = {}
+    
+    @property
+    def redis(self) -> redis.Redis:
+        return self._redis or get_redis_client()
+    
+    def ttl_class(self, key: str) -> str:
+        """TTL class of a key; unknown prefixes share 'default' to bound label cardinality"""
+        prefix = key.split(':', 1)[0]
+        return prefix if prefix in self.cache_ttl else 'default'
     
-    def get_or_set(self, key: str, fetch_func, ttl: Optional[int] = None) -> Any:
+    def get_or_set(self, key: str, fetch_func, ttl: Optional[int] = None,
+                   namespace: Optional[str] = None) -> Any:
         """
         Get value from cache or set it using fetch function
         
         Args:
             key: Cache key
-            fetch_func: Function to fetch data if not in cache
-            ttl: Time to live in seconds
+            fetch_func: Function to fetch data if not in cache; None
+                results are cached for negative_ttl seconds
+            ttl: Time to live in seconds (TTL of the key's class by default)
+            namespace: Versioned namespace of the key, see invalidate_namespace
             
         Returns:
             Cached or fetched data
         """
-        cached = self.redis.get(key)
-        if cached:
-            return json.loads(cached)
+        ttl_class = self.ttl_class(key)
+        observers = self._class_observers(ttl_class)
+        ttl = ttl or self.cache_ttl.get(ttl_class, 3600)
+        
+        started = time.perf_counter()
+        try:
+            stored_key, raw = self._read(key, namespace)
+        except redis.RedisError:
+            logger.warning("Cache unavailable, computing %s", key, exc_info=True)
+            observers['error']()
+            return fetch_func()
+        observers['lookup'](time.perf_counter() - started)
+        
+        entry = self._decode(raw)
+        if entry is not None:
+            if not self._expiring(entry):
+                observers['negative_hit' if 'n' in entry else 'hit']()
+                return entry.get('v')
+            # Пересчитывает один воркер, остальные отдают текущее значение
+            token = self._acquire(stored_key)
+            if token is None:
+                observers['negative_hit' if 'n' in entry else 'hit']()
+                return entry.get('v')
+            observers['early_refresh']()
+            return self._fill(stored_key, fetch_func, ttl, token, observers)
+        
+        observers['miss']()
+        token = self._acquire(stored_key)
+        if token is None:
+            observers['lock_wait']()
+            entry = self._wait_for(stored_key)
+            if entry is not None:
+                return entry.get('v')
+        return self._fill(stored_key, fetch_func, ttl, token, observers)
+    
+    def delete(self, key: str, namespace: Optional[str] = None):
+        """Delete one key (of the current version of its namespace)"""
+        try:
+            stored_key, _ = self._read(key, namespace) if namespace else (key, None)
+            self.redis.delete(stored_key)
+        except redis.RedisError:
+            logger.warning("Failed to delete cache key %s", key, exc_info=True)
+    
+    def invalidate_namespace(self, namespace: str) -> Optional[int]:
+        """
+        Invalidate every key of a namespace in O(1)
         
-        data = fetch_func()
-        ttl = ttl or self.cache_ttl.get(key.split(':')[0], 3600)
-        self.redis.setex(key, ttl, json.dumps(data))
-        return data
+        Readers switch to keys of the new version; keys of older versions
+        are never read again and expire with their TTL.
+        
+        Returns:
+            New version, or None when Redis is unavailable
+        """
+        try:
+            version = self.redis.incr(self.namespace_key_template.format(namespace=namespace))
+        except redis.RedisError:
+            logger.warning("Failed to invalidate cache namespace %s", namespace, exc_info=True)
+            return None
+        CACHE_METRICS['invalidated'].labels(mode='namespace').inc()
+        return version
     
-    def invalidate(self, pattern: str):
+    def namespace_versions(self, namespaces: List[str]) -> Optional[List[int]]:
+        """
+        Current versions of namespaces in one round trip (0 if never bumped)
+        
+        Returns:
+            Versions in the order of `namespaces`, or None when Redis is unavailable
+        """
+        keys = [self.namespace_key_template.format(namespace=namespace) for namespace in namespaces]
+        try:
+            values = self.redis.mget(keys)
+        except redis.RedisError:
+            logger.warning("Failed to read cache namespace versions", exc_info=True)
+            return None
+        return [int(value or 0) for value in values]
+    
+    def invalidate(self, pattern: str, batch_size: int = 500) -> int:
         """
         Invalidate cache keys matching pattern
         
+        Keys are found with SCAN and unlinked in batches, so Redis is never
+        blocked by a full keyspace walk as with KEYS.
+        
         Args:
             pattern: Redis pattern to match
+            batch_size: Keys per SCAN step and per UNLINK
+            
+        Returns:
+            Number of keys removed
         """
-        keys = self.redis.keys(pattern)
-        if keys:
-            self.redis.delete(*keys)
+        removed = 0
+        batch = []
+        try:
+            for key in self.redis.scan_iter(match=pattern, count=batch_size):
+                batch.append(key)
+                if len(batch) >= batch_size:
+                    removed += self.redis.unlink(*batch)
+                    batch = []
+            if batch:
+                removed += self.redis.unlink(*batch)
+        except redis.RedisError:
+            logger.warning("Failed to invalidate cache pattern %s", pattern, exc_info=True)
+        CACHE_METRICS['invalidated'].labels(mode='pattern').inc(removed)
+        return removed
+    
+    def _read(self, key: str, namespace: Optional[str]):
+        if namespace is None:
+            return key, self.redis.get(key)
+        if self._versioned_get is None:
+            self._versioned_get = self.redis.register_script(_VERSIONED_GET_SCRIPT)
+        version, raw = self._versioned_get(
+            keys=[self.namespace_key_template.format(namespace=namespace)], args=[key]
+        )
+        version = version.decode() if isinstance(version, bytes) else version
+        return f'{key}:v{version}', raw
+    
+    @staticmethod
+    def _decode(raw) -> Optional[Dict[str, Any]]:
+        if raw is None:
+            return None
+        try:
+            entry = json.loads(raw)
+        except ValueError:
+            return None
+        # Значения в старом формате (без конверта) считаются промахом
+        return entry if isinstance(entry, dict) and 'e' in entry else None
+    
+    def _expiring(self, entry: Dict[str, Any]) -> bool:
+        # XFetch: -delta * beta * ln(rand) растёт с ценой пересчёта
+        if not self.beta:
+            return False
+        return time.time() - entry.get('d', 0) * self.beta * math.log(random.random() or 1e-12) >= entry['e']
+    
+    def _fill(self, stored_key: str, fetch_func, ttl: int, token: Optional[str], observers) -> Any:
+        started = time.perf_counter()
+        try:
+            data = fetch_func()
+            delta = time.perf_counter() - started
+            observers['fetch'](delta)
+            if data is None:
+                entry, entry_ttl = {'n': 1}, min(self.negative_ttl, ttl)
+            else:
+                entry, entry_ttl = {'v': data}, ttl
+            entry['d'] = round(delta, 6)
+            entry['e'] = time.time() + entry_ttl
+            try:
+                self.redis.set(stored_key, json.dumps(entry), ex=entry_ttl)
+            except redis.RedisError:
+                logger.warning("Failed to store cache key %s", stored_key, exc_info=True)
+            return data
+        finally:
+            if token is not None:
+                self._release(stored_key, token)
+    
+    def _acquire(self, stored_key: str) -> Optional[str]:
+        token = uuid.uuid4().hex
+        try:
+            if self.redis.set(stored_key + self.lock_suffix, token, nx=True, px=self.lock_timeout_ms):
+                return token
+        except redis.RedisError:
+            logger.warning("Cache lock unavailable for %s", stored_key, exc_info=True)
+        return None
+    
+    def _release(self, stored_key: str, token: str):
+        try:
+            if self._release_lock is None:
+                self._release_lock = self.redis.register_script(_RELEASE_LOCK_SCRIPT)
+            self._release_lock(keys=[stored_key + self.lock_suffix], args=[token])
+        except redis.RedisError:
+            logger.warning("Failed to release cache lock for %s", stored_key, exc_info=True)
+    
+    def _wait_for(self, stored_key: str) -> Optional[Dict[str, Any]]:
+        deadline = time.monotonic() + self.lock_wait
+        while time.monotonic() < deadline:
+            time.sleep(self.lock_poll)
+            try:
+                entry = self._decode(self.redis.get(stored_key))
+            except redis.RedisError:
+                return None
+            if entry is not None:
+                return entry
+        return None
+    
+    def _class_observers(self, ttl_class: str) -> Dict[str, Any]:
+        observers = self._observers.get(ttl_class)
+        if observers is None:
+            requests = CACHE_METRICS['requests']
+            observers = {
+                result: requests.labels(ttl_class=ttl_class, result=result).inc
+                for result in ('hit', 'negative_hit', 'miss', 'early_refresh', 'error')
+            }
+            observers['lookup'] = CACHE_METRICS['lookup_duration'].labels(ttl_class=ttl_class).observe
+            observers['fetch'] = CACHE_METRICS['fetch_duration'].labels(ttl_class=ttl_class).observe
+            observers['lock_wait'] = CACHE_METRICS['lock_waits'].labels(ttl_class=ttl_class).inc
+            self._observers[ttl_class] = observers
+        return observers
 
 
 class QueryOptimizer:
@@ -451,56 +1001,48 @@ class QueryOptimizer:
 
 
 class PerformanceAlerting:
-    """Performance alerting system"""
+    """Performance alerting system backed by PerformanceThreshold rules"""
     
-    def __init__(self):
-        self.alert_rules = {
-            'high_response_time': {
-                'threshold': 2.0,  # seconds
-                'duration': 300,   # 5 minutes
-                'severity': 'warning'
-            },
-            'high_error_rate': {
-                'threshold': 0.05,  # 5%
-                'duration': 120,    # 2 minutes
-                'severity': 'critical'
-            },
-            'database_slow_queries': {
-                'threshold': 5.0,   # seconds
-                'duration': 180,    # 3 minutes
-                'severity': 'warning'
-            }
-        }
+    # Поля снимка PerformanceMetrics -> (имя метрики, тип метрики)
+    SNAPSHOT_METRICS = {
+        'response_time': ('response_time', 'response_time'),
+        'error_rate': ('error_rate', 'error_rate'),
+        'memory_usage': ('memory_usage', 'memory_usage'),
+        'cpu_usage': ('cpu_usage', 'cpu_usage'),
+    }
     
-    def check_alerts(self, metrics: PerformanceMetrics) -> List[Dict[str, Any]]:
+    def __init__(self, evaluator: Optional[ThresholdEvaluator] = None):
+        self.evaluator = evaluator or threshold_evaluator
+    
+    def check_alerts(self, metrics: PerformanceMetrics,
+                     tenant_id: Optional[int] = None) -> List[Dict[str, Any]]:
         """
-        Check if any alerts should be triggered
+        Feed a metrics snapshot to the threshold evaluator
+        
+        The snapshot becomes one sample per metric; thresholds are evaluated
+        over their sliding windows, so a single spike does not fire a rule
+        with a longer window.
         
         Args:
             metrics: Current performance metrics
+            tenant_id: Tenant whose thresholds apply (None for global ones)
             
         Returns:
-            List of triggered alerts
+            List of alert transitions (fired, escalated, resolved)
         """
-        alerts = []
-        
-        # Check response time
-        if metrics.response_time > self.alert_rules['high_response_time']['threshold']:
-            alerts.append({
-                'type': 'high_response_time',
-                'value': metrics.response_time,
-                'threshold': self.alert_rules['high_response_time']['threshold'],
-                'severity': 'warning'
-            })
-        
-        # Check error rate
-        error_rate = metrics.error_count / max(metrics.request_count, 1)
-        if error_rate > self.alert_rules['high_error_rate']['threshold']:
-            alerts.append({
-                'type': 'high_error_rate',
-                'value': error_rate,
-                'threshold': self.alert_rules['high_error_rate']['threshold'],
-                'severity': 'critical'
-            })
-        
-        return alerts
+        values = {
+            'response_time': metrics.response_time,
+            'error_rate': metrics.error_count / max(metrics.request_count, 1),
+            'memory_usage': metrics.memory_usage,
+            'cpu_usage': metrics.cpu_usage,
+        }
+        timestamp = datetime.fromtimestamp(metrics.timestamp, tz=dt_timezone.utc)
+        samples = [
+            (tenant_id, name, metric_type, '', '', timestamp, values[field])
+            for field, (name, metric_type) in self.SNAPSHOT_METRICS.items()
+        ]
+        return self.evaluator.process(samples)
+
+
+performance_collector = PerformanceCollector()
+database_monitor = DatabaseMonitor()
@@ -0,0 +1,324 @@
+"""
+Background generation of PerformanceReport artifacts
+
+A report period is split into chunks (PERFORMANCE_REPORT_CHUNK_HOURS,
+aligned to the trend resolution so chunks are answered from rollups and
+no trend bucket is split between chunks) and every
+(section, chunk) pair is computed in a thread pool. Partial results are
+rollup buckets, merged per section once all chunks are done, so
+percentiles are those of the whole period. The report is stored as
+zlib-compressed JSON; progress is reported through status and progress.
+
+The artifact is keyed by a fingerprint of the report parameters and of
+the data in the period (row count and last update of the rollups and
+alerts). Regenerating a report whose fingerprint did not change returns
+the stored artifact, or copies it from another report of the tenant with
+the same fingerprint, without running the task.
+"""
+import hashlib
+import json
+import logging
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from app.core import metric_rollups
+from app.core.metric_rollups import _Bucket, _summary, bucket_floor
+
+
+logger = logging.getLogger(__name__)
+
+
+# Меняется при изменении формата отчёта: старые артефакты не переиспользуются
+REPORT_VERSION = 1
+DEFAULT_TOP = 20
+
+
+def _merge_bucket(target: _Bucket, summary: Dict[str, Any]):
+    target.count += summary['count']
+    target.sum += summary['sum']
+    if summary['count']:
+        target.min = min(target.min, summary['min'])
+        target.max = max(target.max, summary['max'])
+    target.sketch.merge(summary['sketch'])
+
+
+def _public(summary: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in summary.items() if key != 'sketch'}
+
+
+class Section:
+    """
+    Report section computed per chunk and merged
+
+    Args:
+        name: Key of the section in the report
+        group_by: Rollup grouping (GROUP_FIELDS) or None for a time series
+        metric_type: Metric type filter
+        top: Rows kept after sorting by p99
+    """
+
+    def __init__(self, name: str, group_by: Optional[str], metric_type: Optional[str] = None,
+                 top: Optional[int] = None):
+        self.name = name
+        self.group_by = group_by
+        self.metric_type = metric_type
+        self.top = top
+
+    def compute(self, tenant, start: datetime, end: datetime, resolution: str) -> Dict[Any, Dict[str, Any]]:
+        series = {'metric_type': self.metric_type} if self.metric_type else {}
+        if self.group_by is None:
+            points = metric_rollups.series(tenant, None, start, end, resolution=resolution, **series)['points']
+            return {point['bucket_start']: point for point in points}
+        groups, _ = metric_rollups.aggregate_groups(tenant, None, start, end, group_by=self.group_by, **series)
+        return groups
+
+    def merge(self, partials: List[Dict[Any, Dict[str, Any]]]) -> Any:
+        buckets: Dict[Any, _Bucket] = {}
+        for partial in partials:
+            for key, summary in partial.items():
+                bucket = buckets.get(key)
+                if bucket is None:
+                    bucket = buckets[key] = _Bucket()
+                _merge_bucket(bucket, summary)
+
+        if self.group_by is None:
+            return [
+                dict(_public(_summary(bucket)), bucket_start=key.isoformat())
+                for key, bucket in sorted(buckets.items())
+            ]
+        rows = [dict(_public(_summary(bucket)), **{self.group_by: key}) for key, bucket in buckets.items()]
+        rows.sort(key=lambda row: row['p99'] or 0, reverse=True)
+        return rows[:self.top] if self.top else rows
+
+
+def report_sections(config: Dict[str, Any]) -> List[Section]:
+    """Sections of a report from its config (sections, metric_type, top)"""
+    metric_type = config.get('metric_type', 'response_time')
+    top = int(config.get('top', DEFAULT_TOP))
+    sections = [
+        Section('overview', 'metric_type'),
+        Section('services', 'service', metric_type),
+        Section('endpoints', 'endpoint', metric_type, top=top),
+        Section('trend', None, metric_type),
+    ]
+    wanted = config.get('sections')
+    return [section for section in sections if not wanted or section.name in wanted]
+
+
+def chunk_ranges(start: datetime, end: datetime, hours: int,
+                 align: int = 3600) -> List[Tuple[datetime, datetime]]:
+    """
+    Split [start, end) into chunks of about `hours` hours
+
+    Inner boundaries are multiples of `align` seconds, so a bucket of
+    that length never belongs to two chunks.
+    """
+    step = timedelta(seconds=max(align, hours * 3600 // align * align))
+    ranges = []
+    low = start
+    while low < end:
+        high = min(bucket_floor(low, align) + step, end)
+        ranges.append((low, high))
+        low = high
+    return ranges
+
+
+def _alerts(report) -> Dict[str, Any]:
+    from app.models import PerformanceAlert
+
+    alerts = PerformanceAlert.objects.filter(
+        tenant=report.tenant, triggered_at__gte=report.start_date, triggered_at__lt=report.end_date
+    )
+    by_severity = dict(alerts.values_list('severity').annotate(count=Count('id')).order_by())
+    by_status = dict(alerts.values_list('status').annotate(count=Count('id')).order_by())
+    return {'total': sum(by_severity.values()), 'by_severity': by_severity, 'by_status': by_status}
+
+
+def fingerprint(report) -> str:
+    """Digest of the report parameters and of the data in its period"""
+    from app.models import PerformanceAlert, PerformanceMetricRollup
+
+    rollups = PerformanceMetricRollup.objects.filter(
+        tenant=report.tenant,
+        bucket_start__gte=bucket_floor(report.start_date, 86400),
+        bucket_start__lt=report.end_date,
+    ).aggregate(count=Count('id'), updated=Max('updated_at'))
+    alerts = PerformanceAlert.objects.filter(
+        tenant=report.tenant, triggered_at__gte=report.start_date, triggered_at__lt=report.end_date
+    ).aggregate(count=Count('id'), updated=Max('updated_at'))
+    payload = [
+        REPORT_VERSION, report.tenant_id, report.report_type, report.config,
+        report.start_date.isoformat(), report.end_date.isoformat(),
+        rollups['count'], rollups['updated'], alerts['count'], alerts['updated'],
+    ]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def pack(content: Dict[str, Any]) -> bytes:
+    return zlib.compress(json.dumps(content, ensure_ascii=False, default=str).encode('utf-8'))
+
+
+class ReportBuilder:
+    """
+    Build report artifacts with a thread pool
+
+    Args:
+        workers: Parallel (section, chunk) computations
+        chunk_hours: Length of a chunk
+    """
+
+    def __init__(self, workers: Optional[int] = None, chunk_hours: Optional[int] = None):
+        self._workers = workers
+        self._chunk_hours = chunk_hours
+
+    @property
+    def workers(self) -> int:
+        return self._workers or getattr(settings, 'PERFORMANCE_REPORT_WORKERS', 4)
+
+    @property
+    def chunk_hours(self) -> int:
+        return self._chunk_hours or getattr(settings, 'PERFORMANCE_REPORT_CHUNK_HOURS', 24)
+
+    def request(self, report, force: bool = False) -> bool:
+        """
+        Make sure the report has an artifact for the current data
+
+        Returns:
+            True when a cached artifact is used, False when generation
+            was queued (or is already running)
+        """
+        from app.models import PerformanceReport
+        from app.tasks import generate_performance_report
+
+        digest = fingerprint(report)
+        if not force:
+            if report.status == 'completed' and report.artifact_digest == digest:
+                return True
+            source = PerformanceReport.objects.filter(
+                tenant=report.tenant, status='completed', artifact_digest=digest
+            ).exclude(pk=report.pk).only('artifact', 'artifact_size', 'generated_at').first()
+            if source is not None:
+                report.artifact = source.artifact
+                report.artifact_size = source.artifact_size
+                report.artifact_digest = digest
+                report.generated_at = source.generated_at
+                report.status, report.progress, report.error_message = 'completed', 100, ''
+                report.save(update_fields=[
+                    'artifact', 'artifact_size', 'artifact_digest', 'generated_at',
+                    'status', 'progress', 'error_message', 'updated_at',
+                ])
+                return True
+
+        # Повторный запрос во время генерации не ставит вторую задачу
+        queued = PerformanceReport.objects.filter(pk=report.pk)
+        if not force:
+            queued = queued.exclude(status__in=('pending', 'running'))
+        if queued.update(status='pending', progress=0, error_message='', updated_at=timezone.now()):
+            generate_performance_report.delay(report.pk)
+        report.refresh_from_db(fields=['status', 'progress', 'error_message'])
+        return False
+
+    def build(self, report_id: int) -> Dict[str, Any]:
+        """
+        Compute the report and store the compressed artifact
+
+        Returns:
+            Dict with status, artifact_size and the number of chunks
+        """
+        from app.models import PerformanceReport
+
+        report = PerformanceReport.objects.select_related('tenant').defer('artifact').get(pk=report_id)
+        digest = fingerprint(report)
+        PerformanceReport.objects.filter(pk=report_id).update(
+            status='running', progress=0, updated_at=timezone.now()
+        )
+        try:
+            content, chunks = self._compute(report)
+            artifact = pack(content)
+        except Exception as exc:
+            logger.exception("Performance report %s failed", report_id)
+            PerformanceReport.objects.filter(pk=report_id).update(
+                status='failed', error_message=f"{type(exc).__name__}: {exc}", updated_at=timezone.now()
+            )
+            return {'status': 'failed'}
+
+        PerformanceReport.objects.filter(pk=report_id).update(
+            status='completed', progress=100, error_message='', artifact=artifact,
+            artifact_size=len(artifact), artifact_digest=digest,
+            generated_at=content['generated_at'], updated_at=timezone.now(),
+        )
+        return {'status': 'completed', 'artifact_size': len(artifact), 'chunks': chunks}
+
+    def _compute(self, report) -> Tuple[Dict[str, Any], int]:
+        from app.models import PerformanceReport
+
+        config = report.config or {}
+        sections = report_sections(config)
+        period = report.end_date - report.start_date
+        resolution = '1h' if period <= timedelta(days=7) else '1d'
+        chunks = chunk_ranges(report.start_date, report.end_date, self.chunk_hours,
+                              align=metric_rollups.RESOLUTION_SECONDS[resolution])
+        jobs = [(section, chunk) for section in sections for chunk in chunks]
+        partials: Dict[str, List[Dict[Any, Dict[str, Any]]]] = {section.name: [] for section in sections}
+        progress = _Progress(
+            len(jobs),
+            lambda percent: PerformanceReport.objects.filter(pk=report.pk).update(progress=percent),
+        )
+
+        def run(section: Section, chunk: Tuple[datetime, datetime]):
+            try:
+                return section.compute(report.tenant, chunk[0], chunk[1], resolution)
+            finally:
+                # Соединение потока пула не переиспользуется Django
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='perf-report') as pool:
+            futures = {pool.submit(run, section, chunk): section for section, chunk in jobs}
+            for future in as_completed(futures):
+                partials[futures[future].name].append(future.result())
+                progress.step()
+
+        generated_at = timezone.now()
+        content = {
+            'report': {
+                'id': report.pk,
+                'name': report.name,
+                'report_type': report.report_type,
+                'period_start': report.start_date.isoformat(),
+                'period_end': report.end_date.isoformat(),
+                'resolution': resolution,
+            },
+            'generated_at': generated_at,
+            'sections': {section.name: section.merge(partials[section.name]) for section in sections},
+        }
+        if not config.get('sections') or 'alerts' in config['sections']:
+            content['sections']['alerts'] = _alerts(report)
+        return content, len(chunks)
+
+
+class _Progress:
+    """Completed jobs as percent, written at most every 5% (100 is written on save)"""
+
+    def __init__(self, total: int, write: Callable[[int], Any]):
+        self.total = total
+        self.done = 0
+        self.written = 0
+        self.write = write
+
+    def step(self):
+        self.done += 1
+        # Последние проценты остаются на сжатие и сохранение
+        percent = self.done * 95 // max(self.total, 1)
+        if percent - self.written >= 5:
+            self.written = percent
+            self.write(percent)
+
+
+report_builder = ReportBuilder()
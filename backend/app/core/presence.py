@@ -0,0 +1,190 @@
+"""
+Presence tracking and typing indicator throttling
+"""
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import redis
+from django.conf import settings
+
+from app.core.redis_client import get_async_redis_client, get_redis_client
+
+
+logger = logging.getLogger(__name__)
+
+
+# KEYS[1] - typing key; ARGV: is_typing, now_ms, throttle_ms, ttl_ms.
+# Returns 1 when the event must be broadcast, 0 when it is coalesced.
+_TYPING_SCRIPT = """
+if ARGV[1] == '1' then
+    local last = redis.call('GET', KEYS[1])
+    if last and tonumber(ARGV[2]) - tonumber(last) < tonumber(ARGV[3]) then
+        return 0
+    end
+    redis.call('SET', KEYS[1], ARGV[2], 'PX', ARGV[4])
+    return 1
+end
+return redis.call('DEL', KEYS[1])
+"""
+
+
+class PresenceTracker:
+    """
+    Heartbeat-based online status per tenant
+
+    Last activity is kept in a sorted set scored by timestamp and open
+    sockets are counted in a hash. A user is online while at least one
+    socket is open and the last heartbeat is younger than `ttl`, so
+    sockets of a crashed worker expire on their own.
+    """
+
+    online_key_template = 'presence:online:{tenant_id}'
+    connections_key_template = 'presence:connections:{tenant_id}'
+
+    def __init__(self, ttl: Optional[int] = None, history: int = 86400):
+        self.ttl = ttl or getattr(settings, 'PRESENCE_TTL', 60)
+        self.history = history
+
+    @property
+    def redis(self) -> redis.Redis:
+        return get_redis_client()
+
+    @property
+    def async_redis(self):
+        return get_async_redis_client()
+
+    def online_key(self, tenant_id: int) -> str:
+        return self.online_key_template.format(tenant_id=tenant_id)
+
+    def connections_key(self, tenant_id: int) -> str:
+        return self.connections_key_template.format(tenant_id=tenant_id)
+
+    async def connect(self, tenant_id: int, user_id: int):
+        """Register an opened socket of the user"""
+        pipe = self.async_redis.pipeline(transaction=False)
+        pipe.hincrby(self.connections_key(tenant_id), user_id, 1)
+        self._touch(pipe, tenant_id, user_id)
+        await self._execute(pipe)
+
+    async def heartbeat(self, tenant_id: int, user_id: int):
+        """Refresh last activity of the user"""
+        pipe = self.async_redis.pipeline(transaction=False)
+        self._touch(pipe, tenant_id, user_id)
+        await self._execute(pipe)
+
+    async def disconnect(self, tenant_id: int, user_id: int):
+        """Unregister a closed socket of the user"""
+        key = self.connections_key(tenant_id)
+        pipe = self.async_redis.pipeline(transaction=False)
+        pipe.hincrby(key, user_id, -1)
+        self._touch(pipe, tenant_id, user_id)
+        result = await self._execute(pipe)
+        if result and result[0] <= 0:
+            try:
+                await self.async_redis.hdel(key, user_id)
+            except redis.RedisError:
+                logger.warning("Failed to clear presence connections", exc_info=True)
+
+    def get_status(self, tenant_id: int, user_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Get online status of many users in one round trip
+
+        Args:
+            tenant_id: ID of the tenant
+            user_ids: IDs of the users
+
+        Returns:
+            Mapping of user id to {'is_online', 'last_seen'}
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zmscore(self.online_key(tenant_id), user_ids)
+        pipe.hmget(self.connections_key(tenant_id), user_ids)
+        try:
+            scores, connections = pipe.execute()
+        except redis.RedisError:
+            logger.warning("Presence store unavailable", exc_info=True)
+            scores, connections = [None] * len(user_ids), [None] * len(user_ids)
+
+        threshold = time.time() - self.ttl
+        statuses = {}
+        for user_id, score, open_sockets in zip(user_ids, scores, connections):
+            statuses[user_id] = {
+                'is_online': bool(score and score >= threshold and int(open_sockets or 0) > 0),
+                'last_seen': score,
+            }
+        return statuses
+
+    def online_user_ids(self, tenant_id: int) -> List[int]:
+        """IDs of users with a recent heartbeat in the tenant"""
+        try:
+            members = self.redis.zrangebyscore(
+                self.online_key(tenant_id), time.time() - self.ttl, '+inf'
+            )
+        except redis.RedisError:
+            logger.warning("Presence store unavailable", exc_info=True)
+            return []
+        candidates = [int(m) for m in members]
+        statuses = self.get_status(tenant_id, candidates)
+        return [user_id for user_id in candidates if statuses[user_id]['is_online']]
+
+    def _touch(self, pipe, tenant_id: int, user_id: int):
+        now = time.time()
+        key = self.online_key(tenant_id)
+        pipe.zadd(key, {user_id: now})
+        pipe.zremrangebyscore(key, '-inf', now - self.history)
+
+    async def _execute(self, pipe) -> Optional[List[Any]]:
+        try:
+            return await pipe.execute()
+        except redis.RedisError:
+            logger.warning("Presence store unavailable", exc_info=True)
+            return None
+
+
+class TypingThrottle:
+    """Rate-limits and coalesces typing events per user per room"""
+
+    key_template = 'typing:{room_name}:{user_id}'
+
+    def __init__(self, throttle_ms: Optional[int] = None, ttl_ms: Optional[int] = None):
+        self.throttle_ms = throttle_ms or getattr(settings, 'TYPING_THROTTLE_MS', 2000)
+        self.ttl_ms = ttl_ms or getattr(settings, 'TYPING_TTL_MS', 6000)
+        self._script = None
+
+    async def should_broadcast(self, room_name: str, user_id: int, is_typing: bool) -> bool:
+        """
+        Decide whether a typing event must reach the room
+
+        Repeated "typing" events inside the throttle window are dropped;
+        "stopped typing" is forwarded only if a "typing" event was sent and
+        has not expired yet. Clients expire indicators after `ttl_ms`.
+
+        Args:
+            room_name: Chat room
+            user_id: ID of the typing user
+            is_typing: Typing state reported by the client
+
+        Returns:
+            bool: True if the event should be broadcast
+        """
+        try:
+            if self._script is None:
+                self._script = get_async_redis_client().register_script(_TYPING_SCRIPT)
+            result = await self._script(
+                keys=[self.key_template.format(room_name=room_name, user_id=user_id)],
+                args=['1' if is_typing else '0', int(time.time() * 1000),
+                      self.throttle_ms, self.ttl_ms],
+            )
+        except redis.RedisError:
+            logger.warning("Typing throttle unavailable", exc_info=True)
+            return True
+        return bool(result)
+
+
+presence = PresenceTracker()
+typing_throttle = TypingThrottle()
@@ -0,0 +1,236 @@
+"""
+Mergeable quantile sketch (DDSketch)
+
+Values are counted in logarithmic buckets whose boundaries grow by
+gamma = (1 + alpha) / (1 - alpha), so every quantile is returned with a
+relative error of at most `alpha`. Sketches built on different workers
+or for different time buckets merge exactly by adding bucket counts,
+which is what makes them storable in rollup rows.
+
+The binary encoding (`to_bytes`) stores bucket indexes as zigzag varint
+deltas; a typical latency distribution fits in a few hundred bytes.
+"""
+import math
+import struct
+from typing import Dict, Iterable, List, Optional, Sequence
+
+
+DEFAULT_ALPHA = 0.01
+DEFAULT_MAX_BINS = 2048
+# Квантили, которые отдают эндпоинты метрик
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+# Значения ближе к нулю считаются нулём: логарифмические корзины для них бесполезны
+MIN_INDEXABLE = 1e-9
+
+_VERSION = 1
+
+
+def _write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, pos: int):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _zigzag(value: int) -> int:
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value: int) -> int:
+    return value >> 1 if not value & 1 else -(value >> 1) - 1
+
+
+class DDSketch:
+    """
+    Quantile sketch with relative accuracy guarantees
+
+    Args:
+        alpha: Relative accuracy of quantiles (0.01 = 1%)
+        max_bins: Bucket limit per sign; the lowest buckets are collapsed
+            when exceeded, which only affects the smallest quantiles
+    """
+
+    __slots__ = ('alpha', 'max_bins', 'gamma', '_log_gamma', 'positive', 'negative',
+                 'zero_count', 'count', 'sum', 'min', 'max')
+
+    def __init__(self, alpha: float = DEFAULT_ALPHA, max_bins: int = DEFAULT_MAX_BINS):
+        if not 0 < alpha < 1:
+            raise ValueError("alpha must be between 0 and 1")
+        self.alpha = alpha
+        self.max_bins = max_bins
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _index(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, index: int) -> float:
+        # Середина корзины (gamma^(i-1), gamma^i] с относительной ошибкой alpha
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def add(self, value: float, weight: int = 1):
+        """Count `value` `weight` times"""
+        if value > MIN_INDEXABLE:
+            index = self._index(value)
+            self.positive[index] = self.positive.get(index, 0) + weight
+            if len(self.positive) > self.max_bins:
+                self._collapse(self.positive)
+        elif value < -MIN_INDEXABLE:
+            index = self._index(-value)
+            self.negative[index] = self.negative.get(index, 0) + weight
+            if len(self.negative) > self.max_bins:
+                self._collapse(self.negative)
+        else:
+            self.zero_count += weight
+        self.count += weight
+        self.sum += value * weight
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def update(self, values: Iterable[float]):
+        """Count every value of an iterable"""
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: 'DDSketch') -> 'DDSketch':
+        """
+        Add counts of another sketch with the same alpha in place
+
+        Returns:
+            self
+        """
+        if other.count == 0:
+            return self
+        if not math.isclose(other.gamma, self.gamma):
+            raise ValueError("Cannot merge sketches with different accuracy")
+        for store, source in ((self.positive, other.positive), (self.negative, other.negative)):
+            for index, count in source.items():
+                store[index] = store.get(index, 0) + count
+            if len(store) > self.max_bins:
+                self._collapse(store)
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def _collapse(self, store: Dict[int, int]):
+        indexes = sorted(store)
+        excess = len(indexes) - self.max_bins
+        target = indexes[excess]
+        store[target] += sum(store.pop(index) for index in indexes[:excess])
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate the q-quantile
+
+        Args:
+            q: Quantile in [0, 1]
+
+        Returns:
+            Estimated value, None for an empty sketch
+        """
+        return self.quantiles((q,))[0]
+
+    def quantiles(self, qs: Sequence[float] = DEFAULT_QUANTILES) -> List[Optional[float]]:
+        """
+        Estimate several quantiles in one pass over the buckets
+
+        Args:
+            qs: Quantiles in [0, 1]
+
+        Returns:
+            Estimates in the order of qs (None for an empty sketch)
+        """
+        if any(not 0 <= q <= 1 for q in qs):
+            raise ValueError("q must be between 0 and 1")
+        if self.count == 0:
+            return [None] * len(qs)
+
+        # Корзины по возрастанию значения: отрицательные, ноль, положительные
+        buckets = [(-self._value(i), c) for i, c in sorted(self.negative.items(), reverse=True)]
+        if self.zero_count:
+            buckets.append((0.0, self.zero_count))
+        buckets.extend((self._value(i), c) for i, c in sorted(self.positive.items()))
+
+        order = sorted(range(len(qs)), key=lambda n: qs[n])
+        results: List[Optional[float]] = [None] * len(qs)
+        position = seen = 0
+        for n in order:
+            rank = qs[n] * (self.count - 1)
+            while position < len(buckets) and seen + buckets[position][1] <= rank:
+                seen += buckets[position][1]
+                position += 1
+            value = buckets[position][0] if position < len(buckets) else self.max
+            results[n] = min(max(value, self.min), self.max)
+        return results
+
+    def percentiles(self, qs: Sequence[float] = DEFAULT_QUANTILES) -> Dict[str, Optional[float]]:
+        """Quantiles keyed as p50/p90/p99"""
+        return {f'p{q * 100:g}': value for q, value in zip(qs, self.quantiles(qs))}
+
+    @property
+    def avg(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def to_bytes(self) -> bytes:
+        """Compact binary encoding, see from_bytes"""
+        out = bytearray(struct.pack('<Bdd', _VERSION, self.alpha, self.sum))
+        _write_varint(out, self.zero_count)
+        _write_varint(out, self.count)
+        out += struct.pack('<dd', self.min if self.count else 0.0, self.max if self.count else 0.0)
+        for store in (self.positive, self.negative):
+            _write_varint(out, len(store))
+            previous = 0
+            for index in sorted(store):
+                _write_varint(out, _zigzag(index - previous))
+                _write_varint(out, store[index])
+                previous = index
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, max_bins: int = DEFAULT_MAX_BINS) -> 'DDSketch':
+        """Decode a sketch produced by to_bytes"""
+        data = bytes(data)
+        version, alpha, total = struct.unpack_from('<Bdd', data, 0)
+        if version != _VERSION:
+            raise ValueError(f"Unsupported sketch version {version}")
+        sketch = cls(alpha=alpha, max_bins=max_bins)
+        sketch.sum = total
+        pos = struct.calcsize('<Bdd')
+        sketch.zero_count, pos = _read_varint(data, pos)
+        sketch.count, pos = _read_varint(data, pos)
+        low, high = struct.unpack_from('<dd', data, pos)
+        pos += 16
+        if sketch.count:
+            sketch.min, sketch.max = low, high
+        for store in (sketch.positive, sketch.negative):
+            size, pos = _read_varint(data, pos)
+            index = 0
+            for _ in range(size):
+                delta, pos = _read_varint(data, pos)
+                count, pos = _read_varint(data, pos)
+                index += _unzigzag(delta)
+                store[index] = count
+        return sketch
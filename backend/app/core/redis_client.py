@@ -0,0 +1,352 @@
+"""
+Shared Redis client and instrumented connection pools
+
+Every Redis user in the project goes through the pools defined here, so
+command latency, pipeline usage and pool saturation are exported to
+Prometheus with a `client` label:
+
+    app            get_redis_client() / get_async_redis_client()
+    cache          django-redis (CACHES OPTIONS CONNECTION_POOL_CLASS)
+    channels       channels_redis (InstrumentedRedisChannelLayer)
+    celery_broker  kombu (InstrumentedKombuTransport)
+    celery_results Celery result backend (InstrumentedRedisBackend)
+
+Latency is measured on the connection, from sending a command to reading
+its reply; a pipeline is observed once under the PIPELINE command name.
+"""
+from collections import deque
+from typing import Dict, Optional, Tuple
+import threading
+import time
+import weakref
+
+import redis
+import redis.asyncio
+from celery.backends.redis import RedisBackend
+from channels_redis.core import RedisChannelLayer
+from channels_redis.utils import create_pool as create_channel_pool
+from django.conf import settings
+from kombu.transport import redis as kombu_redis
+from prometheus_client import Counter, Gauge, Histogram
+
+
+_client: Optional[redis.Redis] = None
+_async_client: Optional[redis.asyncio.Redis] = None
+_lock = threading.Lock()
+
+
+REDIS_METRICS = {
+    'command_duration': Histogram(
+        'redis_command_duration_seconds',
+        'Redis command latency in seconds',
+        ['client', 'command'],
+        buckets=(.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, 1)
+    ),
+    'command_errors': Counter(
+        'redis_command_errors_total',
+        'Redis commands failed with a connection or protocol error',
+        ['client', 'command']
+    ),
+    'pipelines': Counter(
+        'redis_pipelines_total',
+        'Redis pipelines executed',
+        ['client']
+    ),
+    'pipeline_commands': Counter(
+        'redis_pipeline_commands_total',
+        'Commands sent inside Redis pipelines',
+        ['client']
+    ),
+    'pool_in_use': Gauge(
+        'redis_pool_connections_in_use',
+        'Connections checked out of Redis pools',
+        ['client']
+    ),
+    'pool_available': Gauge(
+        'redis_pool_connections_available',
+        'Idle connections kept by Redis pools',
+        ['client']
+    ),
+    'pool_max': Gauge(
+        'redis_pool_max_connections',
+        'Configured connection limit of Redis pools',
+        ['client']
+    ),
+}
+
+_observers: Dict[Tuple[str, str], object] = {}
+_pools: Dict[str, 'weakref.WeakSet'] = {}
+
+
+def _observer(client: str, command: str):
+    """Bound histogram child for (client, command), resolved once"""
+    key = (client, command)
+    observe = _observers.get(key)
+    if observe is None:
+        observe = REDIS_METRICS['command_duration'].labels(client=client, command=command).observe
+        _observers[key] = observe
+    return observe
+
+
+def _command_name(args) -> str:
+    name = args[0] if args else 'UNKNOWN'
+    if isinstance(name, bytes):
+        name = name.decode('latin-1')
+    return str(name).upper()
+
+
+def _pool_size(pool, attribute: str) -> int:
+    """
+    Size of a pool's connection collection
+
+    redis-py has no public API for pool usage; its ConnectionPool keeps
+    _in_use_connections and _available_connections. A pool without them
+    (another pool class or redis-py version) counts as 0 instead of
+    breaking the scrape.
+    """
+    try:
+        return len(getattr(pool, attribute, ()))
+    except TypeError:
+        return 0
+
+
+def _register_pool(name: str, pool):
+    """Track a pool for saturation gauges, evaluated lazily on scrape"""
+    if name not in _pools:
+        pools = _pools[name] = weakref.WeakSet()
+        REDIS_METRICS['pool_in_use'].labels(client=name).set_function(
+            lambda: sum(_pool_size(p, '_in_use_connections') for p in list(pools))
+        )
+        REDIS_METRICS['pool_available'].labels(client=name).set_function(
+            lambda: sum(_pool_size(p, '_available_connections') for p in list(pools))
+        )
+        REDIS_METRICS['pool_max'].labels(client=name).set_function(
+            lambda: sum(p.max_connections for p in list(pools) if p.max_connections < 2 ** 31)
+        )
+    _pools[name].add(pool)
+
+
+class _InstrumentedConnectionMixin:
+    """
+    Times replies against the commands sent on the connection
+
+    Every sent command (or pipeline) is queued with its start time and the
+    number of replies it expects; the last reply observes the latency.
+    """
+
+    metrics_name = 'default'
+
+    def _pending(self) -> deque:
+        pending = self.__dict__.get('_metrics_pending')
+        if pending is None:
+            pending = self._metrics_pending = deque()
+        return pending
+
+    def pack_commands(self, commands):
+        # Используется только конвейерами: одна запись на весь конвейер
+        commands = list(commands)
+        REDIS_METRICS['pipelines'].labels(client=self.metrics_name).inc()
+        REDIS_METRICS['pipeline_commands'].labels(client=self.metrics_name).inc(len(commands))
+        self._pending().append(['PIPELINE', time.perf_counter(), len(commands)])
+        return super().pack_commands(commands)
+
+    def _start_command(self, args):
+        self._pending().append([_command_name(args), time.perf_counter(), 1])
+
+    def _finish_reply(self, failed: bool = False):
+        pending = self._pending()
+        if not pending:
+            return
+        entry = pending[0]
+        if failed:
+            pending.clear()
+            REDIS_METRICS['command_errors'].labels(client=self.metrics_name, command=entry[0]).inc()
+            return
+        entry[2] -= 1
+        if entry[2] <= 0:
+            pending.popleft()
+            _observer(self.metrics_name, entry[0])(time.perf_counter() - entry[1])
+
+    def _reset_pending(self):
+        pending = self.__dict__.get('_metrics_pending')
+        if pending:
+            pending.clear()
+
+
+class InstrumentedConnection(_InstrumentedConnectionMixin, redis.Connection):
+    """redis.Connection reporting command latency"""
+
+    def send_command(self, *args, **kwargs):
+        self._start_command(args)
+        return super().send_command(*args, **kwargs)
+
+    def read_response(self, *args, **kwargs):
+        try:
+            response = super().read_response(*args, **kwargs)
+        except (redis.ConnectionError, redis.TimeoutError):
+            self._finish_reply(failed=True)
+            raise
+        except redis.ResponseError:
+            self._finish_reply()
+            raise
+        self._finish_reply()
+        return response
+
+    def disconnect(self, *args, **kwargs):
+        self._reset_pending()
+        return super().disconnect(*args, **kwargs)
+
+
+class InstrumentedAsyncConnection(_InstrumentedConnectionMixin, redis.asyncio.Connection):
+    """redis.asyncio.Connection reporting command latency"""
+
+    async def send_command(self, *args, **kwargs):
+        self._start_command(args)
+        return await super().send_command(*args, **kwargs)
+
+    async def read_response(self, *args, **kwargs):
+        try:
+            response = await super().read_response(*args, **kwargs)
+        except (redis.ConnectionError, redis.TimeoutError):
+            self._finish_reply(failed=True)
+            raise
+        except redis.ResponseError:
+            self._finish_reply()
+            raise
+        self._finish_reply()
+        return response
+
+    async def disconnect(self, *args, **kwargs):
+        self._reset_pending()
+        return await super().disconnect(*args, **kwargs)
+
+
+_connection_classes: Dict[Tuple[type, str], type] = {}
+
+
+def instrumented_connection_class(base: type, name: str) -> type:
+    """
+    Subclass of a redis-py connection class reporting under `name`
+
+    Keeps the transport of `base` (TCP, SSL, unix socket); works for sync
+    and asyncio connection classes.
+    """
+    if issubclass(base, _InstrumentedConnectionMixin):
+        return base
+    key = (base, name)
+    cls = _connection_classes.get(key)
+    if cls is None:
+        if issubclass(base, redis.asyncio.connection.AbstractConnection):
+            bases = (InstrumentedAsyncConnection, base) if base is not redis.asyncio.Connection \
+                else (InstrumentedAsyncConnection,)
+        else:
+            bases = (InstrumentedConnection, base) if base is not redis.Connection \
+                else (InstrumentedConnection,)
+        cls = type(f'Instrumented{base.__name__}', bases, {'metrics_name': name})
+        _connection_classes[key] = cls
+    return cls
+
+
+class InstrumentedConnectionPool(redis.ConnectionPool):
+    """
+    ConnectionPool with instrumented connections and saturation gauges
+
+    Usable by libraries that accept a pool class, e.g. django-redis:
+        'CONNECTION_POOL_CLASS': 'app.core.redis_client.InstrumentedConnectionPool',
+        'CONNECTION_POOL_KWARGS': {'metrics_name': 'cache'},
+    """
+
+    def __init__(self, connection_class=redis.Connection, metrics_name: str = 'default', **kwargs):
+        super().__init__(
+            connection_class=instrumented_connection_class(connection_class, metrics_name), **kwargs
+        )
+        _register_pool(metrics_name, self)
+
+
+class InstrumentedAsyncConnectionPool(redis.asyncio.ConnectionPool):
+    """asyncio ConnectionPool with instrumented connections and saturation gauges"""
+
+    def __init__(self, connection_class=redis.asyncio.Connection, metrics_name: str = 'default', **kwargs):
+        super().__init__(
+            connection_class=instrumented_connection_class(connection_class, metrics_name), **kwargs
+        )
+        _register_pool(metrics_name, self)
+
+
+def get_connection_pool(url: Optional[str] = None, name: str = 'app', **kwargs) -> InstrumentedConnectionPool:
+    """
+    Create an instrumented connection pool
+
+    Args:
+        url: Redis URL (settings.REDIS_URL by default)
+        name: Value of the `client` metric label
+        **kwargs: Extra ConnectionPool arguments
+
+    Returns:
+        InstrumentedConnectionPool
+    """
+    return InstrumentedConnectionPool.from_url(url or settings.REDIS_URL, metrics_name=name, **kwargs)
+
+
+def get_async_connection_pool(url: Optional[str] = None, name: str = 'app',
+                              **kwargs) -> InstrumentedAsyncConnectionPool:
+    """asyncio counterpart of get_connection_pool"""
+    return InstrumentedAsyncConnectionPool.from_url(url or settings.REDIS_URL, metrics_name=name, **kwargs)
+
+
+def get_redis_client() -> redis.Redis:
+    """
+    Get process-wide Redis client backed by a single connection pool
+
+    Returns:
+        redis.Redis: Client connected to settings.REDIS_URL
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = redis.Redis(connection_pool=get_connection_pool())
+    return _client
+
+
+def get_async_redis_client() -> redis.asyncio.Redis:
+    """
+    Get process-wide asyncio Redis client for consumers
+
+    Returns:
+        redis.asyncio.Redis: Client connected to settings.REDIS_URL
+    """
+    global _async_client
+    if _async_client is None:
+        _async_client = redis.asyncio.Redis(connection_pool=get_async_connection_pool())
+    return _async_client
+
+
+class InstrumentedRedisChannelLayer(RedisChannelLayer):
+    """channels_redis layer whose pools report as client="channels" """
+
+    def create_pool(self, index):
+        host = dict(self.hosts[index])
+        if 'address' not in host:
+            return create_channel_pool(host)
+        return InstrumentedAsyncConnectionPool.from_url(
+            host.pop('address'), metrics_name='channels', **host
+        )
+
+
+class _InstrumentedKombuChannel(kombu_redis.Channel):
+    connection_class = instrumented_connection_class(redis.Connection, 'celery_broker')
+    connection_class_ssl = instrumented_connection_class(redis.SSLConnection, 'celery_broker')
+
+
+class InstrumentedKombuTransport(kombu_redis.Transport):
+    """kombu Redis transport whose connections report as client="celery_broker" """
+
+    Channel = _InstrumentedKombuChannel
+
+
+class InstrumentedRedisBackend(RedisBackend):
+    """Celery result backend whose pool reports as client="celery_results" """
+
+    def _get_pool(self, **params):
+        return InstrumentedConnectionPool(metrics_name='celery_results', **params)
@@ -0,0 +1,315 @@
+"""
+Two-tier cache for hot reference data
+
+Tenant configuration, SLA per priority, the tag list and feature flags
+are read on most requests and rarely change. They are kept in a bounded
+per-process LRU with a short TTL in front of Redis (CacheManager, with
+its stampede protection and negative caching), so a warm worker answers
+them without a network round trip.
+
+Writes invalidate through model signals (app.signals): the Redis entry
+is deleted and the key is published on a pub/sub channel; a listener
+thread in every process drops the key from its LRU as soon as the
+message arrives. While the listener is not subscribed (startup, Redis
+outage) the local tier is bypassed, and it is cleared on every
+subscription, so messages missed during an outage can't leave stale
+entries behind. Cached values are shared between threads and must be
+treated as read-only.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+import redis
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from prometheus_client import Counter
+
+from app.core.performance_monitoring import CacheManager
+from app.core.redis_client import get_redis_client
+
+
+logger = logging.getLogger(__name__)
+
+
+REFERENCE_METRICS = {
+    'local': Counter(
+        'reference_cache_local_requests_total',
+        'Reference cache lookups in the in-process tier (hit, miss, bypass)',
+        ['result']
+    ),
+    'invalidations': Counter(
+        'reference_cache_invalidations_total',
+        'Reference cache keys invalidated (published) and dropped on messages (received)',
+        ['direction']
+    ),
+}
+
+CHANNEL = 'reference_cache:invalidate'
+KEY_PREFIX = 'reference'
+
+_MISSING = object()
+
+
+class LocalLRU:
+    """Bounded in-process LRU with a TTL per entry"""
+
+    def __init__(self):
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Any, ttl: float, max_entries: int):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class ReferenceCache:
+    """
+    In-process LRU in front of Redis with pub/sub invalidation
+
+    Args:
+        cache_manager: Redis tier (CacheManager)
+    """
+
+    def __init__(self, cache_manager: Optional[CacheManager] = None):
+        self.manager = cache_manager or CacheManager()
+        self.local = LocalLRU()
+        # Растёт с каждой инвалидацией: значение, прочитанное из Redis до
+        # неё, не попадает в локальный кеш
+        self._generation = 0
+        self._subscribed = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return getattr(settings, 'REFERENCE_CACHE_ENABLED', True)
+
+    @property
+    def local_max_entries(self) -> int:
+        return getattr(settings, 'REFERENCE_CACHE_LOCAL_MAX_ENTRIES', 10000)
+
+    @property
+    def local_ttl(self) -> float:
+        return getattr(settings, 'REFERENCE_CACHE_LOCAL_TTL', 30)
+
+    def get(self, key: str, loader: Callable[[], Any]) -> Any:
+        """
+        Value of a key from the local tier, Redis or the loader
+
+        Args:
+            key: Reference key (without prefix)
+            loader: Function reading the value from the database; must
+                return JSON-serializable data (None is cached negatively)
+        """
+        if not self.enabled:
+            return loader()
+        local = self.local_max_entries > 0 and self._listening()
+        if local:
+            value = self.local.get(key, _MISSING)
+            if value is not _MISSING:
+                REFERENCE_METRICS['local'].labels(result='hit').inc()
+                return value
+            REFERENCE_METRICS['local'].labels(result='miss').inc()
+        else:
+            REFERENCE_METRICS['local'].labels(result='bypass').inc()
+
+        generation = self._generation
+        value = self.manager.get_or_set(f'{KEY_PREFIX}:{key}', loader)
+        if local and generation == self._generation:
+            self.local.set(key, value, self.local_ttl, self.local_max_entries)
+        return value
+
+    def invalidate(self, keys: Iterable[str]):
+        """Drop keys from Redis and from the local tier of every process"""
+        keys = list(keys)
+        if not keys:
+            return
+        self._drop(keys)
+        for key in keys:
+            self.manager.delete(f'{KEY_PREFIX}:{key}')
+        try:
+            get_redis_client().publish(CHANNEL, json.dumps(keys))
+        except redis.RedisError:
+            # Слушатели, не получившие сообщение, переподпишутся и очистят кеш
+            logger.warning("Failed to publish reference cache invalidation", exc_info=True)
+        REFERENCE_METRICS['invalidations'].labels(direction='published').inc(len(keys))
+
+    def _drop(self, keys: List[str]):
+        self._generation += 1
+        for key in keys:
+            self.local.discard(key)
+
+    def _listening(self) -> bool:
+        # После fork() поток слушателя родителя в дочернем процессе не существует
+        if self._pid != os.getpid() or self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._pid != os.getpid() or self._thread is None or not self._thread.is_alive():
+                    self.local.clear()
+                    self._subscribed.clear()
+                    self._pid = os.getpid()
+                    self._thread = threading.Thread(
+                        target=self._listen, name='reference-cache-listener', daemon=True
+                    )
+                    self._thread.start()
+        return self._subscribed.is_set()
+
+    def _listen(self):
+        backoff = 0.5
+        while True:
+            pubsub = None
+            try:
+                pubsub = get_redis_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+                self.local.clear()
+                self._subscribed.set()
+                backoff = 0.5
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None and message['type'] == 'message':
+                        keys = json.loads(message['data'])
+                        self._drop(keys)
+                        REFERENCE_METRICS['invalidations'].labels(direction='received').inc(len(keys))
+            except Exception:
+                logger.warning("Reference cache listener disconnected", exc_info=True)
+            finally:
+                self._subscribed.clear()
+                self.local.clear()
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+
+reference_cache = ReferenceCache()
+
+
+# Ключи справочников
+
+def tenant_configuration_key(tenant_id: int) -> str:
+    return f'tenant_config:{tenant_id}'
+
+
+def sla_key(tenant_id: int, priority: str) -> str:
+    return f'sla:{tenant_id}:{priority}'
+
+
+TAGS_KEY = 'tags'
+FEATURE_FLAGS_KEY = 'feature_flags'
+
+
+def tenant_configuration(tenant_id: int) -> Optional[Dict[str, Any]]:
+    """TenantConfiguration of a tenant as a dict (None if not configured)"""
+    def load():
+        from app.models import TenantConfiguration
+
+        fields = [
+            field.attname for field in TenantConfiguration._meta.concrete_fields
+            if field.name not in ('id', 'tenant', 'created_at', 'updated_at')
+        ]
+        return TenantConfiguration.objects.filter(tenant_id=tenant_id).values(*fields).first()
+
+    return reference_cache.get(tenant_configuration_key(tenant_id), load)
+
+
+def sla_for_priority(tenant_id: int, priority: str) -> Optional[Dict[str, Any]]:
+    """Active SLA of a tenant for a ticket priority (None if there is none)"""
+    def load():
+        from app.models import SLA
+
+        return SLA.objects.filter(tenant_id=tenant_id, priority=priority, is_active=True).values(
+            'id', 'name', 'priority', 'response_time', 'resolution_time'
+        ).first()
+
+    return reference_cache.get(sla_key(tenant_id, priority), load)
+
+
+def tag_list() -> List[Dict[str, Any]]:
+    """All tags ordered by name"""
+    def load():
+        from app.models import Tag
+
+        return list(Tag.objects.order_by('name').values('id', 'name', 'color', 'description'))
+
+    return reference_cache.get(TAGS_KEY, load)
+
+
+def tag_ids() -> Set[int]:
+    return {tag['id'] for tag in tag_list()}
+
+
+def feature_flags() -> Dict[str, Dict[str, Any]]:
+    """Feature flags by name with rollout, target tenants and dates"""
+    def load():
+        from app.models import FeatureFlag
+
+        flags = {}
+        for flag in FeatureFlag.objects.prefetch_related('target_tenants'):
+            flags[flag.name] = {
+                'is_enabled': flag.is_enabled,
+                'rollout_percentage': flag.rollout_percentage,
+                'target_tenants': [tenant.pk for tenant in flag.target_tenants.all()],
+                'start_date': flag.start_date.isoformat() if flag.start_date else None,
+                'end_date': flag.end_date.isoformat() if flag.end_date else None,
+            }
+        return flags
+
+    return reference_cache.get(FEATURE_FLAGS_KEY, load)
+
+
+def flag_enabled(flag: Dict[str, Any], user_id: int, tenant_id: Optional[int],
+                 now: Optional[datetime] = None) -> bool:
+    """
+    Whether a feature flag (from feature_flags) is on for a user
+
+    Rollout buckets come from a stable hash of the user id, so a user gets
+    the same answer in every worker process.
+    """
+    if not flag['is_enabled']:
+        return False
+    if flag['target_tenants'] and tenant_id not in flag['target_tenants']:
+        return False
+    now = now or timezone.now()
+    if flag['start_date'] and now < parse_datetime(flag['start_date']):
+        return False
+    if flag['end_date'] and now >= parse_datetime(flag['end_date']):
+        return False
+    if flag['rollout_percentage'] < 100:
+        return zlib.crc32(str(user_id).encode()) % 100 < flag['rollout_percentage']
+    return True
@@ -0,0 +1,195 @@
+"""
+Tenant-scoped HTTP response cache with conditional GET
+
+Read-heavy list endpoints are wrapped with `cached_response`. The
+response data is cached in Redis (CacheManager, TTL class 'response')
+under a key built from the view, the tenant, the user role, the accepted
+format and the query parameters, plus the current versions of the
+resources the endpoint reads.
+
+Every resource has a version counter per tenant (or a global one for
+resources shared by all tenants, like tags), bumped by model signals in
+app.signals. A bump makes all keys built with the old version unreachable;
+they expire with their TTL.
+
+Responses carry a strong ETag made of the resource versions and a digest
+of the cached data. A request with a matching If-None-Match gets 304 from
+the cached entry: only Redis is read, the view and its queries are not run.
+Anonymous requests, non-GET requests and errors are never cached.
+"""
+import functools
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from prometheus_client import Counter
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from app.core.performance_monitoring import CacheManager
+
+
+RESPONSE_CACHE_METRICS = {
+    'requests': Counter(
+        'response_cache_requests_total',
+        'Cached endpoint requests by result (hit, miss, not_modified, bypass)',
+        ['view', 'result']
+    ),
+}
+
+# Ресурс -> версия своя у каждого арендатора (True) или общая (False)
+RESOURCES = {
+    'knowledge_articles': True,
+    'knowledge_categories': True,
+    'tags': False,
+}
+
+KEY_PREFIX = 'response'
+
+
+def resource_namespace(resource: str, tenant_id: Optional[int]) -> str:
+    if RESOURCES[resource]:
+        return f'{KEY_PREFIX}:{resource}:{tenant_id}'
+    return f'{KEY_PREFIX}:{resource}'
+
+
+def user_role(user) -> str:
+    if user.is_superuser:
+        return 'superuser'
+    if user.is_staff:
+        return 'staff'
+    return 'user'
+
+
+class _Uncacheable(Exception):
+    """A response the view produced that must not be cached (not 200)"""
+
+    def __init__(self, response):
+        super().__init__(response.status_code)
+        self.response = response
+
+
+class ResponseCache:
+    """
+    Response data cache keyed by tenant, role and query
+
+    Args:
+        cache_manager: Redis tier (CacheManager)
+    """
+
+    def __init__(self, cache_manager: Optional[CacheManager] = None):
+        self.manager = cache_manager or CacheManager()
+
+    @property
+    def enabled(self) -> bool:
+        return getattr(settings, 'RESPONSE_CACHE_ENABLED', True)
+
+    def invalidate(self, resources: List[str], tenant_id: Optional[int] = None):
+        """Bump the versions of resources (of a tenant, for tenant-scoped ones)"""
+        for resource in resources:
+            self.manager.invalidate_namespace(resource_namespace(resource, tenant_id))
+
+    def key(self, view_name: str, request, versions: List[int]) -> str:
+        params = sorted((name, sorted(values)) for name, values in request.query_params.lists())
+        # Хост и путь входят в ключ: ссылки пагинации абсолютные
+        payload = [
+            request.user.tenant_id, user_role(request.user), request.accepted_renderer.format,
+            request.get_host(), request.path, params, versions,
+        ]
+        digest = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+        return f'{KEY_PREFIX}:{view_name}:{digest}'
+
+    def respond(self, view_name: str, resources: List[str], request, render) -> Response:
+        """
+        Cached response of a view, 304 for a matching If-None-Match
+
+        Args:
+            view_name: Label of the endpoint (metrics and key)
+            resources: Resources (RESOURCES) the endpoint reads
+            request: DRF request
+            render: Function calling the view
+        """
+        user = request.user
+        if not self.enabled or request.method not in ('GET', 'HEAD') or not user.is_authenticated:
+            RESPONSE_CACHE_METRICS['requests'].labels(view=view_name, result='bypass').inc()
+            return render()
+
+        versions = self.manager.namespace_versions(
+            [resource_namespace(resource, user.tenant_id) for resource in resources]
+        )
+        if versions is None:
+            RESPONSE_CACHE_METRICS['requests'].labels(view=view_name, result='bypass').inc()
+            return render()
+
+        computed = []
+
+        def fetch() -> Dict[str, Any]:
+            response = render()
+            if response.status_code != status.HTTP_200_OK:
+                raise _Uncacheable(response)
+            computed.append(True)
+            # Данные приводятся к JSON так же, как их отдаст JSONRenderer
+            data = json.loads(json.dumps(response.data, cls=JSONEncoder))
+            digest = hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()[:32]
+            return {'etag': '"{}-{}"'.format('.'.join(map(str, versions)), digest), 'data': data}
+
+        try:
+            entry = self.manager.get_or_set(self.key(view_name, request, versions), fetch)
+        except _Uncacheable as exc:
+            RESPONSE_CACHE_METRICS['requests'].labels(view=view_name, result='bypass').inc()
+            return exc.response
+
+        if self._matches(request, entry['etag']):
+            RESPONSE_CACHE_METRICS['requests'].labels(view=view_name, result='not_modified').inc()
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            result = 'miss' if computed else 'hit'
+            RESPONSE_CACHE_METRICS['requests'].labels(view=view_name, result=result).inc()
+            response = Response(entry['data'])
+        response['ETag'] = entry['etag']
+        # Ответ зависит от арендатора и роли: только кеш клиента, с ревалидацией
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    @staticmethod
+    def _matches(request, etag: str) -> bool:
+        header = request.META.get('HTTP_IF_NONE_MATCH')
+        if not header:
+            return False
+        # If-None-Match сравнивается слабо (RFC 9110, 13.1.2)
+        tags = [tag.strip() for tag in header.split(',')]
+        return '*' in tags or any((tag[2:] if tag.startswith('W/') else tag) == etag for tag in tags)
+
+
+response_cache = ResponseCache()
+
+
+def cached_response(*resources: str):
+    """
+    Cache a viewset method's GET response, see ResponseCache.respond
+
+    Args:
+        resources: Resources (RESOURCES) whose changes invalidate the response
+
+    Example:
+        @action(detail=False, methods=['get'])
+        @cached_response('knowledge_articles', 'tags')
+        def featured(self, request):
+            ...
+    """
+    unknown = set(resources) - set(RESOURCES)
+    if unknown:
+        raise ValueError(f"Unknown cached resources: {', '.join(sorted(unknown))}")
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            view_name = f'{type(self).__name__}.{method.__name__}'
+            return response_cache.respond(
+                view_name, list(resources), request, lambda: method(self, request, *args, **kwargs)
+            )
+        return wrapper
+    return decorator
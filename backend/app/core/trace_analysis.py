@@ -0,0 +1,242 @@
+"""
+Trace tree assembly and critical-path analysis
+
+All spans of a trace are loaded with one query on (tenant, trace_id) and
+linked into a tree in memory. For every span the analysis computes its
+self time (duration not covered by any child, overlapping children
+counted once) and the critical path: the chain of span segments that
+determined the end-to-end latency, found by walking back from the end
+of each span through the child that finished last.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+
+SPAN_FIELDS = (
+    'span_id', 'parent_span_id', 'operation_name', 'service_name', 'start_time',
+    'end_time', 'duration_ms', 'status_code', 'is_error', 'error_message',
+)
+
+
+class SpanNode:
+    """Span of a trace with links to its children"""
+
+    __slots__ = ('span', 'children', 'start', 'end', 'self_time', 'critical_time')
+
+    def __init__(self, span: Dict[str, Any], origin: datetime):
+        self.span = span
+        self.children: List['SpanNode'] = []
+        self.start = (span['start_time'] - origin).total_seconds() * 1000
+        self.end = max(self.start, (span['end_time'] - origin).total_seconds() * 1000)
+        self.self_time = 0.0
+        self.critical_time = 0.0
+
+    @property
+    def span_id(self) -> str:
+        return self.span['span_id']
+
+    def _fields(self) -> Dict[str, Any]:
+        data = {key: self.span[key] for key in SPAN_FIELDS if key not in ('start_time', 'end_time')}
+        data.update(
+            start_offset_ms=round(self.start, 3),
+            self_time_ms=round(self.self_time, 3),
+            critical_time_ms=round(self.critical_time, 3),
+            children=[],
+        )
+        return data
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the subtree (iterative, safe for deep traces)"""
+        root = self._fields()
+        # Словарь потомка добавляется к родителю сразу, заполняется при извлечении из стека
+        stack = [(self, root)]
+        while stack:
+            node, data = stack.pop()
+            for child in node.children:
+                child_data = child._fields()
+                data['children'].append(child_data)
+                stack.append((child, child_data))
+        return root
+
+
+def load_spans(tenant, trace_id: str) -> List[Dict[str, Any]]:
+    """Load all spans of a trace with a single (tenant, trace_id) index lookup"""
+    from app.models import PerformanceTrace
+
+    return list(
+        PerformanceTrace.objects.filter(tenant=tenant, trace_id=trace_id)
+        .order_by('start_time')
+        .values(*SPAN_FIELDS)
+    )
+
+
+def build_tree(spans: Sequence[Dict[str, Any]]) -> List[SpanNode]:
+    """
+    Link spans into trees
+
+    Spans whose parent is missing (not sampled or not yet exported) become
+    additional roots instead of being dropped. Spans linked into a parent
+    cycle (corrupt or colliding span ids) are reported the same way: the
+    cycle is cut at its earliest span, which becomes a root.
+
+    Returns:
+        Root nodes ordered by start time
+    """
+    if not spans:
+        return []
+    origin = min(span['start_time'] for span in spans)
+    nodes = {span['span_id']: SpanNode(span, origin) for span in spans}
+    roots = []
+    for node in nodes.values():
+        parent = nodes.get(node.span['parent_span_id'] or None)
+        if parent is None or parent is node:
+            roots.append(node)
+        else:
+            parent.children.append(node)
+
+    # Span, недостижимые от корней, замкнуты в цикл по parent_span_id
+    reachable = _reachable(roots)
+    if len(reachable) < len(nodes):
+        for node in sorted(nodes.values(), key=lambda node: (node.start, node.end)):
+            if id(node) in reachable:
+                continue
+            nodes[node.span['parent_span_id']].children.remove(node)
+            roots.append(node)
+            reachable |= _reachable([node])
+
+    for node in nodes.values():
+        node.children.sort(key=lambda child: (child.start, child.end))
+    roots.sort(key=lambda root: (root.start, root.end))
+    return roots
+
+
+def _reachable(roots: Sequence[SpanNode]) -> Set[int]:
+    """ids of nodes in the subtrees of roots"""
+    seen = set()
+    stack = list(roots)
+    while stack:
+        node = stack.pop()
+        if id(node) not in seen:
+            seen.add(id(node))
+            stack.extend(node.children)
+    return seen
+
+
+def _covered(node: SpanNode) -> float:
+    """Length of the union of child intervals clipped to the span"""
+    covered = 0.0
+    current_start = current_end = None
+    for child in node.children:
+        start, end = max(child.start, node.start), min(child.end, node.end)
+        if end <= start:
+            continue
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                covered += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        covered += current_end - current_start
+    return covered
+
+
+def compute_self_times(roots: Sequence[SpanNode]):
+    """Set self_time of every node (iterative, safe for deep traces)"""
+    stack = list(roots)
+    while stack:
+        node = stack.pop()
+        node.self_time = max(0.0, node.end - node.start - _covered(node))
+        stack.extend(node.children)
+
+
+def critical_path(root: SpanNode) -> List[Tuple[SpanNode, float, float]]:
+    """
+    Critical path of a span tree
+
+    Starting at the end of the root, time is attributed to the child that
+    finished last before the cursor; the walk then continues inside that
+    child and, after it, from the child's start. Gaps not covered by a
+    child are attributed to the span itself.
+
+    Returns:
+        Chronological list of (node, start_ms, end_ms) segments
+    """
+    segments: List[Tuple[SpanNode, float, float]] = []
+    # (node, cursor) — обход без рекурсии, сегменты собираются от конца к началу
+    stack: List[Tuple[SpanNode, float, Optional[List[SpanNode]]]] = [(root, root.end, None)]
+    while stack:
+        node, cursor, pending = stack.pop()
+        if pending is None:
+            pending = sorted(node.children, key=lambda child: child.end)
+        while pending:
+            child = pending.pop()
+            if child.start >= cursor:
+                continue
+            child_end = min(child.end, cursor)
+            if child_end < cursor:
+                segments.append((node, child_end, cursor))
+            # Продолжим родителя после обхода потомка
+            stack.append((node, max(child.start, node.start), pending))
+            stack.append((child, child_end, None))
+            break
+        else:
+            if cursor > node.start:
+                segments.append((node, node.start, cursor))
+    segments.reverse()
+
+    merged: List[Tuple[SpanNode, float, float]] = []
+    for node, start, end in segments:
+        if end <= start:
+            continue
+        if merged and merged[-1][0] is node and abs(merged[-1][2] - start) < 1e-9:
+            merged[-1] = (node, merged[-1][1], end)
+        else:
+            merged.append((node, start, end))
+    for node, start, end in merged:
+        node.critical_time += end - start
+    return merged
+
+
+def analyze_trace(spans: Sequence[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Build the span tree of a trace with self times and the critical path
+
+    The critical path is computed for the longest root (the request that
+    defines the trace latency); other roots are orphaned subtrees.
+
+    Returns:
+        Dict with duration, span tree and critical path, None for no spans
+    """
+    roots = build_tree(spans)
+    if not roots:
+        return None
+    compute_self_times(roots)
+    main = max(roots, key=lambda root: root.end - root.start)
+    path = critical_path(main)
+
+    by_operation: Dict[Tuple[str, str], float] = {}
+    for node, start, end in path:
+        key = (node.span['service_name'], node.span['operation_name'])
+        by_operation[key] = by_operation.get(key, 0.0) + end - start
+
+    return {
+        'duration_ms': round(main.end - main.start, 3),
+        'span_count': len(spans),
+        'error_count': sum(1 for span in spans if span['is_error']),
+        'roots': [root.to_dict() for root in roots],
+        'critical_path': [
+            {
+                'span_id': node.span_id,
+                'operation_name': node.span['operation_name'],
+                'service_name': node.span['service_name'],
+                'start_offset_ms': round(start, 3),
+                'duration_ms': round(end - start, 3),
+            }
+            for node, start, end in path
+        ],
+        'critical_path_by_operation': [
+            {'service_name': service, 'operation_name': operation, 'duration_ms': round(duration, 3)}
+            for (service, operation), duration in sorted(by_operation.items(), key=lambda item: -item[1])
+        ],
+    }
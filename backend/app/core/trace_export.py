@@ -0,0 +1,413 @@
+"""
+OpenTelemetry span sampling and export to PerformanceTrace
+
+Head sampling keeps TRACE_SAMPLE_RATIO of traces by trace_id (children
+follow their parent's decision). With tail sampling enabled the rest of
+the traces are recorded but not sampled: their spans are held in a
+bounded per-trace buffer until the local root span ends, and the whole
+trace is kept only if one of its spans failed or was slower than
+TRACE_SLOW_SPAN_MS. Kept spans go to a bounded in-process queue that a
+background thread writes to PerformanceTrace with bulk_create, so the
+request path never touches the database and never waits: when the queue
+is full, spans are dropped and counted.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone as dt_timezone
+from typing import Any, List, Optional, Sequence
+
+from django.conf import settings
+from django.db import close_old_connections
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+from opentelemetry.sdk.trace.sampling import (
+    Decision, ParentBased, Sampler, SamplingResult, TraceIdRatioBased,
+)
+from opentelemetry.trace import StatusCode
+from prometheus_client import Counter, Gauge, Histogram
+
+from app.core.batching import BackgroundBatcher
+
+
+logger = logging.getLogger(__name__)
+
+
+# Атрибуты span, которые экспортёр переносит в колонки PerformanceTrace
+TENANT_ATTRIBUTE = 'tenant.id'
+USER_ATTRIBUTE = 'user.id'
+SERVICE_ATTRIBUTE = 'service.name'
+STATUS_ATTRIBUTES = ('http.status_code', 'http.response.status_code')
+
+# Незавершённые трассы старше этого срока решаются без корневого span
+PENDING_TTL = 60.0
+
+TRACE_METRICS = {
+    'kept': Counter(
+        'trace_spans_kept_total',
+        'Spans kept for export by sampling decision',
+        ['reason']
+    ),
+    'discarded': Counter(
+        'trace_spans_discarded_total',
+        'Recorded spans discarded by tail sampling'
+    ),
+    'dropped': Counter(
+        'trace_spans_dropped_total',
+        'Kept spans lost before reaching the database',
+        ['reason']
+    ),
+    'exported': Counter(
+        'trace_spans_exported_total',
+        'Spans written to PerformanceTrace'
+    ),
+    'pending': Gauge(
+        'trace_tail_pending_spans',
+        'Spans held until their trace is complete'
+    ),
+    'queued': Gauge(
+        'trace_export_queue_size',
+        'Spans waiting in the export queue'
+    ),
+    'export_duration': Histogram(
+        'trace_export_duration_seconds',
+        'Time to write one batch of spans'
+    ),
+}
+
+
+class HeadTailSampler(Sampler):
+    """
+    Parent-based trace id ratio sampler
+
+    Spans the ratio sampler drops are still recorded (RECORD_ONLY) when
+    tail sampling is on, so TailSamplingProcessor can keep the trace if it
+    turns out to be failed or slow.
+    """
+
+    def __init__(self, ratio: float, tail: bool = True):
+        self._head = ParentBased(TraceIdRatioBased(ratio))
+        self._tail = tail
+
+    def should_sample(self, parent_context, trace_id, name, kind=None, attributes=None,
+                      links=None, trace_state=None) -> SamplingResult:
+        result = self._head.should_sample(
+            parent_context, trace_id, name, kind=kind, attributes=attributes,
+            links=links, trace_state=trace_state,
+        )
+        if result.decision is Decision.DROP and self._tail:
+            # SDK берёт атрибуты span из результата сэмплера, а не из вызова
+            return SamplingResult(Decision.RECORD_ONLY, attributes, result.trace_state)
+        return result
+
+    def get_description(self) -> str:
+        return f"HeadTailSampler{{{self._head.get_description()}, tail={self._tail}}}"
+
+
+def _duration_ms(span: ReadableSpan) -> float:
+    return max(0, (span.end_time or 0) - (span.start_time or 0)) / 1e6
+
+
+def _http_status(span: ReadableSpan) -> Optional[int]:
+    for key in STATUS_ATTRIBUTES:
+        value = span.attributes.get(key)
+        if value is not None:
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+def _is_error(span: ReadableSpan) -> bool:
+    if span.status.status_code is StatusCode.ERROR:
+        return True
+    status = _http_status(span)
+    return status is not None and status >= 500
+
+
+class _PendingTrace:
+    __slots__ = ('created', 'spans', 'reason')
+
+    def __init__(self):
+        self.created = time.monotonic()
+        self.spans: List[ReadableSpan] = []
+        self.reason: Optional[str] = None
+
+
+class TailSamplingProcessor(SpanProcessor):
+    """
+    Route finished spans to the export queue
+
+    Spans inherit the tenant.id and user.id attributes of their parent.
+    Sampled spans are queued immediately. Recorded-only spans wait for the
+    local root of their trace; the trace is queued if any of its spans was
+    an error or slow, otherwise it is discarded. At most `max_pending`
+    spans are held; beyond that (or after PENDING_TTL) the oldest traces
+    are decided early.
+    """
+
+    def __init__(self, queue: 'SpanExportQueue', slow_ms: Optional[int] = None,
+                 max_pending: Optional[int] = None):
+        self.queue = queue
+        self.slow_ms = slow_ms if slow_ms is not None else getattr(settings, 'TRACE_SLOW_SPAN_MS', 1000)
+        self.max_pending = max_pending or getattr(settings, 'TRACE_TAIL_MAX_PENDING_SPANS', 20000)
+        self._pending: 'OrderedDict[int, _PendingTrace]' = OrderedDict()
+        self._pending_spans = 0
+        self._lock = threading.Lock()
+
+    def _reason(self, span: ReadableSpan) -> Optional[str]:
+        if _is_error(span):
+            return 'error'
+        if _duration_ms(span) >= self.slow_ms:
+            return 'slow'
+        return None
+
+    def on_start(self, span, parent_context=None) -> None:
+        # Арендатор и пользователь задаются на корневом span запроса;
+        # дочерние span наследуют их, иначе строки останутся без арендатора
+        parent = trace.get_current_span(parent_context)
+        parent_attributes = getattr(parent, 'attributes', None)
+        if not parent_attributes or not span.is_recording():
+            return
+        for key in (TENANT_ATTRIBUTE, USER_ATTRIBUTE):
+            if key in parent_attributes and key not in span.attributes:
+                span.set_attribute(key, parent_attributes[key])
+
+    def on_end(self, span: ReadableSpan) -> None:
+        if span.context.trace_flags.sampled:
+            TRACE_METRICS['kept'].labels(reason='head').inc()
+            self.queue.put(span)
+            return
+
+        reason = self._reason(span)
+        local_root = span.parent is None or span.parent.is_remote
+        decided = []
+        with self._lock:
+            pending = self._pending.get(span.context.trace_id)
+            if local_root:
+                if pending is not None:
+                    del self._pending[span.context.trace_id]
+                    self._pending_spans -= len(pending.spans)
+                else:
+                    pending = _PendingTrace()
+                pending.spans.append(span)
+                pending.reason = pending.reason or reason
+                decided.append(pending)
+            else:
+                if pending is None:
+                    pending = self._pending[span.context.trace_id] = _PendingTrace()
+                pending.spans.append(span)
+                pending.reason = pending.reason or reason
+                self._pending_spans += 1
+            decided.extend(self._evict())
+            TRACE_METRICS['pending'].set(self._pending_spans)
+
+        for pending in decided:
+            self._decide(pending)
+
+    def _evict(self) -> List[_PendingTrace]:
+        evicted = []
+        deadline = time.monotonic() - PENDING_TTL
+        while self._pending:
+            oldest = next(iter(self._pending.values()))
+            if self._pending_spans <= self.max_pending and oldest.created > deadline:
+                break
+            self._pending.popitem(last=False)
+            self._pending_spans -= len(oldest.spans)
+            evicted.append(oldest)
+        return evicted
+
+    def _decide(self, pending: _PendingTrace):
+        if pending.reason is None:
+            TRACE_METRICS['discarded'].inc(len(pending.spans))
+            return
+        TRACE_METRICS['kept'].labels(reason=pending.reason).inc(len(pending.spans))
+        self.queue.put_many(pending.spans)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+            self._pending_spans = 0
+        for entry in pending:
+            self._decide(entry)
+        self.queue.flush()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        self.queue.flush()
+        return True
+
+
+def _json_value(value: Any) -> Any:
+    if isinstance(value, (tuple, list)):
+        return [_json_value(item) for item in value]
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+def _datetime(nanoseconds: Optional[int]) -> datetime:
+    return datetime.fromtimestamp((nanoseconds or 0) / 1e9, tz=dt_timezone.utc)
+
+
+def span_to_trace(span: ReadableSpan):
+    """Build an unsaved PerformanceTrace row from a finished span"""
+    from app.models import PerformanceTrace
+
+    attributes = dict(span.attributes or {})
+    service = attributes.pop(SERVICE_ATTRIBUTE, None) or (
+        span.resource.attributes.get(SERVICE_ATTRIBUTE) if span.resource else None
+    ) or getattr(settings, 'TRACE_SERVICE_NAME', 'worker-net-api')
+    tenant_id = attributes.pop(TENANT_ATTRIBUTE, None)
+    user_id = attributes.pop(USER_ATTRIBUTE, None)
+
+    error_message = span.status.description or ''
+    logs = []
+    for event in span.events:
+        event_attributes = {key: _json_value(value) for key, value in (event.attributes or {}).items()}
+        if event.name == 'exception' and not error_message:
+            error_message = str(event_attributes.get('exception.message', ''))
+        logs.append({
+            'name': event.name,
+            'timestamp': _datetime(event.timestamp).isoformat(),
+            'attributes': event_attributes,
+        })
+
+    return PerformanceTrace(
+        trace_id=format(span.context.trace_id, '032x'),
+        span_id=format(span.context.span_id, '016x'),
+        parent_span_id=format(span.parent.span_id, '016x') if span.parent else '',
+        operation_name=span.name[:200],
+        service_name=str(service)[:100],
+        start_time=_datetime(span.start_time),
+        end_time=_datetime(span.end_time),
+        duration_ms=int(round(_duration_ms(span))),
+        status_code=_http_status(span),
+        is_error=_is_error(span),
+        error_message=error_message,
+        tags={key: _json_value(value) for key, value in attributes.items()},
+        logs=logs,
+        tenant_id=int(tenant_id) if tenant_id is not None else None,
+        user_id=int(user_id) if user_id is not None else None,
+    )
+
+
+class PerformanceTraceExporter(SpanExporter):
+    """Write spans to PerformanceTrace with one bulk_create per batch"""
+
+    def __init__(self, batch_size: Optional[int] = None, using: str = 'default'):
+        self.batch_size = batch_size or getattr(settings, 'TRACE_EXPORT_BATCH_SIZE', 512)
+        self.using = using
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        from app.models import PerformanceTrace
+
+        rows = []
+        for span in spans:
+            try:
+                rows.append(span_to_trace(span))
+            except (TypeError, ValueError):
+                TRACE_METRICS['dropped'].labels(reason='invalid').inc()
+                logger.warning("Skipping span %r with invalid attributes", span.name, exc_info=True)
+        if not rows:
+            return SpanExportResult.SUCCESS
+
+        started = time.perf_counter()
+        try:
+            # Повторная выгрузка того же span (trace_id, span_id) не ошибка
+            PerformanceTrace.objects.using(self.using).bulk_create(
+                rows, batch_size=self.batch_size, ignore_conflicts=True
+            )
+        except Exception:
+            TRACE_METRICS['dropped'].labels(reason='export_error').inc(len(rows))
+            logger.exception("Failed to export %s spans", len(rows))
+            close_old_connections()
+            return SpanExportResult.FAILURE
+        finally:
+            TRACE_METRICS['export_duration'].observe(time.perf_counter() - started)
+        TRACE_METRICS['exported'].inc(len(rows))
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self) -> None:
+        pass
+
+
+class SpanExportQueue(BackgroundBatcher):
+    """
+    Bounded span queue drained by a background thread
+
+    `put` never blocks: a span that does not fit into `max_queue` is
+    dropped. The flusher exports a batch as soon as `batch_size` spans
+    are queued or `flush_interval` seconds after the oldest one.
+    """
+
+    thread_name = 'trace-export-flusher'
+
+    def __init__(self, exporter: Optional[SpanExporter] = None, batch_size: Optional[int] = None,
+                 flush_interval: Optional[float] = None, max_queue: Optional[int] = None):
+        super().__init__(
+            batch_size=batch_size or getattr(settings, 'TRACE_EXPORT_BATCH_SIZE', 512),
+            flush_interval=flush_interval or getattr(settings, 'TRACE_EXPORT_FLUSH_MS', 1000) / 1000.0,
+            max_size=max_queue or getattr(settings, 'TRACE_EXPORT_MAX_QUEUE', 10000),
+        )
+        self.exporter = exporter or PerformanceTraceExporter()
+
+    def put(self, span: ReadableSpan):
+        self.put_many((span,))
+
+    def put_many(self, spans: Sequence[ReadableSpan]):
+        accepted = self.add_nowait(spans)
+        if accepted < len(spans):
+            TRACE_METRICS['dropped'].labels(reason='queue_full').inc(len(spans) - accepted)
+
+    def buffer_changed(self, size: int):
+        TRACE_METRICS['queued'].set(size)
+
+    def process_batch(self, batch: List[ReadableSpan]) -> int:
+        try:
+            self.exporter.export(batch)
+        except Exception:
+            TRACE_METRICS['dropped'].labels(reason='export_error').inc(len(batch))
+            logger.exception("Span exporter failed")
+        return len(batch)
+
+
+span_export_queue = SpanExportQueue()
+atexit.register(lambda: span_export_queue.flush() if span_export_queue.buffered else None)
+
+_configure_lock = threading.Lock()
+_processor: Optional[TailSamplingProcessor] = None
+
+
+def configure_tracing() -> TailSamplingProcessor:
+    """
+    Install the sampler and the PerformanceTrace export pipeline (idempotent)
+
+    If an SDK tracer provider is already installed (e.g. by the
+    opentelemetry-instrument launcher), only the span processor is added
+    to it and that provider's sampler stays in charge.
+    """
+    global _processor
+    with _configure_lock:
+        if _processor is not None:
+            return _processor
+        _processor = TailSamplingProcessor(span_export_queue)
+        provider = trace.get_tracer_provider()
+        if not isinstance(provider, TracerProvider):
+            provider = TracerProvider(
+                sampler=HeadTailSampler(
+                    ratio=getattr(settings, 'TRACE_SAMPLE_RATIO', 0.1),
+                    tail=getattr(settings, 'TRACE_TAIL_SAMPLING', True),
+                ),
+                resource=Resource.create({
+                    SERVICE_ATTRIBUTE: getattr(settings, 'TRACE_SERVICE_NAME', 'worker-net-api'),
+                }),
+            )
+            trace.set_tracer_provider(provider)
+        provider.add_span_processor(_processor)
+        return _processor
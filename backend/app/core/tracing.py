@@ -0,0 +1,206 @@
+"""
+Span decorator and trace context propagation
+
+`traced` wraps sync and async callables in a span. The span status
+comes from the outcome of the call: an exception is recorded on the span
+and marks it as an error, a response with a 5xx status code does the
+same, any other return value is a success.
+
+Context propagation:
+- database_sync_to_async / sync_to_async run the function in a copy of
+  the caller's contextvars, so spans opened there are children of the
+  awaiting coroutine's span without extra work;
+- Celery: the current context is injected into the task message headers
+  on publish (W3C traceparent) and extracted by the worker, which runs
+  every task inside a CONSUMER span.
+"""
+import functools
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction
+from celery import signals
+from django.conf import settings
+from opentelemetry import context as otel_context, propagate, trace
+from opentelemetry.trace import SpanKind, Status, StatusCode
+
+from app.core.trace_export import TENANT_ATTRIBUTE, USER_ATTRIBUTE
+
+
+# Прокси-tracer: после configure_tracing() он работает через настроенный провайдер
+_tracer = trace.get_tracer('app')
+
+
+def get_tracer() -> trace.Tracer:
+    return _tracer
+
+
+def set_tracer(tracer: trace.Tracer):
+    """Replace the tracer used by `traced` (benchmarks compare sampling setups with it)"""
+    global _tracer
+    _tracer = tracer
+
+
+def tracing_enabled() -> bool:
+    return getattr(settings, 'TRACE_ENABLED', True)
+
+
+def _call_user(args):
+    # Консюмеры: self.scope['user']; представления: self.request.user или request.user
+    if not args:
+        return None
+    owner = args[0]
+    scope = getattr(owner, 'scope', None)
+    if isinstance(scope, dict):
+        user = scope.get('user')
+    else:
+        request = getattr(owner, 'request', owner)
+        user = getattr(request, 'user', None)
+    # Ленивый пользователь не вычисляется здесь: в async-коде это запрос к БД
+    return getattr(user, '_wrapped', user)
+
+
+def _start_attributes(operation_type: str, args) -> Dict[str, Any]:
+    attributes = {'operation.type': operation_type}
+    user = _call_user(args)
+    if getattr(user, 'is_authenticated', False):
+        attributes[USER_ATTRIBUTE] = user.id
+        if getattr(user, 'tenant_id', None) is not None:
+            attributes[TENANT_ATTRIBUTE] = user.tenant_id
+    return attributes
+
+
+def _record_result(span: trace.Span, result: Any):
+    status_code = getattr(result, 'status_code', None)
+    if isinstance(status_code, int):
+        span.set_attribute('http.status_code', status_code)
+        if status_code >= 500:
+            span.set_status(Status(StatusCode.ERROR, f"HTTP {status_code}"))
+            span.set_attribute('status', 'error')
+            return
+    span.set_attribute('status', 'success')
+
+
+def _record_exception(span: trace.Span, exc: BaseException):
+    span.record_exception(exc)
+    span.set_status(Status(StatusCode.ERROR, f"{type(exc).__name__}: {exc}"))
+    span.set_attribute('status', 'error')
+
+
+def traced(operation_name: Optional[str] = None, operation_type: str = 'function',
+           kind: SpanKind = SpanKind.INTERNAL):
+    """
+    Decorator that runs a sync or async callable inside a span
+
+    Args:
+        operation_name: Span name, the function's qualified name by default
+        operation_type: Value of the operation.type attribute
+        kind: Span kind
+
+    Attributes are only computed for recording spans, so calls that are
+    not sampled cost one non-recording span.
+    """
+    def decorator(func):
+        name = operation_name or func.__qualname__
+
+        def start():
+            return _tracer.start_as_current_span(
+                name, kind=kind, record_exception=False, set_status_on_exception=False
+            )
+
+        if iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not tracing_enabled():
+                    return await func(*args, **kwargs)
+                with start() as span:
+                    recording = span.is_recording()
+                    if recording:
+                        span.set_attributes(_start_attributes(operation_type, args))
+                    try:
+                        result = await func(*args, **kwargs)
+                    except Exception as exc:
+                        if recording:
+                            _record_exception(span, exc)
+                        raise
+                    if recording:
+                        _record_result(span, result)
+                    return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracing_enabled():
+                return func(*args, **kwargs)
+            with start() as span:
+                recording = span.is_recording()
+                if recording:
+                    span.set_attributes(_start_attributes(operation_type, args))
+                try:
+                    result = func(*args, **kwargs)
+                except Exception as exc:
+                    if recording:
+                        _record_exception(span, exc)
+                    raise
+                if recording:
+                    _record_result(span, result)
+                return result
+        return wrapper
+    return decorator
+
+
+# Celery: task_id -> (span, токен контекста); prerun и postrun идут в одном потоке
+_task_spans: Dict[str, Tuple[trace.Span, object]] = {}
+_task_spans_lock = threading.Lock()
+
+
+@signals.before_task_publish.connect
+def inject_task_context(headers=None, **kwargs):
+    """Put the current trace context into the task message headers"""
+    if headers is not None and tracing_enabled():
+        propagate.inject(headers)
+
+
+@signals.task_prerun.connect
+def start_task_span(task_id=None, task=None, **kwargs):
+    """Open the worker span of a task as a child of the publisher's context"""
+    if task is None or not tracing_enabled():
+        return
+    carrier = {
+        key: value for key in ('traceparent', 'tracestate')
+        if (value := getattr(task.request, key, None))
+    }
+    parent = propagate.extract(carrier)
+    span = _tracer.start_span(f"celery.task {task.name}", context=parent, kind=SpanKind.CONSUMER)
+    if span.is_recording():
+        span.set_attributes({
+            'operation.type': 'celery_task',
+            'celery.task_id': task_id or '',
+            'celery.retries': task.request.retries or 0,
+        })
+    token = otel_context.attach(trace.set_span_in_context(span, parent))
+    with _task_spans_lock:
+        _task_spans[task_id] = (span, token)
+
+
+@signals.task_failure.connect
+def record_task_failure(task_id=None, exception=None, **kwargs):
+    with _task_spans_lock:
+        entry = _task_spans.get(task_id)
+    if entry is not None and exception is not None and entry[0].is_recording():
+        _record_exception(entry[0], exception)
+
+
+@signals.task_postrun.connect
+def end_task_span(task_id=None, state=None, **kwargs):
+    with _task_spans_lock:
+        entry = _task_spans.pop(task_id, None)
+    if entry is None:
+        return
+    span, token = entry
+    if span.is_recording():
+        span.set_attribute('celery.state', state or '')
+        if state != 'FAILURE':
+            span.set_attribute('status', 'success')
+    otel_context.detach(token)
+    span.end()
@@ -0,0 +1,104 @@
+"""
+Кодирование кадров WebSocket: JSON-текст или MessagePack-бинарные кадры.
+
+Кодировка согласуется при подключении через подпротокол WebSocket
+(Sec-WebSocket-Protocol): клиент перечисляет поддерживаемые варианты,
+сервер выбирает первый из SUBPROTOCOLS, который предложил клиент.
+Без подпротокола используется JSON, как раньше.
+
+События групп кодируются один раз в group_event(): в событие кладутся
+готовые кадры для всех кодировок, а консюмеры получателей только выбирают
+нужный кадр. permessage-deflate согласует сам ASGI-сервер (uvicorn с
+библиотекой websockets включает его по умолчанию; daphne не поддерживает),
+приложению для этого ничего делать не нужно.
+"""
+import json
+from typing import Any, Dict, Optional, Tuple
+
+import msgpack
+
+
+JSON = 'json'
+MSGPACK = 'msgpack'
+
+# Подпротокол -> кодировка, в порядке предпочтения сервера
+SUBPROTOCOLS = {
+    'workernet.msgpack': MSGPACK,
+    'workernet.json': JSON,
+}
+
+
+def negotiate(scope) -> Tuple[str, Optional[str]]:
+    """
+    Выбрать кодировку по подпротоколам, предложенным клиентом.
+
+    Returns:
+        (кодировка, подпротокол для accept() или None)
+    """
+    offered = scope.get('subprotocols') or []
+    for subprotocol, encoding in SUBPROTOCOLS.items():
+        if subprotocol in offered:
+            return encoding, subprotocol
+    return JSON, None
+
+
+def encode(payload: Dict[str, Any], encoding: str):
+    """Закодировать полезную нагрузку: str для JSON, bytes для MessagePack."""
+    if encoding == MSGPACK:
+        return msgpack.packb(payload, use_bin_type=True)
+    return json.dumps(payload)
+
+
+def encode_frames(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Готовые кадры полезной нагрузки для всех кодировок."""
+    return {JSON: encode(payload, JSON), MSGPACK: encode(payload, MSGPACK)}
+
+
+def decode(text_data: Optional[str] = None, bytes_data: Optional[bytes] = None) -> Dict[str, Any]:
+    """
+    Разобрать входящий кадр: текст как JSON, бинарный как MessagePack.
+
+    Raises:
+        ValueError: кадр не удалось разобрать или это не объект
+    """
+    if text_data is not None:
+        data = json.loads(text_data)
+    else:
+        try:
+            data = msgpack.unpackb(bytes_data, raw=False)
+        except Exception as exc:
+            raise ValueError(str(exc)) from exc
+    if not isinstance(data, dict):
+        raise ValueError("Frame must be an object")
+    return data
+
+
+def group_event(handler: str, group: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Событие для channel_layer.group_send с заранее закодированными кадрами.
+
+    Args:
+        handler: Имя метода-обработчика консюмера
+        group: Группа получателей (нужна мультиплексору)
+        payload: Сообщение для клиента
+    """
+    return {'type': handler, 'group': group, 'frames': encode_frames(payload)}
+
+
+def wrap_prefix(topic: str, encoding: str):
+    """
+    Начало кадра {"topic": topic, "event": <кадр>} для мультиплексора.
+
+    Готовый кадр делегата дописывается в конец без повторной сериализации:
+    для JSON — как текст, для MessagePack — как значение карты из двух пар.
+    """
+    if encoding == MSGPACK:
+        return b'\x82' + msgpack.packb('topic') + msgpack.packb(topic) + msgpack.packb('event')
+    return '{"topic": %s, "event": ' % json.dumps(topic)
+
+
+def wrap(prefix, frame):
+    """Дописать кадр делегата к префиксу wrap_prefix()."""
+    if isinstance(frame, bytes):
+        return prefix + frame
+    return prefix + frame + '}'
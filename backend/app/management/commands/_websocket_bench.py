@@ -0,0 +1,88 @@
+"""
+Общие помощники нагрузочных тестов WebSocket на WebsocketCommunicator.
+"""
+from contextlib import contextmanager
+
+from channels.routing import URLRouter
+from channels.testing.websocket import WebsocketCommunicator
+from django.core.management.base import CommandError
+from django.utils import timezone
+
+from app.api.routing import websocket_urlpatterns
+from app.core import redis_client
+from app.models import Tenant, User
+
+
+def in_memory_layer(capacity=100):
+    """Настройки CHANNEL_LAYERS с in-memory слоем: Redis не нужен."""
+    return {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+            'CONFIG': {'capacity': capacity},
+        }
+    }
+
+
+@contextmanager
+def fake_redis_clients():
+    """
+    Подменить общие клиенты Redis на fakeredis (requirements-dev.txt).
+
+    Консюмеры идут штатным путём с Redis (write-behind, история, presence)
+    без живого сервера. Подмена действует только до первого обращения
+    компонентов к клиенту, поэтому включается в начале команды.
+    """
+    try:
+        import fakeredis
+    except ImportError:
+        raise CommandError("--fake-redis требует пакет fakeredis (requirements-dev.txt)")
+
+    server = fakeredis.FakeServer()
+    saved = redis_client._client, redis_client._async_client
+    redis_client._client = fakeredis.FakeRedis(server=server)
+    redis_client._async_client = fakeredis.FakeAsyncRedis(server=server)
+    try:
+        yield
+    finally:
+        redis_client._client, redis_client._async_client = saved
+
+
+def create_agents(count, prefix='ws-bench'):
+    """
+    Создать арендатора и агентов для теста.
+
+    database_sync_to_async закрывает соединение внутри транзакции, поэтому
+    данные фиксируются; вызывающий удаляет арендатора (каскадно) в конце.
+    """
+    suffix = timezone.now().strftime('%Y%m%d%H%M%S%f')
+    tenant = Tenant.objects.create(
+        name=f"{prefix}-{suffix}", slug=f"{prefix}-{suffix}", domain=f"{prefix}-{suffix}.local"
+    )
+    return [
+        User.objects.create_user(
+            username=f"{prefix}-{suffix}-{i}", email=f"{prefix}-{suffix}-{i}@example.com",
+            tenant=tenant
+        )
+        for i in range(count)
+    ]
+
+
+def websocket_application():
+    """ASGI-приложение с маршрутами WebSocket без проверки Origin и сессий."""
+    return URLRouter(websocket_urlpatterns)
+
+
+async def connect(application, path, user, subprotocols=None):
+    """Открыть соединение от имени пользователя."""
+    communicator = WebsocketCommunicator(application, path, subprotocols=subprotocols)
+    communicator.scope['user'] = user
+    connected, _ = await communicator.connect()
+    if not connected:
+        raise RuntimeError(f"Connection to {path} rejected")
+    return communicator
+
+
+async def drain(communicator, timeout=0.01):
+    """Прочитать кадры, уже отправленные сервером (история, счётчики)."""
+    while not await communicator.receive_nothing(timeout=timeout):
+        await communicator.receive_output()
@@ -0,0 +1,22 @@
+"""
+Построить недостающие сводки бесед (ChatConversation) по истории чата.
+
+Сводки поддерживаются только для существующих строк: участник комнаты
+без строки (история старше таблицы сводок) не получает приращений
+непрочитанных. Миграция 0011 создаёт такие строки один раз; команда
+повторяет это, например после импорта истории.
+
+Пример:
+    python manage.py backfill_chat_conversations
+"""
+from django.core.management.base import BaseCommand
+
+from app.core.chat_conversations import backfill_all_conversations
+
+
+class Command(BaseCommand):
+    help = "Создать недостающие сводки бесед чата по истории сообщений"
+
+    def handle(self, *args, **options):
+        created = backfill_all_conversations()
+        self.stdout.write(f"Создано сводок бесед: {created}")
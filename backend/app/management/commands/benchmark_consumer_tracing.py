@@ -0,0 +1,131 @@
+"""
+Бенчмарк накладных расходов трассировки консюмеров WebSocket.
+
+Гоняет сообщения через TicketConsumer (status_update: запись в БД и
+рассылка в группу) и NotificationConsumer (mark_read: запрос к БД) в
+режимах:
+    off        TRACE_ENABLED=False, декоратор сразу вызывает функцию
+    unsampled  трасса не попала в выборку, tail sampling выключен
+    tail       трасса не в выборке, span записываются и отбрасываются
+    sampled    все span в выборке и уходят в очередь экспорта
+
+Экспортёр в бенчмарке только считает span: запись в PerformanceTrace
+идёт в фоновом потоке и в задержку сообщения не входит.
+
+Пример:
+    python manage.py benchmark_consumer_tracing --messages 2000
+"""
+import statistics
+import time
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+from app.core import tracing
+from app.core.trace_export import HeadTailSampler, SpanExportQueue, TailSamplingProcessor
+from app.management.commands._websocket_bench import (
+    connect, create_agents, drain, in_memory_layer, websocket_application
+)
+from app.models import Ticket
+
+
+MODES = {
+    'off': None,
+    'unsampled': (0.0, False),
+    'tail': (0.0, True),
+    'sampled': (1.0, False),
+}
+
+
+class CountingExporter(SpanExporter):
+    """Экспортёр, который только считает span."""
+
+    def __init__(self):
+        self.count = 0
+
+    def export(self, spans):
+        self.count += len(spans)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+
+class Command(BaseCommand):
+    help = "Измерить накладные расходы трассировки на сообщение WebSocket по режимам сэмплирования"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=1000,
+                            help="Сообщений на консюмер и режим")
+        parser.add_argument('--warmup', type=int, default=100,
+                            help="Сообщений прогрева перед замером")
+
+    def handle(self, *args, **options):
+        user = create_agents(1, prefix='trace-bench')[0]
+        ticket = Ticket.objects.create(
+            title="Trace benchmark", description="Trace benchmark",
+            created_by=user, tenant=user.tenant
+        )
+        previous = tracing.get_tracer()
+        try:
+            with override_settings(CHANNEL_LAYERS=in_memory_layer(capacity=1000)):
+                async_to_sync(self._run)(user, ticket, options)
+        finally:
+            tracing.set_tracer(previous)
+            user.tenant.delete()
+
+    async def _run(self, user, ticket, options):
+        flows = {
+            'ticket': (f'/ws/tickets/{ticket.ticket_id}/',
+                       lambda n: {'type': 'status_update', 'status': ('open', 'in_progress')[n % 2]}),
+            'notifications': ('/ws/notifications/',
+                              lambda n: {'type': 'mark_read', 'notification_id': 0}),
+        }
+        self.stdout.write(
+            f"{'consumer':>14} {'mode':>10} {'mean_us':>9} {'p50_us':>9} {'p99_us':>9} "
+            f"{'overhead_us':>12} {'spans/msg':>10}"
+        )
+        for consumer, (path, message) in flows.items():
+            baseline = None
+            for mode, sampling in MODES.items():
+                timings, spans = await self._measure(path, message, user, sampling, options)
+                mean = statistics.fmean(timings)
+                baseline = mean if baseline is None else baseline
+                ordered = sorted(timings)
+                self.stdout.write(
+                    f"{consumer:>14} {mode:>10} {mean:>9.1f} {ordered[len(ordered) // 2]:>9.1f} "
+                    f"{ordered[int(len(ordered) * 0.99)]:>9.1f} {mean - baseline:>12.1f} "
+                    f"{spans / len(timings):>10.2f}"
+                )
+
+    async def _measure(self, path, message, user, sampling, options):
+        exporter = CountingExporter()
+        queue = SpanExportQueue(exporter=exporter, flush_interval=0.05)
+        if sampling is not None:
+            ratio, tail = sampling
+            provider = TracerProvider(sampler=HeadTailSampler(ratio, tail=tail))
+            provider.add_span_processor(TailSamplingProcessor(queue))
+            tracing.set_tracer(provider.get_tracer('benchmark'))
+
+        with override_settings(TRACE_ENABLED=sampling is not None):
+            communicator = await connect(websocket_application(), path, user)
+            await drain(communicator)
+            timings = []
+            total = options['warmup'] + options['messages']
+            for n in range(total):
+                if n == options['warmup']:
+                    # Span подключения и прогрева не входят в счёт на сообщение
+                    queue.flush()
+                    exporter.count = 0
+                started = time.perf_counter()
+                await communicator.send_json_to(message(n))
+                await communicator.receive_output()
+                if n >= options['warmup']:
+                    timings.append((time.perf_counter() - started) * 1e6)
+            await communicator.disconnect()
+
+        queue.flush()
+        return timings, exporter.count
@@ -0,0 +1,103 @@
+"""
+Бенчмарк пакетного приёма PerformanceMetric: образцов в секунду на воркер.
+
+Сравнивает поштучную запись через ORM (как в PerformanceMetricViewSet.create)
+с parse_samples + MetricIngestBuffer (COPY на PostgreSQL, executemany в других СУБД).
+Пакетный путь включает обновление агрегатов 1m/1h/1d. Записанные
+образцы и агрегаты удаляются после замера.
+
+Пример:
+    python manage.py benchmark_metric_ingest --samples 200000 --request-size 500 --min-throughput 50000
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from app.core.metric_ingest import MetricIngestBuffer, parse_samples
+from app.models import PerformanceMetric, PerformanceMetricRollup
+
+
+BENCH_SERVICE = 'ingest-bench'
+
+
+class Command(BaseCommand):
+    help = "Измерить пропускную способность приёма метрик, образцов/с на воркер"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=100000,
+                            help="Число образцов для пакетного приёма")
+        parser.add_argument('--request-size', type=int, default=500,
+                            help="Образцов в одном запросе ingest")
+        parser.add_argument('--naive-samples', type=int, default=2000,
+                            help="Число образцов для поштучной записи (0 — пропустить)")
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help="Размер пакета записи")
+        parser.add_argument('--min-throughput', type=float,
+                            help="Ошибка, если пакетный приём медленнее, образцов/с")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"database={connection.vendor}")
+        try:
+            if options['naive_samples']:
+                naive = self._naive(options['naive_samples'])
+                self.stdout.write(f"{'create() per sample':>24} {naive:>10.0f} образцов/с")
+            batched = self._batched(options)
+            self.stdout.write(f"{'ingest buffer':>24} {batched:>10.0f} образцов/с")
+        finally:
+            PerformanceMetric.objects.filter(service=BENCH_SERVICE).delete()
+            PerformanceMetricRollup.objects.filter(service=BENCH_SERVICE).delete()
+
+        if options['min_throughput'] is not None and batched < options['min_throughput']:
+            raise CommandError(
+                f"Пропускная способность {batched:.0f}/с < {options['min_throughput']:.0f}/с"
+            )
+
+    def _naive(self, count):
+        samples = self._samples(count)
+        started = time.perf_counter()
+        for sample in samples:
+            PerformanceMetric.objects.create(timestamp=timezone.now(), **sample)
+        return count / (time.perf_counter() - started)
+
+    def _batched(self, options):
+        request_size = options['request_size']
+        requests = [
+            self._samples(request_size)
+            for _ in range(max(1, options['samples'] // request_size))
+        ]
+        total = sum(len(r) for r in requests)
+        buffer = MetricIngestBuffer(
+            batch_size=options['batch_size'], flush_interval=0.05,
+            max_buffer=max(options['batch_size'] * 4, request_size), submit_timeout=30
+        )
+
+        started = time.perf_counter()
+        for samples in requests:
+            buffer.submit(parse_samples(samples, None))
+        buffer.stop()
+        elapsed = time.perf_counter() - started
+
+        written = PerformanceMetric.objects.filter(service=BENCH_SERVICE).count()
+        if written < total:
+            raise CommandError(f"Записано {written} из {total} образцов")
+        return total / elapsed
+
+    def _samples(self, count):
+        endpoints = ['api/v1/tickets/', 'api/v1/tickets/<int:pk>/', 'api/v1/knowledge/articles/']
+        return [
+            {
+                'name': 'http_request_duration',
+                'metric_type': 'response_time',
+                'value': random.uniform(1, 500),
+                'unit': 'ms',
+                'service': BENCH_SERVICE,
+                'endpoint': random.choice(endpoints),
+                'method': 'GET',
+                'tags': {'region': 'eu', 'pod': f'web-{n % 8}'},
+                'metadata': {'status_code': 200},
+            }
+            for n in range(count)
+        ]
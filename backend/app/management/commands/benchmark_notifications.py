@@ -0,0 +1,127 @@
+"""
+Бенчмарк задержки запросов к уведомлениям при росте истории.
+
+Пример:
+    python manage.py benchmark_notifications --steps 10000 50000 200000 --archive
+"""
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from app.models import Notification, Tenant, TenantConfiguration, User
+from app.core.notification_retention import NotificationArchiver
+
+
+class Command(BaseCommand):
+    help = "Измерить задержку запросов к уведомлениям по мере роста истории (данные откатываются)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--steps', nargs='+', type=int, default=[10000, 50000, 100000],
+                            help="Размер истории пользователя на каждом шаге")
+        parser.add_argument('--days', type=int, default=365,
+                            help="Глубина истории в днях")
+        parser.add_argument('--retention-days', type=int, default=30,
+                            help="Срок хранения прочитанных уведомлений для архивации")
+        parser.add_argument('--archive', action='store_true',
+                            help="Архивировать историю перед замером на каждом шаге")
+        parser.add_argument('--repeat', type=int, default=20,
+                            help="Число повторов каждого запроса")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = self._create_user(options['retention_days'])
+            archiver = NotificationArchiver(batch_size=5000)
+            inserted = 0
+
+            self.stdout.write(
+                f"{'rows':>10} {'live':>10} {'unread_page':>12} {'by_type':>10} "
+                f"{'recent_stats':>13} {'unread_cnt':>11}   (медиана, мс)"
+            )
+            for step in sorted(options['steps']):
+                self._grow_history(user, step - inserted, options['days'])
+                inserted = step
+                if options['archive']:
+                    archiver.archive_tenant(user.tenant_id, options['retention_days'])
+
+                timings = self._measure(user, options['repeat'])
+                live = Notification.objects.filter(user=user).count()
+                self.stdout.write(
+                    f"{step:>10} {live:>10} {timings['unread_page']:>12.2f} {timings['by_type']:>10.2f} "
+                    f"{timings['recent_stats']:>13.2f} {timings['unread_count']:>11.2f}"
+                )
+
+            transaction.set_rollback(True)
+
+    def _create_user(self, retention_days):
+        suffix = timezone.now().strftime('%Y%m%d%H%M%S%f')
+        tenant = Tenant.objects.create(
+            name=f"bench-{suffix}", slug=f"bench-{suffix}", domain=f"bench-{suffix}.local"
+        )
+        TenantConfiguration.objects.create(tenant=tenant, notification_retention_days=retention_days)
+        return User.objects.create_user(
+            username=f"bench-{suffix}", email=f"bench-{suffix}@example.com", tenant=tenant
+        )
+
+    def _grow_history(self, user, count, days):
+        """Добавить count уведомлений, равномерно распределённых по истории."""
+        if count <= 0:
+            return
+        now = timezone.now()
+        types = [code for code, _ in Notification.NOTIFICATION_TYPES]
+        per_day = max(1, count // days)
+        created = 0
+        day = 0
+        while created < count:
+            size = min(per_day, count - created)
+            batch = Notification.objects.bulk_create([
+                Notification(
+                    user=user,
+                    type=types[(created + i) % len(types)],
+                    title=f"Bench #{created + i}",
+                    message="x" * 120,
+                    # Свежие уведомления частично не прочитаны, старые — прочитаны
+                    is_read=day > 7 or i % 3 != 0,
+                )
+                for i in range(size)
+            ], batch_size=2000)
+            # auto_now_add не даёт задать created_at при вставке
+            Notification.objects.filter(
+                user=user, created_at__gte=now - timedelta(minutes=5),
+                title__in=[n.title for n in batch],
+            ).update(created_at=now - timedelta(days=day % days, minutes=created % 1440))
+            created += size
+            day += 1
+
+    def _measure(self, user, repeat):
+        week_ago = timezone.now() - timedelta(days=7)
+        queries = {
+            'unread_page': lambda: list(
+                Notification.objects.filter(user=user, is_read=False).order_by('-created_at')[:20]
+            ),
+            'by_type': lambda: list(
+                Notification.objects.filter(user=user, type='ticket').order_by('-created_at')[:20]
+            ),
+            'recent_stats': lambda: list(
+                Notification.objects.filter(user=user, created_at__gte=week_ago)
+                .values('type').annotate(count=Count('id'))
+            ),
+            'unread_count': lambda: Notification.objects.filter(user=user, is_read=False).count(),
+        }
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE notifications')
+
+        timings = {}
+        for name, query in queries.items():
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                query()
+                samples.append((time.perf_counter() - started) * 1000)
+            timings[name] = statistics.median(samples)
+        return timings
@@ -0,0 +1,117 @@
+"""
+Бенчмарк DDSketch против точных перцентилей NumPy: точность и скорость.
+
+Для нескольких распределений времени ответа сравнивает p50/p90/p99/p99.9
+скетча, собранного из --shards частей (как из разных воркеров и минутных
+агрегатов) и прошедшего to_bytes/from_bytes, с numpy.percentile по всем
+значениям. Без NumPy точные перцентили считаются сортировкой списка.
+
+Пример:
+    python manage.py benchmark_quantile_sketch --values 1000000 --shards 60 --max-error 0.01
+"""
+import math
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.core.quantile_sketch import DDSketch
+
+
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class Command(BaseCommand):
+    help = "Сравнить точность и скорость DDSketch с точными перцентилями NumPy"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--values', type=int, default=200000,
+                            help="Число значений в распределении")
+        parser.add_argument('--shards', type=int, default=60,
+                            help="На сколько скетчей делить значения перед слиянием")
+        parser.add_argument('--alpha', type=float, default=0.01,
+                            help="Относительная точность скетча")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--max-error', type=float,
+                            help="Ошибка, если относительная погрешность выше порога")
+
+    def handle(self, *args, **options):
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+            self.stdout.write("NumPy не установлен: точные перцентили через sorted()")
+
+        rng = random.Random(options['seed'])
+        count = options['values']
+        distributions = {
+            'lognormal': lambda: rng.lognormvariate(3.0, 0.8),
+            'pareto': lambda: 5 * rng.paretovariate(1.5),
+            'bimodal': lambda: rng.gauss(20, 3) if rng.random() < 0.9 else rng.gauss(800, 100),
+            'exponential': lambda: rng.expovariate(1 / 50),
+        }
+
+        self.stdout.write(
+            f"{'distribution':>12} {'q':>6} {'exact':>10} {'sketch':>10} {'rel_err':>8}"
+        )
+        worst = 0.0
+        timings = []
+        for name, draw in distributions.items():
+            values = [max(0.0, draw()) for _ in range(count)]
+            exact, exact_time = self._exact(values, numpy)
+            estimates, sketch_times, size = self._sketch(values, options)
+            for q, truth, estimate in zip(QUANTILES, exact, estimates):
+                error = abs(estimate - truth) / truth if truth else abs(estimate)
+                worst = max(worst, error)
+                self.stdout.write(
+                    f"{name:>12} {q:>6} {truth:>10.3f} {estimate:>10.3f} {error:>8.4f}"
+                )
+            timings.append((name, exact_time, sketch_times, size))
+
+        self.stdout.write("")
+        self.stdout.write(
+            f"{'distribution':>12} {'exact_ms':>9} {'add_ms':>8} {'merge_ms':>9} "
+            f"{'query_us':>9} {'bytes':>7}"
+        )
+        for name, exact_time, (add, merge, query), size in timings:
+            self.stdout.write(
+                f"{name:>12} {exact_time * 1000:>9.1f} {add * 1000:>8.1f} {merge * 1000:>9.2f} "
+                f"{query * 1e6:>9.1f} {size:>7}"
+            )
+        self.stdout.write(f"максимальная относительная погрешность {worst:.4f} (alpha={options['alpha']})")
+
+        if options['max_error'] is not None and worst > options['max_error']:
+            raise CommandError(f"Погрешность {worst:.4f} > {options['max_error']}")
+
+    def _exact(self, values, numpy):
+        started = time.perf_counter()
+        if numpy is not None:
+            # method='lower' совпадает с рангом q * (n - 1), который оценивает скетч
+            result = list(numpy.percentile(numpy.asarray(values), [q * 100 for q in QUANTILES], method='lower'))
+        else:
+            ordered = sorted(values)
+            result = [ordered[int(math.floor(q * (len(ordered) - 1)))] for q in QUANTILES]
+        return result, time.perf_counter() - started
+
+    def _sketch(self, values, options):
+        shards = max(1, options['shards'])
+        size = math.ceil(len(values) / shards)
+
+        started = time.perf_counter()
+        parts = []
+        for start in range(0, len(values), size):
+            sketch = DDSketch(alpha=options['alpha'])
+            sketch.update(values[start:start + size])
+            parts.append(sketch.to_bytes())
+        add = time.perf_counter() - started
+
+        started = time.perf_counter()
+        merged = DDSketch(alpha=options['alpha'])
+        for blob in parts:
+            merged.merge(DDSketch.from_bytes(blob))
+        merge = time.perf_counter() - started
+
+        started = time.perf_counter()
+        estimates = merged.quantiles(QUANTILES)
+        query = time.perf_counter() - started
+        return estimates, (add, merge, query), len(merged.to_bytes())
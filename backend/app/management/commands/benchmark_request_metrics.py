@@ -0,0 +1,72 @@
+"""
+Микробенчмарк накладных расходов RequestTimingMiddleware.
+
+Пример:
+    python manage.py benchmark_request_metrics --iterations 200000 --max-us 5
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import ResolverMatch
+
+from app.core.performance_monitoring import RequestTimingMiddleware, performance_collector
+
+
+class Command(BaseCommand):
+    help = "Измерить накладные расходы записи метрик запроса, мкс на запрос"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=100000,
+                            help="Число запросов на замер")
+        parser.add_argument('--max-us', type=float,
+                            help="Ошибка, если накладные расходы middleware выше порога, мкс")
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        collector = performance_collector
+        response = HttpResponse(status=200)
+        request = RequestFactory().get('/api/v1/tickets/42/')
+        request.resolver_match = ResolverMatch(
+            func=lambda r: response, args=(), kwargs={'pk': 42}, route='api/v1/tickets/<int:pk>/'
+        )
+        labels = {'method': 'GET', 'endpoint': 'api/v1/tickets/<int:pk>/', 'status_code': '200'}
+
+        def view(_request):
+            return response
+
+        middleware = RequestTimingMiddleware(view)
+
+        def naive():
+            # Разрешение дочерних метрик по меткам на каждом запросе
+            collector.metrics['response_time'].labels(**labels).observe(0.01)
+            collector.metrics['request_count'].labels(**labels).inc()
+
+        results = {
+            'view only': self._measure(lambda: view(request), iterations),
+            'labels() per request': self._measure(naive, iterations),
+            'record_request (bound)': self._measure(
+                lambda: collector.record_request('GET', labels['endpoint'], 200, 0.01), iterations
+            ),
+            'middleware + view': self._measure(lambda: middleware(request), iterations),
+        }
+        overhead = results['middleware + view'] - results['view only']
+
+        for name, value in results.items():
+            self.stdout.write(f"{name:>24} {value:>8.3f} мкс")
+        self.stdout.write(f"{'middleware overhead':>24} {overhead:>8.3f} мкс")
+
+        if options['max_us'] is not None and overhead > options['max_us']:
+            raise CommandError(f"Накладные расходы {overhead:.3f} мкс > {options['max_us']} мкс")
+
+    def _measure(self, func, iterations):
+        """Лучшее из трёх прогонов, мкс на вызов."""
+        best = None
+        for _ in range(3):
+            started = time.perf_counter()
+            for _ in range(iterations):
+                func()
+            elapsed = (time.perf_counter() - started) / iterations * 1e6
+            best = elapsed if best is None else min(best, elapsed)
+        return best
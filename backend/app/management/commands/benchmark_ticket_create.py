@@ -0,0 +1,96 @@
+"""
+Бенчмарк создания тикета через TicketViewSet.create с кешем справочников.
+
+Создание тикета читает SLA арендатора для приоритета, его настройки и
+список тегов. Запросы идут через представление (APIRequestFactory) в
+режимах:
+    db         REFERENCE_CACHE_ENABLED=False, справочники читаются из БД
+    redis      локальный LRU выключен, справочники читаются из Redis
+    two_tier   локальный LRU процесса перед Redis
+
+Пример:
+    python manage.py benchmark_ticket_create --requests 1000
+"""
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from app.api.views.ticket import TicketViewSet
+from app.management.commands._websocket_bench import create_agents, in_memory_layer
+from app.models import SLA, Tag, TenantConfiguration
+
+
+MODES = {
+    'db': {'REFERENCE_CACHE_ENABLED': False},
+    'redis': {'REFERENCE_CACHE_ENABLED': True, 'REFERENCE_CACHE_LOCAL_MAX_ENTRIES': 0},
+    'two_tier': {'REFERENCE_CACHE_ENABLED': True},
+}
+
+
+class Command(BaseCommand):
+    help = "Измерить задержку создания тикета без кеша справочников, с Redis и с двумя уровнями"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500,
+                            help="Запросов на режим")
+        parser.add_argument('--warmup', type=int, default=50,
+                            help="Запросов прогрева перед замером")
+
+    def handle(self, *args, **options):
+        user = create_agents(1, prefix='ticket-bench')[0]
+        TenantConfiguration.objects.create(tenant=user.tenant, default_sla_hours=48)
+        SLA.objects.create(
+            tenant=user.tenant, name="Ticket benchmark", priority='high',
+            response_time=2, resolution_time=8
+        )
+        tag, tag_created = Tag.objects.get_or_create(name='ticket-bench')
+        view = TicketViewSet.as_view({'post': 'create'})
+        factory = APIRequestFactory()
+        payload = {
+            'title': "Ticket benchmark", 'description': "Ticket benchmark",
+            'priority': 'high', 'tags': [tag.pk],
+        }
+        try:
+            with override_settings(CHANNEL_LAYERS=in_memory_layer(capacity=100000)):
+                self.stdout.write(
+                    f"{'mode':>10} {'mean_us':>9} {'p50_us':>9} {'p99_us':>9} "
+                    f"{'saving_us':>10} {'queries':>8}"
+                )
+                baseline = None
+                for mode, overrides in MODES.items():
+                    with override_settings(**overrides):
+                        timings, queries = self._measure(view, factory, user, payload, options)
+                    mean = statistics.fmean(timings)
+                    baseline = mean if baseline is None else baseline
+                    ordered = sorted(timings)
+                    self.stdout.write(
+                        f"{mode:>10} {mean:>9.1f} {ordered[len(ordered) // 2]:>9.1f} "
+                        f"{ordered[int(len(ordered) * 0.99)]:>9.1f} {baseline - mean:>10.1f} "
+                        f"{queries / len(timings):>8.2f}"
+                    )
+        finally:
+            user.tenant.delete()
+            if tag_created:
+                tag.delete()
+
+    def _measure(self, view, factory, user, payload, options):
+        timings = []
+        queries = 0
+        for n in range(options['warmup'] + options['requests']):
+            request = factory.post('/api/v1/tickets/', payload, format='json')
+            force_authenticate(request, user=user)
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = view(request)
+                elapsed = (time.perf_counter() - started) * 1e6
+            if response.status_code != 201:
+                raise RuntimeError(f"Ticket create failed: {response.status_code} {response.data}")
+            if n >= options['warmup']:
+                timings.append(elapsed)
+                queries += len(captured)
+        return timings, queries
@@ -0,0 +1,92 @@
+"""
+Нагрузочный тест: соединения и память на агента для отдельных сокетов
+и мультиплексированного ws/stream/.
+
+Пример:
+    python manage.py benchmark_websocket_connections --agents 50 --tickets 20 --rooms 2
+"""
+import gc
+import time
+import tracemalloc
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from app.management.commands._websocket_bench import (
+    connect, create_agents, drain, in_memory_layer, websocket_application
+)
+
+
+class Command(BaseCommand):
+    help = "Сравнить число соединений и память на агента: отдельные сокеты против ws/stream/"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--agents', type=int, default=20,
+                            help="Число одновременно подключённых агентов")
+        parser.add_argument('--tickets', type=int, default=20,
+                            help="Открытых тикетов (вкладок) на агента")
+        parser.add_argument('--rooms', type=int, default=1,
+                            help="Комнат чата на агента")
+
+    def handle(self, *args, **options):
+        users = create_agents(options['agents'])
+        try:
+            with override_settings(CHANNEL_LAYERS=in_memory_layer()):
+                # Оба режима в одном цикле событий: асинхронный клиент Redis к нему привязан
+                async_to_sync(self._run)(users, options['tickets'], options['rooms'])
+        finally:
+            users[0].tenant.delete()
+
+    async def _run(self, users, tickets, rooms):
+        self.stdout.write(
+            f"{'mode':>12} {'connections':>12} {'conn/agent':>11} "
+            f"{'KiB/agent':>10} {'connect_s':>10}"
+        )
+        for mode in ('separate', 'multiplexed'):
+            result = await self._measure(mode, users, tickets, rooms)
+            self.stdout.write(
+                f"{mode:>12} {result['connections']:>12} "
+                f"{result['connections'] / len(users):>11.1f} "
+                f"{result['memory'] / len(users) / 1024:>10.1f} {result['elapsed']:>10.2f}"
+            )
+
+    async def _measure(self, mode, users, tickets, rooms):
+        application = websocket_application()
+        topics = (
+            [f'ticket:{n}' for n in range(tickets)]
+            + [f'chat:bench{n}' for n in range(rooms)]
+            + ['notifications']
+        )
+
+        gc.collect()
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+
+        communicators = []
+        for user in users:
+            if mode == 'separate':
+                for topic in topics:
+                    kind, _, key = topic.partition(':')
+                    path = f'/ws/{kind}s/{key}/' if kind == 'ticket' else (
+                        f'/ws/chat/{key}/' if kind == 'chat' else '/ws/notifications/'
+                    )
+                    communicators.append(await connect(application, path, user))
+            else:
+                communicator = await connect(application, '/ws/stream/', user)
+                for topic in topics:
+                    await communicator.send_json_to({'type': 'subscribe', 'topic': topic})
+                communicators.append(communicator)
+
+        for communicator in communicators:
+            await drain(communicator)
+        elapsed = time.perf_counter() - started
+
+        gc.collect()
+        memory = tracemalloc.get_traced_memory()[0] - baseline
+        tracemalloc.stop()
+
+        for communicator in communicators:
+            await communicator.disconnect()
+        return {'connections': len(communicators), 'memory': memory, 'elapsed': elapsed}
@@ -0,0 +1,100 @@
+"""
+Бенчмарк кодирования кадров WebSocket: байты в сети и CPU на 10k рассылок.
+
+Сравнивает прежнюю схему (json.dumps в консюмере каждого получателя) с
+однократным кодированием события в group_event(), а также размер кадров
+JSON и MessagePack с permessage-deflate и без него.
+
+Пример:
+    python manage.py benchmark_websocket_encoding --broadcasts 10000 --recipients 20
+"""
+import json
+import time
+import zlib
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.core import ws_frames
+
+
+class Command(BaseCommand):
+    help = "Измерить байты в сети и CPU на рассылку для JSON/MessagePack и permessage-deflate"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--broadcasts', type=int, default=10000,
+                            help="Число рассылок в группу")
+        parser.add_argument('--recipients', type=int, default=20,
+                            help="Число получателей в группе")
+
+    def handle(self, *args, **options):
+        broadcasts = options['broadcasts']
+        recipients = options['recipients']
+        payloads = [self._sample_payload(n) for n in range(broadcasts)]
+
+        self.stdout.write(f"{broadcasts} рассылок x {recipients} получателей, CPU в мс на 10k рассылок")
+        self.stdout.write(f"{'scheme':>28} {'cpu_ms/10k':>11}")
+        per_recipient = self._cpu(lambda payload: [
+            # Прежний обработчик: копия полей события и json.dumps на каждого получателя
+            json.dumps(dict(payload)) for _ in range(recipients)
+        ], payloads)
+        once = self._cpu(lambda payload: [
+            event['frames'][ws_frames.JSON]
+            for event in [ws_frames.group_event(payload['type'], 'bench', payload)]
+            for _ in range(recipients)
+        ], payloads)
+        self._row('json per recipient', per_recipient, broadcasts)
+        self._row('group_event (json+msgpack)', once, broadcasts)
+
+        self.stdout.write("")
+        self.stdout.write(f"{'encoding':>28} {'bytes/frame':>12} {'cpu_ms/10k':>11}")
+        for encoding in (ws_frames.JSON, ws_frames.MSGPACK):
+            frames = [ws_frames.encode(payload, encoding) for payload in payloads]
+            frames = [f.encode() if isinstance(f, str) else f for f in frames]
+            raw_size = sum(len(f) for f in frames) / len(frames)
+            self.stdout.write(f"{encoding:>28} {raw_size:>12.1f} {'-':>11}")
+
+            # permessage-deflate с переносом контекста между сообщениями (по умолчанию)
+            compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+            started = time.process_time()
+            sizes = [
+                len((compressor.compress(f) + compressor.flush(zlib.Z_SYNC_FLUSH))[:-4])
+                for f in frames
+            ]
+            elapsed = time.process_time() - started
+            self._row(f'{encoding}+deflate', elapsed, broadcasts, sum(sizes) / len(sizes))
+
+    def _cpu(self, func, payloads):
+        started = time.process_time()
+        for payload in payloads:
+            func(payload)
+        return time.process_time() - started
+
+    def _row(self, name, elapsed, broadcasts, size=None):
+        cpu = elapsed * 1000 * 10000 / broadcasts
+        if size is None:
+            self.stdout.write(f"{name:>28} {cpu:>11.1f}")
+        else:
+            self.stdout.write(f"{name:>28} {size:>12.1f} {cpu:>11.1f}")
+
+    def _sample_payload(self, n):
+        """Типичные события: сообщение чата, набор текста, уведомление, комментарий."""
+        now = timezone.now().isoformat()
+        kind = n % 4
+        if kind == 0:
+            return {'type': 'chat_message', 'message': {
+                'id': 100000 + n, 'content': f"Клиент сообщает о проблеме со входом, попытка {n}",
+                'sender': f'agent{n % 50}', 'timestamp': now, 'message_type': 'text',
+            }}
+        if kind == 1:
+            return {'type': 'typing', 'user': f'agent{n % 50}', 'is_typing': True, 'expires_in': 6000}
+        if kind == 2:
+            return {'type': 'notification_created', 'notification': {
+                'id': 200000 + n, 'type': 'ticket', 'title': f"Тикет TCK-{n} назначен вам",
+                'message': "Новый тикет с приоритетом high ожидает ответа", 'payload': {'ticket_id': n},
+                'created_at': now,
+            }}
+        return {'type': 'comment_added', 'comment': {
+            'id': 300000 + n, 'content': "Проверили логи, ошибка воспроизводится на staging",
+            'author': f'agent{n % 50}', 'created_at': now, 'is_internal': n % 2 == 0,
+        }}
@@ -0,0 +1,284 @@
+"""
+Нагрузочный тест рассылки WebSocket: N клиентов, M сообщений в секунду на комнату.
+
+Работает на in-memory channel layer и WebsocketCommunicator. Сообщения
+чата отправляет клиент каждой комнаты через сокет: кадр проходит
+ChatConsumer.receive -> handle_chat_message (write-behind) -> группа ->
+консюмеры -> сокеты. События тикетов и уведомлений рассылают сервисы,
+поэтому они публикуются в группы так же, как это делают сервисы
+(ws_frames.group_event). Без Redis консюмеры работают в деградированном
+режиме (запись сообщений сразу в БД); с --fake-redis Redis-зависимые
+части работают на fakeredis, так команда запускается в CI. Отчёт: p50/p99 задержки доставки,
+пропускная способность и память на соединение. Пороговые опции
+(--max-p99-ms, --min-throughput, --max-kib-per-connection) завершают
+команду с ошибкой при регрессии.
+
+Пример:
+    python manage.py benchmark_websocket_fanout --consumer chat --clients 500 --rooms 10 --rate 20
+"""
+import asyncio
+import gc
+import json
+import logging
+import time
+import tracemalloc
+from contextlib import nullcontext
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.utils import timezone
+
+from app.core import ws_frames
+from app.core.chat_writer import chat_writer
+from app.management.commands._websocket_bench import (
+    connect, create_agents, drain, fake_redis_clients, in_memory_layer, websocket_application
+)
+
+
+class Command(BaseCommand):
+    help = "Измерить задержку рассылки, пропускную способность и память на соединение WebSocket"
+
+    consumers = ('ticket', 'chat', 'notifications', 'stream')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consumer', choices=self.consumers, default='ticket',
+                            help="Проверяемый консюмер (stream — мультиплексированный ws/stream/)")
+        parser.add_argument('--clients', type=int, default=200,
+                            help="Число одновременных клиентов")
+        parser.add_argument('--rooms', type=int, default=10,
+                            help="Число комнат (для notifications — по комнате на клиента)")
+        parser.add_argument('--rate', type=float, default=10,
+                            help="Сообщений в секунду на комнату")
+        parser.add_argument('--duration', type=float, default=5,
+                            help="Длительность публикации, с")
+        parser.add_argument('--encoding', choices=(ws_frames.JSON, ws_frames.MSGPACK),
+                            default=ws_frames.JSON, help="Кодировка кадров клиентов")
+        parser.add_argument('--fake-redis', action='store_true',
+                            help="Redis-зависимые части консюмеров на fakeredis (без живого Redis)")
+        parser.add_argument('--max-p99-ms', type=float,
+                            help="Ошибка, если p99 задержки выше порога")
+        parser.add_argument('--min-throughput', type=float,
+                            help="Ошибка, если доставлено меньше сообщений в секунду")
+        parser.add_argument('--max-kib-per-connection', type=float,
+                            help="Ошибка, если память на соединение выше порога")
+
+    def handle(self, *args, **options):
+        if options['consumer'] == 'notifications':
+            options['rooms'] = options['clients']
+        if options['rooms'] > options['clients']:
+            raise CommandError("--rooms не может превышать --clients")
+
+        users = create_agents(options['clients'], prefix='ws-fanout')
+        # Redis-зависимые части консюмеров (presence, история) без Redis
+        # деградируют с предупреждениями; на время замера они не нужны в выводе
+        logging.disable(logging.WARNING)
+        try:
+            capacity = max(100, int(options['rate'] * options['duration']) * 2)
+            redis = fake_redis_clients() if options['fake_redis'] else nullcontext()
+            with redis, override_settings(CHANNEL_LAYERS=in_memory_layer(capacity)):
+                result = async_to_sync(self._run)(users, options)
+        finally:
+            logging.disable(logging.NOTSET)
+            users[0].tenant.delete()
+
+        self._report(result, options)
+        self._check(result, options)
+
+    async def _run(self, users, options):
+        from channels.layers import get_channel_layer
+
+        consumer = options['consumer']
+        rooms = options['rooms']
+        subprotocols = ['workernet.msgpack'] if options['encoding'] == ws_frames.MSGPACK else None
+        application = websocket_application()
+
+        gc.collect()
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+
+        clients = []
+        for index, user in enumerate(users):
+            room = index % rooms
+            communicator = await connect(application, self._path(consumer, room), user, subprotocols)
+            if consumer == 'stream':
+                await communicator.send_json_to({'type': 'subscribe', 'topic': f'ticket:bench{room}'})
+            clients.append(communicator)
+        for communicator in clients:
+            await drain(communicator)
+
+        gc.collect()
+        memory = tracemalloc.get_traced_memory()[0] - baseline
+        tracemalloc.stop()
+
+        channel_layer = get_channel_layer()
+        per_room = int(options['rate'] * options['duration'])
+        latencies = []
+        # Содержимое сообщения чата -> время отправки клиентом
+        sent = {}
+
+        started = time.perf_counter()
+        receivers = [
+            asyncio.ensure_future(self._receive(communicator, per_room, latencies, sent, options))
+            for communicator in clients
+        ]
+        if consumer == 'chat':
+            # Клиент с индексом room подключён к комнате room
+            publishers = [
+                self._send_chat(clients[room], room, per_room, options['rate'], sent, options['encoding'])
+                for room in range(rooms)
+            ]
+        else:
+            publishers = [
+                self._publish(channel_layer, consumer, self._group(consumer, room, users), per_room, options['rate'])
+                for room in range(rooms)
+            ]
+        await asyncio.gather(*publishers)
+        await asyncio.gather(*receivers)
+        elapsed = time.perf_counter() - started
+        if consumer == 'chat':
+            # Отложенные сообщения записываются до удаления тестовых пользователей
+            await chat_writer.flush()
+
+        for communicator in clients:
+            await communicator.disconnect()
+
+        return {
+            'connections': len(clients),
+            'memory': memory,
+            'expected': per_room * len(clients),
+            'latencies': sorted(latencies),
+            'elapsed': elapsed,
+        }
+
+    def _path(self, consumer, room):
+        if consumer == 'ticket':
+            return f'/ws/tickets/bench{room}/'
+        if consumer == 'chat':
+            return f'/ws/chat/bench{room}/'
+        if consumer == 'notifications':
+            return '/ws/notifications/'
+        return '/ws/stream/'
+
+    def _group(self, consumer, room, users):
+        if consumer == 'notifications':
+            return f'notifications_{users[room].id}'
+        return f'ticket_bench{room}'
+
+    def _event(self, consumer, group, sequence):
+        """Событие в формате, который рассылают сервисы."""
+        sent_at = time.perf_counter()
+        if consumer == 'notifications':
+            handler, payload = 'notification_created', {
+                'type': 'notification_created', 'sent_at': sent_at, 'notification': {
+                    'id': sequence, 'type': 'system', 'title': f"Уведомление #{sequence}",
+                    'message': "Нагрузочный тест", 'payload': {}, 'created_at': timezone.now().isoformat(),
+                }
+            }
+        else:
+            handler, payload = 'status_updated', {
+                'type': 'status_updated', 'sent_at': sent_at, 'status': 'in_progress'
+            }
+        return ws_frames.group_event(handler, group, payload)
+
+    async def _publish(self, channel_layer, consumer, group, count, rate):
+        """Публиковать count сообщений в группу с заданной частотой."""
+        interval = 1.0 / rate
+        started = time.perf_counter()
+        for sequence in range(count):
+            delay = started + sequence * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await channel_layer.group_send(group, self._event(consumer, group, sequence))
+
+    async def _send_chat(self, communicator, room, count, rate, sent, encoding):
+        """Отправлять сообщения чата от клиента комнаты с заданной частотой."""
+        interval = 1.0 / rate
+        started = time.perf_counter()
+        for sequence in range(count):
+            delay = started + sequence * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            content = f"Нагрузочное сообщение {room}/{sequence}"
+            frame = ws_frames.encode({'type': 'chat_message', 'message': {'content': content}}, encoding)
+            sent[content] = time.perf_counter()
+            if isinstance(frame, bytes):
+                await communicator.send_to(bytes_data=frame)
+            else:
+                await communicator.send_to(text_data=frame)
+
+    async def _receive(self, communicator, expected, latencies, sent, options):
+        """Получить ожидаемые кадры клиента и записать задержки доставки."""
+        timeout = options['duration'] + 10
+        deadline = time.perf_counter() + timeout
+        received = 0
+        while received < expected:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                output = await communicator.receive_output(timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            if output['type'] != 'websocket.send':
+                break
+            frame = ws_frames.decode(output.get('text'), output.get('bytes'))
+            event = frame.get('event', frame)
+            if event.get('type') == 'chat_message':
+                sent_at = sent.get(event['message']['content'])
+            else:
+                sent_at = event.get('sent_at')
+            if sent_at is not None:
+                latencies.append(time.perf_counter() - sent_at)
+                received += 1
+
+    def _report(self, result, options):
+        latencies = result['latencies']
+        delivered = len(latencies)
+        self.stdout.write(
+            f"consumer={options['consumer']} clients={result['connections']} rooms={options['rooms']} "
+            f"rate={options['rate']}/s на комнату duration={options['duration']}s encoding={options['encoding']}"
+        )
+        self.stdout.write(
+            f"доставлено {delivered} из {result['expected']} "
+            f"({delivered / result['expected'] * 100 if result['expected'] else 0:.1f}%)"
+        )
+        if latencies:
+            self.stdout.write(
+                f"задержка p50={self._percentile(latencies, 50) * 1000:.2f} мс "
+                f"p99={self._percentile(latencies, 99) * 1000:.2f} мс "
+                f"max={latencies[-1] * 1000:.2f} мс"
+            )
+        self.stdout.write(f"пропускная способность {delivered / result['elapsed']:.0f} сообщений/с")
+        self.stdout.write(f"память {result['memory'] / result['connections'] / 1024:.1f} KiB на соединение")
+        self.stdout.write(json.dumps({
+            'delivered': delivered,
+            'expected': result['expected'],
+            'p50_ms': self._percentile(latencies, 50) * 1000 if latencies else None,
+            'p99_ms': self._percentile(latencies, 99) * 1000 if latencies else None,
+            'throughput': delivered / result['elapsed'],
+            'kib_per_connection': result['memory'] / result['connections'] / 1024,
+        }))
+
+    def _check(self, result, options):
+        latencies = result['latencies']
+        errors = []
+        if len(latencies) < result['expected']:
+            errors.append(f"потеряно {result['expected'] - len(latencies)} сообщений")
+        if options['max_p99_ms'] is not None and latencies:
+            p99 = self._percentile(latencies, 99) * 1000
+            if p99 > options['max_p99_ms']:
+                errors.append(f"p99 {p99:.2f} мс > {options['max_p99_ms']} мс")
+        throughput = len(latencies) / result['elapsed']
+        if options['min_throughput'] is not None and throughput < options['min_throughput']:
+            errors.append(f"пропускная способность {throughput:.0f}/с < {options['min_throughput']}/с")
+        kib = result['memory'] / result['connections'] / 1024
+        if options['max_kib_per_connection'] is not None and kib > options['max_kib_per_connection']:
+            errors.append(f"память {kib:.1f} KiB > {options['max_kib_per_connection']} KiB на соединение")
+        if errors:
+            raise CommandError("Регрессия: " + "; ".join(errors))
+
+    @staticmethod
+    def _percentile(values, percent):
+        index = min(len(values) - 1, max(0, int(round(percent / 100 * len(values))) - 1))
+        return values[index]
@@ -0,0 +1,32 @@
+"""
+Пересчитать агрегаты PerformanceMetric (1m/1h/1d) по сырым строкам.
+
+Нужен после включения агрегатов на существующих данных или после сбоя
+записи пакета. Дни, сырые строки которых могли быть удалены по сроку
+хранения, не пересчитываются.
+
+Пример:
+    python manage.py rebuild_metric_rollups --days 7
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.core.metric_rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Пересчитать агрегаты метрик производительности по сырым строкам"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7,
+                            help="Сколько последних дней пересчитать")
+        parser.add_argument('--chunk-size', type=int, default=20000,
+                            help="Строк за один проход свёртки")
+
+    def handle(self, *args, **options):
+        end = timezone.now()
+        start = end - timedelta(days=options['days'])
+        folded = rebuild_rollups(start, end, chunk_size=options['chunk_size'])
+        self.stdout.write(f"Свёрнуто {folded} сырых строк")
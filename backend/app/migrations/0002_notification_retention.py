@@ -0,0 +1,62 @@
+# Generated by Django 4.2.16 on 2026-10-19 12:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+from app.core.notification_retention import partition_notifications_table
+
+
+def partition_notifications(apps, schema_editor):
+    # Помесячное партиционирование доступно только на PostgreSQL
+    partition_notifications_table(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_id', models.BigIntegerField(db_index=True, verbose_name='ID уведомления')),
+                ('type', models.CharField(max_length=20, verbose_name='Тип')),
+                ('data', models.BinaryField(verbose_name='Сжатые данные')),
+                ('created_at', models.DateTimeField(verbose_name='Создано')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Архивировано')),
+            ],
+            options={
+                'verbose_name': 'Архивное уведомление',
+                'verbose_name_plural': 'Архивные уведомления',
+                'db_table': 'notifications_archive',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='tenantconfiguration',
+            name='notification_retention_days',
+            field=models.PositiveIntegerField(default=90, help_text='Прочитанные уведомления старше этого срока переносятся в архив; 0 — не архивировать', verbose_name='Хранение прочитанных уведомлений (дни)'),
+        ),
+        migrations.RunPython(partition_notifications, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'is_read', 'created_at'], name='notificatio_user_id_5cf777_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'type', 'created_at'], name='notificatio_user_id_74c084_idx'),
+        ),
+        migrations.AddField(
+            model_name='notificationarchive',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_notifications', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AddIndex(
+            model_name='notificationarchive',
+            index=models.Index(fields=['user', 'created_at'], name='notificatio_user_id_6da671_idx'),
+        ),
+    ]
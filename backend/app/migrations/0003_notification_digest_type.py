@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-19 12:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_notification_retention'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='type',
+            field=models.CharField(choices=[('ticket', 'Тикет'), ('system', 'Система'), ('chat', 'Чат'), ('digest', 'Сводка')], default='system', max_length=20, verbose_name='Тип'),
+        ),
+    ]
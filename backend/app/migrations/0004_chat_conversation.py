@@ -0,0 +1,35 @@
+# Generated by Django 4.2.16 on 2026-10-19 12:25
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_notification_digest_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatConversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('room_name', models.CharField(max_length=200, verbose_name='Комната')),
+                ('last_message_at', models.DateTimeField(blank=True, null=True, verbose_name='Время последнего сообщения')),
+                ('unread_count', models.PositiveIntegerField(default=0, verbose_name='Непрочитанные')),
+                ('last_read_at', models.DateTimeField(blank=True, null=True, verbose_name='Прочитано до')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='app.chatmessage', verbose_name='Последнее сообщение')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_conversations', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Беседа чата',
+                'verbose_name_plural': 'Беседы чата',
+                'db_table': 'chat_conversations',
+                'indexes': [models.Index(fields=['user', '-last_message_at'], name='chat_conver_user_id_60ae91_idx')],
+                'unique_together': {('user', 'room_name')},
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.16 on 2026-10-19 12:27
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_chat_conversation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='client_id',
+            field=models.CharField(blank=True, help_text='ID, под которым сообщение разослано до записи в БД', max_length=64, null=True, unique=True, verbose_name='Временный ID'),
+        ),
+        migrations.AlterField(
+            model_name='chatmessage',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время'),
+        ),
+    ]
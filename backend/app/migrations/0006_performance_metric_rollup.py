@@ -0,0 +1,44 @@
+# Generated by Django 4.2.16 on 2026-10-19 12:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_chat_message_client_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerformanceMetricRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('1m', '1 минута'), ('1h', '1 час'), ('1d', '1 день')], max_length=2, verbose_name='Разрешение')),
+                ('bucket_start', models.DateTimeField(verbose_name='Начало интервала')),
+                ('name', models.CharField(max_length=100, verbose_name='Название')),
+                ('metric_type', models.CharField(max_length=30, verbose_name='Тип метрики')),
+                ('service', models.CharField(blank=True, max_length=100, verbose_name='Сервис')),
+                ('endpoint', models.CharField(blank=True, max_length=200, verbose_name='Эндпоинт')),
+                ('count', models.BigIntegerField(default=0, verbose_name='Количество')),
+                ('sum', models.FloatField(default=0, verbose_name='Сумма')),
+                ('min', models.FloatField(verbose_name='Минимум')),
+                ('max', models.FloatField(verbose_name='Максимум')),
+                ('sketch', models.BinaryField(verbose_name='Квантильный скетч')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+                ('tenant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='performance_metric_rollups', to='app.tenant', verbose_name='Арендатор')),
+            ],
+            options={
+                'verbose_name': 'Агрегат метрики производительности',
+                'verbose_name_plural': 'Агрегаты метрик производительности',
+                'db_table': 'performance_metric_rollups',
+                'ordering': ['resolution', 'bucket_start'],
+                'indexes': [models.Index(fields=['tenant', 'name', 'resolution', 'bucket_start'], name='performance_tenant__e778f2_idx'), models.Index(fields=['resolution', 'bucket_start'], name='performance_resolut_ad856c_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='performancemetricrollup',
+            constraint=models.UniqueConstraint(fields=('resolution', 'tenant', 'name', 'metric_type', 'service', 'endpoint', 'bucket_start'), name='uniq_metric_rollup_bucket'),
+        ),
+    ]
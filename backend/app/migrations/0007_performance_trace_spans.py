@@ -0,0 +1,30 @@
+# Generated by Django 4.2.16 on 2026-10-19 12:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_performance_metric_rollup'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='performancetrace',
+            name='trace_id',
+            field=models.CharField(max_length=100, verbose_name='ID трассировки'),
+        ),
+        migrations.AddIndex(
+            model_name='performancetrace',
+            index=models.Index(fields=['tenant', 'trace_id'], name='performance_tenant__4322ad_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='performancetrace',
+            index=models.Index(condition=models.Q(('parent_span_id', '')), fields=['tenant', 'duration_ms'], name='perf_trace_root_duration'),
+        ),
+        migrations.AddConstraint(
+            model_name='performancetrace',
+            constraint=models.UniqueConstraint(fields=('trace_id', 'span_id'), name='uniq_trace_span'),
+        ),
+    ]
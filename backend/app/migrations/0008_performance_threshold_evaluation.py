@@ -0,0 +1,61 @@
+# Generated by Django 4.2.16 on 2026-10-19 13:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_performance_trace_spans'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='performancealert',
+            name='current_value',
+            field=models.FloatField(blank=True, null=True, verbose_name='Текущее значение'),
+        ),
+        migrations.AddField(
+            model_name='performancealert',
+            name='threshold',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='alerts', to='app.performancethreshold', verbose_name='Пороговое значение'),
+        ),
+        migrations.AddField(
+            model_name='performancethreshold',
+            name='aggregation',
+            field=models.CharField(choices=[('avg', 'Среднее'), ('min', 'Минимум'), ('max', 'Максимум'), ('sum', 'Сумма'), ('count', 'Количество')], default='avg', max_length=10, verbose_name='Агрегат'),
+        ),
+        migrations.AddField(
+            model_name='performancethreshold',
+            name='metric_name',
+            field=models.CharField(blank=True, max_length=100, verbose_name='Имя метрики'),
+        ),
+        migrations.AddField(
+            model_name='performancethreshold',
+            name='min_samples',
+            field=models.PositiveIntegerField(default=1, verbose_name='Минимум значений в окне'),
+        ),
+        migrations.AddField(
+            model_name='performancethreshold',
+            name='operator',
+            field=models.CharField(choices=[('gt', 'Больше'), ('gte', 'Больше или равно'), ('lt', 'Меньше'), ('lte', 'Меньше или равно'), ('eq', 'Равно'), ('ne', 'Не равно')], default='gt', max_length=10, verbose_name='Оператор сравнения'),
+        ),
+        migrations.AddField(
+            model_name='performancethreshold',
+            name='window_seconds',
+            field=models.PositiveIntegerField(default=300, verbose_name='Окно (сек)'),
+        ),
+        migrations.AddIndex(
+            model_name='performancealert',
+            index=models.Index(fields=['tenant', 'status'], name='performance_tenant__932218_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='performancethreshold',
+            index=models.Index(fields=['tenant', 'is_active'], name='performance_tenant__ae19d5_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='performancealert',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['active', 'acknowledged'])), fields=('threshold',), name='uniq_open_alert_per_threshold'),
+        ),
+    ]
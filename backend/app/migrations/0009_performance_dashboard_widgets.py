@@ -0,0 +1,23 @@
+# Generated by Django 4.2.16 on 2026-10-19 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_performance_threshold_evaluation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='performancedashboard',
+            name='layout',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Раскладка'),
+        ),
+        migrations.AddField(
+            model_name='performancedashboard',
+            name='widgets',
+            field=models.JSONField(blank=True, default=list, verbose_name='Виджеты'),
+        ),
+    ]
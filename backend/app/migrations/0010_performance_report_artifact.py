@@ -0,0 +1,48 @@
+# Generated by Django 4.2.16 on 2026-10-19 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_performance_dashboard_widgets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='performancereport',
+            name='artifact',
+            field=models.BinaryField(blank=True, null=True, verbose_name='Сжатый отчет'),
+        ),
+        migrations.AddField(
+            model_name='performancereport',
+            name='artifact_digest',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='Отпечаток данных'),
+        ),
+        migrations.AddField(
+            model_name='performancereport',
+            name='artifact_size',
+            field=models.PositiveIntegerField(default=0, verbose_name='Размер отчета'),
+        ),
+        migrations.AddField(
+            model_name='performancereport',
+            name='error_message',
+            field=models.TextField(blank=True, verbose_name='Ошибка'),
+        ),
+        migrations.AddField(
+            model_name='performancereport',
+            name='generated_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Сформирован'),
+        ),
+        migrations.AddField(
+            model_name='performancereport',
+            name='progress',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Прогресс, %'),
+        ),
+        migrations.AddField(
+            model_name='performancereport',
+            name='status',
+            field=models.CharField(choices=[('draft', 'Не сформирован'), ('pending', 'В очереди'), ('running', 'Формируется'), ('completed', 'Сформирован'), ('failed', 'Ошибка')], default='draft', max_length=20, verbose_name='Статус'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.16 on 2026-10-19 17:40
+
+from django.db import migrations
+
+from app.core.chat_conversations import backfill_all_conversations
+
+
+def backfill_conversations(apps, schema_editor):
+    # Сводки истории старше таблицы ChatConversation; новые сообщения ведут их сами
+    backfill_all_conversations()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_performance_report_artifact'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_conversations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.16 on 2026-10-19 14:08
+
+from django.db import migrations, models
+
+from app.core.quantile_sketch import DDSketch
+
+
+KEY_FIELDS = ('resolution', 'name', 'metric_type', 'service', 'endpoint', 'bucket_start')
+
+
+def merge_duplicate_rollups(apps, schema_editor):
+    # Без ограничения параллельные воркеры могли вставить одну корзину без арендатора дважды
+    PerformanceMetricRollup = apps.get_model('app', 'PerformanceMetricRollup')
+    duplicates = (
+        PerformanceMetricRollup.objects.filter(tenant__isnull=True)
+        .values(*KEY_FIELDS).annotate(rows=models.Count('id')).filter(rows__gt=1)
+    )
+    for key in duplicates:
+        key.pop('rows')
+        first, *rest = PerformanceMetricRollup.objects.filter(tenant__isnull=True, **key).order_by('pk')
+        sketch = DDSketch.from_bytes(first.sketch)
+        for rollup in rest:
+            first.count += rollup.count
+            first.sum += rollup.sum
+            first.min = min(first.min, rollup.min)
+            first.max = max(first.max, rollup.max)
+            sketch.merge(DDSketch.from_bytes(rollup.sketch))
+        first.sketch = sketch.to_bytes()
+        first.save(update_fields=['count', 'sum', 'min', 'max', 'sketch'])
+        PerformanceMetricRollup.objects.filter(pk__in=[rollup.pk for rollup in rest]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_backfill_chat_conversations'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_rollups, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='performancemetricrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('tenant__isnull', True)), fields=('resolution', 'name', 'metric_type', 'service', 'endpoint', 'bucket_start'), name='uniq_metric_rollup_bucket_no_tenant'),
+        ),
+    ]
@@ -3,14 +3,14 @@
 from .tenant import User, Tenant, TenantConfiguration
 from .ticket import Ticket, TicketComment, TicketAttachment, Tag, SLA, TicketSLA
 from .knowledge import KnowledgeCategory, KnowledgeArticle, KnowledgeArticleAttachment, KnowledgeArticleRating, KnowledgeArticleView, KnowledgeSearch
-from .chat import ChatMessage
-from .notification import Notification
+from .chat import ChatMessage, ChatConversation
+from .notification import Notification, NotificationArchive
 from .ab_testing import FeatureFlag, ABTest, ABTestVariant, ABTestParticipant, ABTestEvent, ABTestMetric
 from .incident import Incident, IncidentUpdate, IncidentAttachment, IncidentTimeline, IncidentEscalation, IncidentSLA
 from .template import ResponseTemplate, TemplateVariable, TemplateUsage, TemplateCategory, TemplateVersion
 from .rating import TicketRating, AgentRating, ServiceRating, RatingCategory, RatingSurvey, RatingSurveyQuestion, RatingSurveyResponse
 from .automation import AutomationRule, AutomationExecution, AutomationCondition, AutomationAction, AutomationTemplate, AutomationSchedule
-from .performance import PerformanceMetric, PerformanceAlert, PerformanceTrace, PerformanceDashboard, PerformanceReport, PerformanceThreshold
+from .performance import PerformanceMetric, PerformanceMetricRollup, PerformanceAlert, PerformanceTrace, PerformanceDashboard, PerformanceReport, PerformanceThreshold
 
 __all__ = [
     # Tenant models
@@ -23,7 +23,7 @@ __all__ = [
     'KnowledgeCategory', 'KnowledgeArticle', 'KnowledgeArticleAttachment', 'KnowledgeArticleRating', 'KnowledgeArticleView', 'KnowledgeSearch',
     
     # Communication models
-    'ChatMessage', 'Notification',
+    'ChatMessage', 'ChatConversation', 'Notification', 'NotificationArchive',
     
     # A/B Testing models
     'FeatureFlag', 'ABTest', 'ABTestVariant', 'ABTestParticipant', 'ABTestEvent', 'ABTestMetric',
@@ -41,5 +41,5 @@ __all__ = [
     'AutomationRule', 'AutomationExecution', 'AutomationCondition', 'AutomationAction', 'AutomationTemplate', 'AutomationSchedule',
     
     # Performance models
-    'PerformanceMetric', 'PerformanceAlert', 'PerformanceTrace', 'PerformanceDashboard', 'PerformanceReport', 'PerformanceThreshold',
+    'PerformanceMetric', 'PerformanceMetricRollup', 'PerformanceAlert', 'PerformanceTrace', 'PerformanceDashboard', 'PerformanceReport', 'PerformanceThreshold',
 ]
@@ -2,6 +2,7 @@
 Модели чата для службы поддержки и обмена сообщениями в реальном времени.
 """
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 
@@ -18,7 +19,13 @@ class ChatMessage(models.Model):
     )
     content = models.TextField(verbose_name=_("Содержимое"))
     message_type = models.CharField(max_length=20, default="text", verbose_name=_("Тип сообщения"))
-    timestamp = models.DateTimeField(auto_now_add=True, verbose_name=_("Время"))
+    # Время задаётся при приёме сообщения: запись в БД может быть отложена (write-behind)
+    timestamp = models.DateTimeField(default=timezone.now, verbose_name=_("Время"))
+    client_id = models.CharField(
+        max_length=64, unique=True, null=True, blank=True,
+        verbose_name=_("Временный ID"),
+        help_text=_("ID, под которым сообщение разослано до записи в БД"),
+    )
 
     class Meta:
         verbose_name = _("Сообщение чата")
@@ -29,3 +36,37 @@ class ChatMessage(models.Model):
     def __str__(self) -> str:
         return f"{self.room_name} | {self.sender_id} | {self.timestamp.isoformat()}"
 
+
+
+class ChatConversation(models.Model):
+    """Сводка беседы пользователя в комнате: последнее сообщение и непрочитанные."""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="chat_conversations",
+        verbose_name=_("Пользователь"),
+    )
+    room_name = models.CharField(max_length=200, verbose_name=_("Комната"))
+    last_message = models.ForeignKey(
+        ChatMessage,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name=_("Последнее сообщение"),
+    )
+    last_message_at = models.DateTimeField(null=True, blank=True, verbose_name=_("Время последнего сообщения"))
+    unread_count = models.PositiveIntegerField(default=0, verbose_name=_("Непрочитанные"))
+    last_read_at = models.DateTimeField(null=True, blank=True, verbose_name=_("Прочитано до"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Обновлено"))
+
+    class Meta:
+        verbose_name = _("Беседа чата")
+        verbose_name_plural = _("Беседы чата")
+        db_table = "chat_conversations"
+        unique_together = ["user", "room_name"]
+        indexes = [models.Index(fields=["user", "-last_message_at"])]
+
+    def __str__(self) -> str:
+        return f"{self.user_id} | {self.room_name} | {self.unread_count}"
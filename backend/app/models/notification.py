@@ -1,6 +1,9 @@
 """
 Модели уведомлений для пользователей и учёт статуса доставки.
 """
+import json
+import zlib
+
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
@@ -13,6 +16,7 @@ class Notification(models.Model):
         ("ticket", "Тикет"),
         ("system", "Система"),
         ("chat", "Чат"),
+        ("digest", "Сводка"),
     )
 
     user = models.ForeignKey(
@@ -33,7 +37,57 @@ class Notification(models.Model):
         verbose_name_plural = _("Уведомления")
         db_table = "notifications"
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["user", "is_read", "created_at"]),
+            models.Index(fields=["user", "type", "created_at"]),
+        ]
 
     def __str__(self) -> str:
         return f"{self.user_id} | {self.type} | {self.title}"
 
+
+class NotificationArchive(models.Model):
+    """Архивная копия прочитанного уведомления со сжатым содержимым."""
+
+    notification_id = models.BigIntegerField(db_index=True, verbose_name=_("ID уведомления"))
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="archived_notifications",
+        verbose_name=_("Пользователь"),
+    )
+    type = models.CharField(max_length=20, verbose_name=_("Тип"))
+    data = models.BinaryField(verbose_name=_("Сжатые данные"))
+    created_at = models.DateTimeField(verbose_name=_("Создано"))
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Архивировано"))
+
+    class Meta:
+        verbose_name = _("Архивное уведомление")
+        verbose_name_plural = _("Архивные уведомления")
+        db_table = "notifications_archive"
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["user", "created_at"])]
+
+    def __str__(self) -> str:
+        return f"{self.user_id} | {self.type} | #{self.notification_id}"
+
+    @classmethod
+    def from_notification(cls, notification: Notification) -> "NotificationArchive":
+        """Собрать архивную запись из уведомления (без сохранения)."""
+        content = {
+            "title": notification.title,
+            "message": notification.message,
+            "payload": notification.payload,
+        }
+        return cls(
+            notification_id=notification.pk,
+            user_id=notification.user_id,
+            type=notification.type,
+            data=zlib.compress(json.dumps(content, ensure_ascii=False).encode("utf-8")),
+            created_at=notification.created_at,
+        )
+
+    def unpack(self) -> dict:
+        """Распаковать заголовок, текст и данные уведомления."""
+        return json.loads(zlib.decompress(bytes(self.data)).decode("utf-8"))
+
@@ -1,6 +1,9 @@
 """
 Модели для системы мониторинга производительности.
 """
+import json
+import zlib
+
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils.translation import gettext_lazy as _
@@ -71,6 +74,69 @@ class PerformanceMetric(models.Model):
         return f"{self.name}: {self.value}{self.unit}"
 
 
+class PerformanceMetricRollup(models.Model):
+    """Агрегат метрик производительности за интервал (1 минута, 1 час, 1 день)."""
+    
+    RESOLUTIONS = [
+        ('1m', _('1 минута')),
+        ('1h', _('1 час')),
+        ('1d', _('1 день')),
+    ]
+    
+    resolution = models.CharField(max_length=2, choices=RESOLUTIONS, verbose_name=_("Разрешение"))
+    bucket_start = models.DateTimeField(verbose_name=_("Начало интервала"))
+    
+    # Ключ ряда
+    name = models.CharField(max_length=100, verbose_name=_("Название"))
+    metric_type = models.CharField(max_length=30, verbose_name=_("Тип метрики"))
+    service = models.CharField(max_length=100, blank=True, verbose_name=_("Сервис"))
+    endpoint = models.CharField(max_length=200, blank=True, verbose_name=_("Эндпоинт"))
+    
+    # Агрегаты
+    count = models.BigIntegerField(default=0, verbose_name=_("Количество"))
+    sum = models.FloatField(default=0, verbose_name=_("Сумма"))
+    min = models.FloatField(verbose_name=_("Минимум"))
+    max = models.FloatField(verbose_name=_("Максимум"))
+    sketch = models.BinaryField(verbose_name=_("Квантильный скетч"))
+    
+    # Арендатор
+    tenant = models.ForeignKey(
+        Tenant,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='performance_metric_rollups',
+        verbose_name=_("Арендатор")
+    )
+    
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Обновлено"))
+    
+    class Meta:
+        verbose_name = _("Агрегат метрики производительности")
+        verbose_name_plural = _("Агрегаты метрик производительности")
+        db_table = 'performance_metric_rollups'
+        ordering = ['resolution', 'bucket_start']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['resolution', 'tenant', 'name', 'metric_type', 'service', 'endpoint', 'bucket_start'],
+                name='uniq_metric_rollup_bucket'
+            ),
+            # NULL в tenant не равен NULL: рядам без арендатора нужен отдельный ключ
+            models.UniqueConstraint(
+                fields=['resolution', 'name', 'metric_type', 'service', 'endpoint', 'bucket_start'],
+                condition=models.Q(tenant__isnull=True),
+                name='uniq_metric_rollup_bucket_no_tenant'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['tenant', 'name', 'resolution', 'bucket_start']),
+            models.Index(fields=['resolution', 'bucket_start']),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} [{self.resolution} {self.bucket_start:%Y-%m-%d %H:%M}]: {self.count}"
+
+
 class PerformanceAlert(models.Model):
     """Алерт производительности."""
     
@@ -92,21 +158,37 @@ class PerformanceAlert(models.Model):
     name = models.CharField(max_length=200, verbose_name=_("Название"))
     description = models.TextField(blank=True, verbose_name=_("Описание"))
     
+    COMPARISON_OPERATORS = [
+        ('gt', _('Больше')),
+        ('gte', _('Больше или равно')),
+        ('lt', _('Меньше')),
+        ('lte', _('Меньше или равно')),
+        ('eq', _('Равно')),
+        ('ne', _('Не равно')),
+    ]
+    
+    # Открытый алерт: не больше одного на пороговое значение
+    OPEN_STATUSES = ('active', 'acknowledged')
+    
     # Условие алерта
     metric_type = models.CharField(max_length=30, verbose_name=_("Тип метрики"))
     threshold_value = models.FloatField(verbose_name=_("Пороговое значение"))
     comparison_operator = models.CharField(
         max_length=10,
-        choices=[
-            ('gt', _('Больше')),
-            ('gte', _('Больше или равно')),
-            ('lt', _('Меньше')),
-            ('lte', _('Меньше или равно')),
-            ('eq', _('Равно')),
-            ('ne', _('Не равно')),
-        ],
+        choices=COMPARISON_OPERATORS,
         verbose_name=_("Оператор сравнения")
     )
+    current_value = models.FloatField(null=True, blank=True, verbose_name=_("Текущее значение"))
+    
+    # Правило, по которому сработал алерт (пусто для созданных вручную)
+    threshold = models.ForeignKey(
+        'PerformanceThreshold',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='alerts',
+        verbose_name=_("Пороговое значение")
+    )
     
     # Настройки алерта
     severity = models.CharField(max_length=20, choices=SEVERITY_CHOICES, verbose_name=_("Критичность"))
@@ -141,6 +223,16 @@ class PerformanceAlert(models.Model):
         verbose_name_plural = _("Алерты производительности")
         db_table = 'performance_alerts'
         ordering = ['-triggered_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['threshold'],
+                condition=models.Q(status__in=['active', 'acknowledged']),
+                name='uniq_open_alert_per_threshold'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['tenant', 'status']),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.get_severity_display()})"
@@ -150,7 +242,8 @@ class PerformanceTrace(models.Model):
     """Трассировка запроса."""
     
     # Базовая информация
-    trace_id = models.CharField(max_length=100, unique=True, verbose_name=_("ID трассировки"))
+    # Трассировка состоит из нескольких span с общим trace_id
+    trace_id = models.CharField(max_length=100, verbose_name=_("ID трассировки"))
     span_id = models.CharField(max_length=100, verbose_name=_("ID span"))
     parent_span_id = models.CharField(max_length=100, blank=True, verbose_name=_("ID родительского span"))
     
@@ -200,10 +293,20 @@ class PerformanceTrace(models.Model):
         verbose_name_plural = _("Трассировки производительности")
         db_table = 'performance_traces'
         ordering = ['-start_time']
+        constraints = [
+            models.UniqueConstraint(fields=['trace_id', 'span_id'], name='uniq_trace_span'),
+        ]
         indexes = [
             models.Index(fields=['trace_id']),
+            models.Index(fields=['tenant', 'trace_id']),
             models.Index(fields=['service_name', 'start_time']),
             models.Index(fields=['operation_name', 'start_time']),
+            # Медленные трассировки: корневые span арендатора по длительности
+            models.Index(
+                fields=['tenant', 'duration_ms'],
+                condition=models.Q(parent_span_id=''),
+                name='perf_trace_root_duration'
+            ),
         ]
     
     def __str__(self):
@@ -218,6 +321,9 @@ class PerformanceDashboard(models.Model):
     
     # Конфигурация дашборда
     config = models.JSONField(default=dict, verbose_name=_("Конфигурация"))
+    layout = models.JSONField(default=dict, blank=True, verbose_name=_("Раскладка"))
+    # Виджеты: widget_type, title, position, size, config (запрос к агрегатам метрик)
+    widgets = models.JSONField(default=list, blank=True, verbose_name=_("Виджеты"))
     
     # Настройки
     is_public = models.BooleanField(default=False, verbose_name=_("Публичный"))
@@ -265,6 +371,14 @@ class PerformanceReport(models.Model):
         ('custom', _('Пользовательский')),
     ]
     
+    STATUSES = [
+        ('draft', _('Не сформирован')),
+        ('pending', _('В очереди')),
+        ('running', _('Формируется')),
+        ('completed', _('Сформирован')),
+        ('failed', _('Ошибка')),
+    ]
+    
     # Базовая информация
     name = models.CharField(max_length=200, verbose_name=_("Название"))
     description = models.TextField(blank=True, verbose_name=_("Описание"))
@@ -280,6 +394,15 @@ class PerformanceReport(models.Model):
     # Результаты отчета
     results = models.JSONField(default=dict, verbose_name=_("Результаты"))
     
+    # Генерация: статус, прогресс и сжатый артефакт (zlib + JSON)
+    status = models.CharField(max_length=20, choices=STATUSES, default='draft', verbose_name=_("Статус"))
+    progress = models.PositiveSmallIntegerField(default=0, verbose_name=_("Прогресс, %"))
+    error_message = models.TextField(blank=True, verbose_name=_("Ошибка"))
+    artifact = models.BinaryField(null=True, blank=True, verbose_name=_("Сжатый отчет"))
+    artifact_size = models.PositiveIntegerField(default=0, verbose_name=_("Размер отчета"))
+    artifact_digest = models.CharField(max_length=64, blank=True, db_index=True, verbose_name=_("Отпечаток данных"))
+    generated_at = models.DateTimeField(null=True, blank=True, verbose_name=_("Сформирован"))
+    
     # Арендатор
     tenant = models.ForeignKey(
         Tenant,
@@ -310,20 +433,47 @@ class PerformanceReport(models.Model):
     
     def __str__(self):
         return f"{self.name} ({self.get_report_type_display()})"
+    
+    def unpack(self):
+        """Распаковать сформированный отчет (None, если его еще нет)."""
+        if not self.artifact:
+            return None
+        return json.loads(zlib.decompress(bytes(self.artifact)).decode('utf-8'))
 
 
 class PerformanceThreshold(models.Model):
     """Пороговое значение для метрики."""
     
+    AGGREGATIONS = [
+        ('avg', _('Среднее')),
+        ('min', _('Минимум')),
+        ('max', _('Максимум')),
+        ('sum', _('Сумма')),
+        ('count', _('Количество')),
+    ]
+    
     # Базовая информация
     name = models.CharField(max_length=200, verbose_name=_("Название"))
     metric_type = models.CharField(max_length=30, verbose_name=_("Тип метрики"))
+    # Пустое имя — правило для всех метрик этого типа
+    metric_name = models.CharField(max_length=100, blank=True, verbose_name=_("Имя метрики"))
     
     # Пороговые значения
     warning_threshold = models.FloatField(verbose_name=_("Порог предупреждения"))
     critical_threshold = models.FloatField(verbose_name=_("Критический порог"))
+    operator = models.CharField(
+        max_length=10,
+        choices=PerformanceAlert.COMPARISON_OPERATORS,
+        default='gt',
+        verbose_name=_("Оператор сравнения")
+    )
     
-    # Условия
+    # Скользящее окно: агрегат значений за window_seconds сравнивается с порогами
+    aggregation = models.CharField(max_length=10, choices=AGGREGATIONS, default='avg', verbose_name=_("Агрегат"))
+    window_seconds = models.PositiveIntegerField(default=300, verbose_name=_("Окно (сек)"))
+    min_samples = models.PositiveIntegerField(default=1, verbose_name=_("Минимум значений в окне"))
+    
+    # Условия: фильтры service/endpoint
     conditions = models.JSONField(default=dict, verbose_name=_("Условия"))
     
     # Настройки
@@ -348,6 +498,9 @@ class PerformanceThreshold(models.Model):
         verbose_name_plural = _("Пороговые значения")
         db_table = 'performance_thresholds'
         ordering = ['metric_type', 'name']
+        indexes = [
+            models.Index(fields=['tenant', 'is_active']),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.metric_type})"
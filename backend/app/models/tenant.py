@@ -149,6 +149,11 @@ class TenantConfiguration(models.Model):
     email_notifications = models.BooleanField(default=True, verbose_name=_("Уведомления по email"))
     sms_notifications = models.BooleanField(default=False, verbose_name=_("Уведомления по SMS"))
     push_notifications = models.BooleanField(default=True, verbose_name=_("Push-уведомления"))
+    notification_retention_days = models.PositiveIntegerField(
+        default=90,
+        verbose_name=_("Хранение прочитанных уведомлений (дни)"),
+        help_text=_("Прочитанные уведомления старше этого срока переносятся в архив; 0 — не архивировать"),
+    )
     
     # Безопасность
     password_policy = models.JSONField(default=dict, verbose_name=_("Политика паролей"))
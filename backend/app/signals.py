@@ -0,0 +1,128 @@
+"""
+Обработчики сигналов моделей WorkerNet.
+"""
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.dispatch import receiver
+
+from app.models.ab_testing import FeatureFlag
+from app.models.chat import ChatMessage
+from app.models.knowledge import KnowledgeArticle, KnowledgeArticleRating, KnowledgeCategory
+from app.models.notification import Notification
+from app.models.tenant import TenantConfiguration
+from app.models.ticket import SLA, Tag, Ticket
+from app.core import reference_cache as references
+from app.core.response_cache import response_cache
+from app.core.chat_conversations import apply_new_message
+from app.core.chat_history import chat_history, serialize_message
+from app.core.notification_counters import unread_counter
+
+
+@receiver(post_save, sender=Notification)
+def notification_saved(sender, instance, created, **kwargs):
+    """Увеличить счётчик непрочитанных при создании уведомления."""
+    if created and not instance.is_read:
+        transaction.on_commit(
+            lambda: unread_counter.adjust_and_publish(instance.user_id, 1)
+        )
+
+
+@receiver(post_delete, sender=Notification)
+def notification_deleted(sender, instance, **kwargs):
+    """Уменьшить счётчик непрочитанных при удалении уведомления."""
+    if not instance.is_read:
+        transaction.on_commit(
+            lambda: unread_counter.adjust_and_publish(instance.user_id, -1)
+        )
+
+
+@receiver(post_save, sender=ChatMessage)
+def chat_message_saved(sender, instance, created, **kwargs):
+    """Обновить сводки бесед и буфер истории комнаты при новом сообщении."""
+    if created:
+        apply_new_message(instance)
+        transaction.on_commit(
+            lambda: chat_history.append(instance.room_name, serialize_message(instance))
+        )
+
+
+def _invalidate_references(keys):
+    """Сбросить справочники в Redis и в локальных кешах всех процессов после коммита."""
+    transaction.on_commit(lambda: references.reference_cache.invalidate(keys))
+
+
+@receiver(post_save, sender=TenantConfiguration)
+@receiver(post_delete, sender=TenantConfiguration)
+def tenant_configuration_changed(sender, instance, **kwargs):
+    _invalidate_references([references.tenant_configuration_key(instance.tenant_id)])
+
+
+@receiver(post_save, sender=SLA)
+@receiver(post_delete, sender=SLA)
+def sla_changed(sender, instance, **kwargs):
+    # Приоритет мог измениться: сбрасываем SLA арендатора по всем приоритетам
+    _invalidate_references([
+        references.sla_key(instance.tenant_id, priority) for priority, _ in Ticket.PRIORITY_CHOICES
+    ])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    _invalidate_references([references.TAGS_KEY])
+    _invalidate_responses(['tags'])
+
+
+@receiver(post_save, sender=FeatureFlag)
+@receiver(post_delete, sender=FeatureFlag)
+@receiver(m2m_changed, sender=FeatureFlag.target_tenants.through)
+def feature_flag_changed(sender, action='post_save', **kwargs):
+    if action.startswith('post_'):
+        _invalidate_references([references.FEATURE_FLAGS_KEY])
+
+
+def _invalidate_responses(resources, tenant_ids=(None,)):
+    """Сменить версии ресурсов в кеше ответов API после коммита."""
+    def invalidate():
+        for tenant_id in tenant_ids:
+            response_cache.invalidate(resources, tenant_id)
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=KnowledgeArticle)
+@receiver(post_delete, sender=KnowledgeArticle)
+def knowledge_article_changed(sender, instance, update_fields=None, **kwargs):
+    # Счётчик просмотров растёт при каждом открытии статьи: списки с ним
+    # обновляются по TTL кеша ответов, а не сбрасываются на каждый просмотр
+    if update_fields is not None and set(update_fields) == {'view_count'}:
+        return
+    # В дереве категорий есть число статей
+    _invalidate_responses(['knowledge_articles', 'knowledge_categories'], [instance.tenant_id])
+
+
+@receiver(m2m_changed, sender=KnowledgeArticle.tags.through)
+def knowledge_article_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        tenant_ids = [instance.tenant_id]
+    else:
+        # instance - тег, статьи в pk_set (при очистке - все статьи тега)
+        articles = KnowledgeArticle.objects.filter(tags=instance) if pk_set is None else \
+            KnowledgeArticle.objects.filter(pk__in=pk_set)
+        tenant_ids = set(articles.values_list('tenant_id', flat=True))
+    _invalidate_responses(['knowledge_articles'], tenant_ids)
+
+
+@receiver(post_save, sender=KnowledgeCategory)
+@receiver(post_delete, sender=KnowledgeCategory)
+def knowledge_category_changed(sender, instance, **kwargs):
+    # В списках статей есть название категории
+    _invalidate_responses(['knowledge_categories', 'knowledge_articles'], [instance.tenant_id])
+
+
+@receiver(post_save, sender=KnowledgeArticleRating)
+@receiver(post_delete, sender=KnowledgeArticleRating)
+def knowledge_article_rating_changed(sender, instance, **kwargs):
+    tenant_ids = KnowledgeArticle.objects.filter(pk=instance.article_id).values_list('tenant_id', flat=True)
+    _invalidate_responses(['knowledge_articles'], list(tenant_ids))
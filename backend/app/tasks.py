@@ -0,0 +1,55 @@
+"""
+Фоновые задачи Celery для WorkerNet.
+"""
+from celery import shared_task
+
+from app.core.chat_writer import recover_pending
+from app.core.dashboard_renderer import refresh_watched
+from app.core.metric_rollups import expire_metrics
+from app.core.notification_digest import digest_engine
+from app.core.notification_retention import NotificationArchiver, ensure_monthly_partitions
+from app.core.performance_reports import report_builder
+
+
+@shared_task(name='app.notifications.archive_read')
+def archive_read_notifications(batch_size=1000, pause=0.05):
+    """Перенести прочитанные уведомления старше срока хранения в архив."""
+    archiver = NotificationArchiver(batch_size=batch_size, pause=pause)
+    archived = archiver.archive_all()
+    return {str(tenant_id): count for tenant_id, count in archived.items() if count}
+
+
+@shared_task(name='app.notifications.ensure_partitions')
+def ensure_notification_partitions(months_ahead=2):
+    """Заранее создать помесячные партиции таблицы уведомлений."""
+    return ensure_monthly_partitions(months_ahead=months_ahead)
+
+
+@shared_task(name='app.notifications.flush_digests')
+def flush_notification_digests(limit=500):
+    """Сформировать сводки уведомлений, срок отправки которых наступил."""
+    return digest_engine.flush_due(limit=limit)
+
+
+@shared_task(name='app.chat.recover_pending')
+def recover_chat_messages(min_age=30.0):
+    """Дописать в БД сообщения чата, оставшиеся в потоке после сбоя воркера."""
+    return recover_pending(min_age=min_age)
+
+
+@shared_task(name='app.performance.expire_metrics')
+def expire_performance_metrics(batch_size=5000, pause=0.05):
+    """Удалить сырые метрики и агрегаты старше сроков хранения."""
+    return expire_metrics(batch_size=batch_size, pause=pause)
+
+
+@shared_task(name='app.performance.refresh_dashboards')
+def refresh_performance_dashboards():
+    """Разослать изменившиеся виджеты открытых дашбордов производительности."""
+    return refresh_watched()
+
+
+@shared_task(name='app.performance.generate_report')
+def generate_performance_report(report_id):
+    """Сформировать отчет производительности и сохранить сжатый результат."""
+    return report_builder.build(report_id)
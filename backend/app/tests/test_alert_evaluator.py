@@ -0,0 +1,83 @@
+"""
+Тесты потоковой оценки порогов производительности.
+"""
+import time
+from unittest import mock
+
+from django.test import TestCase
+
+from app.core.alert_evaluator import CRITICAL, WARNING, ThresholdEvaluator
+from app.models import PerformanceAlert, PerformanceThreshold
+from app.tests.utils import create_tenant
+
+
+class ThresholdEvaluatorTest(TestCase):
+
+    def setUp(self):
+        self.tenant = create_tenant('alerts')
+        self.threshold = PerformanceThreshold.objects.create(
+            name="Время ответа", metric_type='response_time', metric_name='api.latency',
+            warning_threshold=100, critical_threshold=200, operator='gt',
+            aggregation='avg', window_seconds=60, tenant=self.tenant,
+        )
+
+    def evaluator(self):
+        # Проверка тишины на каждом пакете
+        return ThresholdEvaluator(refresh_interval=60, sweep_interval=0)
+
+    def sample(self, value, ts=None, name='api.latency'):
+        ts = time.time() if ts is None else ts
+        return (self.tenant.id, name, 'response_time', '', '', ts, value)
+
+    def open_alerts(self):
+        return PerformanceAlert.objects.filter(
+            threshold=self.threshold, status__in=PerformanceAlert.OPEN_STATUSES
+        )
+
+    def test_fires_and_escalates(self):
+        evaluator = self.evaluator()
+        transitions = evaluator.process([self.sample(50), self.sample(250)])
+        self.assertEqual([(t['transition'], t['level']) for t in transitions], [('fired', WARNING)])
+        alert = self.open_alerts().get()
+        self.assertEqual((alert.severity, alert.current_value), ('medium', 150))
+
+        transitions = evaluator.process([self.sample(500)])
+        self.assertEqual([(t['transition'], t['level']) for t in transitions], [('escalated', CRITICAL)])
+        alert.refresh_from_db()
+        self.assertEqual((alert.severity, alert.threshold_value), ('critical', 200))
+
+    def test_resolves_when_window_goes_quiet(self):
+        evaluator = ThresholdEvaluator(refresh_interval=60, sweep_interval=3600)
+        evaluator.process([self.sample(300, ts=time.time() - 120)])
+        alert = self.open_alerts().get()
+
+        evaluator.sweep_interval = 0
+        transitions = evaluator.process([])
+        self.assertEqual([t['transition'] for t in transitions], ['resolved'])
+        alert.refresh_from_db()
+        self.assertEqual(alert.status, 'resolved')
+        self.assertIsNotNone(alert.resolved_at)
+
+    def test_other_worker_does_not_resolve_ongoing_breach(self):
+        self.evaluator().process([self.sample(150)])
+        alert = self.open_alerts().get()
+
+        # Второй воркер (или процесс после перезапуска) загружает правила,
+        # но значений этой метрики не получал
+        other = self.evaluator()
+        self.assertEqual(other.process([self.sample(1, name='other.metric')]), [])
+        self.assertEqual(other.process([]), [])
+        alert.refresh_from_db()
+        self.assertEqual(alert.status, 'active')
+
+        # Нарушение у второго воркера не открывает дубликат
+        self.assertEqual(other.process([self.sample(150)]), [])
+        self.assertEqual(self.open_alerts().count(), 1)
+
+    def test_alert_is_written_outside_window_lock(self):
+        evaluator = self.evaluator()
+        locked = []
+        with mock.patch.object(ThresholdEvaluator, '_open_alert',
+                               side_effect=lambda *args: locked.append(evaluator._lock.locked())):
+            evaluator.process([self.sample(300)])
+        self.assertEqual(locked, [False])
@@ -0,0 +1,74 @@
+"""
+Тесты общего фонового пакетировщика.
+"""
+import threading
+
+from django.test import SimpleTestCase
+
+from app.core.batching import BackgroundBatcher
+
+
+class RecordingBatcher(BackgroundBatcher):
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.batches = []
+        self.sizes = []
+        self.release = threading.Event()
+        self.release.set()
+        self.processed = threading.Event()
+
+    def process_batch(self, batch):
+        self.release.wait(5)
+        self.batches.append(list(batch))
+        self.processed.set()
+        return len(batch)
+
+    def buffer_changed(self, size):
+        self.sizes.append(size)
+
+
+class BackgroundBatcherTest(SimpleTestCase):
+
+    def batcher(self, **kwargs):
+        options = {'batch_size': 3, 'flush_interval': 60, 'max_size': 4}
+        options.update(kwargs)
+        batcher = RecordingBatcher(**options)
+        self.addCleanup(batcher.stop)
+        return batcher
+
+    def test_full_batch_is_processed_by_the_flusher(self):
+        batcher = self.batcher()
+        self.assertEqual(batcher.add_nowait([1, 2, 3]), 3)
+        self.assertTrue(batcher.processed.wait(5))
+        self.assertEqual(batcher.batches, [[1, 2, 3]])
+        self.assertEqual(batcher.buffered, 0)
+
+    def test_flush_processes_partial_batches(self):
+        batcher = self.batcher()
+        batcher.add_nowait([1, 2])
+        self.assertEqual(batcher.flush(), 2)
+        self.assertEqual(batcher.batches, [[1, 2]])
+        self.assertEqual(batcher.sizes[-1], 0)
+
+    def test_add_nowait_drops_what_does_not_fit(self):
+        batcher = self.batcher(batch_size=10)
+        self.assertEqual(batcher.add_nowait([1, 2, 3]), 3)
+        self.assertEqual(batcher.add_nowait([4, 5, 6]), 1)
+        self.assertEqual(batcher.flush(), 4)
+
+    def test_add_gives_up_while_the_buffer_is_full(self):
+        batcher = self.batcher(batch_size=10)
+        self.assertTrue(batcher.add([1, 2, 3], timeout=0))
+        self.assertFalse(batcher.add([4, 5], timeout=0.05))
+        self.assertEqual(batcher.buffered, 3)
+
+    def test_add_waits_for_the_flusher_to_free_space(self):
+        batcher = self.batcher(batch_size=2)
+        # Фоновый поток забирает пакет, но держит его до release
+        batcher.release.clear()
+        self.assertTrue(batcher.add([1, 2, 3, 4], timeout=0))
+        threading.Timer(0.05, batcher.release.set).start()
+        self.assertTrue(batcher.add([5, 6, 7], timeout=5))
+        batcher.flush()
+        self.assertEqual(sorted(sum(batcher.batches, [])), [1, 2, 3, 4, 5, 6, 7])
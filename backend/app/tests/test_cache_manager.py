@@ -0,0 +1,90 @@
+"""
+Тесты CacheManager: отрицательное кеширование, защита от лавины, инвалидация.
+"""
+import threading
+import time
+from unittest import mock
+
+import redis
+from django.test import SimpleTestCase
+
+from app.core.performance_monitoring import CacheManager
+from app.tests.utils import fake_redis
+
+
+class CacheManagerTest(SimpleTestCase):
+
+    def setUp(self):
+        self.redis = fake_redis()
+        # Без вероятностного раннего пересчёта: результаты детерминированы
+        self.manager = CacheManager(self.redis, negative_ttl=30, beta=0)
+        self.calls = []
+
+    def fetch(self, value):
+        def fetch_func():
+            self.calls.append(value)
+            return value
+        return fetch_func
+
+    def test_falsy_values_are_cached(self):
+        for value in (0, [], '', False):
+            with self.subTest(value=value):
+                self.calls.clear()
+                key = f'ticket_list:{value!r}'
+                self.assertEqual(self.manager.get_or_set(key, self.fetch(value)), value)
+                self.assertEqual(self.manager.get_or_set(key, self.fetch(value)), value)
+                self.assertEqual(self.calls, [value])
+
+    def test_none_is_cached_for_negative_ttl(self):
+        self.assertIsNone(self.manager.get_or_set('user_profile:1', self.fetch(None)))
+        self.assertIsNone(self.manager.get_or_set('user_profile:1', self.fetch(None)))
+        self.assertEqual(self.calls, [None])
+        self.assertLessEqual(self.redis.ttl('user_profile:1'), 30)
+
+    def test_namespace_invalidation_switches_version(self):
+        key, namespace = 'knowledge_articles:list', 'kb:1'
+        self.assertEqual(self.manager.get_or_set(key, self.fetch('old'), namespace=namespace), 'old')
+        self.assertEqual(self.manager.namespace_versions([namespace, 'kb:2']), [0, 0])
+
+        self.assertEqual(self.manager.invalidate_namespace(namespace), 1)
+        self.assertEqual(self.manager.get_or_set(key, self.fetch('new'), namespace=namespace), 'new')
+        self.assertEqual(self.manager.namespace_versions([namespace, 'kb:2']), [1, 0])
+        # Ключи других пространств не затронуты
+        other = 'knowledge_articles:list:2'
+        self.manager.get_or_set(other, self.fetch('other'), namespace='kb:2')
+        self.manager.invalidate_namespace(namespace)
+        self.assertEqual(self.manager.get_or_set(other, self.fetch('recomputed'), namespace='kb:2'), 'other')
+
+    def test_pattern_invalidation_scans_in_batches(self):
+        for n in range(7):
+            self.redis.set(f'ticket_list:{n}', n)
+        self.redis.set('user_profile:1', 1)
+
+        self.assertEqual(self.manager.invalidate('ticket_list:*', batch_size=3), 7)
+        self.assertEqual(self.redis.keys('*'), [b'user_profile:1'])
+
+    def test_concurrent_misses_compute_once(self):
+        def slow():
+            self.calls.append(threading.get_ident())
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.manager.get_or_set('system_config:x', slow)))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['value'] * 4)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_unavailable_redis_falls_back_to_fetch(self):
+        broken = mock.Mock(spec=redis.Redis)
+        broken.get.side_effect = redis.ConnectionError
+        broken.incr.side_effect = redis.ConnectionError
+        manager = CacheManager(broken)
+        self.assertEqual(manager.get_or_set('user_profile:1', self.fetch('db')), 'db')
+        self.assertIsNone(manager.invalidate_namespace('kb:1'))
@@ -0,0 +1,77 @@
+"""
+Тесты доступа к комнате через консюмер чата.
+"""
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser
+from django.test import TransactionTestCase, override_settings
+
+from app.core.chat_history import chat_history
+from app.core.presence import presence
+from app.management.commands._websocket_bench import websocket_application
+from app.models.chat import ChatMessage
+from app.tests.utils import IN_MEMORY_CHANNEL_LAYERS, create_tenant, create_user, fake_redis
+from channels.testing.websocket import WebsocketCommunicator
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, CHAT_WRITE_BEHIND_ENABLED=False)
+class ChatConsumerAccessTest(TransactionTestCase):
+    # Консюмер читает БД из потока database_sync_to_async, поэтому данные
+    # должны быть зафиксированы
+
+    def setUp(self):
+        for patcher in (
+            mock.patch.object(chat_history, '_redis', fake_redis()),
+            mock.patch.object(presence, 'connect', new_callable=mock.AsyncMock),
+            mock.patch.object(presence, 'disconnect', new_callable=mock.AsyncMock),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        tenant = create_tenant('chat-consumer')
+        self.alice = create_user(tenant, 'chat-consumer')
+        self.mallory = create_user(tenant, 'chat-consumer')
+        ChatMessage.objects.create(room_name='support', sender=self.alice, content='секрет')
+
+    def session(self, user, frames=()):
+        """Подключиться к комнате, отправить кадры; вернуть (connected, ответы)."""
+        async def run():
+            communicator = WebsocketCommunicator(websocket_application(), '/ws/chat/support/')
+            communicator.scope['user'] = user
+            connected, _ = await communicator.connect()
+            replies = []
+            if connected:
+                replies.append(await communicator.receive_json_from())
+                for frame in frames:
+                    await communicator.send_json_to(frame)
+                    replies.append(await communicator.receive_json_from())
+            await communicator.disconnect()
+            return connected, replies
+        return async_to_sync(run)()
+
+    def test_anonymous_socket_is_refused(self):
+        connected, _ = self.session(AnonymousUser())
+        self.assertFalse(connected)
+
+    def test_participant_gets_history(self):
+        connected, (history,) = self.session(self.alice)
+        self.assertTrue(connected)
+        self.assertEqual([m['content'] for m in history['messages']], ['секрет'])
+
+    def test_non_participant_gets_no_history(self):
+        load_older = {'type': 'load_older', 'before': {'timestamp': '2100-01-01T00:00:00+00:00', 'id': 1}}
+        connected, (history, older) = self.session(self.mallory, [load_older])
+        self.assertTrue(connected)
+        self.assertEqual(history['messages'], [])
+        self.assertFalse(history['has_more'])
+        self.assertEqual(older, {'type': 'error', 'message': 'Not a room participant'})
+
+    def test_sender_becomes_participant(self):
+        load_older = {'type': 'load_older', 'before': {'timestamp': '2100-01-01T00:00:00+00:00', 'id': 2 ** 31}}
+        connected, (_, sent, older) = self.session(self.mallory, [
+            {'type': 'chat_message', 'message': {'content': 'привет'}},
+            load_older,
+        ])
+        self.assertEqual(sent['message']['content'], 'привет')
+        self.assertEqual(older['type'], 'history_page')
+        self.assertEqual([m['content'] for m in older['messages']], ['секрет', 'привет'])
@@ -0,0 +1,69 @@
+"""
+Тесты сводок бесед чата.
+"""
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from app.models import ChatConversation, ChatMessage
+from app.tests.utils import create_user
+
+
+def legacy_history(messages):
+    """Сообщения без сводок, как история старше таблицы ChatConversation."""
+    start = timezone.now() - timedelta(hours=1)
+    return ChatMessage.objects.bulk_create([
+        ChatMessage(room_name=room, sender=sender, content=f"m{n}", timestamp=start + timedelta(minutes=n))
+        for n, (room, sender) in enumerate(messages)
+    ])
+
+
+class ConversationBackfillTest(APITestCase):
+
+    def setUp(self):
+        self.alice = create_user(prefix='chat')
+        self.bob = create_user(tenant=self.alice.tenant, prefix='chat')
+        legacy_history([
+            ('room-a', self.alice), ('room-a', self.bob), ('room-a', self.bob),
+            ('room-b', self.alice), ('room-b', self.bob),
+        ])
+        self.client.force_authenticate(self.alice)
+
+    def conversations(self):
+        response = self.client.get(reverse('chat-message-conversations'))
+        self.assertEqual(response.status_code, 200)
+        return {row['room_name']: row['unread_count'] for row in response.data['results']}
+
+    def test_list_does_not_backfill(self):
+        # Список бесед читает только таблицу сводок
+        self.assertEqual(self.conversations(), {})
+        self.assertFalse(ChatConversation.objects.exists())
+
+    def test_missing_rooms_are_rebuilt_next_to_existing_rows(self):
+        # Новое сообщение создаёт сводку только для своей комнаты
+        ChatMessage.objects.create(room_name='room-a', sender=self.alice, content="новое")
+        self.assertEqual(list(ChatConversation.objects.filter(user=self.alice).values_list('room_name', flat=True)),
+                         ['room-a'])
+
+        call_command('backfill_chat_conversations', stdout=StringIO())
+        self.assertEqual(self.conversations(), {'room-a': 0, 'room-b': 1})
+
+    def test_backfilled_participant_gets_increments(self):
+        call_command('backfill_chat_conversations', stdout=StringIO())
+        ChatMessage.objects.create(room_name='room-b', sender=self.bob, content="ещё")
+        self.assertEqual(self.conversations(), {'room-a': 2, 'room-b': 2})
+
+    def test_command_backfills_every_participant(self):
+        out = StringIO()
+        call_command('backfill_chat_conversations', stdout=out)
+        self.assertIn("4", out.getvalue())
+        self.assertEqual(
+            dict(ChatConversation.objects.filter(user=self.bob).values_list('room_name', 'unread_count')),
+            {'room-a': 1, 'room-b': 1}
+        )
+        call_command('backfill_chat_conversations', stdout=out)
+        self.assertEqual(ChatConversation.objects.count(), 4)
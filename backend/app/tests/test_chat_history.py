@@ -0,0 +1,42 @@
+"""
+Тесты истории комнаты чата (REST, keyset-пагинация).
+"""
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from app.tests.test_chat_conversations import legacy_history
+from app.tests.utils import create_user
+
+
+class ChatHistoryScopingTest(APITestCase):
+
+    def setUp(self):
+        self.alice = create_user(prefix='history')
+        self.bob = create_user(tenant=self.alice.tenant, prefix='history')
+        self.stranger = create_user(prefix='history')
+        legacy_history([('room-a', self.alice), ('room-a', self.bob), ('room-a', self.bob)])
+
+    def history(self, user, **params):
+        self.client.force_authenticate(user)
+        return self.client.get(reverse('chat-message-history'), {'room_name': 'room-a', **params})
+
+    def test_participant_reads_history_with_cursor(self):
+        response = self.history(self.bob, limit=2)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([m['content'] for m in response.data['results']], ['m1', 'm2'])
+
+        cursor = response.data['next']
+        response = self.history(self.bob, limit=2, before=cursor['before'], before_id=cursor['before_id'])
+        self.assertEqual([m['content'] for m in response.data['results']], ['m0'])
+        self.assertIsNone(response.data['next'])
+
+    def test_non_participant_gets_404(self):
+        # Пользователь другого арендатора не видит комнату
+        self.assertEqual(self.history(self.stranger).status_code, 404)
+        self.assertEqual(self.history(self.stranger, room_name='no-such-room').status_code, 404)
+
+    def test_limit_out_of_range_is_rejected(self):
+        for limit in ('0', '-1', '201', 'abc'):
+            with self.subTest(limit=limit):
+                self.assertEqual(self.history(self.alice, limit=limit).status_code, 400)
+        self.assertEqual(self.history(self.alice, limit=200).status_code, 200)
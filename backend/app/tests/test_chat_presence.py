@@ -0,0 +1,38 @@
+"""
+Тесты продления статуса онлайн в консюмере чата.
+"""
+import json
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+
+from app.api.consumers import ChatConsumer
+from app.core.presence import presence
+
+
+class ChatPresenceTest(SimpleTestCase):
+
+    def setUp(self):
+        self.consumer = ChatConsumer()
+        self.consumer.scope = {'user': SimpleNamespace(is_authenticated=True, tenant_id=1, id=7)}
+        # Последнее продление - дольше трети TTL назад
+        self.consumer.presence_touched_at = time.monotonic() - presence.ttl
+
+    def receive(self, frame):
+        async_to_sync(self.consumer.receive)(text_data=json.dumps(frame))
+
+    @mock.patch.object(presence, 'heartbeat', new_callable=mock.AsyncMock)
+    def test_any_frame_refreshes_presence_once_per_interval(self, heartbeat):
+        # Клиент не шлёт heartbeat: статус продлевает любой кадр
+        self.receive({'type': 'unknown'})
+        heartbeat.assert_awaited_once_with(1, 7)
+
+        self.receive({'type': 'heartbeat'})
+        self.assertEqual(heartbeat.await_count, 1)
+
+        self.consumer.presence_touched_at -= presence.ttl
+        self.receive({'type': 'heartbeat'})
+        self.assertEqual(heartbeat.await_count, 2)
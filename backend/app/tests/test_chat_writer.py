@@ -0,0 +1,165 @@
+"""
+Тесты отложенной записи сообщений чата.
+"""
+import asyncio
+from types import SimpleNamespace
+from unittest import mock
+
+import fakeredis
+import redis
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.auth.models import AnonymousUser
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+
+from app.core import ws_frames
+from app.core.chat_history import chat_history
+from app.core.chat_writer import DEAD_LETTER_STREAM, PENDING_STREAM, ChatWriteBehind, recover_pending
+from app.models.chat import ChatMessage
+from app.tests.utils import IN_MEMORY_CHANNEL_LAYERS, create_user, fake_redis
+
+
+class ChatWriterSubmitTest(TransactionTestCase):
+
+    def setUp(self):
+        self.writer = ChatWriteBehind()
+        self.writer._redis = mock.AsyncMock()
+
+    def submit(self, sender):
+        return async_to_sync(self.writer.submit)('support', sender, 'привет')
+
+    def test_anonymous_sender_is_rejected_before_queueing(self):
+        for sender in (AnonymousUser(), SimpleNamespace(is_authenticated=True, id=None, username='x')):
+            with self.assertRaises(ValueError):
+                self.submit(sender)
+        self.writer.redis.xadd.assert_not_awaited()
+        self.assertEqual(self.writer._buffer, [])
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class ChatWriterFlushTest(TransactionTestCase):
+    # Запись идёт из потока database_sync_to_async, данные должны фиксироваться
+
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+        patcher = mock.patch.object(chat_history, '_redis', fakeredis.FakeRedis(server=self.server))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = create_user(prefix='chat-writer')
+
+    def writer(self, **kwargs):
+        writer = ChatWriteBehind(**kwargs)
+        writer._redis = fakeredis.FakeAsyncRedis(server=self.server)
+        return writer
+
+    def test_messages_are_broadcast_first_and_persisted_in_one_batch(self):
+        async def run():
+            writer = self.writer(batch_size=100, flush_interval=60)
+            layer = get_channel_layer()
+            channel = await layer.new_channel()
+            await layer.group_add('chat_support', channel)
+
+            payloads = [await writer.submit('support', self.user, f"m{n}") for n in range(3)]
+            pending = await writer.redis.xlen(PENDING_STREAM)
+            stored_before = await ChatMessage.objects.acount()
+            created = await writer.flush()
+            persisted = [
+                ws_frames.decode((await layer.receive(channel))['frames'][ws_frames.JSON])
+                for _ in created
+            ]
+            return payloads, pending, stored_before, created, persisted, await writer.redis.xlen(PENDING_STREAM)
+
+        payloads, pending, stored_before, created, persisted, pending_after = async_to_sync(run)()
+
+        self.assertTrue(all(p['provisional'] and p['id'] == p['client_id'] for p in payloads))
+        self.assertEqual((pending, stored_before), (3, 0))
+        self.assertEqual([m.content for m in created], ['m0', 'm1', 'm2'])
+        self.assertEqual(pending_after, 0)
+        self.assertEqual(
+            {(event['client_id'], event['id']) for event in persisted},
+            {(m.client_id, m.id) for m in created}
+        )
+        self.assertEqual({p['client_id'] for p in payloads}, {m.client_id for m in created})
+
+    def test_full_batch_is_flushed_without_waiting_for_the_timer(self):
+        async def run():
+            writer = self.writer(batch_size=2, flush_interval=60)
+            await writer.submit('support', self.user, "первое")
+            await writer.submit('support', self.user, "второе")
+            for _ in range(100):
+                if not writer._buffer and await ChatMessage.objects.acount() == 2:
+                    break
+                await asyncio.sleep(0.01)
+            return writer._flush_handle
+
+        self.assertIsNone(async_to_sync(run)())
+        self.assertEqual(ChatMessage.objects.count(), 2)
+
+    def test_message_is_written_through_without_stream(self):
+        async def run():
+            writer = ChatWriteBehind()
+            writer._redis = mock.AsyncMock()
+            writer._redis.xadd.side_effect = redis.ConnectionError("down")
+            return await writer.submit('support', self.user, "сразу")
+
+        payload = async_to_sync(run)()
+        message = ChatMessage.objects.get()
+        self.assertFalse(payload['provisional'])
+        self.assertEqual((payload['id'], message.content), (message.id, "сразу"))
+
+
+class RecoverPendingTest(TransactionTestCase):
+    # Нарушение внешнего ключа SQLite проверяет при фиксации транзакции
+
+    def setUp(self):
+        self.redis = fake_redis()
+        for patcher in (
+            mock.patch('app.core.chat_writer.get_redis_client', return_value=self.redis),
+            mock.patch.object(chat_history, '_redis', self.redis),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = create_user(prefix='chat-writer')
+
+    def queue(self, client_id, sender_id, **extra):
+        fields = {
+            'client_id': client_id,
+            'room_name': 'support',
+            'sender_id': str(sender_id),
+            'content': client_id,
+            'message_type': 'text',
+            'timestamp': timezone.now().isoformat(),
+        }
+        fields.update(extra)
+        self.redis.xadd(PENDING_STREAM, fields)
+
+    def dead_letters(self):
+        return [fields[b'client_id'].decode() for _, fields in self.redis.xrange(DEAD_LETTER_STREAM)]
+
+    def test_valid_batch_is_persisted(self):
+        self.queue('first', self.user.id)
+        self.queue('second', self.user.id)
+
+        self.assertEqual(recover_pending(min_age=-1), 2)
+        self.assertEqual(
+            list(ChatMessage.objects.order_by('id').values_list('client_id', flat=True)),
+            ['first', 'second']
+        )
+        self.assertEqual(self.redis.xlen(PENDING_STREAM), 0)
+        self.assertEqual(self.dead_letters(), [])
+
+    def test_bad_entries_do_not_block_the_batch(self):
+        self.queue('good', self.user.id)
+        self.queue('anonymous', None)
+        self.queue('no-timestamp', self.user.id, timestamp='')
+        self.queue('deleted-sender', self.user.id + 1000)
+        self.queue('also-good', self.user.id)
+
+        self.assertEqual(recover_pending(min_age=-1), 2)
+        self.assertEqual(
+            sorted(ChatMessage.objects.values_list('client_id', flat=True)),
+            ['also-good', 'good']
+        )
+        self.assertEqual(self.redis.xlen(PENDING_STREAM), 0)
+        self.assertEqual(sorted(self.dead_letters()), ['anonymous', 'deleted-sender', 'no-timestamp'])
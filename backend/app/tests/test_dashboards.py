@@ -0,0 +1,206 @@
+"""
+Тесты отрисовки дашбордов производительности и рассылки обновлений.
+"""
+from datetime import timedelta
+from unittest import mock
+
+import fakeredis
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from app.core import dashboard_renderer, ws_frames
+from app.core.metric_ingest import COLUMNS
+from app.core.metric_rollups import apply_rollups
+from app.management.commands._websocket_bench import websocket_application
+from app.models import PerformanceDashboard
+from app.tests.utils import IN_MEMORY_CHANNEL_LAYERS, LOCMEM_CACHES, create_user
+from channels.testing.websocket import WebsocketCommunicator
+
+
+WIDGETS = [
+    {'widget_type': 'stat', 'title': "Задержка API", 'config': {'metric': 'api.latency', 'stat': 'max'}},
+    {'widget_type': 'top', 'title': "Медленные эндпоинты",
+     'config': {'metric': 'api.latency', 'group_by': 'endpoint', 'stat': 'max'}},
+    {'widget_type': 'stat', 'title': "Очередь", 'config': {'metric': 'queue.depth', 'stat': 'count'}},
+    {'widget_type': 'text', 'title': "Заметка", 'data': {'text': "дежурный: вторая линия"}},
+    {'widget_type': 'stat', 'title': "Без метрики", 'config': {}},
+]
+
+
+def record(tenant, name, *values, endpoint='/api/v1/tickets/'):
+    """Записать значения метрики в агрегаты, как это делает приём метрик."""
+    rows = []
+    for value in values:
+        row = dict.fromkeys(COLUMNS, '')
+        row.update(name=name, metric_type='response_time', value=value, endpoint=endpoint,
+                   tenant_id=tenant.id, tags='{}', metadata='{}',
+                   timestamp=timezone.now() - timedelta(minutes=5))
+        rows.append(tuple(row[column] for column in COLUMNS))
+    apply_rollups(rows, COLUMNS)
+
+
+def create_dashboard(user, widgets=WIDGETS):
+    return PerformanceDashboard.objects.create(
+        name="API", tenant=user.tenant, created_by=user, widgets=widgets
+    )
+
+
+@override_settings(CACHES=LOCMEM_CACHES, CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class DashboardRenderTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user(prefix='dashboard')
+        self.client.force_authenticate(self.user)
+        self.dashboard = create_dashboard(self.user)
+        record(self.user.tenant, 'api.latency', 40.0, 60.0)
+        record(self.user.tenant, 'api.latency', 900.0, endpoint='/api/v1/reports/')
+
+    def render(self, dashboard=None):
+        dashboard = dashboard or self.dashboard
+        return self.client.get(reverse('performance-dashboard-render', args=[dashboard.id]))
+
+    def test_widgets_are_rendered_from_rollups(self):
+        response = self.render()
+
+        self.assertEqual(response.status_code, 200)
+        latency, top, queue, note, broken = response.data['widgets']
+        self.assertEqual((latency['data']['value'], latency['data']['count']), (900.0, 3))
+        self.assertEqual(
+            [(row['endpoint'], row['max']) for row in top['data']['rows']],
+            [('/api/v1/reports/', 900.0), ('/api/v1/tickets/', 60.0)]
+        )
+        self.assertEqual(queue['data']['value'], 0)
+        self.assertEqual(note['data'], {'text': "дежурный: вторая линия"})
+        self.assertIsNone(broken['data'])
+        self.assertIn('metric', broken['error'])
+
+    def test_second_render_is_served_from_widget_cache(self):
+        first = self.render().data['widgets']
+        self.assertFalse(any(widget['cached'] for widget in first[:3]))
+
+        with self.assertNumQueries(1):
+            second = self.render().data['widgets']
+        self.assertTrue(all(widget['cached'] for widget in second[:3]))
+        self.assertEqual([widget['data'] for widget in second], [widget['data'] for widget in first])
+
+    def test_dashboard_of_another_tenant_is_not_found(self):
+        stranger = create_user(prefix='dashboard-other')
+        self.assertEqual(self.render(create_dashboard(stranger)).status_code, 404)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS,
+                   DASHBOARD_WIDGET_TTL_1M=0)
+class DashboardPublishTest(APITestCase):
+    # Без кеша виджетов каждая публикация видит свежие агрегаты
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user(prefix='dashboard-push')
+        self.dashboard = create_dashboard(self.user, WIDGETS[:3])
+        record(self.user.tenant, 'api.latency', 40.0)
+        self.layer = get_channel_layer()
+        self.channel = async_to_sync(self.layer.new_channel)()
+        async_to_sync(self.layer.group_add)(dashboard_renderer.dashboard_group(self.dashboard.id), self.channel)
+
+    def received(self):
+        """Следующее событие группы дашборда (тип и полезная нагрузка)."""
+        event = async_to_sync(self.layer.receive)(self.channel)
+        return event['type'], ws_frames.decode(event['frames'][ws_frames.JSON])
+
+    def test_only_changed_widgets_are_pushed(self):
+        self.assertEqual(dashboard_renderer.publish(self.dashboard), 3)
+        handler, payload = self.received()
+        self.assertEqual((handler, payload['type']), ('dashboard_rendered', 'dashboard_rendered'))
+
+        self.assertEqual(dashboard_renderer.publish(self.dashboard), 0)
+
+        record(self.user.tenant, 'queue.depth', 7.0)
+        self.assertEqual(dashboard_renderer.publish(self.dashboard), 1)
+        handler, payload = self.received()
+        self.assertEqual(handler, 'dashboard_widgets_updated')
+        self.assertEqual([(w['index'], w['data']['value']) for w in payload['widgets']], [(2, 1)])
+
+    def test_added_widget_pushes_the_full_dashboard(self):
+        dashboard_renderer.publish(self.dashboard)
+        self.received()
+        self.client.force_authenticate(self.user)
+
+        response = self.client.post(
+            reverse('performance-dashboard-add-widget', args=[self.dashboard.id]), WIDGETS[3], format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['widgets_count'], 4)
+        handler, payload = self.received()
+        self.assertEqual(handler, 'dashboard_rendered')
+        self.assertEqual([w['title'] for w in payload['widgets']], [w['title'] for w in WIDGETS[:4]])
+
+    def test_invalid_widget_is_rejected(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.post(
+            reverse('performance-dashboard-add-widget', args=[self.dashboard.id]), WIDGETS[4], format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.dashboard.refresh_from_db()
+        self.assertEqual(len(self.dashboard.widgets), 3)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class DashboardConsumerTest(TransactionTestCase):
+    # Консюмер читает дашборд из потока database_sync_to_async
+
+    def setUp(self):
+        cache.clear()
+        server = fakeredis.FakeServer()
+        for patcher in (
+            mock.patch.object(dashboard_renderer, 'get_async_redis_client',
+                              return_value=fakeredis.aioredis.FakeRedis(server=server)),
+            mock.patch.object(dashboard_renderer, 'get_redis_client',
+                              return_value=fakeredis.FakeRedis(server=server)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = create_user(prefix='dashboard-ws')
+        self.dashboard = create_dashboard(self.user, WIDGETS[:1])
+        record(self.user.tenant, 'api.latency', 25.0)
+
+    def session(self, user, dashboard_id):
+        """Подключиться к дашборду; вернуть (connected, первый кадр, кадр после публикации)."""
+        async def run():
+            communicator = WebsocketCommunicator(
+                websocket_application(), f'/ws/performance/dashboards/{dashboard_id}/'
+            )
+            communicator.scope['user'] = user
+            connected, _ = await communicator.connect()
+            if not connected:
+                return False, None, None
+            rendered = await communicator.receive_json_from()
+            await get_channel_layer().group_send(
+                dashboard_renderer.dashboard_group(dashboard_id),
+                ws_frames.group_event('dashboard_widgets_updated', 'g', {'type': 'dashboard_widgets_updated'})
+            )
+            update = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return True, rendered, update
+        return async_to_sync(run)()
+
+    def test_socket_gets_rendering_and_updates(self):
+        connected, rendered, update = self.session(self.user, self.dashboard.id)
+
+        self.assertTrue(connected)
+        self.assertEqual(rendered['type'], 'dashboard_rendered')
+        self.assertEqual(rendered['widgets'][0]['data']['value'], 25.0)
+        self.assertEqual(update, {'type': 'dashboard_widgets_updated'})
+        self.assertEqual(dashboard_renderer.dashboard_watchers.watched(), [self.dashboard.id])
+
+    def test_dashboard_of_another_tenant_is_refused(self):
+        stranger = create_user(prefix='dashboard-ws-other')
+        connected, _, _ = self.session(stranger, self.dashboard.id)
+        self.assertFalse(connected)
+        self.assertEqual(dashboard_renderer.dashboard_watchers.watched(), [])
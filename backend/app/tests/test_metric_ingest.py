@@ -0,0 +1,77 @@
+"""
+Тесты пакетного приёма метрик производительности.
+"""
+from unittest import mock
+
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from app.core.metric_ingest import MetricIngestBuffer
+from app.models import PerformanceMetric, PerformanceMetricRollup
+from app.tests.utils import create_user
+
+
+def samples(count, **extra):
+    return [
+        dict({'name': 'api.latency', 'metric_type': 'response_time', 'value': 10.0 * (n + 1),
+              'unit': 'ms', 'endpoint': '/api/v1/tickets/', 'timestamp': '2026-10-19T12:00:00Z'}, **extra)
+        for n in range(count)
+    ]
+
+
+class MetricIngestTest(APITestCase):
+
+    def setUp(self):
+        self.user = create_user(prefix='ingest')
+        self.client.force_authenticate(self.user)
+        self.url = reverse('performance-metric-ingest')
+
+    def use_buffer(self, **options):
+        # Фоновый поток не сработает: запись выполняет flush() в потоке теста
+        options = dict({'batch_size': 1000, 'flush_interval': 60}, **options)
+        buffer = MetricIngestBuffer(**options)
+        patcher = mock.patch('app.api.views.performance.metric_ingest', buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(buffer.stop)
+        return buffer
+
+    def test_samples_are_buffered_then_written_with_rollups(self):
+        buffer = self.use_buffer()
+        response = self.client.post(self.url, {'samples': samples(3)}, format='json')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data, {'accepted': 3})
+        self.assertFalse(PerformanceMetric.objects.exists())
+
+        self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(
+            sorted(PerformanceMetric.objects.filter(tenant=self.user.tenant).values_list('value', flat=True)),
+            [10.0, 20.0, 30.0]
+        )
+        minute = PerformanceMetricRollup.objects.get(resolution='1m', tenant=self.user.tenant)
+        self.assertEqual((minute.count, minute.sum, minute.max), (3, 60.0, 30.0))
+
+    def test_invalid_sample_rejects_the_request(self):
+        buffer = self.use_buffer()
+        batch = samples(2)
+        batch[1]['value'] = 'fast'
+        response = self.client.post(self.url, batch, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('1', response.data['error'])
+        self.assertEqual(buffer.buffered, 0)
+
+    def test_full_buffer_answers_429(self):
+        buffer = self.use_buffer(max_buffer=3, submit_timeout=0)
+        self.assertEqual(self.client.post(self.url, samples(3), format='json').status_code, 202)
+
+        response = self.client.post(self.url, samples(1), format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertEqual(buffer.buffered, 3)
+
+        # Больше образцов, чем вмещает буфер, не примет и пустой буфер
+        buffer.flush()
+        self.assertEqual(self.client.post(self.url, samples(4), format='json').status_code, 400)
+        self.assertEqual(self.client.post(self.url, samples(1), format='json').status_code, 202)
@@ -0,0 +1,42 @@
+"""
+Тесты агрегатов метрик производительности.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import IntegrityError, transaction
+from django.test import TestCase
+
+from app.core.metric_ingest import COLUMNS
+from app.core.metric_rollups import apply_rollups
+from app.core.quantile_sketch import DDSketch
+from app.models import PerformanceMetricRollup
+
+
+TIMESTAMP = datetime(2026, 10, 19, 12, 30, 15, tzinfo=dt_timezone.utc)
+
+
+def sample(value, tenant_id=None):
+    row = dict.fromkeys(COLUMNS, '')
+    row.update(name='api.latency', metric_type='response_time', value=value,
+               tenant_id=tenant_id, timestamp=TIMESTAMP, tags='{}', metadata='{}')
+    return tuple(row[column] for column in COLUMNS)
+
+
+class NullTenantRollupTest(TestCase):
+
+    def test_batches_without_tenant_merge_into_one_bucket(self):
+        apply_rollups([sample(10.0)], COLUMNS)
+        apply_rollups([sample(30.0), sample(20.0)], COLUMNS)
+
+        rollups = PerformanceMetricRollup.objects.filter(tenant__isnull=True)
+        self.assertEqual(sorted(rollups.values_list('resolution', flat=True)), ['1d', '1h', '1m'])
+        minute = rollups.get(resolution='1m')
+        self.assertEqual((minute.count, minute.sum, minute.min, minute.max), (3, 60.0, 10.0, 30.0))
+        self.assertEqual(DDSketch.from_bytes(minute.sketch).count, 3)
+
+    def test_duplicate_bucket_without_tenant_is_rejected(self):
+        fields = dict(resolution='1m', name='api.latency', metric_type='response_time', service='',
+                      endpoint='', bucket_start=TIMESTAMP, min=1, max=1, sketch=DDSketch().to_bytes())
+        PerformanceMetricRollup.objects.create(**fields)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            PerformanceMetricRollup.objects.create(**fields)
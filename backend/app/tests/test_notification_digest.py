@@ -0,0 +1,122 @@
+"""
+Тесты движка сводок уведомлений.
+"""
+from datetime import timedelta
+from unittest import mock
+
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from app.core.notification_counters import UnreadNotificationCounter
+from app.core.notification_digest import NotificationDigestEngine
+from app.models import Notification
+from app.tests.utils import IN_MEMORY_CHANNEL_LAYERS, create_user, fake_redis
+
+
+def set_digest(user, frequency):
+    user.preferences = {'notifications': {'digest_frequency': frequency}}
+    user.save(update_fields=['preferences'])
+
+
+class DigestEngineMixin:
+
+    def setUp(self):
+        super().setUp()
+        redis_client = fake_redis()
+        self.engine = NotificationDigestEngine(redis_client=redis_client)
+        patcher = mock.patch(
+            'app.core.notification_digest.unread_counter',
+            UnreadNotificationCounter(redis_client=redis_client)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class NotificationDigestEngineTest(DigestEngineMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user(prefix='digest')
+
+    def test_immediate_preference_delivers_now(self):
+        notification = self.engine.notify(self.user, 'ticket', "Тикет обновлён")
+        self.assertIsNotNone(notification)
+        self.assertEqual(Notification.objects.filter(user=self.user).count(), 1)
+
+    def test_high_priority_is_not_buffered(self):
+        set_digest(self.user, 'hourly')
+        self.assertIsNotNone(self.engine.notify(self.user, 'ticket', "Срочно", priority='urgent'))
+        self.assertEqual(self.engine.pending(self.user.id), [])
+
+    def test_events_are_grouped_by_ticket(self):
+        set_digest(self.user, 'hourly')
+        for n in range(3):
+            self.assertIsNone(self.engine.notify(self.user, 'ticket', f"Обновление {n}", payload={'ticket_id': 7}))
+        self.engine.notify(self.user, 'system', "Обслуживание")
+
+        groups = {group['group']: group for group in self.engine.pending(self.user.id)}
+        self.assertEqual(groups['ticket:7']['count'], 3)
+        self.assertEqual(groups['ticket:7']['last']['title'], "Обновление 2")
+        self.assertEqual(groups['system']['count'], 1)
+        self.assertFalse(Notification.objects.filter(user=self.user).exists())
+
+    def test_flush_due_creates_one_digest(self):
+        set_digest(self.user, 'hourly')
+        for n in range(2):
+            self.engine.notify(self.user, 'ticket', f"Обновление {n}", payload={'ticket_id': 7})
+
+        self.assertEqual(self.engine.flush_due(now=timezone.now()), 0)
+        self.assertEqual(self.engine.flush_due(now=timezone.now() + timedelta(hours=2)), 1)
+
+        digest = Notification.objects.get(user=self.user)
+        self.assertEqual(digest.type, 'digest')
+        self.assertEqual(digest.payload['total'], 2)
+        self.assertEqual(self.engine.pending(self.user.id), [])
+
+    def test_failed_write_keeps_buffered_events(self):
+        set_digest(self.user, 'hourly')
+        self.engine.notify(self.user, 'ticket', "Обновление", payload={'ticket_id': 7})
+        later = timezone.now() + timedelta(hours=2)
+
+        with mock.patch.object(Notification.objects, 'bulk_create', side_effect=DatabaseError("down")):
+            with self.assertRaises(DatabaseError):
+                self.engine.flush_due(now=later)
+
+        groups = self.engine.pending(self.user.id)
+        self.assertEqual([(group['group'], group['count']) for group in groups], [('ticket:7', 1)])
+        self.assertEqual(self.engine.flush_due(now=later), 1)
+        self.assertEqual(Notification.objects.get(user=self.user).payload['total'], 1)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class NotificationCreateApiTest(DigestEngineMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch('app.api.views.notification.digest_engine', self.engine)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.sender = create_user(prefix='digest-api')
+        self.recipient = create_user(tenant=self.sender.tenant, prefix='digest-api')
+        self.client.force_authenticate(self.sender)
+        self.url = reverse('notification-list')
+
+    def test_create_goes_through_digest_engine(self):
+        response = self.client.post(self.url, {'user': self.recipient.pk, 'title': "Сразу"}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['user'], self.recipient.pk)
+
+        set_digest(self.recipient, 'daily')
+        response = self.client.post(self.url, {'user': self.recipient.pk, 'title': "В сводку"}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(self.engine.pending(self.recipient.id)), 1)
+
+    def test_recipient_from_other_tenant_is_rejected(self):
+        stranger = create_user(prefix='digest-api')
+        response = self.client.post(self.url, {'user': stranger.pk, 'title': "Чужому"}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Notification.objects.filter(user=stranger).exists())
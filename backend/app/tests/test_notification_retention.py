@@ -0,0 +1,81 @@
+"""
+Тесты хранения и архивации уведомлений.
+"""
+from datetime import date, timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from app.core.notification_retention import (
+    NotificationArchiver, ensure_monthly_partitions, iter_months, partition_name,
+)
+from app.models import Notification, NotificationArchive, TenantConfiguration
+from app.tests.utils import create_user
+
+
+def notification(user, days_ago, is_read=True, title="Уведомление"):
+    """Уведомление, созданное days_ago дней назад."""
+    created = Notification.objects.create(
+        user=user, title=title, message="Текст", payload={'ticket': 7}, is_read=is_read
+    )
+    Notification.objects.filter(pk=created.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+    return created
+
+
+@override_settings(NOTIFICATION_RETENTION_DAYS=30)
+class NotificationArchiverTest(TestCase):
+
+    def setUp(self):
+        self.user = create_user(prefix='retention')
+
+    def test_only_read_notifications_past_retention_are_archived(self):
+        old_read = notification(self.user, days_ago=40, title="Старое")
+        old_unread = notification(self.user, days_ago=40, is_read=False)
+        recent_read = notification(self.user, days_ago=5)
+
+        archived = NotificationArchiver().archive_all()
+
+        self.assertEqual(archived[self.user.tenant_id], 1)
+        self.assertEqual(set(Notification.objects.values_list('pk', flat=True)), {old_unread.pk, recent_read.pk})
+        archive = NotificationArchive.objects.get()
+        self.assertEqual(archive.notification_id, old_read.pk)
+        self.assertEqual(archive.user_id, self.user.pk)
+        self.assertEqual(archive.unpack(), {'title': "Старое", 'message': "Текст", 'payload': {'ticket': 7}})
+
+    def test_tenant_policy_overrides_default(self):
+        kept = notification(self.user, days_ago=40)
+        other = create_user(prefix='retention')
+        moved = notification(other, days_ago=8)
+        TenantConfiguration.objects.create(tenant=self.user.tenant, notification_retention_days=0)
+        TenantConfiguration.objects.create(tenant=other.tenant, notification_retention_days=7)
+
+        archived = NotificationArchiver().archive_all()
+
+        self.assertEqual(archived, {self.user.tenant_id: 0, other.tenant_id: 1})
+        self.assertTrue(Notification.objects.filter(pk=kept.pk).exists())
+        self.assertEqual(list(NotificationArchive.objects.values_list('notification_id', flat=True)), [moved.pk])
+
+    def test_archive_moves_rows_in_chunks(self):
+        for _ in range(5):
+            notification(self.user, days_ago=40)
+
+        self.assertEqual(NotificationArchiver(batch_size=2, max_batches=1).archive_tenant(self.user.tenant_id, 30), 2)
+        self.assertEqual(NotificationArchiver(batch_size=2).archive_tenant(self.user.tenant_id, 30), 3)
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(NotificationArchive.objects.count(), 5)
+
+
+class NotificationPartitionTest(TestCase):
+
+    def test_months_cover_range_across_year_boundary(self):
+        months = list(iter_months(date(2025, 11, 15), date(2026, 1, 3)))
+        self.assertEqual(months, [
+            (date(2025, 11, 1), date(2025, 12, 1)),
+            (date(2025, 12, 1), date(2026, 1, 1)),
+            (date(2026, 1, 1), date(2026, 2, 1)),
+        ])
+        self.assertEqual(partition_name(date(2026, 1, 1)), 'notifications_p2026_01')
+
+    def test_plain_table_gets_no_partitions(self):
+        # Партиционирование есть только на PostgreSQL
+        self.assertEqual(ensure_monthly_partitions(), [])
@@ -0,0 +1,50 @@
+"""
+Тесты счётчика непрочитанных уведомлений в REST API.
+"""
+from unittest import mock
+
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from app.core.notification_counters import UnreadNotificationCounter
+from app.models import Notification
+from app.tests.utils import IN_MEMORY_CHANNEL_LAYERS, create_user, fake_redis
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class NotificationReadStateTest(APITestCase):
+
+    def setUp(self):
+        self.user = create_user(prefix='notify')
+        self.client.force_authenticate(self.user)
+        self.counter = UnreadNotificationCounter(redis_client=fake_redis())
+        patcher = mock.patch('app.api.views.notification.unread_counter', self.counter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.notification = Notification.objects.create(user=self.user, title="Уведомление")
+        Notification.objects.create(user=self.user, title="Второе")
+        self.assertEqual(self.counter.reconcile(self.user.id), 2)
+
+    def post(self, action):
+        url = reverse(f'notification-{action}', kwargs={'pk': self.notification.pk})
+        return self.client.post(url)
+
+    def test_mark_read_decrements_once(self):
+        self.assertEqual(self.post('mark-read').status_code, 200)
+        self.assertEqual(self.post('mark-read').status_code, 200)
+        self.assertEqual(self.counter.get(self.user.id), 1)
+        self.notification.refresh_from_db()
+        self.assertTrue(self.notification.is_read)
+
+    def test_mark_unread_increments_once(self):
+        self.post('mark-read')
+        self.post('mark-unread')
+        self.post('mark-unread')
+        self.assertEqual(self.counter.get(self.user.id), 2)
+
+    def test_other_users_notification_is_not_found(self):
+        other = Notification.objects.create(user=create_user(prefix='notify'), title="Чужое")
+        url = reverse('notification-mark-read', kwargs={'pk': other.pk})
+        self.assertEqual(self.client.post(url).status_code, 404)
+        self.assertEqual(self.counter.get(self.user.id), 2)
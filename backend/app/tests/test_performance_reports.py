@@ -0,0 +1,130 @@
+"""
+Тесты фоновой генерации и выгрузки отчетов производительности.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from django.test import SimpleTestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from app import tasks
+from app.core.metric_ingest import COLUMNS
+from app.core.metric_rollups import apply_rollups, bucket_floor
+from app.core.performance_reports import Section, chunk_ranges
+from app.models import PerformanceReport
+from app.tests.utils import create_user
+
+
+def record(tenant, timestamp, *values, endpoint='/api/v1/tickets/'):
+    rows = []
+    for value in values:
+        row = dict.fromkeys(COLUMNS, '')
+        row.update(name='api.latency', metric_type='response_time', value=value, endpoint=endpoint,
+                   service='api', tenant_id=tenant.id, timestamp=timestamp, tags='{}', metadata='{}')
+        rows.append(tuple(row[column] for column in COLUMNS))
+    apply_rollups(rows, COLUMNS)
+
+
+class ChunkRangesTest(SimpleTestCase):
+
+    def test_inner_boundaries_are_aligned(self):
+        start = datetime(2026, 10, 17, 9, 30, tzinfo=dt_timezone.utc)
+        end = datetime(2026, 10, 19, 6, 0, tzinfo=dt_timezone.utc)
+        self.assertEqual(chunk_ranges(start, end, 24), [
+            (start, datetime(2026, 10, 18, 9, 0, tzinfo=dt_timezone.utc)),
+            (datetime(2026, 10, 18, 9, 0, tzinfo=dt_timezone.utc), end),
+        ])
+        self.assertEqual(len(chunk_ranges(start, end, 6, align=86400)), 3)
+
+
+class ReportGenerationTest(TransactionTestCase):
+    # Части отчета считаются в потоках пула со своими соединениями с БД,
+    # поэтому данные должны быть зафиксированы
+
+    def setUp(self):
+        self.user = create_user(prefix='report')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.end = bucket_floor(timezone.now(), 3600)
+        self.start = self.end - timedelta(hours=48)
+        record(self.user.tenant, self.start + timedelta(hours=1, minutes=5), 10.0, 20.0)
+        record(self.user.tenant, self.start + timedelta(hours=30), 30.0, 400.0, endpoint='/api/v1/reports/')
+        self.report = self.create_report()
+        patcher = mock.patch.object(tasks.generate_performance_report, 'delay')
+        self.delay = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_report(self, **config):
+        return PerformanceReport.objects.create(
+            name="Двое суток", report_type='custom', start_date=self.start, end_date=self.end,
+            config=config, tenant=self.user.tenant, created_by=self.user
+        )
+
+    def url(self, name, report=None):
+        return reverse(f'performance-report-{name}', args=[(report or self.report).id])
+
+    def generate(self, report=None):
+        return self.client.post(self.url('generate', report), format='json')
+
+    def test_generation_is_queued_then_downloaded(self):
+        response = self.generate()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual((response.data['status'], response.data['cached']), ('pending', False))
+        self.delay.assert_called_once_with(self.report.id)
+        self.assertEqual(self.client.get(self.url('download')).status_code, 409)
+
+        result = tasks.generate_performance_report(self.report.id)
+
+        self.assertEqual((result['status'], result['chunks']), ('completed', 2))
+        self.report.refresh_from_db()
+        self.assertEqual((self.report.status, self.report.progress), ('completed', 100))
+        self.assertEqual(self.report.artifact_size, len(self.report.artifact))
+
+        response = self.client.get(self.url('download'))
+        self.assertEqual(response.status_code, 200)
+        sections = response.data['sections']
+        self.assertEqual(sections['overview'][0]['count'], 4)
+        self.assertEqual(
+            [(row['endpoint'], row['max']) for row in sections['endpoints']],
+            [('/api/v1/reports/', 400.0), ('/api/v1/tickets/', 20.0)]
+        )
+        self.assertEqual([point['count'] for point in sections['trend']], [2, 2])
+        self.assertEqual(sections['alerts']['total'], 0)
+
+    def test_unchanged_data_reuses_the_artifact(self):
+        self.generate()
+        tasks.generate_performance_report(self.report.id)
+        self.delay.reset_mock()
+
+        response = self.generate()
+        self.assertEqual((response.status_code, response.data['cached']), (200, True))
+
+        # Отчет с теми же параметрами получает копию готового результата
+        twin = self.create_report()
+        response = self.generate(twin)
+        self.assertEqual((response.status_code, response.data['status']), (200, 'completed'))
+        self.delay.assert_not_called()
+        self.assertEqual(self.client.get(self.url('download', twin)).data['sections']['overview'][0]['count'], 4)
+
+        record(self.user.tenant, self.start + timedelta(hours=40), 50.0)
+        self.assertEqual(self.generate().status_code, 202)
+        self.delay.assert_called_once_with(self.report.id)
+
+    def test_repeated_request_does_not_queue_twice(self):
+        self.generate()
+        response = self.generate()
+        self.assertEqual((response.status_code, response.data['status']), (202, 'pending'))
+        self.delay.assert_called_once_with(self.report.id)
+
+    def test_failure_is_reported(self):
+        self.generate()
+        with mock.patch.object(Section, 'compute', side_effect=RuntimeError('rollups unavailable')), \
+                self.assertLogs('app.core.performance_reports', 'ERROR'):
+            self.assertEqual(tasks.generate_performance_report(self.report.id), {'status': 'failed'})
+
+        response = self.client.get(self.url('download'))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['status'], 'failed')
+        self.assertIn('rollups unavailable', response.data['error_message'])
@@ -0,0 +1,129 @@
+"""
+Тесты квантильного скетча DDSketch и перцентилей по агрегатам.
+"""
+import random
+from datetime import timedelta
+
+from django.test import SimpleTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from app.core.metric_ingest import COLUMNS
+from app.core.metric_rollups import apply_rollups, bucket_floor
+from app.core.quantile_sketch import DEFAULT_QUANTILES, DDSketch
+from app.tests.utils import create_user
+
+
+ALPHA = 0.01
+
+
+def exact(values, q):
+    """Точный квантиль с тем же рангом q*(n-1), что и у скетча."""
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def latencies(count, seed=7):
+    generator = random.Random(seed)
+    return [generator.lognormvariate(3, 1.2) for _ in range(count)]
+
+
+class DDSketchTest(SimpleTestCase):
+
+    def assertWithinAlpha(self, estimate, expected):
+        self.assertLessEqual(abs(estimate - expected), ALPHA * abs(expected) + 1e-12)
+
+    def test_quantiles_are_within_relative_error(self):
+        values = latencies(20000)
+        sketch = DDSketch(alpha=ALPHA)
+        sketch.update(values)
+
+        self.assertEqual(sketch.count, len(values))
+        for q in (0.0, 0.25) + DEFAULT_QUANTILES + (0.999, 1.0):
+            self.assertWithinAlpha(sketch.quantile(q), exact(values, q))
+
+    def test_zero_and_negative_values(self):
+        values = [-500.0, -20.0, -1.5, 0.0, 0.0, 2.0, 40.0, 900.0]
+        sketch = DDSketch(alpha=ALPHA)
+        sketch.update(values)
+        for q in (0.0, 0.2, 0.4, 0.5, 0.7, 1.0):
+            self.assertWithinAlpha(sketch.quantile(q), exact(values, q))
+
+    def test_merged_parts_equal_one_sketch(self):
+        values = latencies(6000)
+        whole = DDSketch(alpha=ALPHA)
+        whole.update(values)
+        merged = DDSketch(alpha=ALPHA)
+        for start in range(0, len(values), 1500):
+            part = DDSketch(alpha=ALPHA)
+            part.update(values[start:start + 1500])
+            merged.merge(DDSketch.from_bytes(part.to_bytes()))
+
+        self.assertEqual(merged.count, whole.count)
+        self.assertEqual(merged.quantiles(DEFAULT_QUANTILES), whole.quantiles(DEFAULT_QUANTILES))
+
+    def test_serialization_round_trip(self):
+        sketch = DDSketch(alpha=ALPHA)
+        sketch.update(latencies(1000) + [0.0, -3.0])
+        restored = DDSketch.from_bytes(sketch.to_bytes())
+
+        self.assertEqual(restored.count, sketch.count)
+        self.assertEqual(restored.percentiles(), sketch.percentiles())
+        self.assertAlmostEqual(restored.avg, sketch.avg)
+
+    def test_empty_sketch_and_invalid_arguments(self):
+        sketch = DDSketch(alpha=ALPHA)
+        self.assertIsNone(sketch.quantile(0.5))
+        self.assertEqual(sketch.percentiles(), {'p50': None, 'p90': None, 'p99': None})
+        with self.assertRaises(ValueError):
+            sketch.quantiles([1.5])
+        coarse = DDSketch(alpha=0.05)
+        coarse.add(10.0)
+        with self.assertRaises(ValueError):
+            sketch.merge(coarse)
+
+
+class RollupPercentilesTest(APITestCase):
+
+    def setUp(self):
+        self.user = create_user(prefix='percentiles')
+        self.client.force_authenticate(self.user)
+        # Час целиком внутри суток: перцентили берутся из часовых агрегатов
+        self.hour = bucket_floor(timezone.now(), 3600) - timedelta(hours=3)
+
+    def rows(self, values, endpoint):
+        result = []
+        for n, value in enumerate(values):
+            row = dict.fromkeys(COLUMNS, '')
+            row.update(name='api.latency', metric_type='response_time', value=value, endpoint=endpoint,
+                       tenant_id=self.user.tenant_id, tags='{}', metadata='{}',
+                       timestamp=self.hour + timedelta(seconds=n % 3600))
+            result.append(tuple(row[column] for column in COLUMNS))
+        return result
+
+    def test_percentiles_merge_workers_per_endpoint(self):
+        slow, fast = latencies(3000, seed=1), [value / 10 for value in latencies(1000, seed=2)]
+        # Два воркера пишут в одни и те же интервалы
+        apply_rollups(self.rows(slow[:1200], '/api/v1/reports/'), COLUMNS)
+        apply_rollups(self.rows(slow[1200:], '/api/v1/reports/') + self.rows(fast, '/api/v1/tickets/'), COLUMNS)
+
+        response = self.client.get(reverse('performance-metric-percentiles'), {
+            'metric_name': 'api.latency', 'period': 'day', 'group_by': 'endpoint',
+        })
+
+        self.assertEqual(response.status_code, 200)
+        results = {item['endpoint']: item for item in response.data['results']}
+        self.assertEqual([item['endpoint'] for item in response.data['results']],
+                         ['/api/v1/reports/', '/api/v1/tickets/'])
+        for endpoint, values in (('/api/v1/reports/', slow), ('/api/v1/tickets/', fast)):
+            self.assertEqual(results[endpoint]['count'], len(values))
+            for key, q in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99)):
+                self.assertLessEqual(abs(results[endpoint][key] - exact(values, q)), ALPHA * exact(values, q))
+
+    def test_percentiles_require_a_metric(self):
+        response = self.client.get(reverse('performance-metric-percentiles'), {'group_by': 'endpoint'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('performance-metric-percentiles'),
+                                   {'metric_name': 'api.latency', 'group_by': 'tenant'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,87 @@
+"""
+Тесты инструментирования ORM-запросов.
+"""
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from prometheus_client import REGISTRY
+
+from app.core.performance_monitoring import (
+    QueryBudgetExceeded, QueryInstrumentationMiddleware, fingerprint_query, query_budget,
+)
+from app.models import Tenant
+from app.tests.utils import create_tenant
+
+
+def samples(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def lookups(count):
+    """Представление с запросом в цикле (N+1)."""
+    def view(request):
+        for pk in range(count):
+            Tenant.objects.filter(pk=pk).exists()
+        return HttpResponse()
+    return view
+
+
+class FingerprintTest(SimpleTestCase):
+
+    def test_literals_and_value_lists_are_normalized(self):
+        self.assertEqual(
+            fingerprint_query("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'o''brien' LIMIT 21"),
+            "SELECT * FROM t WHERE id IN (?) AND name = ? LIMIT ?"
+        )
+        self.assertEqual(
+            fingerprint_query("SELECT 1 FROM t WHERE id = 7"),
+            fingerprint_query("SELECT  1 FROM t\n WHERE id = 12")
+        )
+
+
+class QueryBudgetTest(TestCase):
+
+    def test_queries_are_counted_and_timed_by_type(self):
+        create_tenant('queries')
+        selects = samples('db_query_duration_seconds_count', query_type='SELECT')
+        with query_budget(5) as queries:
+            list(Tenant.objects.all())
+            Tenant.objects.exists()
+        self.assertEqual(queries.count, 2)
+        self.assertEqual(samples('db_query_duration_seconds_count', query_type='SELECT') - selects, 2)
+
+    def test_exceeding_the_budget_raises(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget(2):
+                for pk in range(3):
+                    Tenant.objects.filter(pk=pk).exists()
+
+
+class QueryInstrumentationMiddlewareTest(TestCase):
+
+    @override_settings(DB_DUPLICATE_QUERY_THRESHOLD=3)
+    def test_repeated_queries_are_logged_as_n_plus_one(self):
+        middleware = QueryInstrumentationMiddleware(lookups(4))
+        requests = samples('db_queries_per_request_count')
+        query_sum = samples('db_queries_per_request_sum')
+        duplicates = samples('db_duplicate_queries_total')
+
+        with self.assertLogs('app.core.performance_monitoring', 'WARNING') as logs:
+            middleware(RequestFactory().get('/'))
+
+        self.assertEqual(samples('db_queries_per_request_count') - requests, 1)
+        self.assertEqual(samples('db_queries_per_request_sum') - query_sum, 4)
+        self.assertEqual(samples('db_duplicate_queries_total') - duplicates, 1)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("repeated 4 times", logs.output[0])
+
+    @override_settings(DB_DUPLICATE_QUERY_THRESHOLD=3)
+    def test_distinct_queries_are_not_reported(self):
+        middleware = QueryInstrumentationMiddleware(lookups(2))
+        with self.assertNoLogs('app.core.performance_monitoring', 'WARNING'):
+            middleware(RequestFactory().get('/'))
+
+    @override_settings(DB_QUERY_BUDGET=2, DB_QUERY_BUDGET_RAISE=True)
+    def test_request_budget_can_raise(self):
+        middleware = QueryInstrumentationMiddleware(lookups(3))
+        with self.assertRaises(QueryBudgetExceeded):
+            middleware(RequestFactory().get('/'))
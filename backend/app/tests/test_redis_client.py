@@ -0,0 +1,38 @@
+"""
+Тесты метрик пулов соединений Redis.
+"""
+import fakeredis
+from django.test import SimpleTestCase
+from prometheus_client import REGISTRY
+
+from app.core.redis_client import InstrumentedConnectionPool, _register_pool
+
+
+def gauge(name, client):
+    return REGISTRY.get_sample_value(name, {'client': client})
+
+
+class PoolGaugesTest(SimpleTestCase):
+
+    def test_gauges_follow_checked_out_connections(self):
+        pool = InstrumentedConnectionPool(
+            connection_class=fakeredis.FakeRedisConnection, metrics_name='test_pool',
+            server=fakeredis.FakeServer(), max_connections=10
+        )
+        connection = pool.get_connection('PING')
+        self.assertEqual(gauge('redis_pool_connections_in_use', 'test_pool'), 1)
+        pool.release(connection)
+        self.assertEqual(gauge('redis_pool_connections_in_use', 'test_pool'), 0)
+        self.assertEqual(gauge('redis_pool_connections_available', 'test_pool'), 1)
+        self.assertEqual(gauge('redis_pool_max_connections', 'test_pool'), 10)
+
+    def test_pool_without_private_counters_does_not_break_scrape(self):
+        # Пул без внутренних полей redis-py (другая версия или класс пула)
+        class OpaquePool:
+            max_connections = 4
+
+        pool = OpaquePool()
+        _register_pool('test_opaque', pool)
+        self.assertEqual(gauge('redis_pool_connections_in_use', 'test_opaque'), 0)
+        self.assertEqual(gauge('redis_pool_connections_available', 'test_opaque'), 0)
+        self.assertEqual(gauge('redis_pool_max_connections', 'test_opaque'), 4)
@@ -0,0 +1,71 @@
+"""
+Тесты кеша справочников при создании тикета (SLA, настройки, теги).
+"""
+from unittest import mock
+
+from django.db import IntegrityError
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from app.models import SLA, Tag, TenantConfiguration, Ticket, TicketSLA
+from app.tests.utils import create_user, use_fake_cache_redis
+
+
+# Только уровень Redis: поток слушателя локального уровня в тестах не запускается
+@override_settings(REFERENCE_CACHE_ENABLED=True, REFERENCE_CACHE_LOCAL_MAX_ENTRIES=0)
+class TicketCreateReferenceTest(APITestCase):
+
+    def setUp(self):
+        use_fake_cache_redis(self)
+        self.user = create_user(prefix='refs')
+        self.client.force_authenticate(self.user)
+
+    def create_ticket(self, title, **extra):
+        response = self.client.post(
+            reverse('ticket-list'),
+            {'title': title, 'description': title, 'priority': 'high', **extra},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return Ticket.objects.get(title=title)
+
+    def test_sla_change_reaches_next_ticket(self):
+        sla = SLA.objects.create(
+            tenant=self.user.tenant, name="Высокий", priority='high', response_time=2, resolution_time=8
+        )
+        ticket = self.create_ticket("первый")
+        self.assertEqual(ticket.sla_hours, 8)
+        self.assertTrue(TicketSLA.objects.filter(ticket=ticket, sla=sla).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sla.resolution_time = 4
+            sla.save()
+        self.assertEqual(self.create_ticket("второй").sla_hours, 4)
+
+    def test_tenant_default_sla_change_reaches_next_ticket(self):
+        config = TenantConfiguration.objects.create(tenant=self.user.tenant, default_sla_hours=48)
+        self.assertEqual(self.create_ticket("первый").sla_hours, 48)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            config.default_sla_hours = 12
+            config.save()
+        self.assertEqual(self.create_ticket("второй").sla_hours, 12)
+
+    def test_new_tag_is_accepted_right_away(self):
+        Tag.objects.create(name='billing')
+        self.create_ticket("первый")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tag = Tag.objects.create(name='network')
+        ticket = self.create_ticket("второй", tags=[tag.pk])
+        self.assertEqual(list(ticket.tags.values_list('name', flat=True)), ['network'])
+
+    def test_ticket_is_rolled_back_without_sla_link(self):
+        SLA.objects.create(
+            tenant=self.user.tenant, name="Высокий", priority='high', response_time=2, resolution_time=8
+        )
+        with mock.patch.object(TicketSLA.objects, 'create', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                self.create_ticket("без SLA")
+        self.assertFalse(Ticket.objects.filter(title="без SLA").exists())
@@ -0,0 +1,67 @@
+"""
+Тесты записи метрик HTTP-запросов middleware.
+"""
+from asgiref.sync import async_to_sync
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+from prometheus_client import REGISTRY
+from rest_framework.test import APITestCase
+
+from app.core.performance_monitoring import RequestTimingMiddleware
+from app.tests.utils import create_user
+
+
+TICKET_ROUTE = 'api/v1/tickets/(?P<pk>[^/.]+)/$'
+
+
+def sample(name, method, endpoint, status_code):
+    labels = {'method': method, 'endpoint': endpoint, 'status_code': str(status_code)}
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class RequestMetricsTest(APITestCase):
+
+    def setUp(self):
+        self.client.force_authenticate(create_user(prefix='metrics'))
+
+    def test_requests_are_labelled_by_route_template(self):
+        before = sample('http_requests_total', 'GET', TICKET_ROUTE, 404)
+        errors_before = sample('http_errors_total', 'GET', TICKET_ROUTE, 404)
+        timed_before = sample('http_request_duration_seconds_count', 'GET', TICKET_ROUTE, 404)
+
+        for pk in (999001, 999002, 999003):
+            self.assertEqual(self.client.get(f'/api/v1/tickets/{pk}/').status_code, 404)
+
+        # Разные id одного маршрута не порождают новые ряды
+        self.assertEqual(sample('http_requests_total', 'GET', TICKET_ROUTE, 404) - before, 3)
+        self.assertEqual(sample('http_errors_total', 'GET', TICKET_ROUTE, 404) - errors_before, 3)
+        self.assertEqual(sample('http_request_duration_seconds_count', 'GET', TICKET_ROUTE, 404) - timed_before, 3)
+        self.assertIsNone(REGISTRY.get_sample_value(
+            'http_requests_total', {'method': 'GET', 'endpoint': '/api/v1/tickets/999001/', 'status_code': '404'}
+        ))
+
+    def test_unresolved_paths_share_one_label(self):
+        before = sample('http_requests_total', 'GET', '<unmatched>', 404)
+        self.client.get('/no-such-page/1/')
+        self.client.get('/no-such-page/2/')
+        self.assertEqual(sample('http_requests_total', 'GET', '<unmatched>', 404) - before, 2)
+
+
+class RequestTimingMiddlewareTest(SimpleTestCase):
+
+    def test_async_stack_records_requests(self):
+        async def view(request):
+            return HttpResponse(status=201)
+
+        middleware = RequestTimingMiddleware(view)
+        before = sample('http_requests_total', 'POST', '<unmatched>', 201)
+        response = async_to_sync(middleware)(RequestFactory().post('/'))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(sample('http_requests_total', 'POST', '<unmatched>', 201) - before, 1)
+        self.assertEqual(sample('http_errors_total', 'POST', '<unmatched>', 201), 0)
+
+    def test_unknown_methods_are_folded(self):
+        middleware = RequestTimingMiddleware(lambda request: HttpResponse(status=405))
+        before = sample('http_requests_total', 'OTHER', '<unmatched>', 405)
+        middleware(RequestFactory().generic('BREW', '/'))
+        self.assertEqual(sample('http_requests_total', 'OTHER', '<unmatched>', 405) - before, 1)
@@ -0,0 +1,88 @@
+"""
+Тесты кеша ответов API (ETag, 304, сброс по сигналам моделей).
+"""
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from app.models import KnowledgeArticle, KnowledgeCategory, Tag
+from app.tests.utils import create_user, use_fake_cache_redis
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=True)
+class ResponseCacheTestCase(APITestCase):
+
+    def setUp(self):
+        use_fake_cache_redis(self)
+
+    def get(self, url, user, etag=None):
+        self.client.force_authenticate(user)
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(url, **headers)
+
+
+class TagListCacheTest(ResponseCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user(prefix='tags')
+        self.url = reverse('tag-list')
+        Tag.objects.create(name='billing')
+
+    def test_matching_etag_gets_304_without_queries(self):
+        response = self.get(self.url, self.user)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([tag['name'] for tag in response.data['results']], ['billing'])
+
+        with self.assertNumQueries(0):
+            response = self.get(self.url, self.user, etag=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_tag_change_invalidates_list(self):
+        etag = self.get(self.url, self.user)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='network')
+
+        response = self.get(self.url, self.user, etag=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual([tag['name'] for tag in response.data['results']], ['billing', 'network'])
+
+    def test_only_staff_changes_tags(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.post(self.url, {'name': 'vip'}).status_code, 403)
+
+        staff = create_user(tenant=self.user.tenant, prefix='tags', is_staff=True)
+        self.client.force_authenticate(staff)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(self.url, {'name': 'vip'}).status_code, 201)
+        names = [tag['name'] for tag in self.get(self.url, self.user).data['results']]
+        self.assertIn('vip', names)
+
+
+class KnowledgeListCacheTest(ResponseCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.alice = create_user(prefix='kb')
+        self.bob = create_user(prefix='kb')
+        self.url = reverse('knowledge-article-list')
+
+    def article(self, user, title):
+        with self.captureOnCommitCallbacks(execute=True):
+            category, _ = KnowledgeCategory.objects.get_or_create(name="Общее", tenant=user.tenant)
+            return KnowledgeArticle.objects.create(
+                title=title, slug=title, content=title, status='published',
+                category=category, author=user, tenant=user.tenant
+            )
+
+    def test_change_invalidates_only_own_tenant(self):
+        self.article(self.alice, 'first')
+        alice_etag = self.get(self.url, self.alice)['ETag']
+        bob_etag = self.get(self.url, self.bob)['ETag']
+
+        self.article(self.bob, 'second')
+        self.assertEqual(self.get(self.url, self.alice, etag=alice_etag).status_code, 304)
+        response = self.get(self.url, self.bob, etag=bob_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([article['title'] for article in response.data['results']], ['second'])
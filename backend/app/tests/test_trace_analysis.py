@@ -0,0 +1,96 @@
+"""
+Тесты анализа трасс: дерево span, собственное время, критический путь.
+"""
+from datetime import datetime, timedelta
+
+from django.test import SimpleTestCase
+
+from app.core.trace_analysis import analyze_trace, build_tree, compute_self_times
+
+
+ORIGIN = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def span(span_id, parent, start_ms, end_ms, operation=None):
+    return {
+        'span_id': span_id,
+        'parent_span_id': parent,
+        'operation_name': operation or span_id,
+        'service_name': 'api',
+        'start_time': ORIGIN + timedelta(milliseconds=start_ms),
+        'end_time': ORIGIN + timedelta(milliseconds=end_ms),
+        'duration_ms': end_ms - start_ms,
+        'status_code': 'OK',
+        'is_error': False,
+        'error_message': '',
+    }
+
+
+def path_of(result):
+    return [(step['span_id'], step['start_offset_ms'], step['duration_ms']) for step in result['critical_path']]
+
+
+class TraceAnalysisTest(SimpleTestCase):
+
+    def test_self_time_counts_overlapping_children_once(self):
+        roots = build_tree([
+            span('root', None, 0, 100),
+            span('a', 'root', 10, 40),
+            span('b', 'root', 30, 60),
+            # Выходит за границы родителя: учитывается только пересечение
+            span('c', 'b', 50, 80),
+        ])
+        compute_self_times(roots)
+        root = roots[0]
+        a, b = root.children
+        self.assertEqual(root.self_time, 50)
+        self.assertEqual((a.self_time, b.self_time), (30, 20))
+
+    def test_critical_path_follows_last_finishing_child(self):
+        result = analyze_trace([
+            span('root', None, 0, 100),
+            span('a', 'root', 10, 40),
+            span('b', 'root', 50, 90),
+            span('g', 'b', 60, 80),
+        ])
+        self.assertEqual(result['duration_ms'], 100)
+        self.assertEqual(path_of(result), [
+            ('root', 0, 10), ('a', 10, 30), ('root', 40, 10),
+            ('b', 50, 10), ('g', 60, 20), ('b', 80, 10), ('root', 90, 10),
+        ])
+        tree = result['roots'][0]
+        self.assertEqual(tree['critical_time_ms'], 30)
+        self.assertEqual([child['span_id'] for child in tree['children']], ['a', 'b'])
+
+    def test_overlapped_child_is_off_the_critical_path(self):
+        result = analyze_trace([
+            span('root', None, 0, 100),
+            span('slow', 'root', 10, 70),
+            span('fast', 'root', 20, 50),
+        ])
+        self.assertEqual(path_of(result), [('root', 0, 10), ('slow', 10, 60), ('root', 70, 30)])
+        by_operation = {row['operation_name']: row['duration_ms'] for row in result['critical_path_by_operation']}
+        self.assertEqual(by_operation, {'root': 40, 'slow': 60})
+
+    def test_missing_parent_and_cycle_become_orphan_roots(self):
+        result = analyze_trace([
+            span('root', None, 0, 100),
+            span('lost', 'not-exported', 10, 20),
+            span('x', 'y', 30, 40),
+            span('y', 'x', 35, 38),
+        ])
+        self.assertEqual(result['span_count'], 4)
+        self.assertEqual([root['span_id'] for root in result['roots']], ['root', 'lost', 'x'])
+        self.assertEqual([child['span_id'] for child in result['roots'][2]['children']], ['y'])
+
+    def test_deep_trace_is_serialized_without_recursion(self):
+        depth = 5000
+        spans = [span('s0', None, 0, depth * 2)]
+        spans += [span(f's{n}', f's{n - 1}', n, depth * 2 - n) for n in range(1, depth)]
+        result = analyze_trace(spans)
+
+        node, levels = result['roots'][0], 1
+        while node['children']:
+            node, levels = node['children'][0], levels + 1
+        self.assertEqual(levels, depth)
+        self.assertEqual(result['duration_ms'], depth * 2)
@@ -0,0 +1,135 @@
+"""
+Тесты декоратора traced и передачи контекста трассировки.
+"""
+from types import SimpleNamespace
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from django.http import HttpResponse
+from django.test import SimpleTestCase, override_settings
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.trace import SpanKind, StatusCode
+
+from app.core import tracing
+from app.core.trace_export import TENANT_ATTRIBUTE, USER_ATTRIBUTE
+
+
+AGENT = SimpleNamespace(is_authenticated=True, id=5, tenant_id=3)
+
+
+class TracingTestMixin:
+
+    def setUp(self):
+        self.exporter = InMemorySpanExporter()
+        provider = TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(self.exporter))
+        previous = tracing.get_tracer()
+        tracing.set_tracer(provider.get_tracer('tests'))
+        self.addCleanup(tracing.set_tracer, previous)
+
+    def spans(self):
+        return {span.name: span for span in self.exporter.get_finished_spans()}
+
+
+class TracedTest(TracingTestMixin, SimpleTestCase):
+
+    def test_sync_call_records_user_and_success(self):
+        @tracing.traced('tickets.list', operation_type='api_call')
+        def view(request):
+            return HttpResponse(status=200)
+
+        view(SimpleNamespace(user=AGENT))
+
+        span = self.spans()['tickets.list']
+        self.assertEqual(span.attributes['operation.type'], 'api_call')
+        self.assertEqual(span.attributes[USER_ATTRIBUTE], 5)
+        self.assertEqual(span.attributes[TENANT_ATTRIBUTE], 3)
+        self.assertEqual(span.attributes['status'], 'success')
+        self.assertEqual(span.attributes['http.status_code'], 200)
+        self.assertNotEqual(span.status.status_code, StatusCode.ERROR)
+
+    def test_falsy_result_is_not_an_error(self):
+        tracing.traced('empty')(lambda: [])()
+        self.assertEqual(self.spans()['empty'].attributes['status'], 'success')
+
+    def test_server_error_response_marks_span(self):
+        tracing.traced('broken')(lambda: HttpResponse(status=503))()
+        span = self.spans()['broken']
+        self.assertEqual(span.status.status_code, StatusCode.ERROR)
+        self.assertEqual(span.attributes['status'], 'error')
+
+    def test_async_exception_is_recorded_and_reraised(self):
+        class Consumer:
+            scope = {'user': AGENT}
+
+            @tracing.traced('consumer.receive')
+            async def receive(self):
+                raise KeyError('type')
+
+        with self.assertRaises(KeyError):
+            async_to_sync(Consumer().receive)()
+
+        span = self.spans()['consumer.receive']
+        self.assertEqual(span.status.status_code, StatusCode.ERROR)
+        self.assertEqual(span.attributes['status'], 'error')
+        self.assertEqual(span.attributes[USER_ATTRIBUTE], 5)
+        self.assertEqual([event.name for event in span.events], ['exception'])
+        self.assertEqual(span.events[0].attributes['exception.type'], 'KeyError')
+
+    def test_database_threads_nest_under_the_awaiting_span(self):
+        @database_sync_to_async
+        @tracing.traced('consumer.load')
+        def load():
+            return 1
+
+        @tracing.traced('consumer.connect')
+        async def connect():
+            return await load()
+
+        self.assertEqual(async_to_sync(connect)(), 1)
+        spans = self.spans()
+        self.assertEqual(spans['consumer.load'].parent.span_id, spans['consumer.connect'].context.span_id)
+        self.assertEqual(spans['consumer.load'].context.trace_id, spans['consumer.connect'].context.trace_id)
+
+    @override_settings(TRACE_ENABLED=False)
+    def test_disabled_tracing_creates_no_spans(self):
+        self.assertEqual(tracing.traced('off')(lambda: 7)(), 7)
+        self.assertEqual(self.exporter.get_finished_spans(), ())
+
+
+class CeleryPropagationTest(TracingTestMixin, SimpleTestCase):
+
+    def run_task(self, headers, task_id, state='SUCCESS', exception=None):
+        """Обработать сигналы воркера для задачи с заголовками headers."""
+        request = SimpleNamespace(retries=0, **headers)
+        task = SimpleNamespace(name='app.tasks.generate_report', request=request)
+        tracing.start_task_span(task_id=task_id, task=task)
+        if exception is not None:
+            tracing.record_task_failure(task_id=task_id, exception=exception)
+        tracing.end_task_span(task_id=task_id, state=state)
+
+    def test_worker_span_is_a_child_of_the_publisher(self):
+        headers = {}
+        with tracing.get_tracer().start_as_current_span('api.publish') as publisher:
+            tracing.inject_task_context(headers=headers)
+        self.assertIn('traceparent', headers)
+
+        self.run_task(headers, 'task-1')
+
+        span = self.spans()['celery.task app.tasks.generate_report']
+        self.assertEqual(span.kind, SpanKind.CONSUMER)
+        self.assertEqual(span.parent.span_id, publisher.get_span_context().span_id)
+        self.assertEqual(span.attributes['celery.task_id'], 'task-1')
+        self.assertEqual(span.attributes['status'], 'success')
+        self.assertEqual(tracing._task_spans, {})
+
+    def test_failed_task_records_the_exception(self):
+        self.run_task({}, 'task-2', state='FAILURE', exception=RuntimeError('boom'))
+
+        span = self.spans()['celery.task app.tasks.generate_report']
+        self.assertIsNone(span.parent)
+        self.assertEqual(span.status.status_code, StatusCode.ERROR)
+        self.assertEqual(span.attributes['celery.state'], 'FAILURE')
+        self.assertEqual(span.attributes['status'], 'error')
@@ -0,0 +1,90 @@
+"""
+Тесты согласования кодировки кадров WebSocket.
+"""
+from types import SimpleNamespace
+from unittest import mock
+
+import msgpack
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.test import SimpleTestCase, override_settings
+
+from app.core import ws_frames
+from app.management.commands._websocket_bench import websocket_application
+from app.tests.utils import IN_MEMORY_CHANNEL_LAYERS
+from channels.testing.websocket import WebsocketCommunicator
+
+
+AGENT = SimpleNamespace(is_authenticated=True, id=1, tenant_id=1)
+
+
+class NegotiationTest(SimpleTestCase):
+
+    def test_server_preference_wins(self):
+        scope = {'subprotocols': ['workernet.json', 'workernet.msgpack']}
+        self.assertEqual(ws_frames.negotiate(scope), (ws_frames.MSGPACK, 'workernet.msgpack'))
+        self.assertEqual(ws_frames.negotiate({'subprotocols': ['workernet.json']}), (ws_frames.JSON, 'workernet.json'))
+
+    def test_clients_without_subprotocol_keep_json(self):
+        self.assertEqual(ws_frames.negotiate({'subprotocols': ['chat.v2']}), (ws_frames.JSON, None))
+        self.assertEqual(ws_frames.negotiate({}), (ws_frames.JSON, None))
+
+    def test_decode_rejects_non_objects(self):
+        self.assertEqual(ws_frames.decode(bytes_data=msgpack.packb({'type': 'x'})), {'type': 'x'})
+        for frame in ({'text_data': '[1, 2]'}, {'bytes_data': msgpack.packb([1])}, {'bytes_data': b'\xc1'}):
+            with self.assertRaises(ValueError):
+                ws_frames.decode(**frame)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class EncodedDeliveryTest(SimpleTestCase):
+
+    async def connect(self, path, subprotocols=None):
+        communicator = WebsocketCommunicator(websocket_application(), path, subprotocols=subprotocols)
+        communicator.scope['user'] = AGENT
+        connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator, subprotocol
+
+    def test_group_event_is_encoded_once_for_all_recipients(self):
+        payload = {'type': 'status_updated', 'status': 'resolved', 'note': "готово"}
+
+        async def run():
+            json_client, json_protocol = await self.connect('/ws/tickets/7/')
+            binary_client, binary_protocol = await self.connect('/ws/tickets/7/', ['workernet.msgpack'])
+            event = ws_frames.group_event('status_updated', 'ticket_7', payload)
+            # Рассылка не сериализует кадр заново для каждого получателя
+            with mock.patch.object(ws_frames.json, 'dumps', side_effect=AssertionError), \
+                    mock.patch.object(ws_frames.msgpack, 'packb', side_effect=AssertionError):
+                await get_channel_layer().group_send('ticket_7', event)
+                text = await json_client.receive_from()
+                binary = await binary_client.receive_output()
+            await json_client.disconnect()
+            await binary_client.disconnect()
+            return json_protocol, binary_protocol, text, binary
+
+        json_protocol, binary_protocol, text, binary = async_to_sync(run)()
+        self.assertEqual((json_protocol, binary_protocol), (None, 'workernet.msgpack'))
+        self.assertEqual(ws_frames.decode(text_data=text), payload)
+        self.assertNotIn('text', binary)
+        self.assertEqual(msgpack.unpackb(binary['bytes']), payload)
+
+    def test_multiplexed_binary_frames_wrap_the_delegate_frame(self):
+        async def run():
+            client, _ = await self.connect('/ws/stream/', ['workernet.msgpack'])
+            await client.send_to(bytes_data=msgpack.packb({'type': 'subscribe', 'topic': 'ticket:7'}))
+            subscribed = await client.receive_output()
+            await get_channel_layer().group_send(
+                'ticket_7', ws_frames.group_event('status_updated', 'ticket_7', {'type': 'status_updated'})
+            )
+            event = await client.receive_output()
+            await client.send_to(bytes_data=b'\xc1')
+            error = await client.receive_output()
+            await client.disconnect()
+            return [msgpack.unpackb(frame['bytes']) for frame in (subscribed, event, error)]
+
+        self.assertEqual(async_to_sync(run)(), [
+            {'type': 'subscribed', 'topic': 'ticket:7'},
+            {'topic': 'ticket:7', 'event': {'type': 'status_updated'}},
+            {'type': 'error', 'topic': None, 'message': 'Invalid frame'},
+        ])
@@ -0,0 +1,97 @@
+"""
+Тесты мультиплексированного WebSocket ws/stream/.
+"""
+from types import SimpleNamespace
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.auth.models import AnonymousUser
+from django.test import SimpleTestCase, override_settings
+
+from app.core import ws_frames
+from app.management.commands._websocket_bench import websocket_application
+from app.tests.utils import IN_MEMORY_CHANNEL_LAYERS
+from channels.testing.websocket import WebsocketCommunicator
+
+
+AGENT = SimpleNamespace(is_authenticated=True, id=1, tenant_id=1)
+
+
+def status_event(ticket_id, status):
+    group = f'ticket_{ticket_id}'
+    return group, ws_frames.group_event('status_updated', group, {'type': 'status_updated', 'status': status})
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class MultiplexConsumerTest(SimpleTestCase):
+
+    def run_session(self, scenario, user=AGENT):
+        """Выполнить scenario(communicator) на одном соединении ws/stream/."""
+        async def run():
+            communicator = WebsocketCommunicator(websocket_application(), '/ws/stream/')
+            communicator.scope['user'] = user
+            connected, _ = await communicator.connect()
+            if not connected:
+                return False
+            try:
+                return await scenario(communicator)
+            finally:
+                await communicator.disconnect()
+        return async_to_sync(run)()
+
+    def test_anonymous_socket_is_refused(self):
+        self.assertFalse(self.run_session(None, user=AnonymousUser()))
+
+    def test_group_events_are_routed_to_their_topic(self):
+        async def scenario(communicator):
+            layer = get_channel_layer()
+            replies = []
+            for topic in ('ticket:1', 'ticket:2'):
+                await communicator.send_json_to({'type': 'subscribe', 'topic': topic})
+                replies.append(await communicator.receive_json_from())
+            for ticket_id, status in ((2, 'resolved'), (1, 'in_progress')):
+                await layer.group_send(*status_event(ticket_id, status))
+                replies.append(await communicator.receive_json_from())
+            return replies
+
+        self.assertEqual(self.run_session(scenario), [
+            {'type': 'subscribed', 'topic': 'ticket:1'},
+            {'type': 'subscribed', 'topic': 'ticket:2'},
+            {'topic': 'ticket:2', 'event': {'type': 'status_updated', 'status': 'resolved'}},
+            {'topic': 'ticket:1', 'event': {'type': 'status_updated', 'status': 'in_progress'}},
+        ])
+
+    def test_unsubscribed_topic_gets_no_events(self):
+        async def scenario(communicator):
+            await communicator.send_json_to({'type': 'subscribe', 'topic': 'ticket:1'})
+            await communicator.receive_json_from()
+            await communicator.send_json_to({'type': 'unsubscribe', 'topic': 'ticket:1'})
+            reply = await communicator.receive_json_from()
+            await get_channel_layer().group_send(*status_event(1, 'closed'))
+            return reply, await communicator.receive_nothing(timeout=0.1)
+
+        self.assertEqual(self.run_session(scenario), ({'type': 'unsubscribed', 'topic': 'ticket:1'}, True))
+
+    def test_protocol_errors(self):
+        async def scenario(communicator):
+            replies = []
+            for frame in (
+                {'type': 'subscribe', 'topic': 'secrets:1'},
+                {'type': 'subscribe', 'topic': 'notifications:1'},
+                {'type': 'comment', 'topic': 'ticket:1', 'content': "мимо"},
+                {'type': 'subscribe', 'topic': 'ticket:1'},
+                {'type': 'subscribe', 'topic': 'ticket:2'},
+            ):
+                await communicator.send_json_to(frame)
+                replies.append(await communicator.receive_json_from())
+            return [(reply['type'], reply.get('message')) for reply in replies]
+
+        with override_settings(WS_MAX_SUBSCRIPTIONS=1):
+            replies = self.run_session(scenario)
+        self.assertEqual(replies, [
+            ('error', 'Unknown topic'),
+            ('error', 'Unknown topic'),
+            ('error', 'Not subscribed'),
+            ('subscribed', None),
+            ('error', 'Too many subscriptions'),
+        ])
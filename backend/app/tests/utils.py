@@ -0,0 +1,67 @@
+"""
+Общие помощники тестов.
+
+Тесты не требуют Redis: компоненты с Redis получают клиент fakeredis
+(requirements-dev.txt), слой каналов - in-memory.
+"""
+import itertools
+from unittest import mock
+
+import fakeredis
+from django.contrib.auth import get_user_model
+
+from app.core.performance_monitoring import CacheManager
+from app.core.reference_cache import reference_cache
+from app.core.response_cache import response_cache
+from app.models import Tenant
+
+
+User = get_user_model()
+
+IN_MEMORY_CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    }
+}
+
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+_sequence = itertools.count()
+
+
+def create_tenant(prefix='test'):
+    """Создать арендатора с уникальными slug и доменом."""
+    n = next(_sequence)
+    return Tenant.objects.create(name=f"{prefix}-{n}", slug=f"{prefix}-{n}", domain=f"{prefix}-{n}.local")
+
+
+def create_user(tenant=None, prefix='test', **extra):
+    """Создать пользователя (и арендатора, если он не передан)."""
+    tenant = tenant or create_tenant(prefix)
+    n = next(_sequence)
+    return User.objects.create_user(
+        username=f"{prefix}-user-{n}", email=f"{prefix}-user-{n}@example.com",
+        tenant=tenant, **extra
+    )
+
+
+def fake_redis():
+    """Отдельный in-memory Redis (с поддержкой Lua-скриптов)."""
+    return fakeredis.FakeRedis(server=fakeredis.FakeServer())
+
+
+def use_fake_cache_redis(test_case):
+    """Перевести кеш ответов и кеш справочников на общий fakeredis до конца теста."""
+    redis_client = fake_redis()
+    for patcher in (
+        mock.patch.object(response_cache, 'manager', CacheManager(redis_client)),
+        mock.patch.object(reference_cache, 'manager', CacheManager(redis_client)),
+        mock.patch('app.core.reference_cache.get_redis_client', return_value=redis_client),
+    ):
+        patcher.start()
+        test_case.addCleanup(patcher.stop)
+    return redis_client
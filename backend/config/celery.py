@@ -0,0 +1,19 @@
+"""
+Celery config for WorkerNet Portal project.
+"""
+
+import os
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+app = Celery('workernet')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+
+# conf.result_backend берёт переменную окружения CELERY_RESULT_BACKEND раньше
+# настроек, поэтому инструментированный бэкенд (метрики redis_*) задаётся
+# приложению явно: backend_cls важнее conf.result_backend
+result_backend = app.conf.result_backend or ''
+if result_backend.startswith(('redis://', 'rediss://')):
+    app.backend_cls = 'app.core.redis_client:InstrumentedRedisBackend+' + result_backend
+app.autodiscover_tasks()
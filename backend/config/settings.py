@@ -82,6 +82,8 @@ INSTALLED_APPS = ['app'] + DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
     'django_prometheus.middleware.PrometheusBeforeMiddleware',
+    'app.core.performance_monitoring.RequestTimingMiddleware',
+    'app.core.performance_monitoring.QueryInstrumentationMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -233,6 +235,8 @@ CACHES = {
         'LOCATION': env('REDIS_CACHE_URL', default='redis://127.0.0.1:6379/1'),
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'CONNECTION_POOL_CLASS': 'app.core.redis_client.InstrumentedConnectionPool',
+            'CONNECTION_POOL_KWARGS': {'metrics_name': 'cache'},
         }
     }
 }
@@ -240,18 +244,51 @@ CACHES = {
 # Celery
 CELERY_BROKER_URL = env('CELERY_BROKER_URL', default='redis://127.0.0.1:6379/2')
 CELERY_RESULT_BACKEND = env('CELERY_RESULT_BACKEND', default='redis://127.0.0.1:6379/3')
+# Соединения Celery с Redis идут через инструментированные пулы (метрики redis_*);
+# класс бэкенда результатов задаётся приложению в config/celery.py
+if CELERY_BROKER_URL.startswith(('redis://', 'rediss://')):
+    CELERY_BROKER_TRANSPORT = 'app.core.redis_client:InstrumentedKombuTransport'
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+CELERY_BEAT_SCHEDULE = {
+    'archive-read-notifications': {
+        'task': 'app.notifications.archive_read',
+        'schedule': timedelta(hours=1),
+    },
+    'flush-notification-digests': {
+        'task': 'app.notifications.flush_digests',
+        'schedule': timedelta(minutes=1),
+    },
+    'recover-chat-messages': {
+        'task': 'app.chat.recover_pending',
+        'schedule': timedelta(minutes=1),
+    },
+    'ensure-notification-partitions': {
+        'task': 'app.notifications.ensure_partitions',
+        'schedule': timedelta(days=1),
+    },
+    'expire-performance-metrics': {
+        'task': 'app.performance.expire_metrics',
+        'schedule': timedelta(hours=1),
+    },
+    'refresh-performance-dashboards': {
+        'task': 'app.performance.refresh_dashboards',
+        'schedule': timedelta(seconds=env.int('DASHBOARD_REFRESH_SECONDS', default=15)),
+    },
+}
+
+# Redis (общий клиент для счётчиков, presence и т.п.)
+REDIS_URL = env('REDIS_URL', default='redis://127.0.0.1:6379/0')
 
 # Channels
 CHANNEL_LAYERS = {
     'default': {
-        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'BACKEND': 'app.core.redis_client.InstrumentedRedisChannelLayer',
         'CONFIG': {
-            "hosts": [env('REDIS_URL', default='redis://127.0.0.1:6379/0')],
+            "hosts": [REDIS_URL],
         },
     },
 }
@@ -348,6 +385,86 @@ TENANT_HEADER = env('TENANT_HEADER', default='X-Tenant-ID')
 
 # Performance
 CACHE_TTL = env('CACHE_TTL', default=3600)
+# Интервал ленивой сверки счётчиков непрочитанных уведомлений с БД (сек)
+NOTIFICATION_UNREAD_COUNTER_TTL = env.int('NOTIFICATION_UNREAD_COUNTER_TTL', default=300)
+# Число последних сообщений комнаты, отдаваемых ChatConsumer при подключении
+CHAT_HISTORY_SIZE = env.int('CHAT_HISTORY_SIZE', default=50)
+# Отложенная (write-behind) запись сообщений чата пакетами
+CHAT_WRITE_BEHIND_ENABLED = env.bool('CHAT_WRITE_BEHIND_ENABLED', default=True)
+CHAT_WRITE_BEHIND_BATCH_SIZE = env.int('CHAT_WRITE_BEHIND_BATCH_SIZE', default=100)
+CHAT_WRITE_BEHIND_FLUSH_MS = env.int('CHAT_WRITE_BEHIND_FLUSH_MS', default=20)
+# Presence: пользователь онлайн, пока heartbeat не старше PRESENCE_TTL секунд
+PRESENCE_TTL = env.int('PRESENCE_TTL', default=60)
+# Индикатор набора: не чаще раза в TYPING_THROTTLE_MS, гаснет через TYPING_TTL_MS
+TYPING_THROTTLE_MS = env.int('TYPING_THROTTLE_MS', default=2000)
+TYPING_TTL_MS = env.int('TYPING_TTL_MS', default=6000)
+# Максимум тем на одном мультиплексированном WebSocket (ws/stream/)
+WS_MAX_SUBSCRIPTIONS = env.int('WS_MAX_SUBSCRIPTIONS', default=100)
+# Бюджет SQL-запросов на HTTP-запрос (None — без ограничения); в тестах
+# DB_QUERY_BUDGET_RAISE=True превращает превышение в исключение
+DB_QUERY_BUDGET = env.int('DB_QUERY_BUDGET', default=None)
+DB_QUERY_BUDGET_RAISE = env.bool('DB_QUERY_BUDGET_RAISE', default=False)
+# Сколько повторов одного запроса за HTTP-запрос считать N+1
+DB_DUPLICATE_QUERY_THRESHOLD = env.int('DB_DUPLICATE_QUERY_THRESHOLD', default=5)
+# Пакетный приём PerformanceMetric (metrics/ingest/): сброс каждые N строк
+# или N мс; при METRIC_INGEST_MAX_BUFFER строк в буфере — 429 после таймаута
+METRIC_INGEST_BATCH_SIZE = env.int('METRIC_INGEST_BATCH_SIZE', default=5000)
+METRIC_INGEST_FLUSH_MS = env.int('METRIC_INGEST_FLUSH_MS', default=200)
+METRIC_INGEST_MAX_BUFFER = env.int('METRIC_INGEST_MAX_BUFFER', default=100000)
+METRIC_INGEST_SUBMIT_TIMEOUT_MS = env.int('METRIC_INGEST_SUBMIT_TIMEOUT_MS', default=1000)
+METRIC_INGEST_MAX_SAMPLES = env.int('METRIC_INGEST_MAX_SAMPLES', default=10000)
+# Сроки хранения PerformanceMetric (дни): сырые строки и агрегаты 1m/1h/1d
+METRIC_RAW_RETENTION_DAYS = env.int('METRIC_RAW_RETENTION_DAYS', default=7)
+METRIC_ROLLUP_1M_RETENTION_DAYS = env.int('METRIC_ROLLUP_1M_RETENTION_DAYS', default=14)
+METRIC_ROLLUP_1H_RETENTION_DAYS = env.int('METRIC_ROLLUP_1H_RETENTION_DAYS', default=180)
+METRIC_ROLLUP_1D_RETENTION_DAYS = env.int('METRIC_ROLLUP_1D_RETENTION_DAYS', default=730)
+METRIC_LATEST_MAX_LIMIT = env.int('METRIC_LATEST_MAX_LIMIT', default=1000)
+# Оценка порогов PerformanceThreshold на потоке метрик: правила арендатора
+# перечитываются раз в N сек, окна без новых значений проверяются раз в N сек
+ALERT_RULES_REFRESH_SECONDS = env.int('ALERT_RULES_REFRESH_SECONDS', default=60)
+ALERT_SWEEP_SECONDS = env.int('ALERT_SWEEP_SECONDS', default=10)
+# Трассировки OpenTelemetry: доля трасс по trace_id (head sampling); при
+# TRACE_TAIL_SAMPLING остальные трассы сохраняются, только если в них
+# была ошибка или любой span (не только корневой) дольше TRACE_SLOW_SPAN_MS
+TRACE_ENABLED = env.bool('TRACE_ENABLED', default=True)
+TRACE_SERVICE_NAME = env('TRACE_SERVICE_NAME', default='worker-net-api')
+TRACE_SAMPLE_RATIO = env.float('TRACE_SAMPLE_RATIO', default=0.1)
+TRACE_TAIL_SAMPLING = env.bool('TRACE_TAIL_SAMPLING', default=True)
+TRACE_SLOW_SPAN_MS = env.int('TRACE_SLOW_SPAN_MS', default=1000)
+TRACE_TAIL_MAX_PENDING_SPANS = env.int('TRACE_TAIL_MAX_PENDING_SPANS', default=20000)
+# Запись span в PerformanceTrace: bulk_create пачками раз в N мс; span сверх
+# TRACE_EXPORT_MAX_QUEUE в очереди отбрасываются, запрос не ждёт
+TRACE_EXPORT_BATCH_SIZE = env.int('TRACE_EXPORT_BATCH_SIZE', default=512)
+TRACE_EXPORT_MAX_QUEUE = env.int('TRACE_EXPORT_MAX_QUEUE', default=10000)
+TRACE_EXPORT_FLUSH_MS = env.int('TRACE_EXPORT_FLUSH_MS', default=1000)
+# Дашборды производительности: TTL кеша результата виджета по разрешению
+# агрегатов (сек) и срок, в течение которого дашборд без heartbeat от
+# открытых сокетов ещё считается просматриваемым и обновляется по WebSocket
+DASHBOARD_WIDGET_TTL_1M = env.int('DASHBOARD_WIDGET_TTL_1M', default=30)
+DASHBOARD_WIDGET_TTL_1H = env.int('DASHBOARD_WIDGET_TTL_1H', default=300)
+DASHBOARD_WIDGET_TTL_1D = env.int('DASHBOARD_WIDGET_TTL_1D', default=1800)
+DASHBOARD_WATCH_TTL = env.int('DASHBOARD_WATCH_TTL', default=120)
+# Отчеты производительности: период делится на части по N часов, части
+# разделов считаются параллельно в M потоках задачи Celery
+PERFORMANCE_REPORT_CHUNK_HOURS = env.int('PERFORMANCE_REPORT_CHUNK_HOURS', default=24)
+PERFORMANCE_REPORT_WORKERS = env.int('PERFORMANCE_REPORT_WORKERS', default=4)
+# CacheManager: TTL отрицательных записей (fetch вернул None), параметр
+# вероятностного досрочного пересчёта (0 - выключен), время жизни блокировки
+# ключа при пересчёте и сколько остальные воркеры ждут значение (мс)
+CACHE_NEGATIVE_TTL = env.int('CACHE_NEGATIVE_TTL', default=60)
+CACHE_EARLY_EXPIRATION_BETA = env.float('CACHE_EARLY_EXPIRATION_BETA', default=1.0)
+CACHE_LOCK_TIMEOUT_MS = env.int('CACHE_LOCK_TIMEOUT_MS', default=10000)
+CACHE_LOCK_WAIT_MS = env.int('CACHE_LOCK_WAIT_MS', default=2000)
+# Кеш справочников (настройки арендатора, SLA, теги, флаги): выключатель,
+# размер и TTL (с) локального LRU процесса перед Redis
+REFERENCE_CACHE_ENABLED = env.bool('REFERENCE_CACHE_ENABLED', default=True)
+REFERENCE_CACHE_LOCAL_MAX_ENTRIES = env.int('REFERENCE_CACHE_LOCAL_MAX_ENTRIES', default=10000)
+REFERENCE_CACHE_LOCAL_TTL = env.int('REFERENCE_CACHE_LOCAL_TTL', default=30)
+# Кеш ответов API (база знаний, теги) с ETag и условным GET; TTL - класс
+# 'response' в CacheManager
+RESPONSE_CACHE_ENABLED = env.bool('RESPONSE_CACHE_ENABLED', default=True)
+# Срок хранения прочитанных уведомлений по умолчанию (дни), если у арендатора нет настроек
+NOTIFICATION_RETENTION_DAYS = env.int('NOTIFICATION_RETENTION_DAYS', default=90)
 RATE_LIMIT_ENABLED = env('RATE_LIMIT_ENABLED', default=True)
 
 # Development